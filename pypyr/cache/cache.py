@@ -1,27 +1,101 @@
 """pypyr caching base class and functions."""
+from collections import OrderedDict
+from contextlib import contextmanager
 import logging
 import threading
+from time import monotonic
+from timeit import default_timer as timer
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
+# sentinel for a missing key, since None is a valid cached value.
+_MISSING = object()
+
 
 class Cache():
     """Thread-safe general purpose cache for objects.
 
     Add things to the cache by calling get(key, creator). If the requested key
     doesn't exist, will add the item to the cache for you.
+
+    Reading an item that is already in the cache does not lock. Creating an
+    item only locks on that item's key, so a slow creator does not block
+    other keys.
+
+    Optionally bounded by max_size, where adding an item past max_size evicts
+    the least recently used item. Optionally items expire ttl seconds after
+    they were created, after which the next get creates the item again.
+
+    Attributes:
+        max_size (int): Maximum number of items to keep. None is unbounded.
+        ttl (float): Seconds an item lives after creation. None never expires.
     """
 
-    def __init__(self):
-        """Instantiate the cache."""
+    def __init__(self, max_size=None, ttl=None):
+        """Instantiate the cache.
+
+        Args:
+            max_size (int): Maximum number of items to keep. Default None,
+                            meaning unbounded.
+            ttl (float): Seconds an item lives after creation. Default None,
+                         meaning items never expire.
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        # guards writes to _cache, _expires & _key_locks. Never held while
+        # creating.
         self._lock = threading.RLock()
-        self._cache = {}
+        self._cache = OrderedDict()
+        self._expires = {}
+        # key: [lock, number of threads holding or waiting on it]
+        self._key_locks = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._creation_time = 0.0
+
+    def configure(self, max_size=None, ttl=None):
+        """Change the cache's limits.
+
+        Shrinking max_size evicts the least recently used items right away.
+        A new ttl applies to items created after this.
+
+        Args:
+            max_size (int): Maximum number of items to keep. Default None,
+                            meaning unbounded.
+            ttl (float): Seconds an item lives after creation. Default None,
+                         meaning items never expire.
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._evict()
 
     def clear(self):
         """Clear the cache of all objects."""
         with self._lock:
             self._cache.clear()
+            self._expires.clear()
+
+    def invalidate(self, key):
+        """Remove key from the cache, so the next get creates it again.
+
+        Does nothing if key is not in the cache.
+
+        Args:
+            key: key (unique id) of cached item
+        """
+        with self._lock:
+            if self._cache.pop(key, _MISSING) is not _MISSING:
+                logger.debug("%s invalidated", key)
+            self._expires.pop(key, None)
 
     def get(self, key, creator):
         """Get key from cache. If key not exist, call creator and cache result.
@@ -31,8 +105,9 @@ def get(self, key, creator):
         If key is not found, call creator and save the result to cache for that
         key.
 
-        Be warned that get happens under the context of a RLock. . . so if
-        creator takes a long time you might well be blocking.
+        creator runs under a lock for key only. Other threads asking for the
+        same key wait for creator to finish rather than also calling it. Other
+        keys are not blocked.
 
         Args:
             key: key (unique id) of cached item
@@ -41,13 +116,126 @@ def get(self, key, creator):
         Returns:
             Cached item at key or the result of creator()
         """
-        with self._lock:
-            if key in self._cache:
+        # fast path: a single dict lookup is atomic, so no lock for a hit.
+        obj = self._get_live(key)
+        if obj is not _MISSING:
+            logger.debug("%s loading from cache", key)
+            self._hits += 1
+            return obj
+
+        with self._hold_key_lock(key):
+            # double-check: another thread might've created it while waiting.
+            obj = self._get_live(key)
+            if obj is not _MISSING:
                 logger.debug("%s loading from cache", key)
-                obj = self._cache[key]
-            else:
-                logger.debug("%s not found in cache. . . creating", key)
-                obj = creator()
-                self._cache[key] = obj
+                self._hits += 1
+                return obj
+
+            logger.debug("%s not found in cache. . . creating", key)
+            self._misses += 1
+            start = timer()
+            obj = creator()
+            self._creation_time += timer() - start
+            self._add(key, obj)
+
+        return obj
+
+    def _add(self, key, obj):
+        """Add obj to cache at key, evicting least recently used if full."""
+        with self._lock:
+            self._cache[key] = obj
+            if self.ttl is not None:
+                self._expires[key] = monotonic() + self.ttl
+
+            if self.max_size is not None:
+                self._cache.move_to_end(key)
+                self._evict()
+
+    def _evict(self):
+        """Evict least recently used items past max_size. Call under _lock."""
+        if self.max_size is None:
+            return
+
+        while len(self._cache) > self.max_size:
+            evicted, _ = self._cache.popitem(last=False)
+            self._expires.pop(evicted, None)
+            self._evictions += 1
+            logger.debug("%s evicted from cache", evicted)
+
+    def _get_live(self, key):
+        """Get obj at key if it's in cache & not expired, else _MISSING.
+
+        Only locks to reorder for max_size, so the bookkeeping tolerates a
+        concurrent eviction.
+        """
+        obj = self._cache.get(key, _MISSING)
+        if obj is _MISSING:
+            return obj
+
+        if self.ttl is not None:
+            expires = self._expires.get(key)
+            if expires is not None and monotonic() >= expires:
+                # leave it be, the creator that follows overwrites it.
+                logger.debug("%s expired", key)
+                return _MISSING
+
+        if self.max_size is not None:
+            # reordering isn't atomic without the GIL, so lock it like _add.
+            with self._lock:
+                try:
+                    self._cache.move_to_end(key)
+                except KeyError:
+                    # evicted by another thread since the lookup. still a hit.
+                    pass
 
         return obj
+
+    def get_stats(self):
+        """Get cache hit, miss & creation time statistics.
+
+        Counts are cumulative for the lifetime of the cache instance - clear()
+        does not reset them. Counters update without locking, so under heavy
+        contention they are indicative rather than exact.
+
+        Returns:
+            dict with keys:
+                hits: int. Number of get calls served from cache.
+                misses: int. Number of get calls that called creator.
+                evictions: int. Number of items evicted by max_size.
+                creation_time: float. Total seconds spent in creator.
+                size: int. Number of items currently in cache.
+        """
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'creation_time': self._creation_time,
+            'size': len(self._cache)
+        }
+
+    @contextmanager
+    def _hold_key_lock(self, key):
+        """Hold the creation lock for key, making it if it doesn't exist yet.
+
+        The lock only lives while some thread holds or waits on it, so clear,
+        invalidate & eviction never hand a 2nd thread a fresh lock while the
+        creator still holds the old one.
+
+        Re-entrant so that a creator that recursively gets its own key fails
+        the same way it would have without the lock, rather than deadlock.
+        """
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.RLock(), 0]
+            entry[1] += 1
+
+        key_lock = entry[0]
+        try:
+            with key_lock:
+                yield key_lock
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
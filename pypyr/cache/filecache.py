@@ -0,0 +1,157 @@
+"""Global cache for parsed json & yaml documents.
+
+fetchJson & fetchYaml only use the cache with cache: True. The jsonfile &
+yamlfile context parsers always use it.
+
+The cache holds at most DEFAULT_MAX_SIZE documents & never holds a file
+bigger than DEFAULT_MAX_FILE_SIZE bytes, which loads directly instead. That
+way a big file you read once doesn't stay in memory for the life of the
+process.
+
+Attributes:
+    file_cache: global instance of the parsed document cache.
+                Use this attribute to access the cache from elsewhere.
+"""
+from copy import deepcopy
+import json
+import logging
+import os
+import ruamel.yaml as yaml
+from pypyr.cache.cache import Cache
+
+# use pypyr logger to ensure loglevel is set correctly
+logger = logging.getLogger(__name__)
+
+# most documents the global cache keeps.
+DEFAULT_MAX_SIZE = 64
+# bytes. bigger files load without the cache.
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+
+
+class FileCache(Cache):
+    """Get parsed json & yaml files from the document cache.
+
+    The cache key is the absolute path, the format & the file's stat
+    signature, so a file that changed on disk since it was cached loads
+    again. Replacing a path's signature drops the outdated document.
+
+    Callers get a deep copy of the cached document, so changing the result
+    does not change what the next caller gets.
+
+    Files that can't be stat-ed skip the cache and load directly, so the open
+    raises the same error it would have without the cache. So do files
+    bigger than max_file_size.
+
+    Attributes:
+        max_file_size (int): Bytes. Bigger files aren't cached. None caches
+            files of any size.
+    """
+
+    def __init__(self, max_size=None, ttl=None, max_file_size=None):
+        """Instantiate the cache.
+
+        Args:
+            max_size (int): Maximum number of documents to keep. Default
+                            None, meaning unbounded.
+            ttl (float): Seconds a document lives after loading. Default
+                         None, meaning documents never expire.
+            max_file_size (int): Bytes. Load bigger files without caching
+                                 them. Default None, meaning no limit.
+        """
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.max_file_size = max_file_size
+        # (path, format): key currently cached for that file.
+        self._current_keys = {}
+
+    def clear(self):
+        """Clear the cache of all objects."""
+        with self._lock:
+            super().clear()
+            self._current_keys.clear()
+
+    def get_json(self, path):
+        """Get parsed json document at path. Adds to cache if not exist.
+
+        Args:
+            path (path-like): Path to json file.
+
+        Returns:
+            Deep copy of the parsed json.
+        """
+        return self.get_document(path, 'json', load_json)
+
+    def get_yaml(self, path):
+        """Get parsed yaml document at path. Adds to cache if not exist.
+
+        Args:
+            path (path-like): Path to yaml file.
+
+        Returns:
+            Deep copy of the parsed yaml.
+        """
+        return self.get_document(path, 'yaml', load_yaml)
+
+    def get_document(self, path, format, loader):
+        """Get parsed document at path. Adds to cache if not exist.
+
+        Args:
+            path (path-like): Path to file.
+            format (str): Name of the document format. Documents with the
+                          same format share cache entries.
+            loader (callable): loader(path) returns the parsed document.
+
+        Returns:
+            Deep copy of the parsed document.
+        """
+        logger.debug("starting")
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.debug("can't stat %s. . . loading without cache", path)
+            return loader(path)
+
+        max_file_size = self.max_file_size
+        if max_file_size is not None and stat.st_size > max_file_size:
+            logger.debug("%s is bigger than %s bytes. . . loading without "
+                         "cache", path, max_file_size)
+            return loader(path)
+
+        source = (path, format)
+        # stat before loading, so an edit during the load is caught on the
+        # next get rather than missed.
+        key = (path, format, stat.st_mtime_ns, stat.st_size, stat.st_ino,
+               stat.st_dev)
+
+        with self._lock:
+            previous_key = self._current_keys.get(source)
+            if previous_key != key:
+                if previous_key:
+                    logger.debug("%s changed on disk. . . reloading", path)
+                    self.invalidate(previous_key)
+                self._current_keys[source] = key
+
+        document = deepcopy(self.get(key, lambda: loader(path)))
+
+        logger.debug("done")
+        return document
+
+
+# single global instance of parsed documents in a cache
+file_cache = FileCache(max_size=DEFAULT_MAX_SIZE,
+                       max_file_size=DEFAULT_MAX_FILE_SIZE)
+
+
+def load_json(path):
+    """Parse the json file at path."""
+    logger.debug("attempting to open file: %s", path)
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def load_yaml(path):
+    """Parse the yaml file at path."""
+    logger.debug("attempting to open file: %s", path)
+    with open(path) as yaml_file:
+        yaml_loader = yaml.YAML(typ='safe', pure=True)
+        return yaml_loader.load(yaml_file)
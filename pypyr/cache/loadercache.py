@@ -11,6 +11,9 @@
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
+# loads pipelines from local disk when no loader specified.
+DEFAULT_LOADER = 'pypyr.pypeloaders.fileloader'
+
 
 class PypeLoaderCache(Cache):
     """Get functions from the pypeloader cache."""
@@ -33,7 +36,7 @@ def get_pype_loader(self, loader=None):
         if loader:
             logger.debug("you set the pype loader to: %s", loader)
         else:
-            loader = 'pypyr.pypeloaders.fileloader'
+            loader = DEFAULT_LOADER
             logger.debug("use default pype loader: %s", loader)
 
         loader_function = self.get(loader, lambda: load_the_loader(loader))
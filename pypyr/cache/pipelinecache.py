@@ -1,44 +1,170 @@
 """Global cache for pipeline yaml.
 
+By default the cache keeps every pipeline it loaded for the life of the
+process. To change that, call pipeline_cache.configure, or from the cli use
+--cache-size, --cache-ttl & --revalidate.
+
 Attributes:
     pipeline_cache: global instance of the pipeline yaml cache.
                     Use this attribute to access the cache from elsewhere.
 """
 import logging
+from pathlib import Path
 from pypyr.cache.cache import Cache
-from pypyr.cache.loadercache import pypeloader_cache
+from pypyr.cache.loadercache import DEFAULT_LOADER, pypeloader_cache
 import pypyr.moduleloader
+from pypyr.pypeloaders.fileloader import get_pipeline_path
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
 
 class PipelineCache(Cache):
-    """Get and add Pipeline yaml from the pipelines cache."""
+    """Get and add Pipeline yaml from the pipelines cache.
+
+    If is_revalidate is True, checks the modified time of the pipeline's
+    source file on each get & reloads only the pipelines that changed since
+    they were cached. This only works for pipelines from the default file
+    loader, since other loaders do not have a local file to check.
+
+    A pipeline you get with a working_dir caches under the key
+    (pipeline_name, Path(working_dir)), so that concurrent runs from different
+    working directories each get their own pipeline. Without working_dir, the
+    key is the pipeline_name & the pipeline loads from the process-wide
+    working directory.
+
+    Attributes:
+        is_revalidate (bool): Reload a cached pipeline when its source file
+                              changed.
+    """
+
+    def __init__(self, max_size=None, ttl=None, is_revalidate=False):
+        """Instantiate the cache.
+
+        Args:
+            max_size (int): Maximum number of pipelines to keep. Default
+                            None, meaning unbounded.
+            ttl (float): Seconds a pipeline lives after loading. Default
+                         None, meaning pipelines never expire.
+            is_revalidate (bool): Reload a cached pipeline when its source
+                                  file changed. Default False.
+        """
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.is_revalidate = is_revalidate
+        # cache key: (path, st_mtime_ns) at the time it loaded.
+        self._sources = {}
+
+    def clear(self):
+        """Clear the cache of all objects."""
+        with self._lock:
+            super().clear()
+            self._sources.clear()
+
+    def configure(self, max_size=None, ttl=None, is_revalidate=False):
+        """Change the cache's limits & whether it revalidates.
+
+        Args:
+            max_size (int): Maximum number of pipelines to keep. Default
+                            None, meaning unbounded.
+            ttl (float): Seconds a pipeline lives after loading. Default
+                         None, meaning pipelines never expire.
+            is_revalidate (bool): Reload a cached pipeline when its source
+                                  file changed. Default False.
+        """
+        with self._lock:
+            super().configure(max_size=max_size, ttl=ttl)
+            self.is_revalidate = is_revalidate
 
-    def get_pipeline(self, pipeline_name, loader=None):
+    def invalidate(self, key):
+        """Remove pipeline from the cache, so the next get loads it again.
+
+        Args:
+            key: Name of pipeline, or (name, Path(working_dir)) if you got
+                 the pipeline with a working_dir.
+        """
+        with self._lock:
+            super().invalidate(key)
+            self._sources.pop(key, None)
+
+    def get_pipeline(self, pipeline_name, loader=None, working_dir=None):
         """Get cached pipeline yaml. Adds to cache if not exist.
 
         Args:
             pipeline_name: (string) Name of pipeline, sans .yaml at end.
             loader: (string) Name of loader to load the pipeline
+            working_dir: (path-like) Load the pipeline from here. Defaults
+                         to the process-wide working directory.
 
         Returns:
             yaml: Yaml representation of pipeline_name
         """
         logger.debug("starting")
-        pipeline = self.get(pipeline_name, load_pipeline(pipeline_name,
-                                                         loader))
+        if working_dir is None:
+            key = pipeline_name
+        else:
+            working_dir = Path(working_dir)
+            key = (pipeline_name, working_dir)
+
+        creator = load_pipeline(pipeline_name, loader, working_dir)
+
+        if self.is_revalidate:
+            if self._is_stale(key):
+                logger.debug("%s changed on disk. . . reloading",
+                             pipeline_name)
+                self.invalidate(key)
+            creator = self._track_source(key,
+                                         pipeline_name,
+                                         loader,
+                                         working_dir,
+                                         creator)
+
+        pipeline = self.get(key, creator)
 
         logger.debug("done")
         return pipeline
 
+    def _is_stale(self, key):
+        """Check if cached pipeline's source file changed since it loaded."""
+        source = self._sources.get(key)
+        if not source:
+            return False
+
+        path, mtime = source
+        try:
+            return path.stat().st_mtime_ns != mtime
+        except OSError:
+            # gone or unreadable: reload so the loader raises the real error.
+            return True
+
+    def _track_source(self, key, pipeline_name, loader, working_dir, creator):
+        """Wrap creator to record the source file's mtime before loading.
+
+        Stats before loading, so that an edit during the load is caught on
+        the next get rather than missed.
+        """
+        def track_source_inner():
+            if loader and loader != DEFAULT_LOADER:
+                return creator()
+
+            path = get_pipeline_path(
+                pipeline_name=pipeline_name,
+                working_directory=(
+                    working_dir if working_dir is not None
+                    else pypyr.moduleloader.get_working_directory()))
+            mtime = path.stat().st_mtime_ns
+            pipeline = creator()
+            with self._lock:
+                self._sources[key] = (path, mtime)
+            return pipeline
+
+        return track_source_inner
+
 
 # single global instance of pipelines in a cache
 pipeline_cache = PipelineCache()
 
 
-def load_pipeline(pipeline_name, loader=None):
+def load_pipeline(pipeline_name, loader=None, working_dir=None):
     """Return function that loads the pipeline using loader.
 
     This is a wrapped function, so it returns a callable. The actual work
@@ -48,6 +174,8 @@ def load_pipeline(pipeline_name, loader=None):
         pipeline_name (str): Name of pipeline, sans .yaml at end.
         loader (str): str. optional. Absolute name of pipeline loader module.
                 If not specified will use pypyr.pypeloaders.fileloader.
+        working_dir (Path): optional. Load the pipeline from here. Defaults
+                to the process-wide working directory.
 
     Returns:
         callable that will execute the loader and retrieve the pipeline def.
@@ -59,7 +187,8 @@ def load_pipeline_inner():
 
         pipeline_definition = get_pipeline_definition(
             pipeline_name=pipeline_name,
-            working_dir=pypyr.moduleloader.get_working_directory()
+            working_dir=(working_dir if working_dir is not None
+                         else pypyr.moduleloader.get_working_directory())
         )
         logger.debug("done")
         return pipeline_definition
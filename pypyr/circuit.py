@@ -0,0 +1,291 @@
+"""Circuit breakers that stop retry loops hammering a dependency that's down.
+
+Give a step's retry a circuit, & all the retry loops with the same circuit
+name share the same breaker:
+
+    - name: pypyr.steps.cmd
+      retry:
+        max: 10
+        sleep: 5
+        circuit: db # or a dict, like below.
+      in:
+        cmd: ./query-db.sh
+
+    - name: pypyr.steps.cmd
+      retry:
+        max: 10
+        circuit:
+          name: db
+          failures: 5 # open after 5 of the same error type. default 5
+          window: 60 # ...within 60 seconds. default 60
+          reset: 30 # seconds open before a probe. default 30
+          stateFile: .pypyr/db.circuit # share with other processes.
+      in:
+        cmd: ./update-db.sh
+
+The breaker starts closed & counts each retry attempt's failures by error
+type. A success clears the counts. When the same error type fails failures
+times within window seconds, the breaker opens. The retry loop that opened it
+stops straight away with CircuitOpenError, rather than sleeping & retrying.
+
+While open, every retry loop on the breaker fails fast with CircuitOpenError
+without running its step. After reset seconds the breaker is half-open, & the
+next attempt runs as a probe. The other attempts keep failing fast until the
+probe is done. A successful probe closes the breaker, a failed probe opens it
+for another reset seconds.
+
+Breakers are process-wide. The first definition of a name wins. With
+stateFile, processes that use the same stateFile share the breaker, too. A
+relative stateFile is relative to the pipeline's working dir.
+"""
+from contextlib import contextmanager
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+from pypyr.errors import CircuitOpenError, PipelineDefinitionError
+from pypyr.resources import try_lock_file
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+# defaults when the circuit definition doesn't say.
+DEFAULT_FAILURES = 5
+DEFAULT_WINDOW = 60
+DEFAULT_RESET = 30
+
+# seconds between tries to lock a busy state file.
+LOCK_INTERVAL = 0.01
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# name: CircuitBreaker. Shared by all pipelines in the process.
+_circuits = {}
+_circuits_lock = threading.Lock()
+
+
+def get_new_state():
+    """Get the state of a closed breaker without failures."""
+    return {'state': CLOSED, 'opened': None, 'probe': None, 'failures': {}}
+
+
+class CircuitBreaker():
+    """A named circuit breaker, optionally shared across processes.
+
+    Attributes:
+        name: (str) Name of the breaker.
+        failures: (int) Open after this many failures of the same error type.
+        window: (float) Count failures from the last this many seconds.
+        reset: (float) Seconds open before letting a probe through. Also how
+               long a probe may take before another attempt can probe.
+        state_file: (Path) Share state with other processes in this file.
+                    None means only this process.
+    """
+
+    __slots__ = ('name', 'failures', 'window', 'reset', 'state_file',
+                 '_lock', '_state')
+
+    def __init__(self, name, failures=DEFAULT_FAILURES,
+                 window=DEFAULT_WINDOW, reset=DEFAULT_RESET, state_file=None):
+        """Initialize the breaker, closed.
+
+        Args:
+            name: str. Name of the breaker.
+            failures: int. Open after this many failures of the same error
+                      type.
+            window: float. Count failures from the last this many seconds.
+            reset: float. Seconds open before letting a probe through.
+            state_file: path-like. Share state with other processes in this
+                        file. None means only this process.
+        """
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.reset = reset
+        self.state_file = None if state_file is None else Path(state_file)
+        self._lock = threading.Lock()
+        self._state = get_new_state()
+
+    def __repr__(self):
+        """Show the breaker's definition."""
+        state_file = None if self.state_file is None else str(self.state_file)
+        return (f'CircuitBreaker({self.name!r}, {self.failures!r}, '
+                f'{self.window!r}, {self.reset!r}, {state_file!r})')
+
+    def before_call(self):
+        """Let an attempt through, or fail fast.
+
+        When half-open, the attempt that gets through is the probe.
+
+        Raises:
+            CircuitOpenError: the breaker is open, or half-open with another
+                attempt probing.
+        """
+        with self._lock_state() as state:
+            if state['state'] == CLOSED:
+                return
+
+            now = time.time()
+            if state['state'] == OPEN:
+                remaining = state['opened'] + self.reset - now
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        f"circuit {self.name} is open. failing fast for "
+                        f"{remaining:.1f}s more.")
+
+                state['state'] = HALF_OPEN
+            elif now - state['probe'] < self.reset:
+                raise CircuitOpenError(
+                    f"circuit {self.name} is half-open & another attempt is "
+                    "probing.")
+
+            # 1st attempt after reset, or the last probe never finished.
+            state['probe'] = now
+
+        logger.info("circuit %s half-open. probing.", self.name)
+
+    def get_state(self):
+        """Get the breaker's state: closed, open or half-open."""
+        with self._lock_state() as state:
+            return state['state']
+
+    def record_failure(self, error_name):
+        """Count a failed attempt & open the breaker if that's too many.
+
+        Args:
+            error_name: str. The attempt's error type.
+
+        Returns:
+            bool. True if the breaker is open.
+        """
+        with self._lock_state() as state:
+            now = time.time()
+            if state['state'] == CLOSED:
+                since = now - self.window
+                failures = {name: [t for t in times if t > since]
+                            for name, times in state['failures'].items()}
+                times = failures.setdefault(error_name, [])
+                times.append(now)
+                state['failures'] = failures
+                if len(times) < self.failures:
+                    return False
+
+                logger.error("circuit %s opened after %s %s failures in %ss.",
+                             self.name, len(times), error_name, self.window)
+            elif state['state'] == HALF_OPEN:
+                logger.error("circuit %s probe failed with %s. opened again.",
+                             self.name, error_name)
+            else:
+                # an attempt that started before the breaker opened.
+                return True
+
+            state.update(get_new_state())
+            state['state'] = OPEN
+            state['opened'] = now
+            return True
+
+    def record_success(self):
+        """Close the breaker & clear its failure counts."""
+        with self._lock_state() as state:
+            if state['state'] != CLOSED:
+                logger.info("circuit %s closed.", self.name)
+
+            state.update(get_new_state())
+
+    @contextmanager
+    def _lock_state(self):
+        """Lock the state & yield it to edit. Saves edits to state_file.
+
+        The thread lock keeps threads in this process in line, the lock file
+        next to state_file keeps other processes in line.
+        """
+        with self._lock:
+            if self.state_file is None:
+                yield self._state
+                return
+
+            path = self.state_file
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path.with_name(f'{path.name}.lock'), 'a') as lock_file:
+                while not try_lock_file(lock_file):
+                    time.sleep(LOCK_INTERVAL)
+
+                try:
+                    saved = path.read_text()
+                    state = json.loads(saved)
+                except (OSError, ValueError):
+                    # no state file yet, or a process died writing it.
+                    state = get_new_state()
+                    saved = json.dumps(state)
+
+                yield state
+
+                edited = json.dumps(state)
+                if edited != saved:
+                    path.write_text(edited)
+
+
+def clear():
+    """Remove all circuit breakers from this process."""
+    with _circuits_lock:
+        _circuits.clear()
+
+
+def get_circuit(definition, working_dir=None):
+    """Get the circuit breaker for a retry's circuit definition.
+
+    Creates the breaker if it doesn't exist yet. A name that already exists
+    keeps its existing definition.
+
+    Args:
+        definition: str or dict. The breaker's name, or a dict with a name &
+                    optional failures, window, reset & stateFile.
+        working_dir: path-like. Relative stateFile is relative to this.
+
+    Returns:
+        CircuitBreaker.
+
+    Raises:
+        PipelineDefinitionError: definition is wrong.
+    """
+    if isinstance(definition, str):
+        definition = {'name': definition}
+    elif not isinstance(definition, dict):
+        raise PipelineDefinitionError(
+            "retry circuit must be a circuit name or a dict (i.e a map).")
+
+    name = definition.get('name', None)
+    if not name:
+        raise PipelineDefinitionError("retry circuit must have a name.")
+
+    circuit = _circuits.get(name)
+    if circuit is not None:
+        return circuit
+
+    try:
+        failures = int(definition.get('failures', DEFAULT_FAILURES))
+        window = float(definition.get('window', DEFAULT_WINDOW))
+        reset = float(definition.get('reset', DEFAULT_RESET))
+    except (TypeError, ValueError) as err:
+        raise PipelineDefinitionError(
+            f"circuit {name} failures, window & reset must be numbers. "
+            f"{err}") from err
+
+    if failures < 1 or window <= 0 or reset < 0:
+        raise PipelineDefinitionError(
+            f"circuit {name} failures must be at least 1, window more than 0 "
+            "& reset at least 0.")
+
+    state_file = definition.get('stateFile', None)
+    if state_file is not None and working_dir is not None:
+        state_file = Path(working_dir).joinpath(state_file)
+
+    circuit = CircuitBreaker(name, failures, window, reset, state_file)
+    with _circuits_lock:
+        circuit = _circuits.setdefault(name, circuit)
+
+    logger.debug("using %r", circuit)
+    return circuit
@@ -3,10 +3,13 @@
 Parse command line arguments in, invoke pipelinerunner.
 """
 import argparse
+import json
 from pathlib import Path
+from pypyr.cache.pipelinecache import pipeline_cache
 import pypyr.log.logger
 import pypyr.pipelinerunner
 import pypyr.version
+import pypyr.workqueue
 import signal
 import sys
 import textwrap
@@ -86,12 +89,172 @@ def get_parser():
     parser.add_argument('--logpath', dest='log_path',
                         help=wrap(
                             'Log-file path. Append log output to this path.'))
+    parser.add_argument('--batch', dest='batch_path', default=None,
+                        help=wrap(
+                            'Run the pipeline once for each line in this '
+                            'jsonl file. Each line is a json object that '
+                            'initializes context. Use - for stdin.\n'
+                            'Writes the result of each run as a json line to '
+                            'stdout.'))
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help=wrap(
+                            'With --batch, run this many pipelines at the '
+                            'same time.\n'
+                            'Defaults to cpu count.'))
+    parser.add_argument('--unordered', dest='is_unordered',
+                        action='store_true',
+                        help=wrap(
+                            'With --batch, write each result as soon as its '
+                            'run completes, rather than in input order.'))
+    parser.add_argument('--shard', dest='shard', default=None,
+                        help=wrap(
+                            'INDEX/COUNT, like 0/4. Only run this shard\'s '
+                            'items in foreach loops of steps with shard set.\n'
+                            'Sets context shardIndex & shardCount.'))
+    parser.add_argument('--timeout', dest='timeout', type=float,
+                        default=None,
+                        help=wrap(
+                            'Fail the pipeline if it runs for longer than '
+                            'this many seconds. Kills commands it started.\n'
+                            'With --batch, applies to each run.'))
+    parser.add_argument('--cache-size', dest='cache_size', type=int,
+                        default=None,
+                        help=wrap(
+                            'Keep at most this many pipelines in the '
+                            'pipeline cache.\n'
+                            'Defaults to no limit.'))
+    parser.add_argument('--cache-ttl', dest='cache_ttl', type=float,
+                        default=None,
+                        help=wrap(
+                            'Reload a cached pipeline this many seconds '
+                            'after it loaded.\n'
+                            'Defaults to never.'))
+    parser.add_argument('--revalidate', dest='is_revalidate',
+                        action='store_true',
+                        help=wrap(
+                            'Reload a cached pipeline when its file changed '
+                            'since it loaded.'))
     parser.add_argument('--version', action='version',
                         help='Echo version number.',
                         version=f'{pypyr.version.get_version()}')
     return parser
 
 
+def get_worker_args(args):
+    """Parse pypyr worker arguments passed in from shell."""
+    return get_worker_parser().parse_args(args)
+
+
+def get_worker_parser():
+    """Return ArgumentParser for pypyr worker cli."""
+    parser = argparse.ArgumentParser(
+        prog='pypyr-worker',
+        allow_abbrev=True,
+        description='pypyr-worker: run pype jobs from a work queue',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('queue',
+                        help=wrap('Work queue to take jobs from. For the '
+                                  'default backend, path to the SQLite '
+                                  'file.'))
+    parser.add_argument('--backend', dest='backend', default=None,
+                        help=wrap('Absolute name of the work queue backend '
+                                  'module.\n'
+                                  'Defaults to pypyr.queues.sqlitequeue.'))
+    parser.add_argument('--dir', dest='working_dir', default=None,
+                        help=wrap('Working directory. Run all jobs from '
+                                  'here.\n'
+                                  'Defaults to the working directory of '
+                                  'each job\'s parent pipeline.'))
+    parser.add_argument('--interval', dest='interval', type=float,
+                        default=pypyr.workqueue.DEFAULT_INTERVAL,
+                        help=wrap('Seconds to wait before checking for new '
+                                  'jobs when the queue is empty.\n'
+                                  'Defaults to '
+                                  f'{pypyr.workqueue.DEFAULT_INTERVAL}.'))
+    parser.add_argument('--max-jobs', dest='max_jobs', type=int,
+                        default=None,
+                        help=wrap('Stop after running this many jobs.'))
+    parser.add_argument('--exit-when-empty', dest='is_stop_when_empty',
+                        action='store_true',
+                        help=wrap('Stop when there are no waiting jobs, '
+                                  'rather than waiting for more.'))
+    parser.add_argument('--log', '--loglevel', dest='log_level', type=int,
+                        default=None,
+                        help=wrap('Integer log level. Defaults to 25 '
+                                  '(NOTIFY).'))
+    parser.add_argument('--logpath', dest='log_path',
+                        help=wrap(
+                            'Log-file path. Append log output to this path.'))
+    return parser
+
+
+def run_worker(parsed_args):
+    """Run jobs from the work queue until stopped.
+
+    Returns:
+        int. 0.
+    """
+    pypyr.workqueue.run_worker(
+        location=parsed_args.queue,
+        backend=parsed_args.backend,
+        working_dir=parsed_args.working_dir,
+        interval=parsed_args.interval,
+        max_jobs=parsed_args.max_jobs,
+        is_stop_when_empty=parsed_args.is_stop_when_empty)
+
+    return 0
+
+
+def get_batch_contexts(batch_file):
+    """Yield a dict from each non-blank json line in batch_file."""
+    for line in batch_file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def run_batch(parsed_args):
+    """Run pipeline for each json line in --batch & write results to stdout.
+
+    Returns:
+        int. 0 if all runs succeeded. 255 if any of them failed.
+    """
+    if parsed_args.batch_path == '-':
+        return write_batch_results(parsed_args, sys.stdin)
+
+    with open(parsed_args.batch_path, encoding='utf-8') as batch_file:
+        return write_batch_results(parsed_args, batch_file)
+
+
+def write_batch_results(parsed_args, batch_file):
+    """Write each run_many result from batch_file inputs as a json line.
+
+    Context values that aren't json serializable write as their str.
+
+    Returns:
+        int. 0 if all runs succeeded. 255 if any of them failed.
+    """
+    failed_count = 0
+    for result in pypyr.pipelinerunner.run_many(
+            pipeline_name=parsed_args.pipeline_name,
+            contexts=get_batch_contexts(batch_file),
+            workers=parsed_args.workers,
+            working_dir=parsed_args.working_dir,
+            groups=parsed_args.groups,
+            success_group=parsed_args.success_group,
+            failure_group=parsed_args.failure_group,
+            is_ordered=not parsed_args.is_unordered,
+            shard=parsed_args.shard,
+            timeout=parsed_args.timeout):
+        if 'error' in result:
+            failed_count += 1
+
+        sys.stdout.write(json.dumps(result, default=str))
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+
+    return 255 if failed_count else 0
+
+
 def main(args=None):
     """Entry point for pypyr cli.
 
@@ -103,18 +266,59 @@ def main(args=None):
         args = sys.argv[1:]
 
     parsed_args = get_args(args)
+    return run_and_report(parsed_args, run_pipeline)
+
+
+def worker_main(args=None):
+    """Entry point for pypyr-worker cli, which runs pype jobs from a queue.
+
+    The setup_py entry_point wraps this in sys.exit already.
+    """
+    if args is None:
+        args = sys.argv[1:]
+
+    parsed_args = get_worker_args(args)
+    return run_and_report(parsed_args, run_worker)
+
+
+def run_pipeline(parsed_args):
+    """Run the pipeline, or the batch of pipelines, from parsed_args.
+
+    Returns:
+        int. Exit code.
+    """
+    if (parsed_args.cache_size is not None
+            or parsed_args.cache_ttl is not None
+            or parsed_args.is_revalidate):
+        pipeline_cache.configure(max_size=parsed_args.cache_size,
+                                 ttl=parsed_args.cache_ttl,
+                                 is_revalidate=parsed_args.is_revalidate)
+
+    if parsed_args.batch_path:
+        return run_batch(parsed_args)
 
+    return pypyr.pipelinerunner.main(
+        pipeline_name=parsed_args.pipeline_name,
+        pipeline_context_input=parsed_args.context_args,
+        working_dir=parsed_args.working_dir,
+        groups=parsed_args.groups,
+        success_group=parsed_args.success_group,
+        failure_group=parsed_args.failure_group,
+        shard=parsed_args.shard,
+        timeout=parsed_args.timeout)
+
+
+def run_and_report(parsed_args, run):
+    """Set up logging, call run(parsed_args) & turn errors into exit codes.
+
+    Returns:
+        int. Exit code. 130 on Ctrl+C, 255 on error.
+    """
     try:
         pypyr.log.logger.set_root_logger(log_level=parsed_args.log_level,
                                          log_path=parsed_args.log_path)
 
-        return pypyr.pipelinerunner.main(
-            pipeline_name=parsed_args.pipeline_name,
-            pipeline_context_input=parsed_args.context_args,
-            working_dir=parsed_args.working_dir,
-            groups=parsed_args.groups,
-            success_group=parsed_args.success_group,
-            failure_group=parsed_args.failure_group)
+        return run(parsed_args)
     except KeyboardInterrupt:
         # Shell standard is 128 + signum = 130 (SIGINT = 2)
         sys.stdout.write("\n")
@@ -1,11 +1,32 @@
 """pypyr context class. Dictionary ahoy."""
 from collections import namedtuple
-from collections.abc import Mapping, Set
+from collections.abc import Mapping, Sequence, Set
+from contextlib import contextmanager
+from copy import deepcopy
+import copyreg
+import io
+import pickle
+import struct
+import threading
+from pypyr.cache.namespacecache import pystring_namespace_cache
 from pypyr.dsl import SpecialTagDirective
 from pypyr.errors import KeyInContextHasNoValueError, KeyNotInContextError
 from pypyr.formatting import RecursiveFormatter
 from pypyr.utils import asserts, expressions, types
 
+# these never format, nor iterate, so no need for the formatter.
+_LITERAL_TYPES = frozenset((int, float, bool, complex, type(None)))
+
+# snapshot format: magic, buffer count, (length, buffer)*, pickle stream.
+_SNAPSHOT_MAGIC = b'PYPYRCTX1'
+_SNAPSHOT_LENGTH = struct.Struct('<Q')
+# protocol 5 pickles large buffers out-of-band, but only exists on py 3.8+.
+_SNAPSHOT_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+# ConcurrentContext spreads top-level keys over this many locks, so threads
+# writing different keys seldom wait for each other.
+_LOCK_SHARDS = 16
+
 ContextItemInfo = namedtuple('ContextItemInfo',
                              ['key',
                               'key_in_context',
@@ -29,6 +50,8 @@ class Context(dict):
                                  initialized from the cli --dir arg.
         pystring_globals (dict): globals namespace for PyString expression
                                  evals.
+        pystring_imports (list): import statement sources that pyimport
+                                 merged into pystring_globals, in order.
 
     """
 
@@ -36,12 +59,16 @@ class Context(dict):
     # see the class methods are functional, not dependant on class state (also,
     # no __init__).
     # https://github.com/python/cpython/blob/master/Lib/string.py
-    formatter = RecursiveFormatter(special_types=SpecialTagDirective)
+    # memo is safe to share between instances, because it checks each
+    # memoized string's args against the context it's formatting.
+    formatter = RecursiveFormatter(special_types=SpecialTagDirective,
+                                   memo_size=4096)
 
     def __init__(self, *args, **kwargs):
         """Initialize context."""
         super().__init__(*args, **kwargs)
         self.pystring_globals = {}
+        self.pystring_imports = []
 
     def __missing__(self, key):
         """Throw KeyNotInContextError rather than KeyError.
@@ -206,6 +233,56 @@ def assert_keys_type_value(self,
         for context_item in context_items:
             self.assert_key_type_value(context_item, caller, extra_error_text)
 
+    def dump(self, file):
+        """Write a binary snapshot of context to file.
+
+        The snapshot is a pickle, so it keeps types the json & yaml writers
+        can't, like PyString, SicString & Jsonify. Large buffers that support
+        pickle protocol 5 go out-of-band rather than copying into the pickle.
+
+        pystring_globals holds modules & functions, which don't pickle, so
+        the snapshot stores pystring_imports instead & load imports them
+        again. Anything else in pystring_globals is not in the snapshot.
+
+        Context attributes like pipeline_name & working_dir are in the
+        snapshot. Nested Context values snapshot the same way.
+
+        Only load snapshots you trust - loading a pickle can run arbitrary
+        code.
+
+        Args:
+            file: Binary file-like object with a write method.
+
+        Returns:
+            None.
+
+        """
+        buffers = []
+        stream = io.BytesIO()
+        _get_snapshot_pickler(stream, buffers).dump(self)
+
+        file.write(_SNAPSHOT_MAGIC)
+        file.write(_SNAPSHOT_LENGTH.pack(len(buffers)))
+        for buffer in buffers:
+            raw = buffer.raw()
+            file.write(_SNAPSHOT_LENGTH.pack(raw.nbytes))
+            file.write(raw)
+
+        file.write(stream.getbuffer())
+
+    def dumps(self):
+        """Get a binary snapshot of context as bytes.
+
+        See dump for what's in the snapshot.
+
+        Returns:
+            bytes.
+
+        """
+        file = io.BytesIO()
+        self.dump(file)
+        return file.getvalue()
+
     def get_eval_string(self, input_string):
         """Dynamically evaluates the input_string python expression.
 
@@ -238,7 +315,7 @@ def get_eval_string(self, input_string):
             raise ValueError('input expression is empty. It must be a valid '
                              'python expression instead.')
 
-    def get_formatted(self, key):
+    def get_formatted(self, key, is_shared=False):
         """Return formatted value for context[key].
 
         This is a convenience method that calls the same thing as
@@ -268,6 +345,9 @@ def get_formatted(self, key):
 
         Args:
             key: dictionary key to retrieve.
+            is_shared: bool. Default False. Where nothing inside a container
+                       changed, return the container in context rather than
+                       a copy. Only set this if you won't mutate the result.
 
         Returns:
             Whatever object results from the formatting expression(s) at the
@@ -282,7 +362,8 @@ def get_formatted(self, key):
 
         try:
             # any sort of complex type will work with recursive formatter.
-            return self.formatter.vformat(val, None, self)
+            return self.formatter.vformat(val, None, self,
+                                          is_shared=is_shared)
         except KeyNotInContextError as err:
             # less cryptic error for end-user friendliness
             raise KeyNotInContextError(
@@ -359,7 +440,7 @@ def get_formatted_as_type(self, value, default=None, out_type=str):
         else:
             return out_type(value)
 
-    def get_formatted_value(self, input_value):
+    def get_formatted_value(self, input_value, is_shared=False):
         """Run token substitution on the input against context.
 
         If input_value is a formattable string or SpecialTagDirective,
@@ -400,8 +481,14 @@ def get_formatted_value(self, input_value):
             where formatting changed a value from a string to the
             formatting expression's evaluated value.
 
+        If is_shared is True, containers where nothing inside changed return
+        as is rather than a copy, so formatting a big structure only allocates
+        along the paths where something changed. Only set this if you won't
+        mutate the result, since it shares objects with the input & context.
+
         Args:
             input_value: Any object to format.
+            is_shared: bool. Default False. Return unchanged containers as is.
 
         Returns:
             any given type: Formatted value with {substitutions} made from
@@ -409,7 +496,8 @@ def get_formatted_value(self, input_value):
             untouched.
 
         """
-        return self.formatter.vformat(input_value, None, self)
+        return self.formatter.vformat(input_value, None, self,
+                                      is_shared=is_shared)
 
     def get_processed_string(self, input_string):
         """Use get_formatted_value(input_value) instead. Deprecated."""
@@ -490,7 +578,67 @@ def keys_of_type_exist(self, *keys):
             has_value=k[1] and not self[k[0]] is None
         ) for k in keys_exist)
 
-    def merge(self, add_me):
+    @classmethod
+    def load(cls, file):
+        """Create a Context from a binary snapshot that dump wrote to file.
+
+        Only load snapshots you trust - loading a pickle can run arbitrary
+        code.
+
+        Args:
+            file: Binary file-like object with read & readline methods.
+
+        Returns:
+            pypyr.context.Context with the snapshot's values & attributes,
+            with pystring_globals imported again from pystring_imports.
+
+        Raises:
+            ValueError: file is not a pypyr context snapshot.
+
+        """
+        if file.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+            raise ValueError("input is not a pypyr context snapshot.")
+
+        buffers = [file.read(_read_snapshot_length(file))
+                   for _ in range(_read_snapshot_length(file))]
+
+        # py < 3.8 has no out-of-band buffers. dump never writes any there.
+        kwargs = {'buffers': buffers} if _SNAPSHOT_PROTOCOL >= 5 else {}
+        return pickle.Unpickler(file, **kwargs).load()
+
+    @classmethod
+    def loads(cls, data):
+        """Create a Context from a binary snapshot that dumps returned.
+
+        Args:
+            data (bytes-like): snapshot bytes.
+
+        Returns:
+            pypyr.context.Context.
+
+        """
+        return cls.load(io.BytesIO(data))
+
+    @contextmanager
+    def lock(self, *keys):
+        """Keep other threads from changing keys inside the with block.
+
+        A plain Context isn't for sharing between threads, so this doesn't
+        lock anything. ConcurrentContext does. Code that uses it works with
+        both:
+            with context.lock('counter'):
+                context['counter'] += 1
+
+        Args:
+            *keys: Top-level keys to lock. No keys locks all of context.
+
+        Yields:
+            This context.
+
+        """
+        yield self
+
+    def merge(self, add_me, replace_lists=False):
         """Merge add_me into context and applies interpolation.
 
         Bottom-up merge where add_me merges into context. Applies string
@@ -500,8 +648,8 @@ def merge(self, add_me):
 
         Supports nested hierarchy. add_me can contains dicts/lists/enumerables
         that contain other enumerables et. It doesn't restrict levels of
-        nesting, so if you really want to go crazy with the levels you can, but
-        you might blow your stack.
+        nesting, and since it walks the hierarchy with an explicit stack
+        rather than recursion, depth is not limited by the recursion limit.
 
         If something from add_me exists in context already, but add_me's value
         is of a different type, add_me will overwrite context. Do note this.
@@ -511,66 +659,66 @@ def merge(self, add_me):
 
         If add_me contains lists/sets/tuples, this merges these
         additively, meaning it appends values from add_me to the existing
-        sequence.
+        sequence. If replace_lists is True, a list from add_me replaces an
+        existing list instead.
 
         Args:
             add_me: dict. Merge this dict into context.
+            replace_lists: bool. Default False. Replace existing lists rather
+                           than extend them.
 
         Returns:
             None. All operations mutate this instance of context.
 
         """
-        def merge_recurse(current, add_me):
-            """Walk the current context tree in recursive inner function.
-
-            On 1st iteration, current = self(i.e root of context)
-            On subsequent recursive iterations, current is wherever you're at
-            in the nested context hierarchy.
-
-            Args:
-                current: dict. Destination of merge.
-                add_me: dict. Merge this to current.
-            """
-            for k, v in add_me.items():
+        # depth-first, in the same order as a recursive walk would, since
+        # later keys can format with values merged by earlier keys.
+        # each item is (destination, iterator over source items).
+        stack = [(self, iter(add_me.items()))]
+        get_formatted = self._get_formatted_fast
+
+        while stack:
+            current, items = stack[-1]
+            for k, v in items:
                 # key supports interpolation
-                k = self.get_formatted_value(k)
+                k = get_formatted(k)
 
                 # str not mergable, so it doesn't matter if it exists in dest
                 if isinstance(v, (str, SpecialTagDirective)):
                     # just overwrite dest - str adds/edits indiscriminately
-                    current[k] = self.get_formatted_value(v)
+                    current[k] = get_formatted(v)
                 elif isinstance(v, (bytes, bytearray)):
                     # bytes aren't mergable or formattable
                     # only here to prevent the elif on enumerables catching it
                     current[k] = v
                 # deal with things that are mergable - exists already in dest
                 elif k in current:
-                    if types.are_all_this_type(Mapping, current[k], v):
-                        # it's dict-y, thus recurse through it to merge since
-                        # it exists in dest
-                        merge_recurse(current[k], v)
-                    elif types.are_all_this_type(list, current[k], v):
+                    existing = current[k]
+                    if types.are_all_this_type(Mapping, existing, v):
+                        # it's dict-y, thus descend into it to merge since
+                        # it exists in dest. siblings continue after.
+                        stack.append((existing, iter(v.items())))
+                        break
+                    elif (not replace_lists
+                          and types.are_all_this_type(list, existing, v)):
                         # it's list-y. Extend mutates existing list since it
                         # exists in dest
-                        current[k].extend(
-                            self.get_formatted_value(v))
-                    elif types.are_all_this_type(tuple, current[k], v):
+                        existing.extend(get_formatted(v))
+                    elif types.are_all_this_type(tuple, existing, v):
                         # concatenate tuples
-                        current[k] = (
-                            current[k] + self.get_formatted_value(v))
-                    elif types.are_all_this_type(Set, current[k], v):
+                        current[k] = existing + get_formatted(v)
+                    elif types.are_all_this_type(Set, existing, v):
                         # join sets
-                        current[k] = (
-                            current[k] | self.get_formatted_value(v))
+                        current[k] = existing | get_formatted(v)
                     else:
                         # at this point it's not mergable
-                        current[k] = self.get_formatted_value(v)
+                        current[k] = get_formatted(v)
                 else:
                     # at this point it's not mergable, nor in context
-                    current[k] = self.get_formatted_value(v)
-
-        # first iteration starts at context dict root
-        merge_recurse(self, add_me)
+                    current[k] = get_formatted(v)
+            else:
+                # exhausted this level's items.
+                stack.pop()
 
     def set_defaults(self, defaults):
         """Set defaults in context if keys do not exist already.
@@ -605,31 +753,327 @@ def set_defaults(self, defaults):
             None. All operations mutate this instance of context.
 
         """
-        def defaults_recurse(current, defaults):
-            """Walk the current context tree in recursive inner function.
-
-            On 1st iteration, current = self(i.e root of context)
-            On subsequent recursive iterations, current is wherever you're at
-            in the nested context hierarchy.
-
-            Args:
-                current: dict. Destination of merge.
-                defaults: dict. Add this to current if keys don't exist
-                                already.
-
-            """
-            for k, v in defaults.items():
+        # depth-first with an explicit stack, so depth is not limited by the
+        # recursion limit. each item is (destination, iterator over source).
+        stack = [(self, iter(defaults.items()))]
+        get_formatted = self._get_formatted_fast
+
+        while stack:
+            current, items = stack[-1]
+            for k, v in items:
                 # key supports interpolation
-                k = self.get_formatted_value(k)
+                k = get_formatted(k)
 
                 if k in current:
-                    if types.are_all_this_type(Mapping, current[k], v):
-                        # it's dict-y, thus recurse through it to check if it
+                    existing = current[k]
+                    if types.are_all_this_type(Mapping, existing, v):
+                        # it's dict-y, thus descend into it to check if it
                         # contains child items that don't exist in dest
-                        defaults_recurse(current[k], v)
+                        stack.append((existing, iter(v.items())))
+                        break
                 else:
                     # since it's not in context already, add the default
-                    current[k] = self.get_formatted_value(v)
+                    current[k] = get_formatted(v)
+            else:
+                stack.pop()
+
+    def snapshot(self, *keys):
+        """Get a deep copy of context's values at a single point in time.
+
+        Use this to read many values that another thread might be changing,
+        without seeing only some of its changes. The snapshot doesn't change
+        when context does. Unlike dumps, the snapshot stays in memory.
+
+        Args:
+            *keys: Only copy these top-level keys. No keys copies all of
+                   context.
+
+        Returns:
+            pypyr.context.Context with copies of the values. It does not
+            copy attributes like pystring_globals.
+
+        Raises:
+            KeyNotInContextError: One of keys doesn't exist in context.
+
+        """
+        with self.lock(*keys):
+            if keys:
+                items = {key: self[key] for key in keys}
+            else:
+                items = dict(self)
+
+            return Context(deepcopy(items))
+
+    def _get_formatted_fast(self, value):
+        """Get formatted value, skipping the formatter for plain literals.
+
+        Same result as get_formatted_value, but without the formatter's
+        overhead for the most common leaves: strings without braces & scalars
+        that aren't formattable or iterable.
+
+        Containers get a new formatted copy from _get_formatted_copy, so that
+        their depth isn't limited by the recursion limit either.
+
+        Args:
+            value: Any object to format.
+
+        Returns:
+            Formatted value.
+        """
+        value_type = type(value)
+        if value_type is str:
+            if '{' not in value and '}' not in value:
+                return value
+        elif value_type in _LITERAL_TYPES:
+            return value
+        elif _is_container(value):
+            return self._get_formatted_copy(value)
+
+        return self.get_formatted_value(value)
+
+    def _get_formatted_copy(self, value):
+        """Get a formatted copy of container value without recursion.
+
+        Same result as get_formatted_value, but walks value with an explicit
+        stack, copying the innermost containers first. The same nested
+        object formats to the same copy each time it appears.
+
+        Args:
+            value: Mapping, Sequence or Set to format. Not str or bytes.
+
+        Returns:
+            New container of the same type as value, with formatted items.
+
+        Raises:
+            RecursionError: value contains itself.
+        """
+        memo = {}
+        # ids of the containers on the stack, to catch a cycle.
+        active = {id(value)}
+        copies = []
+        # each frame is (container, is mapping, iterator over its items,
+        # formatted items). mappings keep key & value one after another.
+        stack = [(value, isinstance(value, Mapping),
+                  iter(value.items() if isinstance(value, Mapping) else value),
+                  [])]
+
+        while stack:
+            obj, is_mapping, items, formatted = stack[-1]
+            for item in items:
+                if is_mapping:
+                    k, item = item
+                    formatted.append(self._get_formatted_fast(k))
+
+                if _is_container(item):
+                    done = memo.get(id(item))
+                    if done is None:
+                        if id(item) in active:
+                            raise RecursionError(
+                                "can't format a container that contains "
+                                "itself.")
+
+                        # descend, this item's copy appends when it's done.
+                        active.add(id(item))
+                        is_child_mapping = isinstance(item, Mapping)
+                        stack.append((item, is_child_mapping,
+                                      iter(item.items() if is_child_mapping
+                                           else item),
+                                      []))
+                        break
+
+                    formatted.append(done)
+                else:
+                    formatted.append(self._get_formatted_fast(item))
+            else:
+                stack.pop()
+                active.discard(id(obj))
+                if is_mapping:
+                    new = obj.__class__(zip(formatted[::2], formatted[1::2]))
+                else:
+                    new = obj.__class__(formatted)
+
+                memo[id(obj)] = new
+                (stack[-1][3] if stack else copies).append(new)
+
+        return copies[0]
+
+
+class ConcurrentContext(Context):
+    """Context that many threads can change at the same time.
+
+    Opt in to this when steps run their own threads on the same context. Pass
+    a ConcurrentContext as main_with_context's dict_in to run the pipeline
+    with one.
+
+    Each top-level key belongs to 1 of a fixed set of locks. Setting,
+    deleting or popping a key only takes that key's lock, so threads that
+    write different keys seldom wait for each other.
+
+    merge, set_defaults, update, clear, popitem & dump are transactions:
+    they hold all the locks, so other threads see either none or all of
+    their changes.
+
+    Reads don't lock. Use snapshot() to read many values as they were at a
+    single point in time. To read-modify-write a value, or to change
+    something nested inside a value, hold that key's lock:
+        with context.lock('counter'):
+            context['counter'] += 1
+
+    Don't call transactions while holding only some keys' locks - another
+    thread's transaction could be waiting for those, while holding the rest.
+
+    Attributes: the same as Context.
+
+    """
+
+    __slots__ = ('_locks',)
+
+    def __init__(self, *args, **kwargs):
+        """Initialize context & its locks."""
+        self._locks = tuple(threading.RLock() for _ in range(_LOCK_SHARDS))
+        super().__init__(*args, **kwargs)
+
+    def __reduce__(self):
+        """Pickle & copy without the locks, which don't pickle."""
+        return (type(self), (dict(self),), vars(self).copy())
+
+    def __setitem__(self, key, value):
+        """Set key while holding its lock."""
+        with self._get_lock(key):
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        """Delete key while holding its lock."""
+        with self._get_lock(key):
+            super().__delitem__(key)
+
+    def __ior__(self, other):
+        """Update context from other in a single transaction."""
+        self.update(other)
+        return self
+
+    def clear(self):
+        """Remove all keys in a single transaction."""
+        with self.lock():
+            super().clear()
+
+    def dump(self, file):
+        """Write a binary snapshot of context to file in a transaction."""
+        with self.lock():
+            super().dump(file)
+
+    @contextmanager
+    def lock(self, *keys):
+        """Keep other threads from changing keys inside the with block.
+
+        Takes the locks in a fixed order, so 2 threads locking overlapping
+        keys can't deadlock. The locks are re-entrant, so the thread holding
+        them can set & delete the keys inside the block.
+
+        Args:
+            *keys: Top-level keys to lock. No keys locks all of context.
+
+        Yields:
+            This context.
+
+        """
+        if keys:
+            locks = [self._locks[index] for index in sorted(
+                {hash(key) % _LOCK_SHARDS for key in keys})]
+        else:
+            locks = self._locks
+
+        for lock in locks:
+            lock.acquire()
+
+        try:
+            yield self
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def merge(self, add_me, replace_lists=False):
+        """Merge add_me into context in a single transaction.
+
+        See Context.merge.
+        """
+        with self.lock():
+            super().merge(add_me, replace_lists=replace_lists)
+
+    def pop(self, key, *args):
+        """Remove key & return its value while holding its lock."""
+        with self._get_lock(key):
+            return super().pop(key, *args)
+
+    def popitem(self):
+        """Remove & return the last inserted item in a transaction."""
+        with self.lock():
+            return super().popitem()
+
+    def set_defaults(self, defaults):
+        """Set defaults in context in a single transaction.
+
+        See Context.set_defaults.
+        """
+        with self.lock():
+            super().set_defaults(defaults)
+
+    def setdefault(self, key, default=None):
+        """Get key, setting it to default first if it doesn't exist."""
+        with self._get_lock(key):
+            return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        """Update context like dict.update in a single transaction."""
+        with self.lock():
+            super().update(*args, **kwargs)
+
+    def _get_lock(self, key):
+        """Get the lock for key."""
+        return self._locks[hash(key) % _LOCK_SHARDS]
+
+
+def _get_snapshot_pickler(file, buffers):
+    """Get pickler that snapshots any Context it finds in the object graph.
+
+    Uses a per-pickler dispatch table rather than Context.__reduce__, so
+    copy.deepcopy(context) keeps its default behavior.
+    """
+    # py < 3.8 has no buffer_callback, & without protocol 5 never needs one.
+    kwargs = ({'buffer_callback': buffers.append}
+              if _SNAPSHOT_PROTOCOL >= 5 else {})
+    pickler = pickle.Pickler(file, protocol=_SNAPSHOT_PROTOCOL, **kwargs)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[Context] = _reduce_context
+    pickler.dispatch_table[ConcurrentContext] = _reduce_context
+    return pickler
+
+
+def _is_container(value):
+    """Check if value is a container that formatting copies item by item."""
+    return (isinstance(value, (Mapping, Sequence, Set))
+            and not isinstance(value, (str, bytes, bytearray,
+                                       SpecialTagDirective)))
+
+
+def _read_snapshot_length(file):
+    """Read a length field from a snapshot."""
+    return _SNAPSHOT_LENGTH.unpack(file.read(_SNAPSHOT_LENGTH.size))[0]
+
+
+def _reduce_context(context):
+    """Reduce context to its items & attributes, sans pystring_globals."""
+    state = {name: value for name, value in vars(context).items()
+             if name != 'pystring_globals'}
+    return (_restore_context, (type(context), dict(context), state))
+
+
+def _restore_context(cls, items, state):
+    """Create context from snapshot items & state, re-importing py imports."""
+    context = cls(items)
+    vars(context).update(state)
+    for source in context.pystring_imports:
+        context.pystring_globals.update(
+            pystring_namespace_cache.get_namespace(source))
 
-        # first iteration starts at context dict root
-        defaults_recurse(self, defaults)
+    return context
@@ -0,0 +1,184 @@
+"""Dependency graph for step-groups that run steps by their needs.
+
+A step-group is usually a list of steps that run top to bottom. A step-group
+can instead be a mapping, in which case its steps run as soon as the steps
+they need are done, up to parallel steps at the same time:
+
+    release:
+      parallel: 4 # optional. defaults to cpu count. True means cpu count.
+      steps:
+        - name: pypyr.steps.cmd
+          id: build
+          in:
+            cmd: make build
+        - name: pypyr.steps.cmd
+          id: docs
+          in:
+            cmd: make docs
+        - name: pypyr.steps.cmd
+          needs: [build, docs] # or a single str id
+          in:
+            cmd: make publish
+
+id is optional. You only need it if another step needs this step. Steps
+without needs can start immediately.
+
+Each running step works on its own shallow copy of context. When a step is
+done, what it changed merges back into context. runErrors from steps that
+ran at the same time all append. For any other key 2 steps both set, the
+step that finished last wins.
+"""
+import os
+from pypyr.errors import PipelineDefinitionError
+from pypyr.utils.types import cast_to_bool
+
+# keys where each step's new entries append rather than overwrite.
+_APPEND_KEYS = frozenset(['runErrors'])
+
+
+class StepNode():
+    """A step in a dependency graph.
+
+    Attributes:
+        step: The step as it exists in the pipeline yaml. A str or a dict.
+        id: (str) The step's id. None if the step doesn't have one.
+        needs: (list of str) ids of the steps this step waits for.
+        dependents: (list of StepNode) The steps that need this step.
+        pending: (int) Count of needs not done yet. The step can run at 0.
+    """
+
+    __slots__ = ('step', 'id', 'needs', 'dependents', 'pending')
+
+    def __init__(self, step):
+        """Initialize the node from the step's id & needs, if any."""
+        self.step = step
+        self.dependents = []
+
+        if isinstance(step, dict):
+            self.id = step.get('id', None)
+            needs = step.get('needs', None)
+            if not needs:
+                needs = []
+            elif isinstance(needs, str):
+                needs = [needs]
+            self.needs = list(needs)
+        else:
+            self.id = None
+            self.needs = []
+
+        self.pending = len(self.needs)
+
+    def __repr__(self):
+        """Describe the step by its id, else its name."""
+        if self.id is not None:
+            return str(self.id)
+
+        if isinstance(self.step, dict):
+            return str(self.step.get('name', None))
+
+        return str(self.step)
+
+
+def get_max_workers(parallel):
+    """Get how many steps can run at the same time from parallel.
+
+    Args:
+        parallel: bool or int. True means cpu count. False means 1. Strings
+            that aren't ints cast to bool, so a formatted 'True' works.
+
+    Returns:
+        int. Always at least 1.
+    """
+    if isinstance(parallel, str) and not parallel.strip().lstrip(
+            '-').isdigit():
+        parallel = cast_to_bool(parallel)
+
+    if isinstance(parallel, bool):
+        return (os.cpu_count() or 1) if parallel else 1
+
+    max_workers = int(parallel)
+    return max_workers if max_workers > 0 else 1
+
+
+def get_step_nodes(steps):
+    """Get the dependency graph for steps.
+
+    Args:
+        steps: list of steps as they exist in the pipeline yaml.
+
+    Returns:
+        list of StepNode in the same order as steps. Each node's dependents
+        are the nodes that need it.
+
+    Raises:
+        PipelineDefinitionError: duplicate id, a need for an id that doesn't
+            exist, or steps that need each other in a circle.
+    """
+    nodes = [StepNode(step) for step in steps]
+
+    nodes_by_id = {}
+    for node in nodes:
+        if node.id is None:
+            continue
+
+        if node.id in nodes_by_id:
+            raise PipelineDefinitionError(
+                f"step id {node.id} is not unique in its step-group.")
+        nodes_by_id[node.id] = node
+
+    for node in nodes:
+        for need in node.needs:
+            needed_node = nodes_by_id.get(need, None)
+            if needed_node is None:
+                raise PipelineDefinitionError(
+                    f"step {node!r} needs {need}, but no step in its "
+                    "step-group has that id.")
+            needed_node.dependents.append(node)
+
+    # Kahn's algorithm: whatever never becomes ready is in a cycle.
+    pending = {node: node.pending for node in nodes}
+    ready = [node for node in nodes if not node.pending]
+    while ready:
+        for dependent in ready.pop().dependents:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                ready.append(dependent)
+
+    circular = [node for node in nodes if pending[node]]
+    if circular:
+        raise PipelineDefinitionError(
+            f"steps {circular} need each other in a circle, so none of them "
+            "can ever run.")
+
+    return nodes
+
+
+def merge_step_context(context, before, after):
+    """Merge what a step changed in its own copy of context back into context.
+
+    A list under runErrors that the step created or replaced appends its new
+    entries to the list in context, so errors from steps that ran at the same
+    time don't overwrite each other. Any other key the step changed
+    overwrites context, so the last step to finish wins.
+
+    Args:
+        context: dict. The shared context. This arg will mutate.
+        before: dict. Shallow copy of context when the step started.
+        after: dict. The step's context when it finished.
+    """
+    for key, value in after.items():
+        if key in before and before[key] is value:
+            continue
+
+        current = context.get(key, None)
+        if (key in _APPEND_KEYS and isinstance(value, list)
+                and isinstance(current, list)):
+            # step's own list starts with what it saw when it started.
+            seen = before.get(key, None)
+            skip = len(seen) if isinstance(seen, list) else 0
+            context[key] = current + value[skip:]
+        else:
+            context[key] = value
+
+    for key in before.keys() - after.keys():
+        context.pop(key, None)
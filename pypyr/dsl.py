@@ -1,21 +1,34 @@
 """pypyr pipeline yaml definition classes - domain specific language."""
+from collections.abc import Mapping, Sequence, Set
+from functools import partial
 import json
 import logging
+import time
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
 from ruamel.yaml.nodes import ScalarNode
 from pypyr.errors import (Call,
+                          CircuitOpenError,
                           ControlOfFlowInstruction,
                           get_error_name,
                           HandledError,
                           LoopMaxExhaustedError,
                           PipelineDefinitionError,
-                          Stop)
+                          Stop,
+                          TimeoutExpiredError)
 from pypyr.cache.stepcache import step_cache
+from pypyr.circuit import get_circuit
+from pypyr.resources import run_with_resources
 from pypyr.utils import expressions, poll
+from pypyr.utils.cancel import run_with_timeout
+from pypyr.utils.shard import Shard
+from pypyr.utils.types import cast_to_bool
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
+# a step returns one of these to hand over control without raising.
+_INSTRUCTION_TYPES = (ControlOfFlowInstruction, Stop)
+
 # region custom yaml tags
 
 
@@ -235,6 +248,93 @@ def get_value(self, context=None):
 # endregion custom yaml tags
 
 
+class DecoratorValue:
+    """A step decorator value, resolved once if it's a constant.
+
+    Most decorator values in a pipeline are plain literals like True or 3. A
+    constant is a value without a formatting expression or special tag, so
+    formatting it against context always gives the same result. Resolve it
+    once when the step builds rather than on every run.
+
+    Only values that actually can change with context go to the formatter.
+
+    If a constant fails to cast to out_type, it counts as dynamic so that the
+    error raises at run time from the same place it always did.
+
+    Attributes:
+        constant: The resolved value if is_constant, else None.
+        is_constant (bool): True if value needs no formatting.
+        out_type (type): Cast value to this type. None means keep type, as
+                         per Context.get_formatted_value.
+        value: The raw decorator value, as it is in the pipeline yaml.
+    """
+
+    def __init__(self, value, out_type=None):
+        """Classify value as constant or dynamic.
+
+        Args:
+            value: The raw decorator value, as it is in the pipeline yaml.
+            out_type (type): Cast value to this type. None means keep type.
+        """
+        self.out_type = out_type
+        self.set_value(value)
+
+    def set_value(self, value):
+        """Set raw value & classify it as constant or dynamic."""
+        self.value = value
+        self.is_constant = False
+        self.constant = None
+
+        if isinstance(value, SpecialTagDirective):
+            return
+
+        if isinstance(value, str):
+            # '{{' escapes & a stray '}' raise, so formatter decides those.
+            if '{' in value or '}' in value:
+                return
+        elif self.out_type is None and isinstance(value,
+                                                  (Mapping, Sequence, Set)):
+            # get_formatted_value recurses into iterables.
+            return
+
+        if self.out_type is None:
+            constant = value
+        else:
+            try:
+                if self.out_type is bool and isinstance(value, str):
+                    constant = cast_to_bool(value)
+                else:
+                    constant = self.out_type(value)
+            except Exception:
+                return
+
+        self.constant = constant
+        self.is_constant = True
+
+    def get_value(self, context, value):
+        """Get value formatted against context & cast to out_type.
+
+        Args:
+            context: (pypyr.context.Context) Format against this.
+            value: The current raw decorator value. If this is not the value
+                   classified previously, reclassifies. This allows the
+                   owner's public attribute to change after init.
+
+        Returns:
+            Formatted value cast to out_type.
+        """
+        if value is not self.value:
+            self.set_value(value)
+
+        if self.is_constant:
+            return self.constant
+
+        if self.out_type is None:
+            return context.get_formatted_value(value)
+
+        return context.get_formatted_as_type(value, out_type=self.out_type)
+
+
 class Step:
     """A step, as interpreted by the pypyr pipeline definition yaml.
 
@@ -253,6 +353,9 @@ class Step:
         name: (string) this is the step-name. equivalent to the module name of
               of the step. this module is the one dynamically loaded to
               the module attribute.
+        acquire: (str or list of str) defaults None. Hold these named
+                 resources from the pipeline's resources section while the
+                 step runs. See pypyr.resources.
         module: (importlib module) the dynamically loaded module that the
                 step will execute. this module will have the run_step
                 function that implements the actual step execution.
@@ -261,11 +364,18 @@ class Step:
         in_parameters: (dict) defaults None. The in step decorator - i.e dict
                        to add to context before step execution.
         run_me: (bool) defaults True. step runs if this is true.
+        shard_mode: (bool or str) defaults False. If context has
+                    shardIndex & shardCount, foreach only loops over this
+                    shard's items. True or 'stride' splits by position,
+                    'hash' by item value.
         skip_me: (bool) defaults False. step does not run if this is true.
         steps_runner: pypyr.stepsrunner.StepsRunner Step Runner instance
                       running this step.
         swallow_me: (bool) defaults False. swallow any errors during step run
                     and continue processing if true.
+        timeout: (float) defaults None. Seconds each run of the step may
+                 take, before it fails with TimeoutExpiredError. With
+                 foreach, while & retry, applies to each iteration.
         while_decorator: (WhileDecorator) defaults None. execute step in while
                          loop.
 
@@ -289,6 +399,7 @@ def __init__(self, step, steps_runner):
         self.steps_runner = steps_runner
 
         # defaults for decorators
+        self.acquire = None
         self.description = None
         self.foreach_items = None
         self.in_parameters = None
@@ -296,8 +407,10 @@ def __init__(self, step, steps_runner):
         self.line_no = None
         self.line_col = None
         self.run_me = True
+        self.shard_mode = False
         self.skip_me = False
         self.swallow_me = False
+        self.timeout = None
         self.name = None
         self.while_decorator = None
         self.on_error = None
@@ -313,6 +426,14 @@ def __init__(self, step, steps_runner):
                 self.name = step
 
             self.run_step_function = step_cache.get_step(self.name)
+
+            # pre-classify so constants resolve once only.
+            self._acquire = DecoratorValue(self.acquire)
+            self._description = DecoratorValue(self.description)
+            self._run_me = DecoratorValue(self.run_me, bool)
+            self._skip_me = DecoratorValue(self.skip_me, bool)
+            self._swallow_me = DecoratorValue(self.swallow_me, bool)
+            self._timeout = DecoratorValue(self.timeout, float)
         except Exception:
             # Exceptions could also happened on the step init phase
             # (ModuleNotFound, KeyError, etc..),
@@ -358,6 +479,9 @@ def _init_from_dict(self, step):
 
         self.in_parameters = step.get('in', None)
 
+        # acquire: optional, defaults none. Allow substitution.
+        self.acquire = step.get('acquire', None)
+
         # description: optional. Write to stdout if exists and flagged.
         self.description = step.get('description', None)
 
@@ -367,6 +491,9 @@ def _init_from_dict(self, step):
             # current item in loops
             self.for_counter = None
 
+            # shard: optional, defaults false. Allow substitution.
+            self.shard_mode = step.get('shard', False)
+
         # retry: optional, defaults none.
         retry_definition = step.get('retry', None)
         if retry_definition:
@@ -384,6 +511,9 @@ def _init_from_dict(self, step):
         # on_error: optional, defaults none. Allow substitution.
         self.on_error = step.get('onError', None)
 
+        # timeout: optional, defaults none. Allow substitution.
+        self.timeout = step.get('timeout', None)
+
         # while: optional, defaults none.
         while_definition = step.get('while', None)
         if while_definition:
@@ -417,9 +547,9 @@ def save_error(self, context, exception, swallowed):
             'swallowed': swallowed,
         }
 
-        run_errors = context.setdefault('runErrors', [])
-
-        run_errors.append(failure)
+        # steps on other threads can fail at the same time.
+        with context.lock('runErrors'):
+            context.setdefault('runErrors', []).append(failure)
 
     def foreach_loop(self, context):
         """Run step once for each item in foreach_items.
@@ -430,6 +560,10 @@ def foreach_loop(self, context):
         Args:
             context: (pypyr.context.Context) The pypyr context. This arg will
                      mutate.
+
+        Returns:
+            Jump or Stop instruction the step returned, which ends the loop.
+            None otherwise.
         """
         logger.debug("starting")
 
@@ -439,9 +573,28 @@ def foreach_loop(self, context):
 
         foreach_length = len(foreach)
 
-        logger.info("foreach decorator will loop %s times.", foreach_length)
+        if self.shard_mode and context.get('shardCount', None):
+            shard_mode = context.get_formatted_value(self.shard_mode)
+            if (isinstance(shard_mode, str)
+                    and shard_mode not in ('stride', 'hash')):
+                # formatted 'True' or 'False' arrive as str
+                shard_mode = cast_to_bool(shard_mode)
+        else:
+            shard_mode = False
+
+        if shard_mode:
+            shard = Shard(context['shardIndex'], context['shardCount'])
+            logger.info("foreach decorator will loop over shard %s of %s "
+                        "items, by %s.", shard, foreach_length,
+                        'stride' if shard_mode is True else shard_mode)
+            foreach = shard.get_items(foreach, shard_mode)
+        else:
+            logger.info("foreach decorator will loop %s times.",
+                        foreach_length)
 
+        loop_count = 0
         for i in foreach:
+            loop_count += 1
             logger.info("foreach: running step %s", i)
             # the iterator must be available to the step when it executes
             context['i'] = i
@@ -449,11 +602,55 @@ def foreach_loop(self, context):
 
             # conditional operators apply to each iteration, so might be an
             # iteration run, skips or swallows.
-            self.run_conditional_decorators(context)
+            instruction = self.run_conditional_decorators(context)
+            if isinstance(instruction, _INSTRUCTION_TYPES):
+                logger.debug("foreach: %s ends loop at %s",
+                             type(instruction).__name__, i)
+                return instruction
+
             logger.debug("foreach: done step %s", i)
 
-        logger.debug("foreach decorator looped %s times.", foreach_length)
+        logger.debug("foreach decorator looped %s times.", loop_count)
         logger.debug("done")
+        return None
+
+    def handle_error(self, context, exc_info, swallow_me):
+        """Save & log exc_info raised by the step. Re-raise if not swallowed.
+
+        Args:
+            context: (pypyr.context.Context) The pypyr context. This arg will
+                     mutate - runErrors will contain exc_info.
+            exc_info: (Exception) The error raised while running the step.
+            swallow_me: (bool) Log & continue rather than raise.
+        """
+        if isinstance(exc_info, HandledError):
+            exc_info = exc_info.__cause__
+        else:
+            # prevent already logged err logging twice.
+            self.save_error(
+                context=context,
+                exception=exc_info,
+                swallowed=swallow_me
+            )
+        if swallow_me:
+            logger.error(
+                "%s Ignoring error because swallow "
+                "is True for this step.\n"
+                "%s: %s",
+                self.name, get_error_name(exc_info), exc_info
+            )
+        else:
+            if self.line_no:
+                logger.error(
+                    "Error while running step %s "
+                    "at pipeline yaml line: %d, col: %d",
+                    self.name, self.line_no, self.line_col
+                )
+            else:
+                logger.error(
+                    "Error while running step %s", self.name
+                )
+            raise exc_info
 
     def invoke_step(self, context):
         """Invoke 'run_step' in the dynamically loaded step module.
@@ -465,35 +662,62 @@ def invoke_step(self, context):
         you really know what you're doing, use run_step if you intend on
         executing the step the same way pypyr does.
 
+        A step can hand over control either by raising or by returning a
+        control-of-flow instruction. Returning is cheaper, because nothing
+        unwinds. invoke_step runs a Call right here, since call resumes the
+        step once the called groups are done.
+
         Args:
             context: (pypyr.context.Context) The pypyr context. This arg will
                      mutate.
+
+        Returns:
+            The Jump or Stop instruction the step returned, for the caller
+            to pass up to the StepsRunner. None otherwise.
         """
         logger.debug("starting")
 
         logger.debug("running step %s", self.name)
 
         try:
-            self.run_step_function(context)
+            instruction = self.run_step_function(context)
         except Call as call:
-            logger.debug("call: calling %s", call.groups)
-            try:
-                self.steps_runner.run_step_groups(
-                    groups=call.groups,
-                    success_group=call.success_group,
-                    failure_group=call.failure_group)
-            except Exception as ex_info:
-                # don't want to log error twice - would've been logged already
-                # in called step-group.
-                raise HandledError from ex_info
-            finally:
-                self.reset_context_counters(context, call)
-
-            # py 3.9 issue with coveragepy doesn't show this as covered. it is.
-            logger.debug("call: done calling %s",
-                         call.groups)  # pragma: no cover
+            instruction = call
+
+        if isinstance(instruction, Call):
+            self.run_call(context, instruction)
+        elif isinstance(instruction, _INSTRUCTION_TYPES):
+            logger.debug("step %s returned %s", self.name,
+                         type(instruction).__name__)
+            return instruction
 
         logger.debug("step %s done", self.name)
+        return None
+
+    def run_call(self, context, call):
+        """Run the step-groups in the Call instruction, then resume.
+
+        Args:
+            context: (pypyr.context.Context) The pypyr context. This arg will
+                     mutate.
+            call: pypyr.errors.Call The control-of-flow call instruction.
+        """
+        logger.debug("call: calling %s", call.groups)
+        try:
+            self.steps_runner.run_step_groups(
+                groups=call.groups,
+                success_group=call.success_group,
+                failure_group=call.failure_group)
+        except Exception as ex_info:
+            # don't want to log error twice - would've been logged already
+            # in called step-group.
+            raise HandledError from ex_info
+        finally:
+            self.reset_context_counters(context, call)
+
+        # py 3.9 issue with coveragepy doesn't show this as covered. it is.
+        logger.debug("call: done calling %s",
+                     call.groups)  # pragma: no cover
 
     def reset_context_counters(self, context, call):
         """Set loop counters in context to current counters on self.
@@ -557,58 +781,48 @@ def run_conditional_decorators(self, context):
         Args:
             context: (pypyr.context.Context) The pypyr context. This arg will
                      mutate.
+
+        Returns:
+            Jump or Stop instruction the step returned. None otherwise.
         """
         logger.debug("starting")
+        instruction = None
 
         # The decorator attributes might contain formatting expressions that
         # change whether they evaluate True or False, thus apply formatting at
         # last possible instant.
-        run_me = context.get_formatted_as_type(self.run_me, out_type=bool)
-        skip_me = context.get_formatted_as_type(self.skip_me, out_type=bool)
-        swallow_me = context.get_formatted_as_type(self.swallow_me,
-                                                   out_type=bool)
+        run_me = self._run_me.get_value(context, self.run_me)
+        skip_me = self._skip_me.get_value(context, self.skip_me)
+        swallow_me = self._swallow_me.get_value(context, self.swallow_me)
 
         if run_me:
             if not skip_me:
                 try:
+                    step_method = self.invoke_step
+                    if self.acquire is not None:
+                        step_method = partial(
+                            run_with_resources,
+                            self._acquire.get_value(context, self.acquire),
+                            step_method)
+
+                    if self.timeout is not None:
+                        step_method = partial(
+                            run_with_timeout,
+                            self._timeout.get_value(context, self.timeout),
+                            f'step {self.name}',
+                            step_method)
+
                     if self.retry_decorator:
-                        self.retry_decorator.retry_loop(context,
-                                                        self.invoke_step)
+                        instruction = self.retry_decorator.retry_loop(
+                            context, step_method)
                     else:
-                        self.invoke_step(context=context)
+                        instruction = step_method(context=context)
                 except (ControlOfFlowInstruction, Stop):
                     # Control-of-Flow/Stop are instructions to go somewhere
                     # else, not errors per se.
                     raise
                 except Exception as exc_info:
-                    if isinstance(exc_info, HandledError):
-                        exc_info = exc_info.__cause__
-                    else:
-                        # prevent already logged err logging twice.
-                        self.save_error(
-                            context=context,
-                            exception=exc_info,
-                            swallowed=swallow_me
-                        )
-                    if swallow_me:
-                        logger.error(
-                            "%s Ignoring error because swallow "
-                            "is True for this step.\n"
-                            "%s: %s",
-                            self.name, get_error_name(exc_info), exc_info
-                        )
-                    else:
-                        if self.line_no:
-                            logger.error(
-                                "Error while running step %s "
-                                "at pipeline yaml line: %d, col: %d",
-                                self.name, self.line_no, self.line_col
-                            )
-                        else:
-                            logger.error(
-                                "Error while running step %s", self.name
-                            )
-                        raise exc_info
+                    self.handle_error(context, exc_info, swallow_me)
             else:
                 logger.info(
                     "%s not running because skip is True.", self.name)
@@ -616,6 +830,7 @@ def run_conditional_decorators(self, context):
             logger.info("%s not running because run is False.", self.name)
 
         logger.debug("done")
+        return instruction
 
     def run_foreach_or_conditional(self, context):
         """Run the foreach sequence or the conditional evaluation.
@@ -623,16 +838,20 @@ def run_foreach_or_conditional(self, context):
         Args:
             context: (pypyr.context.Context) The pypyr context. This arg will
                      mutate.
+
+        Returns:
+            Jump or Stop instruction the step returned. None otherwise.
         """
         logger.debug("starting")
         # friendly reminder [] list obj (i.e empty) evals False
         if self.foreach_items:
-            self.foreach_loop(context)
+            instruction = self.foreach_loop(context)
         else:
             # since no looping required, don't pollute output with looping info
-            self.run_conditional_decorators(context)
+            instruction = self.run_conditional_decorators(context)
 
         logger.debug("done")
+        return instruction
 
     def run_step(self, context):
         """Run a single pipeline step.
@@ -640,15 +859,19 @@ def run_step(self, context):
         Args:
             context: (pypyr.context.Context) The pypyr context. This arg will
                      mutate.
+
+        Returns:
+            Jump or Stop instruction the step returned, for the StepsRunner
+            to dispatch. None otherwise.
         """
         logger.debug("starting")
 
         # give user helpful output if step will actually run or not.
         if self.description:
-            description = context.get_formatted_value(self.description)
-            run_me = context.get_formatted_as_type(self.run_me, out_type=bool)
-            skip_me = context.get_formatted_as_type(self.skip_me,
-                                                    out_type=bool)
+            description = self._description.get_value(context,
+                                                      self.description)
+            run_me = self._run_me.get_value(context, self.run_me)
+            skip_me = self._skip_me.get_value(context, self.skip_me)
 
             if run_me and not skip_me:
                 logger.notify(description)
@@ -659,15 +882,21 @@ def run_step(self, context):
         self.set_step_input_context(context)
 
         if self.while_decorator:
-            self.while_decorator.while_loop(context,
-                                            self.run_foreach_or_conditional)
+            instruction = self.while_decorator.while_loop(
+                context, self.run_foreach_or_conditional)
         else:
-            self.run_foreach_or_conditional(context)
+            instruction = self.run_foreach_or_conditional(context)
+
+        if isinstance(instruction, _INSTRUCTION_TYPES):
+            # same as when the instruction raises: in params stay in context.
+            logger.debug("done")
+            return instruction
 
         # the in params should be removed from context after step execution.
         self.unset_step_input_context(context)
 
         logger.debug("done")
+        return None
 
     def set_step_input_context(self, context):
         """Append step's 'in' parameters to context, if they exist.
@@ -723,6 +952,84 @@ def unset_step_input_context(self, context):
         logger.debug("done")
 
 
+class SimpleStep(Step):
+    """A step with no decorators, like a bare string step in the pipeline.
+
+    Lighter than Step: initializing doesn't allocate any decorator state, and
+    run_step invokes the step function directly without evaluating run, skip,
+    swallow, foreach, while or retry.
+
+    It's stateless between runs, so the StepsRunner can re-use the same
+    instance every time the same step name appears in its pipeline.
+
+    Attributes:
+        name: (string) this is the step-name. equivalent to the module name of
+              of the step.
+        run_step_function: (callable) the run_step function of the step
+                           module.
+        steps_runner: pypyr.stepsrunner.StepsRunner Step Runner instance
+                      running this step.
+
+    """
+
+    # decorator defaults as class attributes, so the inherited Step methods
+    # work unchanged without each instance having to set them.
+    acquire = None
+    description = None
+    foreach_items = None
+    in_parameters = None
+    line_col = None
+    line_no = None
+    on_error = None
+    retry_decorator = None
+    run_me = True
+    shard_mode = False
+    skip_me = False
+    swallow_me = False
+    timeout = None
+    while_decorator = None
+
+    def __init__(self, name, steps_runner):
+        """Initialize the step & load its step module.
+
+        Deliberately does not call Step.__init__, which sets up decorators.
+
+        Args:
+            name: (string) step name. The step module's name.
+            steps_runner: the StepsRunner instance running this Step.
+
+        """
+        logger.debug("%s is a simple string.", name)
+        self.name = name
+        self.steps_runner = steps_runner
+
+        try:
+            self.run_step_function = step_cache.get_step(name)
+        except Exception:
+            logger.error("Error at pipeline step %s", name)
+            raise
+
+    def run_step(self, context):
+        """Run the step, saving & logging any error it raises.
+
+        Args:
+            context: (pypyr.context.Context) The pypyr context. This arg will
+                     mutate.
+
+        Returns:
+            Jump or Stop instruction the step returned, for the StepsRunner
+            to dispatch. None otherwise.
+        """
+        try:
+            return self.invoke_step(context=context)
+        except (ControlOfFlowInstruction, Stop):
+            # Control-of-Flow/Stop are instructions to go somewhere
+            # else, not errors per se.
+            raise
+        except Exception as exc_info:
+            self.handle_error(context, exc_info, False)
+
+
 class RetryDecorator:
     """Retry decorator, as interpreted by the pypyr pipeline definition yaml.
 
@@ -737,6 +1044,9 @@ class RetryDecorator:
     retry_loop serves as the blackbox entrypoint for this class' other methods.
 
     Attributes:
+        circuit: (str or dict) default None. Name or definition of the
+                 circuit breaker the retry loop shares with other retry loops.
+                 None means no circuit breaker. See pypyr.circuit.
         max: (int) default None. Maximum loop iterations. None is infinite.
         sleep: (float) defaults 0. Sleep in seconds between iterations.
         stop_on: (list) default None. Always stop retry on these error
@@ -744,6 +1054,8 @@ class RetryDecorator:
         retry_on: (list) default None. Only retry on these error types. All
                 other error types will stop retry loop. None means retry all
                 errors.
+        timeout: (float) default None. Total seconds for all the attempts,
+                 including sleeps. None means no limit.
 
     """
 
@@ -761,6 +1073,9 @@ def __init__(self, retry_definition):
         logger.debug("starting")
 
         if isinstance(retry_definition, dict):
+            # circuit: optional. defaults None.
+            self.circuit = retry_definition.get('circuit', None)
+
             # max: optional. defaults None.
             self.max = retry_definition.get('max', None)
 
@@ -772,6 +1087,15 @@ def __init__(self, retry_definition):
 
             # retryOn: optional. defaults None.
             self.retry_on = retry_definition.get('retryOn', None)
+
+            # timeout: optional. defaults None.
+            self.timeout = retry_definition.get('timeout', None)
+
+            # pre-classify so constants resolve once only.
+            self._circuit = DecoratorValue(self.circuit)
+            self._max = DecoratorValue(self.max, int)
+            self._sleep = DecoratorValue(self.sleep, float)
+            self._timeout = DecoratorValue(self.timeout, float)
         else:
             # if it isn't a dict, pipeline configuration is wrong.
             logger.error("retry decorator definition incorrect.")
@@ -779,6 +1103,15 @@ def __init__(self, retry_definition):
                                           "(i.e a map) type.")
 
         self.retry_counter = None
+        # Jump or Stop instruction the step returned, if any.
+        self.instruction = None
+        # time.monotonic() when the timeout runs out. None means no limit.
+        self.deadline = None
+        # timeout & sleep seconds, as formatted for the current loop.
+        self.timeout_seconds = None
+        self.sleep_seconds = 0
+        # CircuitBreaker for the current loop. None means no circuit.
+        self.breaker = None
 
         logger.debug("done")
 
@@ -808,15 +1141,35 @@ def exec_iteration(self, counter, context, step_method):
         context['retryCounter'] = counter
         self.retry_counter = counter
 
+        if self.breaker is not None:
+            # fail fast when the circuit is open, without running the step.
+            self.breaker.before_call()
+
         logger.info("retry: running step with counter %s", counter)
         try:
-            step_method(context)
+            # a returned instruction is a success, so it ends the loop.
+            if self.deadline is None:
+                self.instruction = step_method(context)
+            else:
+                self.instruction = run_with_timeout(
+                    max(self.deadline - time.monotonic(), 0),
+                    'retry',
+                    step_method,
+                    context)
             result = True
         except (ControlOfFlowInstruction, Stop):
             # Control-of-Flow/Stop are instructions to go somewhere
             # else, not errors per se.
             raise
         except Exception as ex_info:
+            if isinstance(ex_info, HandledError):
+                ex_info = ex_info.__cause__
+
+            # count every failed attempt, even when it's the last one.
+            is_circuit_open = (self.breaker is not None
+                               and self.breaker.record_failure(
+                                   get_error_name(ex_info)))
+
             if self.max:
                 if counter == self.max:
                     logger.debug("retry: max %s retries exhausted. "
@@ -825,9 +1178,6 @@ def exec_iteration(self, counter, context, step_method):
                     # but would lose the err info if not, so lesser of 2 evils.
                     raise
 
-            if isinstance(ex_info, HandledError):
-                ex_info = ex_info.__cause__
-
             if self.stop_on or self.retry_on:
                 error_name = get_error_name(ex_info)
                 if self.stop_on:
@@ -850,10 +1200,32 @@ def exec_iteration(self, counter, context, step_method):
                     else:
                         logger.debug("%s in retryOn. Retry again.", error_name)
 
+            # no point sleeping & trying again while the circuit is open.
+            if is_circuit_open:
+                logger.error("retry: circuit %s open after %s attempts. "
+                             "raising error.", self.breaker.name, counter)
+                raise CircuitOpenError(
+                    f"circuit {self.breaker.name} is open. stopped retrying "
+                    f"after {counter} attempts. last error was "
+                    f"{get_error_name(ex_info)}: {ex_info}") from ex_info
+
+            # no time left to sleep & try again.
+            if (self.deadline is not None and
+                    time.monotonic() + self.sleep_seconds >= self.deadline):
+                logger.error("retry: timeout exhausted after %s attempts. "
+                             "raising error.", counter)
+                raise TimeoutExpiredError(
+                    f"retry didn't succeed within its {self.timeout_seconds}s "
+                    f"timeout. gave up after {counter} attempts. last error "
+                    f"was {get_error_name(ex_info)}: {ex_info}") from ex_info
+
             result = False
             logger.error("retry: ignoring error because retryCounter < max.\n"
                          "%s: %s", type(ex_info).__name__, ex_info)
 
+        if result and self.breaker is not None:
+            self.breaker.record_success()
+
         logger.debug("retry: done step with counter %s", counter)
 
         logger.debug("done")
@@ -870,15 +1242,35 @@ def retry_loop(self, context, step_method):
                          will execute on every loop iteration. Signature is:
                          function(context)
 
+        Returns:
+            Jump or Stop instruction step_method returned. None otherwise.
+
         """
         logger.debug("starting")
 
         context['retryCounter'] = 0
         self.retry_counter = 0
+        self.instruction = None
+
+        sleep = self._sleep.get_value(context, self.sleep)
+        self.sleep_seconds = sleep
+        if self.circuit is None:
+            self.breaker = None
+        else:
+            self.breaker = get_circuit(
+                self._circuit.get_value(context, self.circuit),
+                getattr(context, 'working_dir', None))
+        if self.timeout is None:
+            self.deadline = None
+        else:
+            self.timeout_seconds = self._timeout.get_value(context,
+                                                           self.timeout)
+            self.deadline = time.monotonic() + self.timeout_seconds
+            logger.info("retry decorator will give up after %ss.",
+                        self.timeout_seconds)
 
-        sleep = context.get_formatted_as_type(self.sleep, out_type=float)
         if self.max:
-            max = context.get_formatted_as_type(self.max, out_type=int)
+            max = self._max.get_value(context, self.max)
 
             logger.info("retry decorator will try %d times at %ss "
                         "intervals.", max, sleep)
@@ -901,6 +1293,7 @@ def retry_loop(self, context, step_method):
         logger.debug("retry loop done")
 
         logger.debug("done")
+        return self.instruction
 
 
 class WhileDecorator:
@@ -950,6 +1343,11 @@ def __init__(self, while_definition):
             # stop: optional. defaults None.
             self.stop = while_definition.get('stop', None)
 
+            # pre-classify so constants resolve once only.
+            self._error_on_max = DecoratorValue(self.error_on_max, bool)
+            self._max = DecoratorValue(self.max, int)
+            self._sleep = DecoratorValue(self.sleep, float)
+
             if self.stop is None and self.max is None:
                 logger.error("while decorator missing both max and stop.")
                 raise PipelineDefinitionError("the while decorator must have "
@@ -966,6 +1364,8 @@ def __init__(self, while_definition):
                                           "(i.e a map) type.")
 
         self.while_counter = None
+        # Jump or Stop instruction the step returned, if any.
+        self.instruction = None
 
         logger.debug("done")
 
@@ -988,6 +1388,7 @@ def exec_iteration(self, counter, context, step_method):
 
          Returns:
             bool. True if self.stop evaluates to True after step execution,
+                  or if step_method returned a Jump or Stop instruction.
                   False otherwise.
 
         """
@@ -996,9 +1397,15 @@ def exec_iteration(self, counter, context, step_method):
         self.while_counter = counter
 
         logger.info("while: running step with counter %s", counter)
-        step_method(context)
+        instruction = step_method(context)
         logger.debug("while: done step %s", counter)
 
+        if isinstance(instruction, _INSTRUCTION_TYPES):
+            # stop looping, the instruction says go elsewhere.
+            self.instruction = instruction
+            logger.debug("done")
+            return True
+
         result = False
         # if no stop, just iterating to max)
         if self.stop:
@@ -1020,11 +1427,15 @@ def while_loop(self, context, step_method):
                          will execute on every loop iteration. Signature is:
                          function(context)
 
+        Returns:
+            Jump or Stop instruction step_method returned. None otherwise.
+
         """
         logger.debug("starting")
 
         context['whileCounter'] = 0
         self.while_counter = 0
+        self.instruction = None
 
         if self.stop is None and self.max is None:
             # the ctor already does this check, but guess theoretically
@@ -1034,23 +1445,23 @@ def while_loop(self, context, step_method):
                                           "either max or stop, or both. "
                                           "But not neither.")
 
-        error_on_max = context.get_formatted_as_type(
-            self.error_on_max, out_type=bool)
-        sleep = context.get_formatted_as_type(self.sleep, out_type=float)
+        error_on_max = self._error_on_max.get_value(context,
+                                                    self.error_on_max)
+        sleep = self._sleep.get_value(context, self.sleep)
         if self.max is None:
             max = None
             logger.info("while decorator will loop until %s "
                         "evaluates to True at %ss intervals.",
                         self.stop, sleep)
         else:
-            max = context.get_formatted_as_type(self.max, out_type=int)
+            max = self._max.get_value(context, self.max)
 
             if max < 1:
                 logger.info(
                     "max %s is %s. while only runs when max > 0.",
                     self.max, max)
                 logger.debug("done")
-                return
+                return None
 
             if self.stop is None:
                 logger.info("while decorator will loop %s times at "
@@ -1081,8 +1492,12 @@ def while_loop(self, context, step_method):
                         "and %s never evaluated to True.", max, self.stop)
 
             logger.debug("while loop done")
+        elif isinstance(self.instruction, _INSTRUCTION_TYPES):
+            logger.debug("while: %s ends loop at %s",
+                         type(self.instruction).__name__, self.while_counter)
         else:
             logger.info("while loop done, stop condition %s "
                         "evaluated True.", self.stop)
 
         logger.debug("done")
+        return self.instruction
@@ -31,6 +31,10 @@ class Error(Exception):
     """Base class for all pypyr exceptions."""
 
 
+class CircuitOpenError(Error):
+    """A circuit breaker is open, so the step failed fast without running."""
+
+
 class ContextError(Error):
     """Error in the pypyr context."""
 
@@ -71,6 +75,14 @@ class PyModuleNotFoundError(Error, ModuleNotFoundError):
     """Could not load python module because it wasn't found."""
 
 
+class QueueJobError(Error):
+    """A pype job on a work queue failed in its worker."""
+
+
+class TimeoutExpiredError(Error, TimeoutError):
+    """A step, retry or pipeline didn't finish within its timeout."""
+
+
 # -------------------------- Control of Flow Instructions ---------------------
 class Stop(Error):
     """Control of flow. Stop all execution."""
@@ -1,7 +1,14 @@
 """Substitution & interpolation formatting."""
 from collections.abc import Mapping, Set, Sequence
+from itertools import islice
 from string import Formatter
 
+# a formatted string only memoizes if every arg it read is one of these, so
+# that a changed arg always means a different object.
+_IMMUTABLE_TYPES = (str, int, float, bool, complex, bytes, type(None))
+
+_MISSING = object()
+
 
 class RecursionSpec():
     """Parse a string formatting spec.
@@ -89,7 +96,16 @@ class and implement the standard overloads like get_field() and get_value()
     You can still use all the usual format_spec functionality by adding the
     specifiers immediately after the 'ff' or 'rf'.
 
+    If memo_size is set, memoizes each formatted string along with the keyword
+    args that its expressions read. The next time the same string formats,
+    the memoized result returns as long as each of those args is still the
+    same object. This only applies when all the args the expression read are
+    immutable scalars like str or int, since an arg that is a container can
+    change in place. Formatting positional args never memoizes.
+
     Attributes:
+        memo_size (int): Max number of formatted strings to memoize. None
+                         means do not memoize.
         passthrough_types (tuple of type): Objects of this type do not format
                                            at all - pass through without
                                            applying any formatting logic.
@@ -100,7 +116,8 @@ class and implement the standard overloads like get_field() and get_value()
 
     _FORMAT_SPEC_RECURSION_DEPTH = 2
 
-    def __init__(self, passthrough_types=None, special_types=None):
+    def __init__(self, passthrough_types=None, special_types=None,
+                 memo_size=None):
         """Initialize me.
 
         Args:
@@ -114,9 +131,18 @@ def __init__(self, passthrough_types=None, special_types=None):
                                            output value during formatting. If
                                            single type, no need to put it in
                                            tuple.
+            memo_size (int): Max number of formatted strings to memoize.
+                             Default None means do not memoize.
         """
         self.passthrough_types = passthrough_types
         self.special_types = special_types
+        self.memo_size = memo_size
+        # (format_string, is_recursive): (result, ((arg, value), ...))
+        self._memo = {}
+
+    def clear_memo(self):
+        """Clear all memoized formatted strings."""
+        self._memo.clear()
 
     def format(self, format_string, *args, **kwargs):
         """Format the input with arbitrary positional & keyword args.
@@ -130,7 +156,7 @@ def format(self, format_string, *args, **kwargs):
         """
         return self.vformat(format_string, args, kwargs)
 
-    def vformat(self, format_string, args, kwargs):
+    def vformat(self, format_string, args, kwargs, is_shared=False):
         """Format the input with predefined dict of args.
 
         Use exactly as you would in string.Formatter. Only you get 'ff' & 'rf'
@@ -143,24 +169,33 @@ def vformat(self, format_string, args, kwargs):
         contains an iterable object, will iterate through it recursively and
         apply formatting on all strings as it goes.
 
+        If is_shared is True, containers where nothing inside changed return
+        as is rather than as a new copy, so new containers only allocate along
+        the paths where formatting changed something. The result can then
+        share objects with the input & with kwargs, so only use this when the
+        caller does not mutate the result.
+
         Args:
             format_string (object): Any object to format.
             args (iterable): Variable list positional args for formatting
                              expression.
             kwargs (iterable): Variable mapping of keyword args for formatting
                                expression.
+            is_shared (bool): Return unchanged containers as is rather than
+                              copy them. Default False.
         """
         used_args = set()
         result = self._get_formatted_iterable(format_string,
                                               args,
                                               kwargs,
-                                              used_args)
+                                              used_args,
+                                              is_shared=is_shared)
         self.check_unused_args(used_args, args, kwargs)
         return result
 
     def _format_keep_type(self, format_string, args, kwargs, used_args,
                           recursion_depth, auto_arg_index=0,
-                          is_recursive=False):
+                          is_recursive=False, is_shared=False):
         """Do the actual implementation for formatting formattable objects.
 
         Don't call me directly. Use format() or vformat().
@@ -184,6 +219,7 @@ def _format_keep_type(self, format_string, args, kwargs, used_args,
                                  indicated recursion. This is to allow nested
                                  formatting expressions to recurse themselves
                                  by default.
+            is_shared (bool): Return unchanged containers as is.
         """
         if recursion_depth < 0:
             raise ValueError('Max string recursion exceeded')
@@ -235,7 +271,7 @@ def _format_keep_type(self, format_string, args, kwargs, used_args,
                 if recursion_spec.is_recursive or (
                         is_recursive and not recursion_spec.is_flat):
                     obj = self._get_formatted_iterable(
-                        obj, args, kwargs, used_args, None, True)
+                        obj, args, kwargs, used_args, None, True, is_shared)
                     recursion_spec.has_recursed = True
 
                 # do any conversion on the resulting object
@@ -259,7 +295,7 @@ def _format_keep_type(self, format_string, args, kwargs, used_args,
                     # single formatting expression comprising the entire string
                     obj = self._get_formatted_iterable(
                         obj, args, kwargs, used_args, None,
-                        recursion_spec.is_recursive)
+                        recursion_spec.is_recursive, is_shared)
 
                 # if format_spec explicitly specified, can assume caller DOES
                 # want the string conversion that format_spec does.
@@ -278,7 +314,7 @@ def _format_keep_type(self, format_string, args, kwargs, used_args,
                             for obj, is_literal, recursion_spec in result])
 
     def _get_formatted_iterable(self, obj, args, kwargs, used_args, memo=None,
-                                is_recursive=False):
+                                is_recursive=False, is_shared=False):
         """Format any type of object & do so recursively if it's an iterable.
 
         Interpolates strings from the input args & kwargs.
@@ -318,6 +354,8 @@ def _get_formatted_iterable(self, obj, args, kwargs, used_args, memo=None,
                          recursive loops.
             is_recursive (bool): Don't use. Used internally to specify that
                                  in an active recursion loop.
+            is_shared (bool): Return containers where nothing inside changed
+                              as is, rather than a new copy.
 
         Returns:
             The input object formatted, if that object was a string or
@@ -341,12 +379,23 @@ def _get_formatted_iterable(self, obj, args, kwargs, used_args, memo=None,
         elif self.special_types and isinstance(obj, self.special_types):
             new = obj.get_value(kwargs)
         elif isinstance(obj, str):
-            new = self._format_keep_type(
-                obj, args, kwargs, used_args,
-                recursion_depth=self._FORMAT_SPEC_RECURSION_DEPTH,
-                is_recursive=is_recursive)
+            if '{' not in obj and '}' not in obj:
+                # literal, nothing to format.
+                return obj
+            elif self.memo_size and not args:
+                new = self._format_memoized(obj, kwargs, used_args,
+                                            is_recursive, is_shared)
+            else:
+                new = self._format_keep_type(
+                    obj, args, kwargs, used_args,
+                    recursion_depth=self._FORMAT_SPEC_RECURSION_DEPTH,
+                    is_recursive=is_recursive,
+                    is_shared=is_shared)
         elif isinstance(obj, (bytes, bytearray)):
             new = obj
+        elif is_shared and isinstance(obj, (Mapping, Sequence, Set)):
+            new = self._get_formatted_shared(obj, args, kwargs, used_args,
+                                             memo, is_recursive)
         elif isinstance(obj, Mapping):
             # dicts
             new = obj.__class__(
@@ -374,3 +423,106 @@ def _get_formatted_iterable(self, obj, args, kwargs, used_args, memo=None,
             memo[obj_id] = new
 
         return new
+
+    def _get_formatted_shared(self, obj, args, kwargs, used_args, memo,
+                              is_recursive):
+        """Format container, returning it as is if nothing inside changed.
+
+        Don't call me directly. Use vformat(is_shared=True).
+
+        Only allocates a new container if formatting changed at least one
+        child, so unchanged sub-trees share with the input.
+
+        Args:
+            obj (Mapping/Sequence/Set): Format the items in this container.
+            args (iterable): Variable list positional args for formatting
+                             expression.
+            kwargs (iterable): Variable mapping of keyword args for formatting
+                               expression.
+            used_args (set): Mutating set of args used during formatting.
+            memo (dict): Used internally on recursion.
+            is_recursive (bool): In an active recursion loop.
+
+        Returns:
+            obj if nothing in it changed, else a new obj.__class__ instance.
+        """
+        is_mapping = isinstance(obj, Mapping)
+        source = obj.items() if is_mapping else obj
+        # only allocate once the 1st changed item turns up.
+        items = None
+        for index, item in enumerate(source):
+            if is_mapping:
+                k, v = item
+                new_item = (
+                    self._get_formatted_iterable(
+                        k, args, kwargs, used_args, memo, is_recursive, True),
+                    self._get_formatted_iterable(
+                        v, args, kwargs, used_args, memo, is_recursive, True))
+                is_changed = new_item[0] is not k or new_item[1] is not v
+            else:
+                new_item = self._get_formatted_iterable(
+                    item, args, kwargs, used_args, memo, is_recursive, True)
+                is_changed = new_item is not item
+
+            if items is None:
+                if not is_changed:
+                    continue
+                # the unchanged items so far are as is.
+                items = list(islice(source, index))
+
+            items.append(new_item)
+
+        return obj if items is None else obj.__class__(items)
+
+    def _format_memoized(self, format_string, kwargs, used_args,
+                         is_recursive, is_shared):
+        """Format string with kwargs, using the memoized result if valid.
+
+        Don't call me directly. Use format() or vformat().
+
+        Args:
+            format_string (str): String with formatting expressions.
+            kwargs (iterable): Variable mapping of keyword args for formatting
+                               expression.
+            used_args (set): Mutating set of args used during formatting.
+            is_recursive (bool): In an active recursion loop.
+            is_shared (bool): Return unchanged containers as is.
+        """
+        memo_key = (format_string, is_recursive)
+        memoized = self._memo.get(memo_key)
+        if memoized is not None:
+            result, dependencies = memoized
+            for arg, value in dependencies:
+                if kwargs.get(arg, _MISSING) is not value:
+                    break
+            else:
+                used_args.update(arg for arg, _ in dependencies)
+                return result
+
+        # only this string's args, so the memo knows exactly what it reads.
+        string_used_args = set()
+        result = self._format_keep_type(
+            format_string, None, kwargs, string_used_args,
+            recursion_depth=self._FORMAT_SPEC_RECURSION_DEPTH,
+            is_recursive=is_recursive,
+            is_shared=is_shared)
+        used_args.update(string_used_args)
+
+        if not isinstance(result, _IMMUTABLE_TYPES):
+            return result
+
+        dependencies = []
+        for arg in string_used_args:
+            value = kwargs.get(arg, _MISSING)
+            if not isinstance(value, _IMMUTABLE_TYPES):
+                return result
+            dependencies.append((arg, value))
+
+        # many threads share the same formatter. Each memo get, set & clear
+        # is a single dict operation, which is atomic with or without the
+        # GIL, so a race at worst formats a string again.
+        if len(self._memo) >= self.memo_size:
+            self._memo.clear()
+
+        self._memo[memo_key] = (result, tuple(dependencies))
+        return result
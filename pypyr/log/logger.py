@@ -42,14 +42,16 @@ def set_up_notify_log_level():
     By default it outputs only echo step and step name
     with description.
     """
-    # could (should?) be checking hasattr like so:
-    # hasattr(logging, levelName):
-    # hasattr(logging, methodName):
-    # hasattr(logging.getLoggerClass(), methodName):
-    # but this extra check is arguably *more* overhead than just assigning it?
+    # every run calls this, so only patch the logger class the 1st time.
+    # Assigning a class attribute invalidates the type cache for all threads,
+    # which is costly for pipelines running concurrently on threads.
+    logger_class = logging.getLoggerClass()
+    if getattr(logger_class, 'notify', None) is notify:
+        return
+
     logging.addLevelName(NOTIFY, "NOTIFY")
     logging.NOTIFY = NOTIFY
-    logging.getLoggerClass().notify = notify
+    logger_class.notify = notify
 
 
 def set_root_logger(log_level=None, log_path=None):
@@ -10,11 +10,15 @@
 import logging
 from pathlib import Path
 import sys
+import threading
 from pypyr.errors import PyModuleNotFoundError
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
+# guards check & append to sys.path from concurrent pipeline runs.
+_sys_path_lock = threading.Lock()
+
 
 class ImportVisitor(ast.NodeVisitor):
     """Parse python import and import from syntax.
@@ -145,26 +149,57 @@ def set_working_directory(self, working_directory=None):
 
         This allows dynamic loading of arbitrary python modules in cwd.
 
+        This is the process-wide default working directory. A pipeline run
+        uses its own context.working_dir, so concurrent runs with different
+        working directories do not interfere with each other's pipeline
+        lookups.
+
         Args:
             working_directory: string. path to add to sys.paths
 
+        Returns:
+            Path of the working directory.
         """
         logger.debug("starting")
 
         if working_directory is None:
             working_directory = Path.cwd()
 
-        logger.debug("adding %s to sys.paths", working_directory)
-        # sys path doesn't accept Path
-        sys.path.append(str(working_directory))
-        self._cwd = Path(working_directory)
+        # local, since concurrent runs might set _cwd again before return.
+        working_directory = Path(working_directory)
+        self._cwd = working_directory
+        add_sys_path(working_directory)
 
         logger.debug("done")
+        return working_directory
 
 
 working_dir = WorkingDir()
 
 
+def add_sys_path(path):
+    """Append path to sys.path, unless it's already there.
+
+    A long-running process that runs many pipelines would otherwise grow
+    sys.path on every run, slowing down every import that misses.
+
+    Python's module cache is process-wide, so modules with the same name in
+    different paths still resolve to whichever imported first. Use separate
+    processes, like run_many or pypyr-worker, if you need that isolation.
+
+    Args:
+        path: path-like. Path to add to sys.path.
+    """
+    # sys path doesn't accept Path
+    path = str(path)
+    with _sys_path_lock:
+        if path in sys.path:
+            logger.debug("%s already in sys.paths", path)
+        else:
+            logger.debug("adding %s to sys.paths", path)
+            sys.path.append(path)
+
+
 def get_module(module_abs_import):
     """Use importlib to get the module dynamically.
 
@@ -228,5 +263,7 @@ def set_working_directory(working_directory=None):
     Args:
         working_directory: string. path to add to sys.paths
 
+    Returns:
+        Path of the working directory.
     """
-    working_dir.set_working_directory(working_directory)
+    return working_dir.set_working_directory(working_directory)
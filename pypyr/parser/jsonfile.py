@@ -1,7 +1,7 @@
 """Context parser that returns a dictionary from a local json file."""
 from collections.abc import Mapping
 import logging
-import json
+from pypyr.cache.filecache import file_cache
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
@@ -17,10 +17,7 @@ def get_parsed_context(args):
             "pypyr pipelinename ./myjsonfile.json")
 
     path = ' '.join(args)
-    # open the json file on disk so that you can initialize the dictionary
-    logger.debug("attempting to open file: %s", path)
-    with open(path) as json_file:
-        payload = json.load(json_file)
+    payload = file_cache.get_json(path)
 
     if not isinstance(payload, Mapping):
         raise TypeError("json input should describe an object at the top "
@@ -2,7 +2,7 @@
 
 from collections.abc import MutableMapping
 import logging
-import ruamel.yaml as yaml
+from pypyr.cache.filecache import file_cache
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
@@ -17,10 +17,7 @@ def get_parsed_context(args):
             "this yaml parser you're looking for something like:\n"
             "pypyr pipelinename ./myyamlfile.yaml")
     path = ' '.join(args)
-    logger.debug("attempting to open file: %s", path)
-    with open(path) as yaml_file:
-        yaml_loader = yaml.YAML(typ='safe', pure=True)
-        payload = yaml_loader.load(yaml_file)
+    payload = file_cache.get_yaml(path)
 
     if not isinstance(payload, MutableMapping):
         raise TypeError("yaml input should describe a dictionary at the top "
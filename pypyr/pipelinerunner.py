@@ -18,10 +18,22 @@
 
 If you do want to run the pipeline's context_parser, use main() instead.
 
+Use run_many() to run the same pipeline once for each of many context inputs
+in a pool of worker processes.
+
+It's safe to call main() & main_with_context() from many threads at the same
+time, including on free-threaded python, as long as each run has its own
+context. Don't share the same Context instance between concurrent runs.
+
 Runs the pipeline specified by the input pipeline_name parameter.
 Pipelines must have a "steps" list-like attribute.
 """
+from functools import partial
 import logging
+import multiprocessing
+import os
+import pickle
+import threading
 import pypyr.context
 import pypyr.log.logger
 import pypyr.moduleloader
@@ -29,6 +41,7 @@
 from pypyr.cache.pipelinecache import pipeline_cache
 from pypyr.errors import Stop, StopPipeline, StopStepGroup
 from pypyr.stepsrunner import StepsRunner
+from pypyr.utils.shard import get_shard
 import pypyr.yaml
 
 # use pypyr logger to ensure loglevel is set correctly
@@ -90,7 +103,9 @@ def main(
     groups=None,
     success_group=None,
     failure_group=None,
-    loader=None
+    loader=None,
+    shard=None,
+    timeout=None
 ):
     """Entry point for pypyr pipeline runner. Runs context_parser in pipeline.
 
@@ -126,6 +141,12 @@ def main(
         failure_group: (str): Step-group name to run on pipeline failure.
         loader (str): optional. Absolute name of pipeline loader module.
                       If not specified will use pypyr.pypeloaders.fileloader.
+        shard (str): optional. INDEX/COUNT, like 0/4. Only run this shard's
+                     items in foreach loops of steps with shard set. See
+                     pypyr.utils.shard.
+        timeout (float): optional. Seconds the pipeline's steps may run,
+                         before they fail with TimeoutExpiredError. The
+                         failure group still runs. See pypyr.utils.cancel.
 
     Returns:
         None
@@ -138,7 +159,9 @@ def main(
                     loader=loader,
                     groups=groups,
                     success_group=success_group,
-                    failure_group=failure_group)
+                    failure_group=failure_group,
+                    shard=shard,
+                    timeout=timeout)
 
 
 def main_with_context(
@@ -148,7 +171,9 @@ def main_with_context(
     groups=None,
     success_group=None,
     failure_group=None,
-    loader=None
+    loader=None,
+    shard=None,
+    timeout=None
 ):
     """Entry point for pypyr pipeline runner. Does NOT run context_parser.
 
@@ -176,19 +201,30 @@ def main_with_context(
     Args:
         pipeline_name (str): Name of pipeline, sans .yaml at end.
         context_in (dict): Dict-like object to initialize the Context.
+            Pass a pypyr.context.ConcurrentContext to run with a context
+            that steps running their own threads can safely share.
         working_dir (path): Pipeline & module paths resolve from here.
         groups: (list of str): Step-group names to run in pipeline.
         success_group (str): Step-group name to run on success completion.
         failure_group: (str): Step-group name to run on pipeline failure.
         loader (str): optional. Absolute name of pipeline loader module.
                       If not specified will use pypyr.pypeloaders.fileloader.
+        shard (str): optional. INDEX/COUNT, like 0/4. Only run this shard's
+                     items in foreach loops of steps with shard set. See
+                     pypyr.utils.shard.
+        timeout (float): optional. Seconds the pipeline's steps may run,
+                         before they fail with TimeoutExpiredError. The
+                         failure group still runs. See pypyr.utils.cancel.
 
     Returns:
         pypyr.context.Context(): the pypyr context as it is after the pipeline
             completes.
 
     """
-    if dict_in:
+    if isinstance(dict_in, pypyr.context.ConcurrentContext):
+        # opt in to the thread-safe context by passing one in.
+        context = pypyr.context.ConcurrentContext(dict_in)
+    elif dict_in:
         context = pypyr.context.Context(dict_in)
     else:
         context = pypyr.context.Context()
@@ -200,10 +236,182 @@ def main_with_context(
                     loader=loader,
                     groups=groups,
                     success_group=success_group,
-                    failure_group=failure_group)
+                    failure_group=failure_group,
+                    shard=shard,
+                    timeout=timeout)
     return context
 
 
+def run_many(
+    pipeline_name,
+    contexts,
+    workers=None,
+    working_dir=None,
+    groups=None,
+    success_group=None,
+    failure_group=None,
+    loader=None,
+    is_ordered=True,
+    chunksize=1,
+    shard=None,
+    timeout=None,
+    max_pending=None
+):
+    """Run pipeline once for each dict-like input in contexts.
+
+    Does NOT run context_parser. Runs each input with main_with_context() in
+    a pool of worker processes. The pool creates the workers once & re-uses
+    them for all the inputs, so the pipeline, step & parser caches stay warm
+    in each worker.
+
+    contexts can be a generator, so you can stream inputs without holding
+    them all in memory. run_many only takes the next input from contexts when
+    fewer than max_pending inputs are waiting for their result to yield.
+
+    A pipeline that fails doesn't stop the batch. Its result contains the
+    error instead.
+
+    On platforms that spawn rather than fork worker processes, such as
+    Windows & macOS, only call me from code inside an
+    if __name__ == '__main__' block.
+
+    Args:
+        pipeline_name (str): Name of pipeline, sans .yaml at end.
+        contexts (iterable of dict): Initialize each run's Context with one
+            of these.
+        workers (int): Run this many pipelines at the same time. Defaults to
+            cpu count.
+        working_dir (path): Pipeline & module paths resolve from here.
+        groups: (list of str): Step-group names to run in pipeline.
+        success_group (str): Step-group name to run on success completion.
+        failure_group: (str): Step-group name to run on pipeline failure.
+        loader (str): optional. Absolute name of pipeline loader module.
+                      If not specified will use pypyr.pypeloaders.fileloader.
+        is_ordered (bool): True yields results in input order. False yields
+            results as each run completes. Defaults True.
+        chunksize (int): Send inputs to each worker in chunks this big.
+            Larger chunks mean less overhead for many short runs.
+        shard (str): optional. INDEX/COUNT, like 0/4. Only run this shard's
+                     items in foreach loops of steps with shard set. See
+                     pypyr.utils.shard.
+        timeout (float): optional. Seconds the pipeline's steps may run,
+                         before they fail with TimeoutExpiredError. The
+                         failure group still runs. See pypyr.utils.cancel.
+        max_pending (int): optional. Most inputs to take from contexts
+            before their results yield. Defaults to 2 chunks per worker, so
+            the workers always have the next chunk ready. At least
+            chunksize.
+
+    Yields:
+        dict for each input. Success looks like this:
+            {'index': 0, 'context': {...context after the run...}}
+
+        Failure looks like this:
+            {'index': 0, 'error': {'name': 'ValueError',
+                                   'description': 'error message'}}
+
+        index is the input's position in contexts.
+
+    """
+    logger.debug("starting")
+
+    run_item = partial(_run_many_item,
+                       pipeline_name=pipeline_name,
+                       working_dir=working_dir,
+                       groups=groups,
+                       success_group=success_group,
+                       failure_group=failure_group,
+                       loader=loader,
+                       shard=shard,
+                       timeout=timeout)
+
+    if not max_pending:
+        max_pending = 2 * chunksize * (workers or os.cpu_count() or 1)
+    elif max_pending < chunksize:
+        # the pool only sends full chunks, so less never finishes a chunk.
+        max_pending = chunksize
+
+    # the pool takes inputs on its own thread as fast as it can, so hold it
+    # back until results yield.
+    pending = threading.Semaphore(max_pending)
+    stop = threading.Event()
+    inputs = _iter_pending(enumerate(contexts), pending, stop)
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        try:
+            if is_ordered:
+                results = pool.imap(run_item, inputs, chunksize)
+            else:
+                results = pool.imap_unordered(run_item, inputs, chunksize)
+
+            for result in results:
+                pending.release()
+                yield pickle.loads(result)
+        finally:
+            # wake up the pool's input thread, so it can stop.
+            stop.set()
+            pending.release()
+
+    logger.debug("done")
+
+
+def _iter_pending(items, pending, stop):
+    """Yield each of items once pending has room for it, until stop.
+
+    Args:
+        items (iterable): Yield these.
+        pending (threading.Semaphore): Acquire this before each item.
+        stop (threading.Event): Stop yielding items when this is set.
+    """
+    for item in items:
+        pending.acquire()
+        if stop.is_set():
+            return
+
+        yield item
+
+
+def _run_many_item(item,
+                   pipeline_name,
+                   working_dir,
+                   groups,
+                   success_group,
+                   failure_group,
+                   loader,
+                   shard,
+                   timeout):
+    """Run pipeline with a single run_many input in a worker process.
+
+    Pickles the result here, so a context value that can't pickle becomes
+    an error for that input, rather than breaking the whole batch.
+
+    Args:
+        item (tuple): (index, dict_in).
+        The rest are the same as for main_with_context().
+
+    Returns:
+        bytes. Pickled run_many result dict.
+    """
+    index, dict_in = item
+    try:
+        context = main_with_context(pipeline_name=pipeline_name,
+                                    dict_in=dict_in,
+                                    working_dir=working_dir,
+                                    groups=groups,
+                                    success_group=success_group,
+                                    failure_group=failure_group,
+                                    loader=loader,
+                                    shard=shard,
+                                    timeout=timeout)
+
+        return pickle.dumps({'index': index, 'context': dict(context)})
+    except Exception as err:
+        logger.error("run_many input %s failed.", index)
+        return pickle.dumps({'index': index,
+                             'error': {'name': type(err).__name__,
+                                       'description': str(err)}})
+
+
 def prepare_and_run(
     pipeline_name,
     working_dir=None,
@@ -213,7 +421,9 @@ def prepare_and_run(
     loader=None,
     groups=None,
     success_group=None,
-    failure_group=None
+    failure_group=None,
+    shard=None,
+    timeout=None
 ):
     """Prepare plumbing & run pipeline, handling Stop instructions.
 
@@ -227,7 +437,8 @@ def prepare_and_run(
     This function does this:
     - add NOTIFY log level
     - configure working directory
-    - load & run the pipeline
+    - set shardIndex & shardCount in context, if shard
+    - load & run the pipeline, with its steps within timeout if set
     - handle Stop instructions
 
     [pipeline_name].yaml should resolve from the working_dir directory.
@@ -247,6 +458,12 @@ def prepare_and_run(
         failure_group: (str): Step-group name to run on pipeline failure.
         loader (str): optional. Absolute name of pipeline loader module.
                       If not specified will use pypyr.pypeloaders.fileloader.
+        shard (str): optional. INDEX/COUNT, like 0/4. Only run this shard's
+                     items in foreach loops of steps with shard set. See
+                     pypyr.utils.shard.
+        timeout (float): optional. Seconds the pipeline's steps may run,
+                         before they fail with TimeoutExpiredError. The
+                         failure group still runs. See pypyr.utils.cancel.
 
     Returns:
         None
@@ -259,11 +476,20 @@ def prepare_and_run(
     # pipelines specify steps in python modules that load dynamically.
     # make it easy for the operator so that the cwd is automatically included
     # without needing to pip install a package 1st.
-    pypyr.moduleloader.set_working_directory(working_dir)
+    working_dir = pypyr.moduleloader.set_working_directory(working_dir)
 
-    if context is not None:
-        context.pipeline_name = pipeline_name
-        context.working_dir = pypyr.moduleloader.get_working_directory()
+    # the run's own working dir lives on its context, not the process-wide
+    # working dir, so concurrent runs with different dirs don't mix.
+    if context is None:
+        context = pypyr.context.Context()
+
+    shard = get_shard(shard)
+    if shard:
+        context['shardIndex'] = shard.index
+        context['shardCount'] = shard.count
+
+    context.pipeline_name = pipeline_name
+    context.working_dir = working_dir
 
     try:
         load_and_run_pipeline(pipeline_name=pipeline_name,
@@ -273,7 +499,8 @@ def prepare_and_run(
                               loader=loader,
                               groups=groups,
                               success_group=success_group,
-                              failure_group=failure_group)
+                              failure_group=failure_group,
+                              timeout=timeout)
     except Stop:
         logger.debug("Stop: stopped pypyr")
 
@@ -312,7 +539,8 @@ def load_and_run_pipeline(pipeline_name,
                           loader=None,
                           groups=None,
                           success_group=None,
-                          failure_group=None):
+                          failure_group=None,
+                          timeout=None):
     """Load and run the specified pypyr pipeline.
 
     This function runs the actual pipeline by name. If you are running another
@@ -323,8 +551,9 @@ def load_and_run_pipeline(pipeline_name,
     By default pypyr uses file loader. This means that pipeline_name.yaml
     should be in the working_dir/ directory if you're using fileloader.
 
-    Look for pipelines and modules in the working_dir. Set the working_dir by
-    calling pypyr.moduleloader.set_working_directory('/my/dir')
+    Look for pipelines in context.working_dir. If context doesn't have a
+    working_dir, look in the process-wide working dir. Set this by calling
+    pypyr.moduleloader.set_working_directory('/my/dir')
 
     Args:
         pipeline_name (str): Name of pipeline, sans .yaml at end.
@@ -343,6 +572,9 @@ def load_and_run_pipeline(pipeline_name,
             completion.
         failure_group (str): Optional. Step-group name to run on pipeline
             failure.
+        timeout (float): Optional. Seconds the pipeline's steps may run,
+            before they fail with TimeoutExpiredError. failure_group still
+            runs. See pypyr.utils.cancel.
 
     Returns:
         None
@@ -364,7 +596,8 @@ def load_and_run_pipeline(pipeline_name,
     # is very much a fatal stop error.
     pipeline_definition = pipeline_cache.get_pipeline(
         pipeline_name=pipeline_name,
-        loader=loader)
+        loader=loader,
+        working_dir=getattr(context, 'working_dir', None))
 
     run_pipeline(
         pipeline=pipeline_definition,
@@ -373,7 +606,8 @@ def load_and_run_pipeline(pipeline_name,
         parse_input=parse_input,
         groups=groups,
         success_group=success_group,
-        failure_group=failure_group
+        failure_group=failure_group,
+        timeout=timeout
     )
 
 
@@ -383,7 +617,8 @@ def run_pipeline(pipeline,
                  parse_input=True,
                  groups=None,
                  success_group=None,
-                 failure_group=None):
+                 failure_group=None,
+                 timeout=None):
     """Run the specified pypyr pipeline.
 
     This function runs the actual pipeline. If you are running another
@@ -409,6 +644,9 @@ def run_pipeline(pipeline,
         groups (list of str): step-group names to run in pipeline.
         success_group (str): step-group name to run on success completion.
         failure_group (str): step-group name to run on pipeline failure.
+        timeout (float): Seconds the step-groups may run, before they fail
+            with TimeoutExpiredError. failure_group still runs. See
+            pypyr.utils.cancel.
 
     Returns:
         None
@@ -453,6 +691,7 @@ def run_pipeline(pipeline,
     try:
         steps_runner.run_step_groups(groups=groups,
                                      success_group=success_group,
-                                     failure_group=failure_group)
+                                     failure_group=failure_group,
+                                     timeout=timeout)
     except StopPipeline:
         logger.debug("StopPipeline: stopped %s", context.pipeline_name)
@@ -0,0 +1,311 @@
+"""Work queue in a SQLite database file. The default pypyr.workqueue backend.
+
+The queue is a single file, so it needs no service. Every worker that can
+reach the file can take jobs from it. Claiming a job happens in a write
+transaction, so no 2 workers ever get the same job.
+
+A claim is a lease that the worker renews while the job runs. When a worker
+dies, its lease runs out & the next claim puts the job back on the queue for
+another worker. So a job runs at least once, & more than once if its worker
+stalls for longer than the lease. Only the worker that holds a job's lease
+can complete it, so a stalled worker can't overwrite the result of the
+worker that took the job over.
+
+A job whose lease ran out max_attempts times, like a job that crashes its
+worker each time, fails rather than going back on the queue again.
+
+Finished jobs stay on the queue for retention seconds, so the pipeline that
+put them there can collect their results. After that, the next claim deletes
+them.
+
+Jobs & results pickle, so only share the queue file with workers you trust.
+"""
+from contextlib import contextmanager
+import logging
+from pathlib import Path
+import pickle
+import sqlite3
+import time
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+# seconds to wait for another process to finish writing to the queue.
+BUSY_TIMEOUT = 30
+
+# seconds a running job's claim lasts without its worker renewing it.
+LEASE = 60
+
+# claims a job gets before it fails for good.
+MAX_ATTEMPTS = 3
+
+# seconds to keep finished jobs & their results.
+RETENTION = 24 * 60 * 60
+
+
+def get_queue(location):
+    """Get the queue in the SQLite file at location.
+
+    Args:
+        location: path-like. Path to the SQLite file. Creates the file & its
+            parent directories if they don't exist.
+
+    Returns:
+        SqliteQueue.
+    """
+    return SqliteQueue(location)
+
+
+def get_lease_error_result(job_id, worker, attempts, job):
+    """Get the result for a job whose lease ran out on all its attempts.
+
+    Args:
+        job_id: int. The job id.
+        worker: str. Name of the worker whose lease ran out last.
+        attempts: int. How many times the job was claimed.
+        job: dict. The job.
+
+    Returns:
+        dict. Failure result, same shape as pypyr.workqueue.run_worker
+        saves for a job that raised.
+    """
+    return {'error': {'name': 'QueueJobError',
+                      'description': (
+                          f"job {job_id} lease ran out on all {attempts} "
+                          "attempts, so it won't run again.")},
+            'pipeline_name': job['pipeline_name'],
+            'worker': worker}
+
+
+class SqliteQueue():
+    """Work queue in a SQLite database file.
+
+    Each operation opens its own connection, so it's safe to use the same
+    queue from different threads & processes.
+
+    Attributes:
+        path: (Path) Path to the SQLite file.
+        lease: (float) Seconds a running job's claim lasts without its worker
+               renewing it. After that, the job goes back on the queue.
+        max_attempts: (int) Claims a job gets. A job whose lease ran out
+                      this many times fails instead of going back on the
+                      queue.
+        retention: (float) Seconds to keep finished jobs. None keeps them
+                   forever.
+    """
+
+    __slots__ = ('path', 'lease', 'max_attempts', 'retention')
+
+    def __init__(self,
+                 path,
+                 lease=LEASE,
+                 max_attempts=MAX_ATTEMPTS,
+                 retention=RETENTION):
+        """Initialize the queue, creating the SQLite file if it's not there."""
+        self.path = Path(path)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as connection:
+            # WAL lets readers poll for results while a worker writes.
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                "status TEXT NOT NULL DEFAULT 'waiting', "
+                'job BLOB NOT NULL, '
+                'result BLOB, '
+                'worker TEXT, '
+                'attempts INTEGER NOT NULL DEFAULT 0, '
+                'created REAL NOT NULL, '
+                'started REAL, '
+                'renewed REAL, '
+                'finished REAL)')
+
+    def __repr__(self):
+        """Show the queue's path."""
+        return f'SqliteQueue({str(self.path)!r})'
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection in autocommit mode & close it after."""
+        connection = sqlite3.connect(str(self.path),
+                                     timeout=BUSY_TIMEOUT,
+                                     isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def put(self, job):
+        """Add job to the end of the queue.
+
+        Args:
+            job: dict. The job.
+
+        Returns:
+            int. The job id.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                'INSERT INTO jobs (job, created) VALUES (?, ?)',
+                (pickle.dumps(job), time.time()))
+
+        logger.debug("put job %s on %s", cursor.lastrowid, self.path)
+        return cursor.lastrowid
+
+    def claim(self, worker):
+        """Take the oldest waiting job off the queue for worker.
+
+        Running jobs whose lease ran out go back on the queue 1st, or fail if
+        they've had max_attempts claims already. Deletes finished jobs older
+        than retention.
+
+        Args:
+            worker: str. Name of the worker claiming the job.
+
+        Returns:
+            tuple (job id, job dict). None if there are no waiting jobs.
+        """
+        with self._connect() as connection:
+            # IMMEDIATE takes the write lock before the select, so no other
+            # worker can claim the same job in between.
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                expired = connection.execute(
+                    "SELECT id, worker, attempts, job FROM jobs "
+                    "WHERE status = 'running' AND renewed < ?",
+                    (now - self.lease,)).fetchall()
+
+                retry = []
+                failed = []
+                for job_id, expired_worker, attempts, job in expired:
+                    if attempts < self.max_attempts:
+                        retry.append((job_id,))
+                    else:
+                        result = get_lease_error_result(
+                            job_id, expired_worker, attempts,
+                            pickle.loads(job))
+                        failed.append((pickle.dumps(result), now, job_id))
+
+                connection.executemany(
+                    "UPDATE jobs SET status = 'waiting', worker = NULL, "
+                    "started = NULL, renewed = NULL WHERE id = ?",
+                    retry)
+                connection.executemany(
+                    "UPDATE jobs SET status = 'done', result = ?, "
+                    "finished = ? WHERE id = ?",
+                    failed)
+
+                if self.retention is not None:
+                    connection.execute(
+                        "DELETE FROM jobs WHERE status = 'done' "
+                        "AND finished < ?",
+                        (now - self.retention,))
+
+                row = connection.execute(
+                    "SELECT id, job FROM jobs WHERE status = 'waiting' "
+                    "ORDER BY id LIMIT 1").fetchone()
+
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, "
+                        "attempts = attempts + 1, started = ?, renewed = ? "
+                        "WHERE id = ?",
+                        (worker, now, now, row[0]))
+
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+        for job_id, expired_worker, attempts, _ in expired:
+            if attempts < self.max_attempts:
+                logger.warning(
+                    "job %s lease on worker %s ran out after %ss. Put it "
+                    "back on the queue.", job_id, expired_worker, self.lease)
+            else:
+                logger.error(
+                    "job %s lease on worker %s ran out after %ss. That was "
+                    "attempt %s of %s, so the job failed.",
+                    job_id, expired_worker, self.lease, attempts,
+                    self.max_attempts)
+
+        if row is None:
+            return None
+
+        job_id, job = row
+        logger.debug("%s claimed job %s", worker, job_id)
+        return job_id, pickle.loads(job)
+
+    def complete(self, job_id, worker, result):
+        """Save result for job_id & mark it done, if worker holds the job.
+
+        Args:
+            job_id: int. The job id.
+            worker: str. Name of the worker that claimed the job.
+            result: dict. The job's result.
+
+        Returns:
+            bool. False if worker doesn't hold the job anymore, because its
+            lease ran out. The result isn't saved then.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'done', result = ?, finished = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (pickle.dumps(result), time.time(), job_id, worker))
+
+        if cursor.rowcount != 1:
+            return False
+
+        logger.debug("completed job %s", job_id)
+        return True
+
+    def renew(self, job_id, worker):
+        """Renew worker's lease on running job_id.
+
+        Args:
+            job_id: int. The job id.
+            worker: str. Name of the worker that claimed the job.
+
+        Returns:
+            bool. False if worker doesn't hold the job anymore, because its
+            lease ran out.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET renewed = ? WHERE id = ? AND worker = ? "
+                "AND status = 'running'",
+                (time.time(), job_id, worker))
+
+        return cursor.rowcount == 1
+
+    def get_result(self, job_id):
+        """Get the result for job_id.
+
+        Args:
+            job_id: int. The job id.
+
+        Returns:
+            dict. The job's result. None if job_id isn't done yet.
+
+        Raises:
+            ValueError: job_id isn't on the queue.
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT status, result FROM jobs WHERE id = ?',
+                (job_id,)).fetchone()
+
+        if row is None:
+            raise ValueError(f"job {job_id} isn't on queue {self.path}.")
+
+        status, result = row
+        if status != 'done':
+            return None
+
+        return pickle.loads(result)
@@ -0,0 +1,330 @@
+"""Named resources that limit how many steps use them at the same time.
+
+Define resources in the pipeline's resources section, each with how many
+steps may hold it at once. A step with acquire waits until it can hold all
+the resources it names before it runs:
+
+    resources:
+      db: 2 # at most 2 steps at a time in this process.
+      disk:
+        limit: 1
+        lockDir: .pypyr/locks # also share the limit with other processes.
+
+    steps:
+      - name: pypyr.steps.cmd
+        acquire: [db, disk] # or a single str name
+        in:
+          cmd: ./migrate.sh
+
+Resources are process-wide, so the limit holds across all the pipelines &
+threads that run in the process, including child pipelines from pype & steps
+that run in parallel. The first definition of a name wins.
+
+With lockDir, the limit also holds across processes that use the same
+lockDir, by way of a lock file for each slot of the limit. A relative lockDir
+is relative to the pipeline's working dir.
+
+A step holds its resources for each run of the step, so each foreach, while
+& retry iteration acquires them again. Waiting for resources counts against
+the step's timeout. Use get_stats() to see how long steps waited.
+"""
+from contextlib import ExitStack
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from pypyr.errors import PipelineDefinitionError
+from pypyr.utils.cancel import check_cancelled
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+# seconds between checks for a free slot, or for the work to cancel.
+POLL_INTERVAL = 0.1
+
+# name: Resource. Shared by all pipelines in the process.
+_resources = {}
+_resources_lock = threading.Lock()
+
+
+class Resource():
+    """A named counting semaphore, optionally shared across processes.
+
+    Attributes:
+        name: (str) Name of the resource.
+        limit: (int) How many holders the resource allows at the same time.
+        lock_dir: (Path) Directory with the lock files that share limit with
+                  other processes. None means only this process.
+    """
+
+    __slots__ = ('name', 'limit', 'lock_dir', '_semaphore', '_stats_lock',
+                 '_acquisitions', '_waits', '_wait_time', '_max_wait',
+                 '_in_use')
+
+    def __init__(self, name, limit, lock_dir=None):
+        """Initialize the resource.
+
+        Args:
+            name: str. Name of the resource.
+            limit: int. How many holders the resource allows at once.
+            lock_dir: path-like. Share the limit with other processes by way
+                      of lock files in this directory. None means only this
+                      process.
+        """
+        self.name = name
+        self.limit = limit
+        self.lock_dir = None if lock_dir is None else Path(lock_dir)
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._stats_lock = threading.Lock()
+        self._acquisitions = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._in_use = 0
+
+    def __repr__(self):
+        """Show the resource's definition."""
+        return (f'Resource({self.name!r}, {self.limit!r}, '
+                f'{None if self.lock_dir is None else str(self.lock_dir)!r})')
+
+    def acquire(self):
+        """Wait for a free slot & take it.
+
+        Raises TimeoutExpiredError if the work on this thread cancels while
+        it waits.
+
+        Returns:
+            tuple (slot file, seconds waited). slot file is the locked lock
+            file if lock_dir, else None. Pass it to release(). Seconds
+            waited is 0 if a slot was free straight away.
+        """
+        start = time.monotonic()
+        is_wait = not self._semaphore.acquire(blocking=False)
+        if is_wait:
+            while not self._semaphore.acquire(timeout=POLL_INTERVAL):
+                check_cancelled()
+
+        try:
+            if self.lock_dir is None:
+                slot_file = None
+            else:
+                slot_file, is_slot_wait = self._lock_slot()
+                is_wait = is_wait or is_slot_wait
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        waited = time.monotonic() - start if is_wait else 0.0
+        with self._stats_lock:
+            self._acquisitions += 1
+            self._in_use += 1
+            if is_wait:
+                self._waits += 1
+                self._wait_time += waited
+                if waited > self._max_wait:
+                    self._max_wait = waited
+
+        return slot_file, waited
+
+    def get_stats(self):
+        """Get usage & wait time statistics.
+
+        Counts are cumulative for the lifetime of the process.
+
+        Returns:
+            dict with keys:
+                limit: int. How many holders the resource allows at once.
+                in_use: int. Number of holders right now in this process.
+                acquisitions: int. Number of times steps took the resource.
+                waits: int. Number of acquisitions that had to wait.
+                wait_time: float. Total seconds steps waited.
+                max_wait: float. Longest seconds a step waited.
+        """
+        with self._stats_lock:
+            return {
+                'limit': self.limit,
+                'in_use': self._in_use,
+                'acquisitions': self._acquisitions,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'max_wait': self._max_wait
+            }
+
+    def release(self, slot_file):
+        """Give back the slot acquire() took.
+
+        Args:
+            slot_file: The slot file acquire() returned.
+        """
+        if slot_file is not None:
+            # closing the file releases its lock.
+            slot_file.close()
+
+        with self._stats_lock:
+            self._in_use -= 1
+
+        self._semaphore.release()
+
+    def _lock_slot(self):
+        """Wait for a lock file in lock_dir that no-one else has locked.
+
+        Returns:
+            tuple (locked slot file, bool True if it had to wait).
+        """
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        is_wait = False
+        while True:
+            for slot in range(self.limit):
+                slot_file = open(
+                    self.lock_dir.joinpath(f'{self.name}.{slot}.lock'), 'a')
+                if try_lock_file(slot_file):
+                    return slot_file, is_wait
+
+                slot_file.close()
+
+            # another process holds all the slots.
+            is_wait = True
+            check_cancelled()
+            time.sleep(POLL_INTERVAL)
+
+
+def add_resources(definition, working_dir=None):
+    """Add the resources from a pipeline's resources section.
+
+    A name that already exists keeps its existing definition.
+
+    Args:
+        definition: dict. The pipeline's resources section. Each key is a
+                    resource name. Each value is either the int limit, or a
+                    dict with a limit & an optional lockDir.
+        working_dir: path-like. Relative lockDir is relative to this.
+
+    Raises:
+        PipelineDefinitionError: definition is wrong.
+    """
+    if not definition:
+        return
+
+    if not isinstance(definition, dict):
+        raise PipelineDefinitionError(
+            "resources must be a dict (i.e a map) of resource names.")
+
+    for name, config in definition.items():
+        if isinstance(config, dict):
+            limit = config.get('limit', None)
+            lock_dir = config.get('lockDir', None)
+        else:
+            limit = config
+            lock_dir = None
+
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise PipelineDefinitionError(
+                f"resource {name} limit must be an int of at least 1.")
+
+        if lock_dir is not None and working_dir is not None:
+            lock_dir = Path(working_dir).joinpath(lock_dir)
+
+        resource = Resource(name, limit, lock_dir)
+        with _resources_lock:
+            existing = _resources.setdefault(name, resource)
+
+        if existing is resource:
+            logger.debug("added %r", resource)
+        elif (existing.limit != limit
+              or existing.lock_dir != resource.lock_dir):
+            logger.warning("resource %s already exists as %r. Ignoring %r.",
+                           name, existing, resource)
+
+
+def clear():
+    """Remove all resources. Only for resources that no-one holds."""
+    with _resources_lock:
+        _resources.clear()
+
+
+def get_resource(name):
+    """Get the resource called name.
+
+    Raises:
+        PipelineDefinitionError: no pipeline defined a resource called name.
+    """
+    resource = _resources.get(name)
+    if resource is None:
+        raise PipelineDefinitionError(
+            f"resource {name} doesn't exist. Define it in the pipeline's "
+            "resources section.")
+
+    return resource
+
+
+def get_stats():
+    """Get usage & wait time statistics for each resource.
+
+    Returns:
+        dict. {resource name: stats dict}. See Resource.get_stats().
+    """
+    with _resources_lock:
+        resources = list(_resources.values())
+
+    return {resource.name: resource.get_stats() for resource in resources}
+
+
+def run_with_resources(names, function, *args, **kwargs):
+    """Run function(*args, **kwargs) while holding the resources in names.
+
+    Acquires the resources in name order, so that steps that need the same
+    resources can't deadlock each other.
+
+    Args:
+        names: str or list of str. Names of the resources to hold.
+        function: callable. Run this.
+        *args: Positional arguments for function.
+        **kwargs: Keyword arguments for function.
+
+    Returns:
+        What function returned.
+
+    Raises:
+        PipelineDefinitionError: names is wrong or a resource doesn't exist.
+        TimeoutExpiredError: the work cancelled while waiting for resources.
+    """
+    if isinstance(names, str):
+        names = [names]
+    elif not isinstance(names, (list, tuple)):
+        raise PipelineDefinitionError(
+            "acquire must be a resource name or a list of resource names.")
+
+    resources = [get_resource(name) for name in sorted(set(names))]
+
+    with ExitStack() as stack:
+        waited = 0
+        for resource in resources:
+            slot_file, resource_waited = resource.acquire()
+            stack.callback(resource.release, slot_file)
+            waited += resource_waited
+
+        if waited:
+            logger.info("waited %.2fs for resources %s.",
+                        waited, ', '.join(r.name for r in resources))
+
+        return function(*args, **kwargs)
+
+
+def try_lock_file(file):
+    """Lock file without waiting. Closing file releases the lock.
+
+    Returns:
+        bool. True if file is now locked. False if someone else has the lock.
+    """
+    try:
+        if os.name == 'posix':
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            import msvcrt
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+
+    return True
@@ -22,7 +22,15 @@ def run_step(context):
     OR, as a dict
     cmd:
         run: str. mandatory. <<cmd string>> command + args to execute.
+             OR a list of <<cmd string>> to run as a batch.
         save: bool. defaults False. save output to cmdOut.
+        parallel: int. defaults 1. if run is a list, run up to this many
+                  commands at the same time.
+        failFast: bool. defaults False. if run is a list, stop the batch on
+                  the 1st failure.
+        stream: bool. defaults False. if save, log output line by line as it
+                arrives. head, tail & spill then limit what stays in memory.
+                run must be a <<cmd string>>, not a list.
 
     Will execute the command string in the shell as a sub-process.
     Escape curly braces: if you want a literal curly brace, double it like
@@ -38,6 +46,8 @@ def run_step(context):
     means OK. A negative value -N indicates that the child was terminated by
     signal N (POSIX only).
 
+    See pypyr.steps.dsl.cmd.CmdStep for the full stream options.
+
     context['cmd'] will interpolate anything in curly braces for values
     found in context. So if your context looks like this:
         key1: value1
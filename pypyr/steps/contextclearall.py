@@ -16,6 +16,7 @@ def run_step(context):
 
     context.clear()
     context.pystring_globals.clear()
+    context.pystring_imports.clear()
     logger.info("context & py imports wiped. New context size: %s",
                 len(context))
 
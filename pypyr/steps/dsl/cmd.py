@@ -1,9 +1,20 @@
 """pypyr step yaml definition for commands - domain specific language."""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+import os
 import shlex
+import signal
 import subprocess
+import sys
+from tempfile import NamedTemporaryFile
+import threading
+import time
 import logging
 from pypyr.errors import ContextError
 from pypyr.utils import types
+from pypyr.utils.cancel import get_token
 
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
@@ -15,10 +26,27 @@ class CmdStep():
     This models a step that takes config like this:
         cmd: <<cmd string>>
 
+        OR, as a list of commands
+        cmd:
+            - <<cmd string 1>>
+            - <<cmd string 2>>
+
         OR, as a dict
         cmd:
-            run: str. mandatory. command + args to execute.
+            run: str or list of str. mandatory. command + args to execute.
             save: bool. defaults False. save output to cmdOut.
+            parallel: int. defaults 1. if run is a list, run up to this many
+                      commands at the same time. True means one per cpu.
+            failFast: bool. defaults False. if run is a list, stop all
+                      remaining commands as soon as one fails. Else run all
+                      the commands & raise the 1st error after.
+            stream: bool. defaults False. if save, log output line by line
+                    as it arrives rather than once the command completes.
+                    run must be a str, not a list.
+            head: int. optional. if stream, only save first head lines.
+            tail: int. optional. if stream, only save last tail lines.
+            spill: bool. defaults False. if stream, write all output to temp
+                   files.
 
     If save is True, will save the output to context as follows:
         cmdOut:
@@ -30,6 +58,20 @@ class CmdStep():
     means OK. A negative value -N indicates that the child was terminated by
     signal N (POSIX only).
 
+    If run is a list and save is True, cmdOut is a list with an entry like
+    the above for each command, in the same order as run. A command that
+    didn't run because of failFast has returncode None.
+
+    If the step has a timeout & the time runs out, kills the commands it
+    started, along with their child processes.
+
+    If stream is True, cmdOut also contains:
+            elapsed: 1.23 (seconds the command took to run)
+            maxRss: 1234 (peak resident memory of the command in KB. None if
+                    the OS doesn't say.)
+            stdoutPath: '/tmp/pypyr-cmd-xxx.stdout' (only if spill)
+            stderrPath: '/tmp/pypyr-cmd-xxx.stderr' (only if spill)
+
     The run_step method does the actual work. init loads the yaml.
     """
 
@@ -39,12 +81,34 @@ def __init__(self, name, context):
         The step config in the context dict looks like this:
             cmd: <<cmd string>>
 
+            OR, as a list of command strings
+            cmd:
+                - <<cmd string 1>>
+                - <<cmd string 2>>
+
             OR, as a dict
             cmd:
-                run: str. mandatory. command + args to execute.
+                run: str or list of str. mandatory. command + args to
+                     execute.
                 save: bool. optional. defaults False. save output to cmdOut.
+                parallel: int. optional. defaults 1. if run is a list, run up
+                          to this many commands concurrently. True means one
+                          per cpu.
+                failFast: bool. optional. defaults False. if run is a list,
+                          terminate the other commands on the 1st failure.
                 cwd: str/path. optional. if specified, change the working
                      directory just for the duration of the command.
+                stream: bool. optional. defaults False. if save, log output
+                        line by line as it arrives. run must be a str: a
+                        batch's output from concurrent commands would
+                        interleave, so a list raises ContextError.
+                head: int. optional. if stream, save only first head lines
+                      of output to cmdOut.
+                tail: int. optional. if stream, save only last tail lines of
+                      output to cmdOut.
+                spill: bool. optional. defaults False. if stream, write all
+                       output to temp files. If neither head nor tail
+                       specified, cmdOut only has the temp file paths.
 
         Args:
             name: Unique name for step. Likely __name__ of calling step.
@@ -62,10 +126,16 @@ def __init__(self, name, context):
 
         self.context = context
         self.is_save = False
+        self.is_stream = False
+        self.head = None
+        self.tail = None
+        self.is_spill = False
+        self.max_workers = 1
+        self.is_fail_fast = False
 
         cmd_config = context.get_formatted('cmd')
 
-        if isinstance(cmd_config, str):
+        if isinstance(cmd_config, (str, list)):
             self.cmd_text = cmd_config
             self.cwd = None
             self.logger.debug("Processing command string: %s", cmd_config)
@@ -76,6 +146,28 @@ def __init__(self, name, context):
 
             self.cmd_text = cmd_config['run']
             self.is_save = types.cast_to_bool(cmd_config.get('save', False))
+            self.is_stream = types.cast_to_bool(
+                cmd_config.get('stream', False))
+
+            head = cmd_config.get('head', None)
+            self.head = None if head is None else int(head)
+            tail = cmd_config.get('tail', None)
+            self.tail = None if tail is None else int(tail)
+            self.is_spill = types.cast_to_bool(cmd_config.get('spill', False))
+
+            parallel = cmd_config.get('parallel', None)
+            if isinstance(parallel, bool):
+                self.max_workers = (os.cpu_count() or 1) if parallel else 1
+            elif parallel:
+                self.max_workers = max(int(parallel), 1)
+
+            self.is_fail_fast = types.cast_to_bool(
+                cmd_config.get('failFast', False))
+
+            if self.is_stream and isinstance(self.cmd_text, list):
+                raise ContextError(
+                    f"{name} cmd can't stream a list of commands. Set stream "
+                    "only when run is a single command string.")
 
             cwd_string = cmd_config.get('cwd', None)
             if cwd_string:
@@ -104,6 +196,10 @@ def run_step(self, is_shell):
         """
         assert is_shell is not None, ("is_shell param must exist for CmdStep.")
 
+        if isinstance(self.cmd_text, list):
+            self.run_batch(is_shell)
+            return
+
         # why? If shell is True, it is recommended to pass args as a string
         # rather than as a sequence.
         if is_shell:
@@ -111,15 +207,17 @@ def run_step(self, is_shell):
         else:
             args = shlex.split(self.cmd_text)
 
-        if self.is_save:
-            completed_process = subprocess.run(args,
-                                               cwd=self.cwd,
-                                               shell=is_shell,
-                                               # capture_output=True,only>py3.7
-                                               stdout=subprocess.PIPE,
-                                               stderr=subprocess.PIPE,
-                                               # text=True, only>=py3.7,
-                                               universal_newlines=True)
+        if self.is_save and self.is_stream:
+            self.run_and_stream(args, is_shell)
+        elif self.is_save:
+            completed_process = run_process(args,
+                                            cwd=self.cwd,
+                                            shell=is_shell,
+                                            # capture_output=True,only>py3.7
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE,
+                                            # text=True, only>=py3.7,
+                                            universal_newlines=True)
             self.context['cmdOut'] = {
                 'returncode': completed_process.returncode,
                 'stdout': (completed_process.stdout.rstrip()
@@ -138,4 +236,457 @@ def run_step(self, is_shell):
             completed_process.check_returncode()
         else:
             # check=True throws CalledProcessError if exit code != 0
-            subprocess.run(args, shell=is_shell, check=True, cwd=self.cwd)
+            run_process(args, shell=is_shell, check=True, cwd=self.cwd)
+
+    def run_batch(self, is_shell):
+        """Run a list of commands, up to max_workers at the same time.
+
+        If save, saves a list of results to cmdOut in the same order as the
+        input commands.
+
+        If is_fail_fast, a failing command terminates all the other running
+        commands & prevents the commands not started yet from starting.
+        Otherwise all the commands run to completion regardless.
+
+        Args:
+            is_shell: bool. Execute each command through the default shell.
+
+        Raises:
+            subprocess.CalledProcessError: The 1st command, in input order,
+                                           that exited with non-zero return
+                                           code.
+        """
+        commands = self.cmd_text
+        self.logger.debug("running %s commands, %s at a time",
+                          len(commands), self.max_workers)
+
+        cancel = threading.Event()
+        live_processes = set()
+        lock = threading.Lock()
+        # the failure that triggered fail fast, not its casualties.
+        fail_fast_cause = []
+        # commands run on pool threads, so take the step's token from here.
+        cancel_token = get_token()
+
+        def kill_all():
+            """Kill the running commands & don't start new ones."""
+            with lock:
+                cancel.set()
+                for process in live_processes:
+                    terminate_live_process(process, is_kill=True)
+
+        def run_one(cmd_text):
+            """Run a single command & return its CompletedProcess."""
+            args = cmd_text if is_shell else shlex.split(cmd_text)
+
+            if cancel.is_set():
+                self.logger.debug("fail fast: not running %s", cmd_text)
+                return subprocess.CompletedProcess(args, None)
+
+            popen_kwargs = {}
+            if self.is_save:
+                popen_kwargs.update(stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+
+            if ((self.is_fail_fast or cancel_token is not None)
+                    and os.name == 'posix'):
+                # own process group, so terminate gets the shell's children
+                # too, not just the shell.
+                popen_kwargs['start_new_session'] = True
+
+            with subprocess.Popen(args,
+                                  cwd=self.cwd,
+                                  shell=is_shell,
+                                  **popen_kwargs) as process:
+                with lock:
+                    live_processes.add(process)
+                    if cancel.is_set():
+                        terminate_live_process(process)
+                try:
+                    stdout, stderr = process.communicate()
+                finally:
+                    with lock:
+                        live_processes.discard(process)
+
+            completed_process = subprocess.CompletedProcess(
+                args, process.returncode, stdout, stderr)
+
+            if process.returncode and self.is_fail_fast:
+                with lock:
+                    if not cancel.is_set():
+                        self.logger.debug(
+                            "fail fast: %s failed. terminating the rest.",
+                            cmd_text)
+                        cancel.set()
+                        fail_fast_cause.append(completed_process)
+                        for other_process in live_processes:
+                            terminate_live_process(other_process)
+
+            return completed_process
+
+        if cancel_token is not None:
+            cancel_token.add_callback(kill_all)
+
+        try:
+            with ThreadPoolExecutor(
+                    max_workers=self.max_workers) as executor:
+                completed_processes = list(executor.map(run_one, commands))
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(kill_all)
+
+        if self.is_save:
+            cmd_out = []
+            for completed_process in completed_processes:
+                cmd_out.append({
+                    'returncode': completed_process.returncode,
+                    'stdout': (completed_process.stdout.rstrip()
+                               if completed_process.stdout else None),
+                    'stderr': (completed_process.stderr.rstrip()
+                               if completed_process.stderr else None)
+                })
+
+                if completed_process.stdout:
+                    self.logger.info("stdout: %s", completed_process.stdout)
+                if completed_process.stderr:
+                    self.logger.error("stderr: %s", completed_process.stderr)
+
+            self.context['cmdOut'] = cmd_out
+
+        # don't swallow the error, because it's the Step swallow decorator
+        # responsibility to decide to ignore or not.
+        if fail_fast_cause:
+            fail_fast_cause[0].check_returncode()
+
+        for completed_process in completed_processes:
+            if completed_process.returncode:
+                completed_process.check_returncode()
+
+    def run_and_stream(self, args, is_shell):
+        """Run a command, logging & saving its output line by line.
+
+        Output goes to the log as it arrives. Only the lines that head & tail
+        allow stay in memory, so a command with huge output won't balloon
+        memory use. If spill, all the output also goes to temp files.
+
+        Saves the output, elapsed time & peak memory use of the command to
+        cmdOut.
+
+        Args:
+            args: str or list of str. Pass this to subprocess.Popen.
+            is_shell: bool. Execute args through the default shell.
+
+        Raises:
+            subprocess.CalledProcessError: Command exited with non-zero
+                                           return code.
+        """
+        is_keep_all = (self.head is None
+                       and self.tail is None
+                       and not self.is_spill)
+
+        stdout = StreamCapture(self.logger.info,
+                               head=self.head,
+                               tail=self.tail,
+                               is_keep_all=is_keep_all)
+        stderr = StreamCapture(self.logger.error,
+                               head=self.head,
+                               tail=self.tail,
+                               is_keep_all=is_keep_all)
+
+        if self.is_spill:
+            stdout.spill_file = NamedTemporaryFile(mode='w',
+                                                   prefix='pypyr-cmd-',
+                                                   suffix='.stdout',
+                                                   delete=False)
+            stderr.spill_file = NamedTemporaryFile(mode='w',
+                                                   prefix='pypyr-cmd-',
+                                                   suffix='.stderr',
+                                                   delete=False)
+
+        start = time.perf_counter()
+        try:
+            cancel_token = get_token()
+            popen_kwargs = {}
+            if cancel_token is not None and os.name == 'posix':
+                # own process group, so the kill gets the shell's children.
+                popen_kwargs['start_new_session'] = True
+
+            with subprocess.Popen(args,
+                                  cwd=self.cwd,
+                                  shell=is_shell,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  bufsize=1,
+                                  universal_newlines=True,
+                                  **popen_kwargs) as process:
+                with kill_on_cancel(process, cancel_token):
+                    # read stderr on its own thread so neither pipe fills
+                    # up & blocks the child while waiting on the other.
+                    stderr_reader = threading.Thread(target=stderr.read,
+                                                     args=(process.stderr,),
+                                                     daemon=True)
+                    stderr_reader.start()
+                    stdout.read(process.stdout)
+                    stderr_reader.join()
+
+                    returncode, max_rss = wait_for_process(process)
+        except BaseException:
+            # nothing reports the spill paths if the command didn't finish.
+            stdout.close()
+            stderr.close()
+            stdout.remove_spill_file()
+            stderr.remove_spill_file()
+            raise
+        else:
+            stdout.close()
+            stderr.close()
+
+        elapsed = time.perf_counter() - start
+
+        cmd_out = {
+            'returncode': returncode,
+            'stdout': stdout.get_value(),
+            'stderr': stderr.get_value(),
+            'elapsed': elapsed,
+            'maxRss': max_rss
+        }
+
+        if self.is_spill:
+            cmd_out['stdoutPath'] = stdout.spill_file.name
+            cmd_out['stderrPath'] = stderr.spill_file.name
+
+        self.context['cmdOut'] = cmd_out
+
+        self.logger.debug("command done in %.3fs with return code %s. "
+                          "peak memory KB: %s",
+                          elapsed, returncode, max_rss)
+
+        # don't swallow the error, because it's the Step swallow decorator
+        # responsibility to decide to ignore or not.
+        if returncode:
+            raise subprocess.CalledProcessError(returncode,
+                                                args,
+                                                cmd_out['stdout'],
+                                                cmd_out['stderr'])
+
+
+class StreamCapture():
+    """Read a text stream line by line, keeping only head & tail lines.
+
+    Each line goes to the log_line callable as it arrives. Lines that fall
+    outside of head & tail do not stay in memory.
+
+    Attributes:
+        head (list of str): The first lines read.
+        head_max (int): Keep at most this many lines in head. None means
+                        no head.
+        line_count (int): Total number of lines read.
+        spill_file (file-like): If set, write every line read to here.
+        tail (deque of str): The last lines read. None means no tail.
+    """
+
+    def __init__(self, log_line, head=None, tail=None, is_keep_all=True):
+        """Initialize the capture.
+
+        Args:
+            log_line: callable. Called with each line as it arrives.
+            head: int. Keep the first head lines.
+            tail: int. Keep the last tail lines.
+            is_keep_all: bool. Keep all lines if neither head nor tail set.
+        """
+        self.log_line = log_line
+        self.head_max = head
+        self.head = []
+        self.tail = deque(maxlen=tail) if tail is not None else None
+        self.is_keep_all = is_keep_all
+        self.line_count = 0
+        self.spill_file = None
+
+    def add(self, line):
+        """Process a single line of output."""
+        self.line_count += 1
+        self.log_line(line.rstrip('\n'))
+
+        if self.spill_file:
+            self.spill_file.write(line)
+
+        if self.head_max is not None and len(self.head) < self.head_max:
+            self.head.append(line)
+        elif self.tail is not None:
+            self.tail.append(line)
+        elif self.is_keep_all:
+            self.head.append(line)
+
+    def close(self):
+        """Close the spill file, if there is one."""
+        if self.spill_file:
+            self.spill_file.close()
+
+    def remove_spill_file(self):
+        """Delete the spill file, if there is one."""
+        if self.spill_file:
+            try:
+                os.unlink(self.spill_file.name)
+            except FileNotFoundError:
+                pass
+
+    def get_value(self):
+        """Get the kept lines as a single str.
+
+        If head & tail dropped lines, a marker line in between says how many.
+
+        Returns:
+            str. None if no output kept.
+        """
+        lines = list(self.head)
+        tail = list(self.tail) if self.tail is not None else []
+        skipped = self.line_count - len(lines) - len(tail)
+
+        if skipped and (self.head_max is not None or self.tail is not None):
+            lines.append(f'... {skipped} lines omitted ...\n')
+
+        lines.extend(tail)
+        value = ''.join(lines).rstrip()
+
+        return value if value else None
+
+    def read(self, stream):
+        """Read every line from stream until it closes."""
+        for line in stream:
+            self.add(line)
+
+
+@contextmanager
+def kill_on_cancel(process, cancel_token):
+    """Kill process & its process group if cancel_token cancels in the block.
+
+    Args:
+        process: subprocess.Popen. The running process.
+        cancel_token: pypyr.utils.cancel.CancelToken. None means never kill.
+    """
+    if cancel_token is None:
+        yield
+        return
+
+    kill = partial(terminate_process, process, is_kill=True)
+    cancel_token.add_callback(kill)
+    try:
+        yield
+    finally:
+        cancel_token.remove_callback(kill)
+
+
+def run_process(args, **kwargs):
+    """Run args like subprocess.run, but kill it if the step's time runs out.
+
+    Args:
+        args: str or list of str. Pass this to subprocess.
+        **kwargs: The same keyword arguments as subprocess.run.
+
+    Returns:
+        subprocess.CompletedProcess.
+
+    Raises:
+        subprocess.CalledProcessError: check & non-zero return code.
+    """
+    cancel_token = get_token()
+    if cancel_token is None:
+        return subprocess.run(args, **kwargs)
+
+    check = kwargs.pop('check', False)
+    if os.name == 'posix':
+        # own process group, so the kill gets the shell's children too.
+        kwargs['start_new_session'] = True
+
+    with subprocess.Popen(args, **kwargs) as process:
+        with kill_on_cancel(process, cancel_token):
+            stdout, stderr = process.communicate()
+
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode,
+                                            args,
+                                            stdout,
+                                            stderr)
+
+    return subprocess.CompletedProcess(args,
+                                       process.returncode,
+                                       stdout,
+                                       stderr)
+
+
+def terminate_process(process, is_kill=False):
+    """Terminate process & its process group, if it leads one.
+
+    Args:
+        process: subprocess.Popen. The running process.
+        is_kill: bool. Kill rather than ask it to terminate. Defaults False.
+    """
+    if os.name == 'posix':
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid,
+                          signal.SIGKILL if is_kill else signal.SIGTERM)
+                return
+        except ProcessLookupError:
+            # already gone
+            return
+
+    if is_kill:
+        process.kill()
+    else:
+        process.terminate()
+
+
+def terminate_live_process(process, is_kill=False):
+    """Terminate process & its process group, unless it already exited.
+
+    Another thread might have reaped the process already, in which case its
+    pid might belong to something else by now, so leave it alone.
+
+    Args:
+        process: subprocess.Popen. The process to terminate.
+        is_kill: bool. Kill rather than ask it to terminate. Defaults False.
+    """
+    if process.poll() is not None:
+        return
+
+    try:
+        terminate_process(process, is_kill=is_kill)
+    except ProcessLookupError:
+        # exited between poll & signal
+        pass
+
+
+def wait_for_process(process):
+    """Wait for process to complete & get its peak memory use.
+
+    Peak memory use is only available where the OS supports os.wait4.
+
+    Args:
+        process: subprocess.Popen. The running process.
+
+    Returns:
+        tuple (returncode, max_rss). returncode is the exit status of process.
+        max_rss is the peak resident set size of the process in KB, or None
+        if not available.
+    """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+
+    _, status, rusage = os.wait4(process.pid, 0)
+
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+
+    # so Popen knows it's done & doesn't try to wait again.
+    process.returncode = returncode
+
+    max_rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports bytes, everyone else KB.
+        max_rss = max_rss // 1024
+
+    return returncode, max_rss
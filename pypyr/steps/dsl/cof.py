@@ -6,7 +6,30 @@
 
 
 def control_of_flow_instruction(name, instruction_type, context, context_key):
-    """Run a control of flow instruction.
+    """Raise a control of flow instruction.
+
+    Kept for custom steps that expect the instruction to raise. Prefer
+    get_control_of_flow_instruction & returning the instruction from
+    run_step, which is cheaper because nothing unwinds.
+
+    Args:
+        name: Unique name for step. Likely __name__ of calling step.
+        instruction_type: Type - must inherit from
+                          pypyr.errors.ControlOfFlowInstruction
+        context: pypyr.context.Context. Look for config in this context
+                 instance.
+        context_key: str name of step config in context.
+
+    """
+    raise get_control_of_flow_instruction(name=name,
+                                          instruction_type=instruction_type,
+                                          context=context,
+                                          context_key=context_key)
+
+
+def get_control_of_flow_instruction(name, instruction_type, context,
+                                    context_key):
+    """Get a control of flow instruction from step config in context.
 
     The step config in the context dict looks like this:
         <<instruction-name>>: <<cmd string>>. Mandatory.
@@ -25,6 +48,9 @@ def control_of_flow_instruction(name, instruction_type, context, context_key):
                  instance.
         context_key: str name of step config in context.
 
+    Returns:
+        instance of instruction_type, for the step to return from run_step.
+
     """
     assert name, ("name parameter must exist for a ControlOfFlowStep.")
     assert context, ("context param must exist for ControlOfFlowStep.")
@@ -84,7 +110,7 @@ def control_of_flow_instruction(name, instruction_type, context, context_key):
         groups,
         success_group,
         failure_group)
-    raise instruction_type(groups=groups,
-                           success_group=success_group,
-                           failure_group=failure_group,
-                           original_config=original_config)
+    return instruction_type(groups=groups,
+                            success_group=success_group,
+                            failure_group=failure_group,
+                            original_config=original_config)
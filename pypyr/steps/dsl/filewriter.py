@@ -0,0 +1,113 @@
+"""pypyr step yaml definition for writing a payload out to a file."""
+from collections.abc import Mapping
+from contextlib import contextmanager
+import logging
+from pypyr.utils.asserts import assert_key_has_value
+from pypyr.utils.filesystem import ensure_dir, open_atomic
+from pypyr.utils.types import cast_to_bool
+
+
+class FileWriterStep():
+    """A pypyr step that writes a payload out to a file.
+
+    This models a step that takes config like this:
+        root_key:
+            path: str/path-like. Mandatory.
+            payload: any. Optional. Defaults to entire context.
+            atomic: bool. Optional. Defaults False.
+
+    Formats the step config, except for payload. Writers format the payload
+    as they go with format_value, so they never need to hold a full formatted
+    copy of a big payload in memory.
+
+    If atomic is True, writes to a temp file next to path & only replaces
+    path once the write completed. Use this for big payloads, so readers
+    never see a half written file & a failed write doesn't clobber path.
+
+    Attributes:
+        config (dict): The formatted step config, without payload.
+        is_atomic (bool): Write to temp file & then rename to path.
+        is_payload_formatted (bool): The payload is formatted already.
+        path: Write output to this path.
+        payload: The object to write.
+    """
+
+    def __init__(self, name, root_key, context):
+        """Initialize the FileWriterStep.
+
+        Args:
+            name: Unique name for step. Likely __name__ of calling step.
+            root_key: str. Context key name where step's config is saved under.
+            context: pypyr.context.Context. Look for config in this context
+                     instance.
+        """
+        # this way, logs output as the calling step, which makes more sense
+        # to end-user than a mystery steps.dsl.blah logging output.
+        self.logger = logging.getLogger(name)
+        self.context = context
+
+        context.assert_key_has_value(root_key, name)
+        config = context[root_key]
+
+        if isinstance(config, Mapping):
+            self.config = context.get_formatted_value(
+                {k: v for k, v in config.items() if k != 'payload'})
+            self.is_payload_formatted = False
+        else:
+            # the config itself is an expression, so formatting it formats
+            # everything in it, payload included.
+            config = context.get_formatted(root_key, is_shared=True)
+            self.config = config
+            self.is_payload_formatted = True
+
+        assert_key_has_value(obj=self.config,
+                             key='path',
+                             caller=name,
+                             parent=root_key)
+
+        self.path = self.config['path']
+        self.is_atomic = cast_to_bool(self.config.get('atomic', False))
+
+        # doing it like this to safeguard against accidentally dumping all
+        # context with potentially sensitive values in it to disk if payload
+        # exists but is None.
+        if 'payload' in config:
+            self.payload = config['payload']
+        else:
+            self.payload = context
+            self.is_payload_formatted = False
+
+    def format_value(self, value):
+        """Format value from the payload, unless payload formatted already.
+
+        The result is read-only: unchanged containers share with the input.
+
+        Args:
+            value: Any object from the payload.
+
+        Returns:
+            Formatted value.
+        """
+        if self.is_payload_formatted:
+            return value
+
+        return self.context.get_formatted_value(value, is_shared=True)
+
+    @contextmanager
+    def open(self):
+        """Open path for writing, atomically if is_atomic.
+
+        Creates all parent directories of path if they don't exist.
+
+        Yields:
+            The open file object.
+        """
+        self.logger.debug("opening destination file for writing: %s",
+                          self.path)
+        if self.is_atomic:
+            with open_atomic(self.path) as outfile:
+                yield outfile
+        else:
+            ensure_dir(self.path)
+            with open(self.path, 'w') as outfile:
+                yield outfile
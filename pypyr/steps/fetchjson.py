@@ -1,8 +1,11 @@
 """pypyr step that loads json file into context."""
 from collections.abc import MutableMapping
-import json
 import logging
+import mmap
+from pypyr.cache.filecache import file_cache, load_json
 from pypyr.utils.asserts import assert_key_has_value
+from pypyr.utils.lazyjson import get_selection, load_pointer
+from pypyr.utils.types import cast_to_bool
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
 
@@ -24,6 +27,31 @@ def run_step(context):
                     - path. path-like. Path to file on disk.
                     - key. string. If exists, write json structure to this
                       context key. Else json writes to context root.
+                    - select. list or dict. Only load the values at these
+                      json pointers, like /root/child/0. For a list, each
+                      value goes to a key named after the pointer's last
+                      token. For a dict, each value goes to its key, so
+                      {myKey: /root/child} loads /root/child into myKey.
+                      Unselected parts of the file are skipped with the C
+                      json decoder & never kept in memory. Nothing after the
+                      last selected value is read at all.
+                    - lazy. bool. Default False. Load arrays as a
+                      LazyJsonArray, which keeps only where each item starts
+                      & ends, & parses the item again when you iterate or
+                      index it. Use this to run foreach over arrays too big
+                      to hold in memory as python objects. It saves memory,
+                      not time: finding the items takes about as long as
+                      parsing the whole array.
+                    - mmap. bool. Default False. Memory-map the file rather
+                      than reading it into memory. Only the pages you select
+                      or iterate are read from disk, so use with select or
+                      lazy for files larger than available memory.
+                    - cache. bool. Default False. Keep the parsed file in
+                      pypyr.cache.filecache, so the next fetchJson with
+                      cache of the same unchanged file doesn't parse it
+                      again. Each fetch gets its own deep copy. Files
+                      bigger than 1 MB don't cache. No effect with select,
+                      lazy or mmap.
 
     Also supports a passing path as string to fetchJson, but in this case you
     won't be able to specify a key.
@@ -35,6 +63,7 @@ def run_step(context):
 
     Raises:
         FileNotFoundError: take a guess
+        KeyError: A select json pointer isn't in the file.
         pypyr.errors.KeyNotInContextError: fetchJson.path missing in context.
         pypyr.errors.KeyInContextHasNoValueError: fetchJson.path exists but is
                                                   None.
@@ -49,6 +78,10 @@ def run_step(context):
     if isinstance(fetch_json_input, str):
         file_path = fetch_json_input
         destination_key = None
+        select = None
+        is_lazy = False
+        is_mmap = False
+        is_cache = False
     else:
         assert_key_has_value(obj=fetch_json_input,
                              key='path',
@@ -56,10 +89,18 @@ def run_step(context):
                              parent='fetchJson')
         file_path = fetch_json_input['path']
         destination_key = fetch_json_input.get('key', None)
+        select = fetch_json_input.get('select', None)
+        is_lazy = cast_to_bool(fetch_json_input.get('lazy', False))
+        is_mmap = cast_to_bool(fetch_json_input.get('mmap', False))
+        is_cache = cast_to_bool(fetch_json_input.get('cache', False))
 
     logger.debug("attempting to open file: %s", file_path)
-    with open(file_path) as json_file:
-        payload = json.load(json_file)
+    if select or is_lazy or is_mmap:
+        payload = load_json_selection(file_path, select, is_lazy, is_mmap)
+    elif is_cache:
+        payload = file_cache.get_json(file_path)
+    else:
+        payload = load_json(file_path)
 
     if destination_key:
         logger.debug("json file loaded. Writing to context %s",
@@ -79,3 +120,33 @@ def run_step(context):
     logger.info("json file written into pypyr context. Count: %s",
                 len(payload))
     logger.debug("done")
+
+
+def load_json_selection(file_path, select, is_lazy, is_mmap):
+    """Load only the selected json pointers from file_path.
+
+    Args:
+        file_path (path-like): Path to json file.
+        select (list or dict): json pointers to load. If None, loads the
+            whole document.
+        is_lazy (bool): Load arrays as LazyJsonArray.
+        is_mmap (bool): Memory-map file rather than reading it.
+
+    Returns:
+        Parsed json. dict of selected values if select.
+
+    """
+    with open(file_path, 'rb') as json_file:
+        if is_mmap:
+            # the map stays valid after the file closes.
+            buffer = mmap.mmap(json_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = json_file.read()
+
+    if not select:
+        return load_pointer(buffer, '', is_lazy)
+
+    select = get_selection(select)
+    logger.debug("loading %s json pointers from %s", len(select), file_path)
+    return {key: load_pointer(buffer, pointer, is_lazy)
+            for key, pointer in select.items()}
@@ -1,8 +1,10 @@
 """pypyr step that loads yaml file into context."""
 from collections.abc import MutableMapping
 import logging
-import ruamel.yaml as yaml
+from pypyr.cache.filecache import file_cache, load_yaml
 from pypyr.utils.asserts import assert_key_has_value
+from pypyr.utils.lazyjson import get_by_pointer, get_selection
+from pypyr.utils.types import cast_to_bool
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,19 @@ def run_step(context):
                     - path. path-like. Path to file on disk.
                     - key. string. If exists, write yaml to this context key.
                       Else yaml writes to context root.
+                    - select. list or dict. Only keep the values at these
+                      json pointers, like /root/child/0. For a list, each
+                      value goes to a key named after the pointer's last
+                      token. For a dict, each value goes to its key, so
+                      {myKey: /root/child} puts /root/child into myKey.
+                      Yaml has no cheap way to skip over the unselected
+                      parts, so this still parses the whole file, but only
+                      the selected values go into context.
+                    - cache. bool. Default False. Keep the parsed file in
+                      pypyr.cache.filecache, so the next fetchYaml with
+                      cache of the same unchanged file doesn't parse it
+                      again. Each fetch gets its own deep copy. Files
+                      bigger than 1 MB don't cache.
 
     All inputs support formatting expressions.
 
@@ -33,6 +48,7 @@ def run_step(context):
 
     Raises:
         FileNotFoundError: take a guess
+        KeyError: A select json pointer isn't in the file.
         pypyr.errors.KeyNotInContextError: fetchYamlPath missing in context.
         pypyr.errors.KeyInContextHasNoValueError: fetchYamlPath exists but is
                                                   None.
@@ -47,6 +63,8 @@ def run_step(context):
     if isinstance(fetch_yaml_input, str):
         file_path = fetch_yaml_input
         destination_key = None
+        select = None
+        is_cache = False
     else:
         assert_key_has_value(obj=fetch_yaml_input,
                              key='path',
@@ -54,11 +72,18 @@ def run_step(context):
                              parent='fetchYaml')
         file_path = fetch_yaml_input['path']
         destination_key = fetch_yaml_input.get('key', None)
+        select = fetch_yaml_input.get('select', None)
+        is_cache = cast_to_bool(fetch_yaml_input.get('cache', False))
 
     logger.debug("attempting to open file: %s", file_path)
-    with open(file_path) as yaml_file:
-        yaml_loader = yaml.YAML(typ='safe', pure=True)
-        payload = yaml_loader.load(yaml_file)
+    if is_cache:
+        payload = file_cache.get_yaml(file_path)
+    else:
+        payload = load_yaml(file_path)
+
+    if select:
+        payload = {key: get_by_pointer(payload, pointer)
+                   for key, pointer in get_selection(select).items()}
 
     if destination_key:
         logger.debug("yaml file loaded. Writing to context %s",
@@ -0,0 +1,68 @@
+"""pypyr step that merges json files, like the outputs of shards, into one."""
+import json
+import logging
+from pypyr.utils.filesystem import get_glob, open_atomic
+from pypyr.utils.shard import merge_json_files
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+
+def run_step(context):
+    """Merge json files into a single json file.
+
+    Use this to combine what each shard of a pipeline run with --shard wrote
+    with fileWriteJson.
+
+    If the files all contain arrays, the output is a single array with all
+    the items. If the files all contain objects, later files' keys overwrite
+    the same keys from earlier files.
+
+    Args:
+        context: pypyr.context.Context. Mandatory.
+                 The following context keys expected:
+                - fileMergeJson
+                    - in. mandatory. str, path-like, or list of str or
+                      path-like. Glob or list of globs for the json files to
+                      merge. Each glob's matches merge in sorted order.
+                    - out. mandatory. path-like. Write the merged json to
+                      here. Will create directories in path for you.
+
+    All inputs support pypyr formatting expressions.
+
+    Returns:
+        None.
+
+    Raises:
+        pypyr.errors.KeyNotInContextError: fileMergeJson or
+            fileMergeJson['in'] or fileMergeJson['out'] missing in context.
+        pypyr.errors.KeyInContextHasNoValueError: fileMergeJson or
+            fileMergeJson['in'] or fileMergeJson['out'] exists but is None.
+        TypeError: json files aren't all arrays or all objects.
+        FileNotFoundError: fileMergeJson['in'] doesn't match any files.
+    """
+    logger.debug("started")
+
+    context.assert_child_key_has_value('fileMergeJson', 'in', __name__)
+    context.assert_child_key_has_value('fileMergeJson', 'out', __name__)
+
+    config = context.get_formatted('fileMergeJson')
+    in_paths = config['in']
+    if not isinstance(in_paths, (list, tuple)):
+        in_paths = [in_paths]
+
+    paths = [path
+             for in_path in in_paths
+             for path in sorted(get_glob(in_path))]
+    if not paths:
+        raise FileNotFoundError(
+            f"fileMergeJson found no json files to merge in {in_paths}.")
+
+    merged = merge_json_files(paths)
+
+    out_path = config['out']
+    with open_atomic(out_path) as outfile:
+        json.dump(merged, outfile, indent=2, ensure_ascii=False)
+
+    logger.info("merged %s json files to %s", len(paths), out_path)
+    logger.debug("done")
@@ -1,8 +1,10 @@
 """pypyr step that writes payload out to a json file."""
 import json
 import logging
-import os
-from pypyr.utils.asserts import assert_key_has_value
+from pypyr.dsl import SpecialTagDirective
+from pypyr.steps.dsl.filewriter import FileWriterStep
+from pypyr.utils.types import cast_to_bool
+
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
 
@@ -10,6 +12,9 @@
 def run_step(context):
     """Write payload out to json file.
 
+    Formats & writes the payload node by node, so it never holds a full
+    formatted copy of the payload in memory.
+
     Args:
         context: pypyr.context.Context. Mandatory.
                  The following context keys expected:
@@ -18,6 +23,10 @@ def run_step(context):
                       here. Will create directories in path for you.
                     - payload. optional. Write this key to output file. If not
                       specified, output entire context.
+                    - compact. optional. bool. Defaults False. Write without
+                      indentation & whitespace.
+                    - atomic. optional. bool. Defaults False. Write to a temp
+                      file & only replace path with it once done.
 
     Returns:
         None.
@@ -30,30 +39,119 @@ def run_step(context):
 
     """
     logger.debug("started")
-    context.assert_key_has_value('fileWriteJson', __name__)
-
-    input_context = context.get_formatted('fileWriteJson')
-    assert_key_has_value(obj=input_context,
-                         key='path',
-                         caller=__name__,
-                         parent='fileWriteJson')
-
-    out_path = input_context['path']
-    # doing it like this to safeguard against accidentally dumping all context
-    # with potentially sensitive values in it to disk if payload exists but is
-    # None.
-    is_payload_specified = 'payload' in input_context
-
-    logger.debug("opening destination file for writing: %s", out_path)
-    os.makedirs(os.path.abspath(os.path.dirname(out_path)), exist_ok=True)
-    with open(out_path, 'w') as outfile:
-        if is_payload_specified:
-            payload = input_context['payload']
-        else:
-            payload = context.get_formatted_value(context)
 
-        json.dump(payload, outfile,
-                  indent=2, ensure_ascii=False)
+    step = FileWriterStep(__name__, 'fileWriteJson', context)
+    indent = None if cast_to_bool(step.config.get('compact', False)) else 2
+
+    with step.open() as outfile:
+        for chunk in iter_json(step.payload,
+                               None if step.is_payload_formatted
+                               else step.format_value,
+                               indent=indent):
+            outfile.write(chunk)
 
-    logger.info("formatted context content and wrote to %s", out_path)
+    logger.info("formatted context content and wrote to %s", step.path)
     logger.debug("done")
+
+
+def iter_json(obj, format_value=None, indent=2):
+    """Encode obj to json string chunks, formatting each node as it goes.
+
+    Output is the same as json.dump(obj, indent=indent, ensure_ascii=False).
+    If indent is None, output is compact, without any whitespace - i.e
+    separators=(',', ':').
+
+    Formats only strings & special tags, one at a time, as the walk reaches
+    them. A string that formats to a container is formatted already, so its
+    contents write as is.
+
+    Args:
+        obj: Encode this object.
+        format_value: callable. Format a string or special tag. None means
+                      don't format.
+        indent: int. Indent nested levels by this many spaces. None for
+                compact output on a single line.
+
+    Yields:
+        str chunks of json.
+
+    Raises:
+        TypeError: An object or key isn't json serializable.
+        ValueError: obj contains a circular reference.
+    """
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    if indent is None:
+        item_separator, key_separator = ',', ':'
+    else:
+        item_separator, key_separator = ',', ': '
+    markers = set()
+
+    def get_key(key, is_format):
+        """Format key & convert to str the same way json does."""
+        if is_format and isinstance(key, (str, SpecialTagDirective)):
+            key = format_value(key)
+
+        if isinstance(key, str):
+            return key
+        elif isinstance(key, (bool, int, float)) or key is None:
+            # json uses json literals for these: true, null, NaN et.
+            return encode(key)
+
+        raise TypeError("keys must be str, int, float, bool or None, "
+                        f"not {key.__class__.__name__}")
+
+    def walk(o, level, is_format):
+        if is_format and isinstance(o, (str, SpecialTagDirective)):
+            o = format_value(o)
+            # result is fully formatted, don't format its contents again.
+            is_format = False
+
+        if isinstance(o, dict):
+            if not o:
+                yield '{}'
+                return
+            walk_items = ((get_key(k, is_format), v) for k, v in o.items())
+            open_char, close_char, is_dict = '{', '}', True
+        elif isinstance(o, (list, tuple)):
+            if not o:
+                yield '[]'
+                return
+            walk_items = o
+            open_char, close_char, is_dict = '[', ']', False
+        else:
+            # scalars, or raises TypeError if not serializable.
+            yield encode(o)
+            return
+
+        marker = id(o)
+        if marker in markers:
+            raise ValueError("Circular reference detected")
+        markers.add(marker)
+
+        if indent is None:
+            newline_indent = ''
+            separator = item_separator
+            close = close_char
+        else:
+            newline_indent = '\n' + ' ' * (indent * (level + 1))
+            separator = item_separator + newline_indent
+            close = '\n' + ' ' * (indent * level) + close_char
+
+        yield open_char + newline_indent
+        is_first = True
+        for item in walk_items:
+            if is_first:
+                is_first = False
+            else:
+                yield separator
+
+            if is_dict:
+                key, item = item
+                yield encode(key) + key_separator
+
+            yield from walk(item, level + 1, is_format)
+
+        yield close
+        markers.remove(marker)
+
+    yield from walk(obj, 0, format_value is not None)
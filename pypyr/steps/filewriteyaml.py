@@ -1,7 +1,6 @@
 """pypyr step that writes payload out to a yaml file."""
-import os
 import logging
-from pypyr.utils.asserts import assert_key_has_value
+from pypyr.steps.dsl.filewriter import FileWriterStep
 import pypyr.yaml
 
 # logger means the log level will be set correctly
@@ -11,6 +10,11 @@
 def run_step(context):
     """Write payload out to yaml file.
 
+    If the payload is a mapping or a list, formats & writes it one top-level
+    item at a time, so it never holds a full formatted copy of the payload in
+    memory. A consequence is that yaml anchors & aliases only apply within a
+    top-level item, not across items.
+
     Args:
         context: pypyr.context.Context. Mandatory.
                  The following context keys expected:
@@ -19,6 +23,8 @@ def run_step(context):
                       here. Will create directories in path for you.
                     - payload. optional. Write this to output file. If not
                       specified, output entire context.
+                    - atomic. optional. bool. Defaults False. Write to a temp
+                      file & only replace path with it once done.
 
     Returns:
         None.
@@ -31,30 +37,24 @@ def run_step(context):
 
     """
     logger.debug("started")
-    context.assert_key_has_value('fileWriteYaml', __name__)
-
-    input_context = context.get_formatted('fileWriteYaml')
-    assert_key_has_value(obj=input_context,
-                         key='path',
-                         caller=__name__,
-                         parent='fileWriteYaml')
-    out_path = input_context['path']
-    # doing it like this to safeguard against accidentally dumping all context
-    # with potentially sensitive values in it to disk if payload exists but is
-    # None.
-    is_payload_specified = 'payload' in input_context
+
+    step = FileWriterStep(__name__, 'fileWriteYaml', context)
+    payload = step.payload
 
     yaml_writer = pypyr.yaml.get_yaml_parser_roundtrip_for_context()
 
-    logger.debug("opening destination file for writing: %s", out_path)
-    os.makedirs(os.path.abspath(os.path.dirname(out_path)), exist_ok=True)
-    with open(out_path, 'w') as outfile:
-        if is_payload_specified:
-            payload = input_context['payload']
+    with step.open() as outfile:
+        if isinstance(payload, dict) and payload:
+            # a block mapping is the concatenation of its single item
+            # mappings, so this outputs the same as dumping the whole thing.
+            for k, v in payload.items():
+                yaml_writer.dump({step.format_value(k): step.format_value(v)},
+                                 outfile)
+        elif isinstance(payload, list) and payload:
+            for item in payload:
+                yaml_writer.dump([step.format_value(item)], outfile)
         else:
-            payload = context.get_formatted_value(context)
-
-        yaml_writer.dump(payload, outfile)
+            yaml_writer.dump(step.format_value(payload), outfile)
 
-    logger.info("formatted context content and wrote to %s", out_path)
+    logger.info("formatted context content and wrote to %s", step.path)
     logger.debug("done")
@@ -1,7 +1,7 @@
 """Control of flow instruction to jump to another step-group."""
 import logging
 from pypyr.errors import Jump
-from pypyr.steps.dsl.cof import control_of_flow_instruction
+from pypyr.steps.dsl.cof import get_control_of_flow_instruction
 
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
@@ -26,11 +26,11 @@ def run_step(context):
             failure: str. Name of group to run on something going wrong.
 
     Return:
-        None.
+        pypyr.errors.Jump instruction for the StepsRunner to run.
     """
     logger.debug("started")
 
-    control_of_flow_instruction(name=__name__,
-                                instruction_type=Jump,
-                                context=context,
-                                context_key='jump')
+    return get_control_of_flow_instruction(name=__name__,
+                                           instruction_type=Jump,
+                                           context=context,
+                                           context_key='jump')
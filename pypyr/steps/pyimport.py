@@ -46,6 +46,8 @@ def run_step(context):
                  len(namespace))
 
     context.pystring_globals.update(namespace)
+    # remember source so a context snapshot can import it again on load.
+    context.pystring_imports.append(source)
 
     # pystring_globals initialized to {} on Context init, so len() is safe.
     logger.debug("PyString namespace now contains %s objects.",
@@ -8,6 +8,7 @@
                           KeyNotInContextError,
                           Stop)
 import pypyr.pipelinerunner as pipelinerunner
+import pypyr.workqueue as workqueue
 
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
@@ -60,6 +61,21 @@ def run_step(context):
                 - success. str. optional. Step-Group to run on successful
                   pipeline completion.
                 - failure. str. optional. Step-Group to run on pipeline error.
+                - queue. str or path-like. optional. Put the child pipeline
+                  on this work queue for a pypyr-worker to run, rather than
+                  running it here. Only works with useParentContext=False.
+                  See pypyr.workqueue.
+                - queueBackend. str. optional. Absolute name of the work
+                  queue backend module. Defaults to
+                  pypyr.queues.sqlitequeue.
+                - wait. bool. optional. Defaults to True. With queue, wait
+                  for the worker to finish the child pipeline & then save
+                  out to the parent context. If False, carry on at once &
+                  append the job id to context pypeJobs. Use
+                  pypyr.steps.pypewait to get the results later.
+                - timeout. float. optional. With queue & wait, give up
+                  waiting for the job after this many seconds. Defaults to
+                  waiting for as long as it takes.
 
     If none of groups, success & failure specified, will run the default pypyr
     steps, on_success & on_failure sequence.
@@ -91,8 +107,45 @@ def run_step(context):
      failure_group
      ) = get_arguments(context)
 
+    (queue_location,
+     queue_backend,
+     is_wait,
+     wait_timeout) = get_queue_arguments(context)
+    if queue_location and use_parent_context:
+        raise ContextError(
+            "pypyr.steps.pype pype.queue runs the child pipeline in a worker "
+            "process, so it can't use the parent context. Set "
+            "useParentContext = False, or pass pype.args.")
+
     try:
-        if use_parent_context:
+        if queue_location:
+            logger.info("queueing %s on %s.", pipeline_name, queue_location)
+
+            queue = workqueue.get_queue(queue_location, queue_backend)
+            job_id = queue.put({
+                'pipeline_name': pipeline_name,
+                'args': args,
+                'pipe_arg': pipe_arg,
+                'skip_parse': skip_parse,
+                'working_dir': context.working_dir,
+                'loader': loader,
+                'groups': step_groups,
+                'success_group': success_group,
+                'failure_group': failure_group,
+                'out': get_out_mapping(out) if out else None})
+
+            if is_wait:
+                logger.info("waiting for %s job %s.", pipeline_name, job_id)
+                result = workqueue.wait_for_results(queue,
+                                                    [job_id],
+                                                    timeout=wait_timeout)[0]
+                context.update(workqueue.get_out(job_id, result))
+            else:
+                logger.info("queued %s job %s. Not waiting for it.",
+                            pipeline_name, job_id)
+                context.setdefault('pypeJobs', []).append(job_id)
+
+        elif use_parent_context:
             logger.info("pyping %s, using parent context.", pipeline_name)
 
             if args:
@@ -257,16 +310,48 @@ def get_arguments(context):
     )
 
 
-def write_child_context_to_parent(out, parent_context, child_context):
-    """Write out keys from child to parent context.
+def get_queue_arguments(context):
+    """Parse the work queue arguments for pype from context.
+
+    Args:
+        context: pypyr.context.Context. context['pype'] must exist.
+
+    Returns:
+        tuple (queue, #str or path-like. None if not on a queue.
+               queue_backend, #str
+               is_wait, #bool
+               wait_timeout #float. None means no timeout.
+               )
+    """
+    pype = context['pype']
+    queue = pype.get('queue', None)
+    if not queue:
+        return None, None, True, None
+
+    wait_timeout = pype.get('timeout', None)
+    if wait_timeout is not None:
+        wait_timeout = context.get_formatted_as_type(wait_timeout,
+                                                     out_type=float)
+
+    return (context.get_formatted_value(queue),
+            context.get_formatted_value(pype.get('queueBackend', None)),
+            context.get_formatted_as_type(pype.get('wait', None),
+                                          default=True,
+                                          out_type=bool),
+            wait_timeout)
+
+
+def get_out_mapping(out):
+    """Get out as a dict of 'parent-key-name': 'child-key-name'.
 
     Args:
         out. str or dict or list. Pass a string for a single
              key to grab from child context, a list of string for a list
              of keys to grab from child context, or a dict where you map
              'parent-key-name': 'child-key-name'.
-        parent_context: parent Context. destination context.
-        child_context: write from this context to the parent.
+
+    Returns:
+        dict. 'parent-key-name': 'child-key-name'.
     """
     if isinstance(out, str):
         save_me = {out: out}
@@ -278,7 +363,21 @@ def write_child_context_to_parent(out, parent_context, child_context):
         raise ContextError("pypyr.steps.pype pype.out should be a string, or "
                            f"a list or a dict. Instead, it's a {type(out)}")
 
-    for parent_key, child_key in save_me.items():
+    return save_me
+
+
+def write_child_context_to_parent(out, parent_context, child_context):
+    """Write out keys from child to parent context.
+
+    Args:
+        out. str or dict or list. Pass a string for a single
+             key to grab from child context, a list of string for a list
+             of keys to grab from child context, or a dict where you map
+             'parent-key-name': 'child-key-name'.
+        parent_context: parent Context. destination context.
+        child_context: write from this context to the parent.
+    """
+    for parent_key, child_key in get_out_mapping(out).items():
         logger.debug(
             "setting parent context %s to value from child context %s",
             parent_key,
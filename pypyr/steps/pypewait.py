@@ -0,0 +1,97 @@
+"""pypyr step that waits for pype jobs on a work queue to finish."""
+import logging
+from pypyr.errors import QueueJobError
+import pypyr.workqueue as workqueue
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+
+def run_step(context):
+    """Wait for pype jobs that run on a work queue & save their out values.
+
+    pypyr.steps.pype with a queue & wait: False appends each job id to
+    context pypeJobs & carries on without waiting. This step waits for those
+    jobs to finish & then writes each job's out values to context, in job
+    order.
+
+    Args:
+        context: pypyr.context.Context. Mandatory.
+                 The following context keys expected:
+                - pypeWait
+                    - queue. mandatory. str or path-like. The work queue the
+                      jobs are on.
+                    - queueBackend. str. optional. Absolute name of the work
+                      queue backend module. Defaults to
+                      pypyr.queues.sqlitequeue.
+                    - jobs. list. optional. Wait for these job ids. Defaults
+                      to context pypeJobs, which this step then clears.
+                    - interval. float. optional. Seconds between checks for
+                      results. Defaults to 0.25.
+                    - timeout. float. optional. Give up after this many
+                      seconds. Defaults to waiting for as long as it takes.
+                    - raiseError. bool. optional. Defaults to True. If False,
+                      log failed jobs, but carry on with the next step.
+
+    All inputs support pypyr formatting expressions.
+
+    Returns:
+        None.
+
+    Raises:
+        pypyr.errors.KeyNotInContextError: pypeWait or pypeWait['queue']
+            missing in context.
+        pypyr.errors.KeyInContextHasNoValueError: pypeWait or
+            pypeWait['queue'] exists but is None.
+        pypyr.errors.LoopMaxExhaustedError: jobs still not done after
+            timeout.
+        pypyr.errors.QueueJobError: a job failed & raiseError is True.
+    """
+    logger.debug("started")
+
+    context.assert_child_key_has_value('pypeWait', 'queue', __name__)
+    config = context['pypeWait']
+
+    job_ids = context.get_formatted_value(config.get('jobs', None))
+    is_pype_jobs = job_ids is None
+    if is_pype_jobs:
+        job_ids = context.get('pypeJobs', [])
+
+    queue = workqueue.get_queue(
+        context.get_formatted_value(config['queue']),
+        context.get_formatted_value(config.get('queueBackend', None)))
+
+    timeout = config.get('timeout', None)
+    if timeout is not None:
+        timeout = context.get_formatted_as_type(timeout, out_type=float)
+
+    is_raise_error = context.get_formatted_as_type(
+        config.get('raiseError', None), default=True, out_type=bool)
+
+    logger.info("waiting for %s pype jobs.", len(job_ids))
+    results = workqueue.wait_for_results(
+        queue,
+        job_ids,
+        interval=context.get_formatted_as_type(
+            config.get('interval', None),
+            default=workqueue.DEFAULT_INTERVAL,
+            out_type=float),
+        timeout=timeout)
+
+    if is_pype_jobs:
+        context['pypeJobs'] = []
+
+    first_error = None
+    for job_id, result in zip(job_ids, results):
+        try:
+            context.update(workqueue.get_out(job_id, result))
+        except QueueJobError as err:
+            logger.error(str(err))
+            if first_error is None:
+                first_error = err
+
+    if first_error and is_raise_error:
+        raise first_error
+
+    logger.info("pype jobs done.")
+    logger.debug("done")
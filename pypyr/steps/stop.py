@@ -11,4 +11,4 @@ def run_step(context):
     logger.debug("started")
 
     logger.info("Stop: stopping pypyr...")
-    raise Stop("pypyr.steps.stop stopped pypyr execution")
+    return Stop("pypyr.steps.stop stopped pypyr execution")
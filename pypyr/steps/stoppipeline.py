@@ -11,4 +11,4 @@ def run_step(context):
     logger.debug("started")
 
     logger.info("StopPipeline: stopping pipeline...")
-    raise StopPipeline("pypyr.steps.stoppipeline stopped current pipeline")
+    return StopPipeline("pypyr.steps.stoppipeline stopped current pipeline")
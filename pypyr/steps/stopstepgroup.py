@@ -11,4 +11,5 @@ def run_step(context):
     logger.debug("started")
 
     logger.info("StopStepGroup: stopping step-group...")
-    raise StopStepGroup("pypyr.steps.stopstepgroup stopped current step-group")
+    return StopStepGroup(
+        "pypyr.steps.stopstepgroup stopped current step-group")
@@ -1,7 +1,14 @@
 """Archive and extract tars."""
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 import logging
+import os
+import posixpath
+import shlex
+import subprocess
 import tarfile
 from pypyr.errors import KeyNotInContextError
+from pypyr.utils.types import cast_to_bool
 
 # logger means the log level will be set correctly
 logger = logging.getLogger(__name__)
@@ -22,6 +29,10 @@ def run_step(context):
                 - in: /dir/to/archive
                   out: /out/destination.tar
             format: ''
+            parallel: 4
+            include: ['*.py', '*.yaml']
+            exclude: ['__pycache__', '*.pyc']
+            compressor: xz -T0
 
         tar['format'] - if not specified, defaults to lzma/xz
                        Available options:
@@ -30,6 +41,27 @@ def run_step(context):
                         - bz2 (bzip2)
                         - xz (lzma)
 
+        tar['parallel'] - optional. int. Process up to this many extract or
+                          archive entries at the same time. True means one per
+                          cpu. Defaults to 1, i.e one entry after the other.
+        tar['include'] - optional. str or list of str glob patterns. Only
+                         files matching at least one of these go in or come
+                         out of the tar. Doesn't apply to directories.
+        tar['exclude'] - optional. str or list of str glob patterns. Files
+                         and directories matching any of these don't go in or
+                         come out of the tar. An excluded directory excludes
+                         everything under it, too.
+        tar['compressor'] - optional. str. External compression program that
+                            reads from stdin & writes to stdout, like
+                            'xz -T0', 'zstd -T0' or 'pigz'. Use this for
+                            multi-threaded compression. The tar streams
+                            through the program without staging on disk.
+                            Extract runs the same program with -d appended.
+                            When set, format doesn't apply.
+
+    Glob patterns match either the member's path relative to the archive root,
+    like 'sub/dir/file.txt', or just its base name, like 'file.txt'.
+
     This step will run whatever combination of Extract and Archive you specify.
     Regardless of combination, execution order is Extract, Archive.
 
@@ -102,6 +134,105 @@ def get_file_mode_for_writing(context_tar):
     return mode
 
 
+def get_max_workers(context_tar):
+    """Get the number of entries to process concurrently from tar['parallel'].
+
+    Returns:
+        int. 1 if parallel doesn't exist or is falsy. cpu count if parallel
+        is True. Else whatever int parallel is. Strings that aren't ints
+        cast to bool, so 'True' is cpu count.
+    """
+    parallel = context_tar.get('parallel', None)
+
+    if isinstance(parallel, str) and not parallel.strip().lstrip(
+            '-').isdigit():
+        # formatted bool, like 'True' from '{useAllCores}'.
+        parallel = cast_to_bool(parallel)
+
+    if not parallel:
+        return 1
+
+    if isinstance(parallel, bool):
+        return os.cpu_count() or 1
+
+    max_workers = int(parallel)
+    return max_workers if max_workers > 0 else 1
+
+
+def get_member_filter(context_tar):
+    """Get a filter callable for tar members from tar include & exclude.
+
+    Args:
+        context_tar: dictionary-like. Optional keys include & exclude. Each is
+                     a glob pattern str or a list of glob pattern str.
+
+    Returns:
+        callable(tarinfo) that returns the tarinfo if the member should be
+        archived or extracted, or None if not. None if neither include nor
+        exclude specified.
+    """
+    include = context_tar.get('include', None)
+    exclude = context_tar.get('exclude', None)
+
+    if not include and not exclude:
+        return None
+
+    if isinstance(include, str):
+        include = [include]
+
+    if isinstance(exclude, str):
+        exclude = [exclude]
+
+    def is_match(name, patterns):
+        """Return True if path or base name of path matches any pattern."""
+        base_name = posixpath.basename(name)
+        return any(fnmatch(name, pattern) or fnmatch(base_name, pattern)
+                   for pattern in patterns)
+
+    def member_filter(tarinfo):
+        """Return tarinfo if it passes include & exclude, else None."""
+        name = posixpath.normpath(tarinfo.name)
+        if name == '.':
+            # the archive root itself always goes in
+            return tarinfo
+
+        if exclude and is_match(name, exclude):
+            logger.debug("excluding %s", name)
+            return None
+
+        if include and not tarinfo.isdir() and not is_match(name, include):
+            logger.debug("%s not in include. skipping.", name)
+            return None
+
+        return tarinfo
+
+    return member_filter
+
+
+def run_for_each_item(func, items, max_workers, **kwargs):
+    """Run func(item, **kwargs) for each item, concurrently if max_workers > 1.
+
+    Errors raise in input order, once all the items already started finished.
+
+    Args:
+        func: callable with signature func(item, **kwargs)
+        items: iterable of items to process.
+        max_workers: int. Process this many items at the same time.
+        kwargs: pass these to each func invocation.
+    """
+    if max_workers > 1 and len(items) > 1:
+        logger.debug("processing %s items with %s workers",
+                     len(items), max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(func, item, **kwargs)
+                       for item in items]
+            for future in futures:
+                future.result()
+    else:
+        for item in items:
+            func(item, **kwargs)
+
+
 def tar_archive(context_tar):
     """Archive specified path to a tar archive.
 
@@ -121,23 +252,73 @@ def tar_archive(context_tar):
 
         This will archive directory path/to/dir to path/to/destination.tar.xs,
         and also archive file another/my.file to ./my.tar.xs
+
+        If context['tar']['parallel'] > 1, archives that many entries at the
+        same time.
     """
     logger.debug("start")
 
-    mode = get_file_mode_for_writing(context_tar)
+    run_for_each_item(archive_item,
+                      context_tar['archive'],
+                      get_max_workers(context_tar),
+                      mode=get_file_mode_for_writing(context_tar),
+                      member_filter=get_member_filter(context_tar),
+                      compressor=context_tar.get('compressor', None))
 
-    for item in context_tar['archive']:
-        # value is the destination tar. Allow string interpolation.
-        destination = item['out']
-        # key is the source to archive
-        source = item['in']
-        with tarfile.open(destination, mode) as archive_me:
-            logger.debug("Archiving '%s' to '%s'", source, destination)
+    logger.debug("end")
 
-            archive_me.add(source, arcname='.')
-            logger.info("Archived '%s' to '%s'", source, destination)
 
-    logger.debug("end")
+def archive_item(item, mode, member_filter=None, compressor=None):
+    """Archive a single in path to a single out tar.
+
+    Args:
+        item: dict. in is the source path. out is the destination tar.
+        mode: str. tarfile open mode, like w:xz.
+        member_filter: callable. Optional. tarfile.add filter.
+        compressor: str. Optional. External compression program. If set, pipe
+                    the uncompressed tar stream through this program into
+                    destination. mode doesn't apply.
+    """
+    # value is the destination tar. Allow string interpolation.
+    destination = item['out']
+    # key is the source to archive
+    source = item['in']
+    add_kwargs = {'filter': member_filter} if member_filter else {}
+
+    logger.debug("Archiving '%s' to '%s'", source, destination)
+    if compressor:
+        args = shlex.split(compressor)
+        with open(destination, 'wb') as outfile:
+            process = subprocess.Popen(args,
+                                       stdin=subprocess.PIPE,
+                                       stdout=outfile)
+            # a compressor that dies breaks the pipe. its exit code says why,
+            # so that's the error to raise rather than the broken pipe.
+            pipe_error = None
+            try:
+                # w| streams, so the tar never exists uncompressed on disk
+                with tarfile.open(fileobj=process.stdin,
+                                  mode='w|') as archive_me:
+                    archive_me.add(source, arcname='.', **add_kwargs)
+            except BrokenPipeError as err:
+                pipe_error = err
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError as err:
+                    pipe_error = err
+                returncode = process.wait()
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, args)
+
+        if pipe_error:
+            raise pipe_error
+    else:
+        with tarfile.open(destination, mode) as archive_me:
+            archive_me.add(source, arcname='.', **add_kwargs)
+
+    logger.info("Archived '%s' to '%s'", source, destination)
 
 
 def tar_extract(context_tar):
@@ -159,20 +340,91 @@ def tar_extract(context_tar):
 
         This will extract path/to/my.tar.xs to /path/extract/here, and also
         extract another/tar.xs to $PWD.
+
+        If context['tar']['parallel'] > 1, extracts that many entries at the
+        same time.
     """
     logger.debug("start")
 
-    mode = get_file_mode_for_reading(context_tar)
+    run_for_each_item(extract_item,
+                      context_tar['extract'],
+                      get_max_workers(context_tar),
+                      mode=get_file_mode_for_reading(context_tar),
+                      member_filter=get_member_filter(context_tar),
+                      compressor=context_tar.get('compressor', None))
 
-    for item in context_tar['extract']:
-        # in is the path to the tar to extract. Allows string interpolation.
-        source = item['in']
-        # out is the outdir, dhur. Allows string interpolation.
-        destination = item['out']
+    logger.debug("end")
+
+
+def extract_item(item, mode, member_filter=None, compressor=None):
+    """Extract a single in tar to a single out path.
+
+    Args:
+        item: dict. in is the source tar. out is the destination path.
+        mode: str. tarfile open mode, like r:*.
+        member_filter: callable. Optional. Only extract members for which
+                       this returns a value.
+        compressor: str. Optional. External compression program. If set,
+                    decompress the source with this program with -d appended
+                    and stream the output into tar. mode doesn't apply.
+    """
+    # in is the path to the tar to extract. Allows string interpolation.
+    source = item['in']
+    # out is the outdir, dhur. Allows string interpolation.
+    destination = item['out']
+
+    logger.debug("Extracting '%s' to '%s'", source, destination)
+    if compressor:
+        args = shlex.split(compressor)
+        args.append('-d')
+        with open(source, 'rb') as infile:
+            process = subprocess.Popen(args,
+                                       stdin=infile,
+                                       stdout=subprocess.PIPE)
+            try:
+                with tarfile.open(fileobj=process.stdout,
+                                  mode='r|') as extract_me:
+                    extract_members(extract_me, destination, member_filter)
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, args)
+    else:
         with tarfile.open(source, mode) as extract_me:
-            logger.debug("Extracting '%s' to '%s'", source, destination)
+            extract_members(extract_me, destination, member_filter)
 
-            extract_me.extractall(destination)
-            logger.info("Extracted '%s' to '%s'", source, destination)
+    logger.info("Extracted '%s' to '%s'", source, destination)
 
-    logger.debug("end")
+
+def extract_members(tar, destination, member_filter=None):
+    """Extract members of open tar to destination that pass member_filter.
+
+    Members stream out of the tar one at a time, so this works for tars
+    opened in stream mode too.
+
+    Args:
+        tar: open tarfile.TarFile.
+        destination: path. Extract to here.
+        member_filter: callable. Optional. Only extract members for which
+                       this returns a value.
+    """
+    if member_filter:
+        excluded_dirs = []
+
+        def filtered_members():
+            for member in tar:
+                name = posixpath.normpath(member.name)
+                if any(name.startswith(excluded)
+                       for excluded in excluded_dirs):
+                    continue
+
+                if member_filter(member):
+                    yield member
+                elif member.isdir():
+                    excluded_dirs.append(name + '/')
+
+        tar.extractall(destination, members=filtered_members())
+    else:
+        tar.extractall(destination)
@@ -3,16 +3,25 @@
 pipelinerunner uses this to parse and run steps.
 """
 
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import copy
 import logging
-from pypyr.dsl import Step
+from pypyr.dag import get_max_workers, get_step_nodes, merge_step_context
+from pypyr.dsl import SimpleStep, Step
 from pypyr.errors import (ControlOfFlowInstruction,
                           Jump,
+                          PipelineDefinitionError,
                           Stop,
                           StopStepGroup)
+from pypyr.resources import add_resources
+from pypyr.utils.cancel import get_token, run_with_timeout, run_with_token
 
 # use pypyr logger to ensure loglevel is set correctly
 logger = logging.getLogger(__name__)
 
+_INSTRUCTION_TYPES = (ControlOfFlowInstruction, Stop)
+
 
 class StepsRunner():
     """Run step-groups and steps.
@@ -30,6 +39,8 @@ def __init__(self, pipeline_definition, context):
         """
         self.context = context
         self.pipeline = pipeline_definition
+        # step name: SimpleStep. Simple steps are stateless, so re-use them.
+        self._simple_steps = {}
 
     def get_pipeline_steps(self, step_group):
         """Get the specified step-group's step from the pipeline.
@@ -99,8 +110,13 @@ def run_failure_step_group(self, group_name):
     def run_pipeline_steps(self, steps):
         """Run the run_step(context) method of each step in steps.
 
+        Stops at the first step that returns a Jump or Stop instruction.
+
         Args:
             steps: list. Sequence of Steps to execute
+
+        Returns:
+            The Jump or Stop instruction a step returned. None otherwise.
         """
         logger.debug("starting")
         assert isinstance(self.context, dict), (
@@ -111,45 +127,210 @@ def run_pipeline_steps(self, steps):
         else:
             step_count = 0
 
+            simple_steps = self._simple_steps
+            # a pipeline or step with a timeout runs on its own thread.
+            cancel_token = get_token()
+
             for step in steps:
-                step_instance = Step(step, self)
-                step_instance.run_step(self.context)
+                if cancel_token is not None:
+                    # the time ran out, so don't start any more steps.
+                    cancel_token.check()
+
+                if isinstance(step, str):
+                    # bare string step has no decorators, so skip the full
+                    # Step machinery.
+                    step_instance = simple_steps.get(step)
+                    if step_instance is None:
+                        step_instance = SimpleStep(step, self)
+                        simple_steps[step] = step_instance
+                else:
+                    step_instance = Step(step, self)
+
+                instruction = step_instance.run_step(self.context)
                 step_count += 1
 
+                if isinstance(instruction, _INSTRUCTION_TYPES):
+                    logger.debug("executed %s steps, then %s", step_count,
+                                 type(instruction).__name__)
+                    return instruction
+
             logger.debug("executed %s steps", step_count)
 
         logger.debug("done")
+        return None
+
+    def run_dag_steps(self, steps, max_workers):
+        """Run each step as soon as the steps it needs are done.
+
+        Runs up to max_workers steps at the same time. Each running step gets
+        its own shallow copy of context, so concurrent steps' in parameters
+        don't clobber each other. When a step finishes, what it changed in its
+        copy merges back into the shared context before its dependents start.
+        If concurrent steps set the same key, the last one to finish wins.
+
+        Once a step fails or returns a Jump or Stop instruction, no new steps
+        start. Steps already running finish. Then the first error raises, same
+        as for a sequential step-group, so on_failure handling is the same.
+
+        Args:
+            steps: list. Sequence of Steps with optional id & needs.
+            max_workers: int. Run up to this many steps at the same time.
+
+        Returns:
+            The Jump or Stop instruction a step returned. None otherwise.
+        """
+        logger.debug("starting")
+        assert isinstance(self.context, dict), (
+            "context must be a dictionary, even if empty {}.")
+
+        nodes = get_step_nodes(steps)
+        ready = [node for node in nodes if not node.pending]
+        # reversed so pop() starts steps in the order they're in the yaml.
+        ready.reverse()
+
+        logger.debug("running %s steps by their needs, up to %s at a time.",
+                     len(nodes), max_workers)
+
+        running = {}
+        step_count = 0
+        error = None
+        instruction = None
+        # steps on the pool threads stop when this thread's work cancels.
+        cancel_token = get_token()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while running or (ready and error is None and instruction is None):
+                while (ready and len(running) < max_workers
+                       and error is None and instruction is None):
+                    node = ready.pop()
+                    before = dict(self.context)
+                    step_context = copy.copy(self.context)
+                    # own runner, so a Call from the step runs against the
+                    # step's context too.
+                    step_runner = StepsRunner(self.pipeline, step_context)
+                    future = executor.submit(run_with_token,
+                                             cancel_token,
+                                             self.run_dag_step,
+                                             node.step,
+                                             step_runner)
+                    running[future] = (node, before, step_context)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node, before, step_context = running.pop(future)
+                    merge_step_context(self.context, before, step_context)
+                    step_count += 1
+
+                    try:
+                        result = future.result()
+                    except _INSTRUCTION_TYPES as raised:
+                        result = raised
+                    except Exception as ex_info:
+                        if error is None:
+                            logger.debug("%r failed. not starting new steps.",
+                                         node)
+                            error = ex_info
+                        continue
+
+                    if isinstance(result, _INSTRUCTION_TYPES):
+                        if instruction is None:
+                            logger.debug("%r returned %s. not starting new "
+                                         "steps.",
+                                         node, type(result).__name__)
+                            instruction = result
+                        continue
+
+                    for dependent in node.dependents:
+                        dependent.pending -= 1
+                        if not dependent.pending:
+                            ready.append(dependent)
+
+        logger.debug("executed %s of %s steps", step_count, len(nodes))
+
+        if error is not None:
+            raise error
+
+        logger.debug("done")
+        return instruction
+
+    def run_dag_step(self, step, steps_runner):
+        """Run a single step from a dag step-group on its own runner.
+
+        Args:
+            step: str or dict. The step as it exists in the pipeline yaml.
+            steps_runner: StepsRunner. Runner with the step's own context.
+
+        Returns:
+            The Jump or Stop instruction the step returned. None otherwise.
+        """
+        return steps_runner.run_pipeline_steps(steps=[step])
 
     def run_step_group(self, step_group_name, raise_stop=False):
-        """Get the specified step group from the pipeline and run its steps."""
+        """Get the specified step group from the pipeline and run its steps.
+
+        If the step-group is a mapping, runs its steps by their needs. See
+        pypyr.dag for the yaml.
+
+        Steps hand over control by returning or by raising a Jump or Stop
+        instruction. Either way, this dispatches it: Jump runs its groups,
+        StopStepGroup ends this group & other Stops raise to the caller.
+        """
         logger.debug("starting %s", step_group_name)
         assert step_group_name
 
         steps = self.get_pipeline_steps(step_group=step_group_name)
 
         try:
-            self.run_pipeline_steps(steps=steps)
-        except Jump as jump:
-            logger.debug("jump: jumping to %s", jump.groups)
-            self.run_step_groups(groups=jump.groups,
-                                 success_group=jump.success_group,
-                                 failure_group=jump.failure_group)
-            logger.debug("jump: done jumping to %s", jump.groups)
-        except StopStepGroup:
+            if isinstance(steps, Mapping):
+                if 'steps' not in steps:
+                    raise PipelineDefinitionError(
+                        f"step-group {step_group_name} is a mapping, so it "
+                        "needs a steps: sequence.")
+
+                instruction = self.run_dag_steps(
+                    steps=steps['steps'] or [],
+                    max_workers=get_max_workers(
+                        self.context.get_formatted_value(
+                            steps.get('parallel', True))))
+            else:
+                instruction = self.run_pipeline_steps(steps=steps)
+        except (Jump, StopStepGroup) as raised:
+            # backwards compatible path for steps that raise instructions.
+            instruction = raised
+
+        if isinstance(instruction, Jump):
+            logger.debug("jump: jumping to %s", instruction.groups)
+            self.run_step_groups(groups=instruction.groups,
+                                 success_group=instruction.success_group,
+                                 failure_group=instruction.failure_group)
+            logger.debug("jump: done jumping to %s", instruction.groups)
+        elif isinstance(instruction, StopStepGroup):
             logger.debug("StopStepGroup: stopped %s", step_group_name)
             if raise_stop:
-                raise
+                raise instruction
+        elif isinstance(instruction, Stop):
+            # Stop & StopPipeline end more than this group, so the pipeline
+            # runner handles those.
+            raise instruction
 
         logger.debug("done %s", step_group_name)
 
-    def run_step_groups(self, groups, success_group, failure_group):
+    def run_step_groups(self, groups, success_group, failure_group,
+                        timeout=None):
         """Run stepgroups specified, with the success and failure handlers.
 
+        With timeout, groups & success_group run on their own thread under
+        the time limit, but failure_group runs on this thread. So when the
+        time runs out, failure_group still runs, rather than stop straight
+        away because its work cancelled. See pypyr.utils.cancel.
+
         Args:
             groups: (list) list of step-group names to run.
             success_group: (str) name of group to run on successful completion
                            of groups.
             failure_group: (str) name of group to run on error
+            timeout: (float) Seconds groups & success_group may run, before
+                     they fail with TimeoutExpiredError. None means no limit.
 
         Returns:
             None
@@ -160,19 +341,18 @@ def run_step_groups(self, groups, success_group, failure_group):
             raise ValueError("you must specify which step-groups you want to "
                              "run. groups is None.")
         try:
-            # run main steps
-            for step_group in groups:
-                self.run_step_group(step_group)
+            add_resources(self.pipeline.get('resources', None),
+                          getattr(self.context, 'working_dir', None))
 
-            # if nothing went wrong, run on_success
-            if success_group:
-                logger.debug(
-                    "pipeline steps complete. Running %s steps now.",
-                    success_group)
-                self.run_step_group(success_group)
+            if timeout is None:
+                self._run_groups(groups, success_group)
             else:
-                logger.debug(
-                    "pipeline steps complete. No success group specified.")
+                run_with_timeout(
+                    timeout,
+                    f"pipeline {getattr(self.context, 'pipeline_name', None)}",
+                    self._run_groups,
+                    groups,
+                    success_group)
         except (ControlOfFlowInstruction, Stop):
             # Control-of-Flow/Stop are instructions to go somewhere
             # else, not errors per se.
@@ -202,3 +382,19 @@ def run_step_groups(self, groups, success_group, failure_group):
                 raise
 
         logger.debug("done")
+
+    def _run_groups(self, groups, success_group):
+        """Run groups, then success_group if nothing went wrong."""
+        # run main steps
+        for step_group in groups:
+            self.run_step_group(step_group)
+
+        # if nothing went wrong, run on_success
+        if success_group:
+            logger.debug(
+                "pipeline steps complete. Running %s steps now.",
+                success_group)
+            self.run_step_group(success_group)
+        else:
+            logger.debug(
+                "pipeline steps complete. No success group specified.")
@@ -0,0 +1,245 @@
+"""Time limits for steps & pipelines, with cooperative cancellation.
+
+Python can't stop a thread from the outside, so run_with_timeout runs the
+work on its own thread & waits for it for at most the time limit. When the
+time runs out, the caller gets TimeoutExpiredError straight away & the work's
+CancelToken cancels. The work doesn't stop by force, but cancelling tells it
+to stop:
+    - pypyr.steps.dsl.cmd kills the subprocesses it started.
+    - the steps runner doesn't start any more steps.
+    - custom steps that loop or wait can call check_cancelled(), or use
+      get_remaining() to bound their own waits.
+
+Timeouts nest. Work with a timeout inside other work with a timeout stops at
+whichever deadline comes first, and cancelling the outer work cancels the
+inner work too.
+"""
+import logging
+import threading
+import time
+from pypyr.errors import TimeoutExpiredError
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+# the CancelToken of the work running on each thread.
+_local = threading.local()
+
+
+class CancelToken():
+    """Tells work running under a time limit that it should stop.
+
+    Attributes:
+        deadline: (float) time.monotonic() value when the time runs out. None
+                  means no time limit.
+        expired_reason: (str) Why the work has to stop when deadline passes.
+                        When the deadline is parent's, so is the reason.
+        parent: (CancelToken) Token of the enclosing work. Cancelling parent
+                cancels this token too.
+        reason: (str) Why the token cancelled. None if it hasn't.
+    """
+
+    __slots__ = ('deadline', 'expired_reason', 'parent', 'reason',
+                 '_callbacks', '_lock')
+
+    def __init__(self, timeout=None, parent=None, expired_reason=None):
+        """Initialize the token.
+
+        Args:
+            timeout: float. Seconds from now until the time runs out. None
+                     means no time limit of its own.
+            parent: CancelToken. Token of the enclosing work. This token's
+                    deadline is never later than parent's.
+            expired_reason: str. Why the work has to stop when its own
+                            timeout runs out.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if parent is not None and parent.deadline is not None:
+            if deadline is None or parent.deadline <= deadline:
+                # the enclosing work's time runs out 1st, so say so.
+                deadline = parent.deadline
+                expired_reason = parent.expired_reason
+
+        self.deadline = deadline
+        self.expired_reason = expired_reason
+        self.parent = parent
+        self.reason = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """Call callback() when the token cancels.
+
+        Calls callback straight away if the token cancelled already.
+        """
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+
+        callback()
+
+    def cancel(self, reason):
+        """Cancel the token & call its callbacks. Only the 1st cancel counts.
+
+        Args:
+            reason: str. Why the work has to stop.
+        """
+        with self._lock:
+            if self.reason is not None:
+                return
+
+            self.reason = reason
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        logger.debug("cancelled: %s", reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as err:
+                # 1 bad callback mustn't stop the others from cleaning up.
+                logger.error("cancel callback failed. %s: %s",
+                             type(err).__name__, err)
+
+    def check(self):
+        """Raise TimeoutExpiredError if the token cancelled."""
+        if self.reason is not None:
+            raise TimeoutExpiredError(self.reason)
+
+    def get_remaining(self):
+        """Get seconds left until the deadline. None if no deadline."""
+        if self.deadline is None:
+            return None
+
+        return max(self.deadline - time.monotonic(), 0)
+
+    def remove_callback(self, callback):
+        """Stop callback from being called when the token cancels."""
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                # cancel already took it.
+                pass
+
+
+def check_cancelled():
+    """Raise TimeoutExpiredError if the work on this thread cancelled.
+
+    Long-running custom steps can call this in their loops to stop when
+    their time runs out.
+    """
+    token = get_token()
+    if token is not None:
+        token.check()
+
+
+def get_remaining():
+    """Get seconds left for the work on this thread. None if no limit.
+
+    Custom steps can use this to bound their own waits, like a network
+    call's timeout.
+    """
+    token = get_token()
+    return None if token is None else token.get_remaining()
+
+
+def get_token():
+    """Get the CancelToken of the work on this thread. None if none."""
+    return getattr(_local, 'token', None)
+
+
+def run_with_timeout(timeout, name, function, *args, **kwargs):
+    """Run function(*args, **kwargs), but give up on it after timeout.
+
+    function runs on its own thread with a CancelToken, which cancels when
+    the time runs out. The thread doesn't stop by force - see the module
+    docstring for what does stop.
+
+    Args:
+        timeout: float. Seconds function may take.
+        name: str. What's running, for the error message. Like 'step arb'.
+        function: callable. Run this.
+        *args: Positional arguments for function.
+        **kwargs: Keyword arguments for function.
+
+    Returns:
+        What function returned.
+
+    Raises:
+        TimeoutExpiredError: function didn't finish in time.
+        Anything function raised.
+    """
+    parent = get_token()
+    token = CancelToken(timeout,
+                        parent,
+                        f"{name} didn't finish within its {timeout}s timeout.")
+    outcome = {}
+    done = threading.Event()
+
+    def run():
+        _local.token = token
+        try:
+            outcome['result'] = function(*args, **kwargs)
+        except BaseException as err:
+            outcome['error'] = err
+        finally:
+            done.set()
+
+    if parent is not None:
+        # wake up to cancel this work too when the enclosing work cancels.
+        parent.add_callback(done.set)
+
+    # daemon, so a thread stuck for good doesn't keep the process alive.
+    thread = threading.Thread(target=run, name=f'pypyr {name}', daemon=True)
+    logger.debug("running %s with %ss timeout", name, timeout)
+
+    try:
+        thread.start()
+        done.wait(token.get_remaining())
+    finally:
+        if parent is not None:
+            parent.remove_callback(done.set)
+
+        if not outcome:
+            # still running. also on KeyboardInterrupt, so subprocesses
+            # don't outlive the pipeline.
+            if parent is not None and parent.reason is not None:
+                reason = parent.reason
+            elif token.get_remaining() == 0:
+                reason = token.expired_reason
+            else:
+                reason = f"{name} interrupted."
+
+            token.cancel(reason)
+
+    if 'error' in outcome:
+        raise outcome['error']
+
+    if 'result' not in outcome:
+        raise TimeoutExpiredError(token.reason)
+
+    return outcome['result']
+
+
+def run_with_token(token, function, *args, **kwargs):
+    """Run function(*args, **kwargs) on this thread as work of token.
+
+    Use this to carry a step's CancelToken over to threads it starts.
+
+    Args:
+        token: CancelToken. None means no token.
+        function: callable. Run this.
+        *args: Positional arguments for function.
+        **kwargs: Keyword arguments for function.
+
+    Returns:
+        What function returned.
+    """
+    previous = get_token()
+    _local.token = token
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _local.token = previous
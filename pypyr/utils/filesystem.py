@@ -1,5 +1,6 @@
 """Utility functions for file system operations. Read, format files, write."""
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 import glob
 from itertools import chain
 import json
@@ -404,6 +405,39 @@ def ensure_dir(path):
     os.makedirs(os.path.abspath(os.path.dirname(path)), exist_ok=True)
 
 
+@contextmanager
+def open_atomic(path, mode='w'):
+    """Open a temp file for writing, then replace path with it when done.
+
+    The temp file is in the same directory as path, so the replace is an
+    atomic rename. Readers of path never see a partially written file. If
+    anything goes wrong while writing, removes the temp file & leaves path as
+    it was.
+
+    Creates all parent directories of path if they don't exist.
+
+    Args:
+        path: str or path-like. Destination file.
+        mode: str. Open temp file in this mode. Defaults 'w'.
+
+    Yields:
+        The open temp file object.
+    """
+    ensure_dir(path)
+    with NamedTemporaryFile(mode=mode,
+                            dir=os.path.abspath(os.path.dirname(path)),
+                            delete=False) as outfile:
+        try:
+            yield outfile
+        except BaseException:
+            outfile.close()
+            os.remove(outfile.name)
+            raise
+
+    logger.debug("moving temp file to: %s", path)
+    move_temp_file(outfile.name, path)
+
+
 def get_glob(path):
     """Process the input path, applying globbing and formatting.
 
@@ -0,0 +1,632 @@
+"""Utility functions to parse parts of large json documents on demand.
+
+These work directly on the raw bytes of a json document, which can be a
+bytes object or a read-only mmap of the file. The scanner only finds where
+values start and end, so you only get the parsed subtree you asked for.
+
+To find where a value ends, the scanner parses it with the stdlib's C json
+decoder from a decoded window of the buffer & throws the result away. That's
+a lot faster than walking the json in python, but it isn't free: skipping a
+value costs about as much as json.loads of it. The scanner stops as soon as
+it found what you asked for, so what comes after costs nothing.
+
+Windows are bounded, so memory stays bounded too. An array or object that
+doesn't fit in a window is cut off at a member boundary & the C decoder skips
+the members before the cut in 1 go, a window at a time.
+
+So select is faster than json.loads when the values you want come before the
+bulk of the document, or when the parsed document wouldn't fit in memory.
+Lazy arrays parse each item once to find where it ends, so scanning one takes
+about as long as json.loads of the array: the win is memory, not time. See
+tests/common/jsonbench.py to time both on your machine.
+"""
+from array import array
+from collections.abc import Mapping
+import json
+import re
+
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SCALAR = re.compile(rb'[^ \t\n\r,:\[\]{}"]+')
+
+_OPENERS = (b'[', b'{')
+
+# json whitespace is only these 4 characters - rfc 8259 section 2.
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# what comes after an array item or object member.
+_DELIMITER = re.compile(r'[ \t\n\r]*([,\]}])')
+_SEPARATOR = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+_TEXT_OPENERS = ('[', '{')
+# what can come after a value in valid json.
+_FOLLOWERS = frozenset(' \t\n\r,:]}')
+
+_DECODER = json.JSONDecoder()
+# bytes of the buffer to decode at a time. 4x for values that don't fit.
+_WINDOW = 1 << 16
+
+
+def get_pointer_tokens(pointer):
+    """Split a json pointer into its unescaped reference tokens.
+
+    Uses rfc 6901 escapes: ~1 is /, ~0 is ~.
+
+    Args:
+        pointer (str): json pointer, like '/root/child/0'. '' is the document.
+
+    Returns:
+        list of str tokens. [] for the whole document.
+
+    Raises:
+        ValueError: pointer isn't '' and doesn't start with /.
+
+    """
+    if pointer == '':
+        return []
+
+    if not pointer.startswith('/'):
+        raise ValueError(
+            f"json pointer {pointer} must be '' or start with /.")
+
+    return [token.replace('~1', '/').replace('~0', '~')
+            for token in pointer[1:].split('/')]
+
+
+def get_by_pointer(obj, pointer):
+    """Get the value at json pointer from already parsed obj.
+
+    Args:
+        obj: dict/list structure parsed from json or yaml.
+        pointer (str): json pointer, like '/root/child/0'.
+
+    Returns:
+        Value at pointer.
+
+    Raises:
+        KeyError: Nothing at pointer in obj.
+
+    """
+    current = obj
+    for token in get_pointer_tokens(pointer):
+        try:
+            if isinstance(current, list):
+                current = current[_get_index(token, pointer)]
+            else:
+                current = current[token]
+        except (IndexError, KeyError, TypeError):
+            raise KeyError(f"{pointer} not found.") from None
+
+    return current
+
+
+def find_pointer(buffer, pointer):
+    """Find where the value at json pointer is in buffer without parsing it.
+
+    Only scans as far into each container as it needs to find the pointer's
+    next token. When an object has duplicate keys, the first one wins.
+
+    Args:
+        buffer (bytes-like): raw json document. bytes or mmap.
+        pointer (str): json pointer, like '/root/child/0'.
+
+    Returns:
+        tuple (start, end) of the value at pointer in buffer.
+
+    Raises:
+        KeyError: Nothing at pointer in buffer.
+        ValueError: buffer isn't valid json where the scanner looked.
+
+    """
+    return _find_start(buffer, pointer).skip()
+
+
+def get_selection(select):
+    """Get {key: pointer} dict from a select input.
+
+    Args:
+        select (str, list or dict): A single json pointer, a list of json
+            pointers, or a dict of {key: pointer}. For a str or list, the key
+            is the last token of each pointer, so /root/child is child.
+
+    Returns:
+        dict of {key: pointer}.
+
+    Raises:
+        ValueError: list contains '', which has no last token for a key.
+
+    """
+    if isinstance(select, Mapping):
+        return select
+
+    if isinstance(select, str):
+        select = [select]
+
+    selection = {}
+    for pointer in select:
+        tokens = get_pointer_tokens(pointer)
+        if not tokens:
+            raise ValueError(
+                "select list can't contain the whole document pointer ''. "
+                "Use a dict like {myKey: ''} instead.")
+        selection[tokens[-1]] = pointer
+
+    return selection
+
+
+def iter_array(buffer, start):
+    """Yield (start, end) of each item in the json array at start.
+
+    Args:
+        buffer (bytes-like): raw json document. bytes or mmap.
+        start (int): index of the array's opening [ in buffer.
+
+    Yields:
+        tuple (start, end) of each item in the array.
+
+    Raises:
+        ValueError: buffer doesn't have a valid json array at start.
+
+    """
+    _expect(buffer, start, b'[')
+    yield from _Cursor(buffer, start + 1).iter_spans()
+
+
+def iter_object(buffer, start):
+    """Yield (key, start, end) of each member in the json object at start.
+
+    Args:
+        buffer (bytes-like): raw json document. bytes or mmap.
+        start (int): index of the object's opening { in buffer.
+
+    Yields:
+        tuple (key, start, end), where key is the parsed str key & start/end
+        is where its (unparsed) value is in the buffer.
+
+    Raises:
+        ValueError: buffer doesn't have a valid json object at start.
+
+    """
+    _expect(buffer, start, b'{')
+    cursor = _Cursor(buffer, start + 1)
+    for key in cursor.iter_members(is_object=True):
+        value_start, value_end = cursor.skip()
+        yield key, value_start, value_end
+
+
+def load_pointer(buffer, pointer='', is_lazy=False):
+    """Parse only the value at json pointer in buffer.
+
+    Args:
+        buffer (bytes-like): raw json document. bytes or mmap.
+        pointer (str): json pointer, like '/root/child/0'. Defaults to ''.
+        is_lazy (bool): If value at pointer is an array, return a
+            LazyJsonArray that parses each item only when you ask for it.
+
+    Returns:
+        Parsed value at pointer.
+
+    Raises:
+        KeyError: Nothing at pointer in buffer.
+        ValueError: buffer isn't valid json where the scanner looked.
+
+    """
+    cursor = _find_start(buffer, pointer)
+    if is_lazy and cursor.peek() == '[':
+        return LazyJsonArray(buffer, cursor.position)
+
+    if not pointer:
+        # the whole document, so nothing to scan for. slice because
+        # json.loads won't take an mmap directly.
+        return json.loads(buffer[cursor.position:])
+
+    return cursor.scan()
+
+
+def scan_value(buffer, start):
+    """Find where the json value beginning at start ends.
+
+    Strings & scalars are skipped in a single regex match. Arrays & objects
+    are parsed by the C json decoder to find where they end.
+
+    Args:
+        buffer (bytes-like): raw json document. bytes or mmap.
+        start (int): index of the first character of the value.
+
+    Returns:
+        int index 1 past the end of the value.
+
+    Raises:
+        ValueError: No valid json value at start.
+
+    """
+    first = buffer[start:start + 1]
+    if first == b'"':
+        match = _STRING.match(buffer, start)
+        if not match:
+            raise ValueError(f"unterminated json string at {start}.")
+        return match.end()
+
+    if first in _OPENERS:
+        return _Cursor(buffer, start).skip()[1]
+
+    match = _SCALAR.match(buffer, start)
+    if not match:
+        raise ValueError(f"expected json value at {start}.")
+
+    return match.end()
+
+
+def _expect(buffer, position, token):
+    """Raise ValueError if token isn't at position in buffer."""
+    if buffer[position:position + 1] != token:
+        raise ValueError(
+            f"expected {token.decode()} at {position} in json.")
+
+
+def _find_start(buffer, pointer):
+    """Get a cursor at the start of the value at pointer.
+
+    Skips the members before each of the pointer's tokens, but doesn't scan
+    the value itself, so the caller only scans it once.
+
+    Returns:
+        _Cursor just before the value at pointer.
+
+    """
+    cursor = _Cursor(buffer, 0)
+
+    for token in get_pointer_tokens(pointer):
+        opener = cursor.peek()
+        if opener == '{':
+            is_object = True
+        elif opener == '[':
+            is_object = False
+            index = _get_index(token, pointer)
+        else:
+            raise KeyError(f"{pointer} not found.")
+
+        cursor.expect(opener)
+        for i, key in enumerate(cursor.iter_members(is_object)):
+            if (key == token) if is_object else (i == index):
+                break
+
+            cursor.skip()
+        else:
+            raise KeyError(f"{pointer} not found.")
+
+    return cursor
+
+
+def _get_index(token, pointer):
+    """Get token as an array index. Raise KeyError if it isn't one."""
+    if not token.isdigit():
+        raise KeyError(f"{pointer} not found.")
+
+    return int(token)
+
+
+class LazyJsonArray():
+    """Read-only sequence over a json array that parses items on demand.
+
+    Scanning the array once records where each item starts & ends, so the
+    memory cost is 2 ints per item until you actually ask for an item. Each
+    time you access an item it's parsed fresh from the buffer, so mutating an
+    item you got doesn't change the LazyJsonArray.
+
+    Supports len(), iteration, indexing & slicing, so you can use it as
+    the input for foreach.
+
+    Deliberately not a collections.abc.Sequence, so that the pypyr formatter
+    passes it through as is rather than parsing & copying every item.
+
+    Pickling or deep-copying a LazyJsonArray gives you a plain list with all
+    items parsed.
+    """
+
+    __slots__ = ('_buffer', '_starts', '_ends')
+
+    def __init__(self, buffer, start=0):
+        """Scan the json array at start in buffer.
+
+        Args:
+            buffer (bytes-like): raw json document. bytes or mmap.
+            start (int): index of the array's opening [ in buffer.
+
+        Raises:
+            ValueError: buffer doesn't have a valid json array at start.
+
+        """
+        self._buffer = buffer
+        self._starts = array('q')
+        self._ends = array('q')
+        for item_start, item_end in iter_array(buffer, start):
+            self._starts.append(item_start)
+            self._ends.append(item_end)
+
+    def __getitem__(self, index):
+        """Parse & return the item at index. Slices return a list."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        return json.loads(
+            self._buffer[self._starts[index]:self._ends[index]])
+
+    def __iter__(self):
+        """Parse & yield each item in turn."""
+        buffer = self._buffer
+        for start, end in zip(self._starts, self._ends):
+            yield json.loads(buffer[start:end])
+
+    def __len__(self):
+        """Get count of items in the array."""
+        return len(self._starts)
+
+    def __reduce__(self):
+        """Pickle & deepcopy as a plain list."""
+        return (list, (list(self),))
+
+    def __repr__(self):
+        """Show item count without parsing the items."""
+        return f'<{type(self).__name__} of {len(self)} items>'
+
+
+class _Cursor():
+    """Move forward through a json buffer on decoded windows of it.
+
+    The C json decoder only takes str, so the cursor decodes a window of the
+    buffer at a time. Windows start at _WINDOW bytes & only grow for a value
+    that doesn't fit.
+    """
+
+    __slots__ = ('_buffer', '_base', '_size', '_text', '_index', '_is_ascii',
+                 '_is_last', '_mark_index', '_mark')
+
+    def __init__(self, buffer, position):
+        """Start the cursor at byte index position in buffer."""
+        self._buffer = buffer
+        self._load(position, _WINDOW)
+
+    @property
+    def position(self):
+        """Get the cursor's byte index in buffer."""
+        return self._get_position(self._index)
+
+    def expect(self, token):
+        """Move past token after any whitespace. Raise ValueError if not."""
+        if self.peek() != token:
+            raise ValueError(
+                f"expected {token} at {self.position} in json.")
+
+        self._index += 1
+
+    def iter_members(self, is_object=False):
+        """Yield each member of an array or object, from just after its [ or {.
+
+        Each time it yields, the cursor is at the member's value. Skip past
+        the value before you get the next member. Ends just after the ] or }.
+
+        Yields:
+            str key for an object, None for an array.
+
+        """
+        closer = '}' if is_object else ']'
+        if self.peek() == closer:
+            self._index += 1
+            return
+
+        while True:
+            key = None
+            if is_object:
+                if self.peek() != '"':
+                    raise ValueError(
+                        f'expected " at {self.position} in json.')
+
+                key = self.scan()
+                self.expect(':')
+
+            yield key
+
+            match = _DELIMITER.match(self._text, self._index)
+            if match and match.group(1) in (',', closer):
+                self._index = match.end()
+                if match.group(1) == closer:
+                    return
+            elif self.peek() == closer:
+                # delimiter past the end of the window.
+                self._index += 1
+                return
+            else:
+                self.expect(',')
+
+    def iter_spans(self):
+        """Yield (start, end) byte indexes of each item of an array.
+
+        Same as iter_members & skip for each item, but without the overhead
+        for the items that fit in the window, for big arrays.
+        """
+        if self.peek() == ']':
+            self._index += 1
+            return
+
+        while True:
+            text = self._text
+            index = _WHITESPACE.match(text, self._index).end()
+            try:
+                _, end = _DECODER.raw_decode(text, index)
+            except ValueError:
+                end = len(text)
+
+            # end of the window means the item might not be all there.
+            match = _DELIMITER.match(text, end) if end < len(text) else None
+            if match and match.group(1) in (',', ']'):
+                start = self._get_position(index)
+                self._index = match.end()
+                yield start, self._get_position(end)
+                if match.group(1) == ']':
+                    return
+
+                continue
+
+            self._index = index
+            yield self.skip()
+            if self.peek() == ']':
+                self._index += 1
+                return
+
+            self.expect(',')
+
+    def peek(self):
+        """Move past whitespace & get the next character. '' at the end."""
+        while True:
+            self._index = _WHITESPACE.match(self._text, self._index).end()
+            if self._index < len(self._text) or self._is_last:
+                return self._text[self._index:self._index + 1]
+
+            self._load(self.position, _WINDOW)
+
+    def scan(self):
+        """Parse the value at the cursor & move past it.
+
+        Raises:
+            ValueError: No valid json value at the cursor.
+
+        """
+        return self._decode(is_skip=False)[0]
+
+    def skip(self):
+        """Move past the value at the cursor without keeping it.
+
+        An array or object too big for the window is skipped a window of
+        members at a time, so memory stays bounded. See _skip_members.
+
+        Returns:
+            tuple (start, end) byte indexes of the value.
+
+        Raises:
+            ValueError: No valid json value at the cursor.
+
+        """
+        _, start, end = self._decode(is_skip=True)
+        return start, end
+
+    def _decode(self, is_skip):
+        """Decode the value at the cursor & move past it.
+
+        Returns:
+            tuple (value, start, end). value is None if is_skip & the value
+            was too big to decode in 1 go.
+
+        """
+        first = self.peek()
+        start = self.position
+        while True:
+            try:
+                value, index = _DECODER.raw_decode(self._text, self._index)
+            except ValueError as err:
+                if self._is_last:
+                    raise ValueError(
+                        f"invalid json at {start}. {err.msg} at "
+                        f"{self._get_position(err.pos)}.") from None
+            else:
+                # a number can look done where the window cuts it short.
+                if self._is_last or (index < len(self._text)
+                                     and self._text[index] in _FOLLOWERS):
+                    self._index = index
+                    return value, start, self.position
+
+            if self._index:
+                # start the window at the value, so it has the most room.
+                self._load(start, self._size)
+            elif is_skip and first in _TEXT_OPENERS:
+                self._skip_members(is_object=first == '{')
+                return None, start, self.position
+            else:
+                self._load(start, self._size * 4)
+
+    def _get_position(self, index):
+        """Get the byte index in buffer of index in the decoded window.
+
+        For multi-byte characters, it counts on from the last index you asked
+        for, so asking in order is cheapest.
+        """
+        if self._is_ascii:
+            return self._base + index
+
+        if index < self._mark_index:
+            self._mark_index = 0
+            self._mark = self._base
+
+        self._mark += len(self._text[self._mark_index:index].encode(
+            'utf-8', 'surrogateescape'))
+        self._mark_index = index
+        return self._mark
+
+    def _get_separator(self):
+        """Get the text between the member before the cursor & the next one.
+
+        Includes the bracket or quote either side, if there is one, because
+        that makes it less likely to match inside a member.
+
+        Returns:
+            tuple (separator, offset of its comma). separator is None if
+            there's no next member in the window.
+
+        """
+        text = self._text
+        index = self._index
+        match = _SEPARATOR.match(text, index)
+        if not (index and match and match.end() < len(text)):
+            return None, 0
+
+        before = text[index - 1] if text[index - 1] in '"]}' else ''
+        after = text[match.end()] if text[match.end()] in '"[{' else ''
+        separator = before + match.group() + after
+        return separator, len(before) + match.group().index(',')
+
+    def _load(self, position, size):
+        """Decode size bytes of buffer from byte index position."""
+        raw = self._buffer[position:position + size]
+        # the window can end part way through a multi-byte character.
+        self._text = raw.decode('utf-8', 'surrogateescape')
+        self._base = position
+        self._index = 0
+        self._size = size
+        # 1 character per byte, so text & buffer indexes line up.
+        self._is_ascii = len(self._text) == len(raw)
+        self._is_last = position + size >= len(self._buffer)
+        self._mark_index = 0
+        self._mark = position
+
+    def _skip_members(self, is_object):
+        """Move past the array or object at the cursor a window at a time.
+
+        Cuts the window's text off at the last separator like the one between
+        the 1st 2 members & closes it, so the C decoder skips all the members
+        before the cut in 1 go. A cut that lands inside a member doesn't
+        parse, so then skip members 1 at a time to past the cut & try again
+        in the next window.
+        """
+        # a dummy key, because the cut text starts at the 1st member's value.
+        opener, closer = ('{"": ', '}') if is_object else ('[', ']')
+        separator, offset = None, 0
+        retry_position = -1
+        self._index += 1
+        for _ in self.iter_members(is_object):
+            if separator is not None and self.position > retry_position:
+                text = self._text
+                found = text.rfind(separator, self._index)
+                comma = found + offset
+                if found >= 0 and comma > self._index:
+                    cut = opener + text[self._index:comma] + closer
+                    try:
+                        _, end = _DECODER.raw_decode(cut)
+                    except ValueError:
+                        end = None
+
+                    if end == len(cut):
+                        self._index = comma
+                        continue
+
+                    retry_position = self._get_position(comma)
+
+            self.skip()
+            if separator is None:
+                separator, offset = self._get_separator()
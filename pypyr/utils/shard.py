@@ -0,0 +1,183 @@
+"""Split work deterministically between shards, and merge shard outputs.
+
+Run the same pipeline on COUNT machines, each with its own INDEX, like this:
+    pypyr mypipeline --shard 0/4
+    pypyr mypipeline --shard 1/4
+    ...
+
+The run saves INDEX & COUNT to context shardIndex & shardCount. Use these in
+formatting expressions, like to write each shard's output to its own file.
+
+Each run only processes its own slice of the foreach items of steps that
+have shard set. Both ways of splitting items are deterministic, so the shards
+don't need to talk to each other:
+    - stride: item at position p belongs to shard p % COUNT.
+    - hash: item belongs to shard crc32(json of item) % COUNT. An item stays in
+            the same shard even if the items before it change.
+"""
+from collections.abc import Mapping, Sequence
+from itertools import islice
+import json
+import logging
+import zlib
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ('stride', 'hash')
+
+
+class Shard():
+    """The slice of work a single run processes.
+
+    Attributes:
+        index: (int) 0 based index of this shard.
+        count: (int) Total number of shards.
+    """
+
+    __slots__ = ('index', 'count')
+
+    def __init__(self, index, count):
+        """Initialize the shard.
+
+        Args:
+            index: int. 0 based index of this shard.
+            count: int. Total number of shards.
+
+        Raises:
+            ValueError: index isn't in range for count.
+        """
+        index = int(index)
+        count = int(count)
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(
+                f"shard {index}/{count} must be INDEX/COUNT, where COUNT is "
+                "at least 1 & INDEX is 0 to COUNT - 1.")
+
+        self.index = index
+        self.count = count
+
+    def __eq__(self, other):
+        """Shards with same index & count are equal."""
+        if isinstance(other, Shard):
+            return (self.index, self.count) == (other.index, other.count)
+
+        return NotImplemented
+
+    def __repr__(self):
+        """Show as INDEX/COUNT."""
+        return f'{self.index}/{self.count}'
+
+    def __reduce__(self):
+        """Pickle with index & count."""
+        return (Shard, (self.index, self.count))
+
+    def get_items(self, items, mode='stride'):
+        """Yield only the items in this shard.
+
+        Args:
+            items: iterable. All the items across all shards.
+            mode: str. stride or hash. True is stride.
+
+        Yields:
+            Each item in items that belongs to this shard.
+
+        Raises:
+            ValueError: mode isn't stride or hash.
+        """
+        if mode is True:
+            mode = 'stride'
+
+        if mode == 'stride':
+            if (isinstance(items, Sequence)
+                    or (hasattr(items, '__getitem__')
+                        and hasattr(items, '__len__')
+                        and not isinstance(items, Mapping))):
+                # index directly, so lazy sequences only load this shard's.
+                for i in range(self.index, len(items), self.count):
+                    yield items[i]
+            else:
+                yield from islice(items, self.index, None, self.count)
+        elif mode == 'hash':
+            for item in items:
+                if get_item_hash(item) % self.count == self.index:
+                    yield item
+        else:
+            raise ValueError(f"shard mode must be one of {SHARD_MODES}. "
+                             f"Instead, it's {mode}.")
+
+
+def get_item_hash(item):
+    """Get a hash for item that is the same in every process & machine.
+
+    Python's own hash() is salted per process for str, so it won't do.
+
+    Args:
+        item: json serializable object. Anything else hashes on its str.
+
+    Returns:
+        int. crc32 of item's json.
+    """
+    return zlib.crc32(json.dumps(item,
+                                 sort_keys=True,
+                                 default=str).encode('utf-8'))
+
+
+def get_shard(shard):
+    """Get a Shard from INDEX/COUNT str input.
+
+    Args:
+        shard: str like '1/4', a tuple (1, 4), a Shard or None.
+
+    Returns:
+        Shard. None if shard is None.
+
+    Raises:
+        ValueError: shard isn't INDEX/COUNT.
+    """
+    if shard is None or isinstance(shard, Shard):
+        return shard
+
+    if isinstance(shard, str):
+        parts = shard.split('/')
+        if len(parts) != 2:
+            raise ValueError(f"shard {shard} must be INDEX/COUNT, like 0/4.")
+        return Shard(*parts)
+
+    return Shard(*shard)
+
+
+def merge_json_files(paths):
+    """Merge the json documents at paths into a single document.
+
+    Use this to combine what each shard wrote with fileWriteJson. Lists
+    concatenate in the order of paths. Mappings merge, so later paths
+    overwrite the same keys from earlier paths.
+
+    Args:
+        paths: iterable of path-like. All must contain lists, or all mappings.
+
+    Returns:
+        list or dict. The merged document. None if no paths.
+
+    Raises:
+        TypeError: documents aren't all lists or all mappings.
+    """
+    merged = None
+    for path in paths:
+        logger.debug("merging %s", path)
+        with open(path, encoding='utf-8') as json_file:
+            document = json.load(json_file)
+
+        if merged is None and isinstance(document, (list, dict)):
+            merged = document
+        elif isinstance(merged, list) and isinstance(document, list):
+            merged.extend(document)
+        elif isinstance(merged, dict) and isinstance(document, dict):
+            merged.update(document)
+        else:
+            raise TypeError(
+                "can only merge json that is all arrays or all objects. "
+                f"{path} is a {type(document).__name__}.")
+
+    return merged
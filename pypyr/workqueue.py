@@ -0,0 +1,295 @@
+"""Run pype child pipelines as jobs on a work queue, in worker processes.
+
+pypyr.steps.pype with a queue puts a job on the queue, rather than running
+the child pipeline itself. Workers take jobs off the queue, run them & save
+each job's result back to the queue. Start as many workers as you like on the
+same queue:
+    pypyr-worker path/to/queue.db
+
+Workers are long-running, so the pipeline, step & parser caches stay warm
+from one job to the next.
+
+The parent pipeline waits for its job's result, or with pype wait: False it
+carries on & collects the results later with pypyr.steps.pypewait.
+
+The default backend is pypyr.queues.sqlitequeue, which needs nothing but a
+file all the workers can reach. To plug in a different backend, use the
+absolute name of a module with a get_queue(location) function that returns
+an object with these methods:
+    put(job) -> job id. job is a dict.
+    claim(worker) -> (job id, job) for the oldest waiting job. None if there
+        are no waiting jobs. No 2 workers may claim the same job.
+    complete(job_id, worker, result) -> bool. result is a dict. Only saves
+        result if worker still holds the job. False if it doesn't.
+    renew(job_id, worker) -> bool. Renew worker's claim on a running job.
+        False if the worker doesn't hold the job anymore. A job whose claim
+        isn't renewed in time goes back on the queue, so a job whose worker
+        dies runs on another worker.
+    get_result(job_id) -> result dict. None if the job isn't done yet.
+"""
+from contextlib import contextmanager
+import logging
+import os
+import socket
+import threading
+import time
+from pypyr.context import Context
+from pypyr.errors import LoopMaxExhaustedError, QueueJobError
+import pypyr.moduleloader
+import pypyr.pipelinerunner
+from pypyr.utils.cancel import check_cancelled
+
+# logger means the log level will be set correctly
+logger = logging.getLogger(__name__)
+
+# work queue in a SQLite file when no backend specified.
+DEFAULT_BACKEND = 'pypyr.queues.sqlitequeue'
+
+# seconds between checks for new jobs or results.
+DEFAULT_INTERVAL = 0.25
+
+# seconds between renewals of a running job's claim.
+RENEW_INTERVAL = 10
+
+
+def get_queue(location, backend=None):
+    """Get the work queue at location from backend.
+
+    Args:
+        location: str or path-like. Where the queue is, as backend
+            understands it. For the default backend, the SQLite file path.
+        backend: str. Absolute name of the queue backend module. Defaults to
+            pypyr.queues.sqlitequeue.
+
+    Returns:
+        The queue object.
+    """
+    if not backend:
+        backend = DEFAULT_BACKEND
+
+    logger.debug("getting queue %s from %s", location, backend)
+    return pypyr.moduleloader.get_module(backend).get_queue(location)
+
+
+def get_worker_name():
+    """Get a name for this worker that is unique across processes & hosts."""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def get_error_result(error):
+    """Get the result dict for a job that raised error."""
+    return {'error': {'name': type(error).__name__,
+                      'description': str(error)}}
+
+
+@contextmanager
+def renewing_claim(queue, job_id, worker, interval=RENEW_INTERVAL):
+    """Renew worker's claim on job_id every interval seconds in the with block.
+
+    Args:
+        queue: The work queue the job is on.
+        job_id: The job id.
+        worker: str. Name of the worker that claimed the job.
+        interval: float. Seconds between renewals.
+    """
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(interval):
+            try:
+                if not queue.renew(job_id, worker):
+                    logger.warning(
+                        "worker %s lost its claim on job %s, so another "
+                        "worker might run it too.", worker, job_id)
+                    return
+            except Exception as err:
+                # try again next interval, the queue might be busy.
+                logger.error("Couldn't renew claim on job %s. %s: %s",
+                             job_id, type(err).__name__, err)
+
+    thread = threading.Thread(target=renew,
+                              name=f'pypyr renew job {job_id}',
+                              daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job, working_dir=None):
+    """Run the child pipeline for job.
+
+    Args:
+        job: dict. Job as pypyr.steps.pype put it on the queue.
+        working_dir: path-like. Run the job from here. Defaults to the
+            parent pipeline's working dir.
+
+    Returns:
+        dict. Success has the child context values the parent wants:
+            {'out': {'parent-key': 'value from child context'}}
+
+        Failure has the error instead:
+            {'error': {'name': 'ValueError', 'description': 'error message'}}
+    """
+    pipeline_name = job['pipeline_name']
+    args = job['args']
+    context = Context(args) if args else Context()
+
+    try:
+        pypyr.pipelinerunner.prepare_and_run(
+            pipeline_name=pipeline_name,
+            working_dir=working_dir if working_dir else job['working_dir'],
+            pipeline_context_input=job['pipe_arg'],
+            context=context,
+            parse_input=not job['skip_parse'],
+            loader=job['loader'],
+            groups=job['groups'],
+            success_group=job['success_group'],
+            failure_group=job['failure_group'])
+
+        out = job['out']
+        return {'out': {parent_key: context.get_formatted(child_key)
+                        for parent_key, child_key in out.items()}
+                if out else {}}
+    except Exception as err:
+        logger.error("Something went wrong running %s job. %s: %s",
+                     pipeline_name, type(err).__name__, err)
+        return get_error_result(err)
+
+
+def run_worker(location,
+               backend=None,
+               working_dir=None,
+               interval=DEFAULT_INTERVAL,
+               max_jobs=None,
+               is_stop_when_empty=False):
+    """Run jobs from the work queue at location, one after the other.
+
+    A job that fails doesn't stop the worker. The job's result contains the
+    error instead.
+
+    Args:
+        location: str or path-like. Where the queue is.
+        backend: str. Absolute name of the queue backend module. Defaults to
+            pypyr.queues.sqlitequeue.
+        working_dir: path-like. Run all jobs from here. Defaults to each
+            job's parent pipeline working dir.
+        interval: float. Seconds to wait before checking for new jobs when
+            the queue is empty.
+        max_jobs: int. Stop after this many jobs. Defaults to no limit.
+        is_stop_when_empty: bool. Stop when there are no waiting jobs, rather
+            than waiting for more.
+
+    Returns:
+        int. Count of jobs the worker ran.
+    """
+    queue = get_queue(location, backend)
+    worker = get_worker_name()
+    logger.info("worker %s started on %s.", worker, location)
+
+    job_count = 0
+    while max_jobs is None or job_count < max_jobs:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            if is_stop_when_empty:
+                break
+
+            time.sleep(interval)
+            continue
+
+        job_id, job = claimed
+        logger.info("worker %s running %s job %s.",
+                    worker, job['pipeline_name'], job_id)
+
+        with renewing_claim(queue, job_id, worker):
+            result = run_job(job, working_dir)
+
+        result['pipeline_name'] = job['pipeline_name']
+        result['worker'] = worker
+        try:
+            is_saved = queue.complete(job_id, worker, result)
+        except Exception as err:
+            # the out values didn't serialize. fail the job, not the worker.
+            logger.error("Couldn't save result of job %s. %s: %s",
+                         job_id, type(err).__name__, err)
+            error_result = get_error_result(err)
+            error_result['pipeline_name'] = job['pipeline_name']
+            error_result['worker'] = worker
+            is_saved = queue.complete(job_id, worker, error_result)
+
+        if not is_saved:
+            logger.warning(
+                "worker %s lost its claim on job %s before it finished, so "
+                "its result isn't saved.", worker, job_id)
+
+        job_count += 1
+
+    logger.info("worker %s done after %s jobs.", worker, job_count)
+    return job_count
+
+
+def wait_for_results(queue,
+                     job_ids,
+                     interval=DEFAULT_INTERVAL,
+                     timeout=None):
+    """Wait until all job_ids are done.
+
+    Args:
+        queue: The work queue the jobs are on.
+        job_ids: list of job ids.
+        interval: float. Seconds between checks for results.
+        timeout: float. Give up after this many seconds. Defaults to waiting
+            for as long as it takes.
+
+    Returns:
+        list of result dicts, in the same order as job_ids.
+
+    Raises:
+        LoopMaxExhaustedError: jobs still not done after timeout.
+        TimeoutExpiredError: the work on this thread cancelled while waiting.
+    """
+    logger.debug("waiting for jobs %s", job_ids)
+    start = time.monotonic()
+    results = {}
+    while True:
+        for job_id in job_ids:
+            if job_id not in results:
+                result = queue.get_result(job_id)
+                if result is not None:
+                    results[job_id] = result
+
+        if len(results) == len(job_ids):
+            return [results[job_id] for job_id in job_ids]
+
+        if timeout is not None and time.monotonic() - start >= timeout:
+            pending = [job_id for job_id in job_ids if job_id not in results]
+            raise LoopMaxExhaustedError(
+                f"jobs {pending} still not done after waiting {timeout} "
+                "seconds.")
+
+        check_cancelled()
+        time.sleep(interval)
+
+
+def get_out(job_id, result):
+    """Get the out values from a job's result.
+
+    Args:
+        job_id: The job id.
+        result: dict. The job's result.
+
+    Returns:
+        dict. Write these to the parent context.
+
+    Raises:
+        QueueJobError: the job failed.
+    """
+    if 'error' in result:
+        error = result['error']
+        raise QueueJobError(
+            f"{result['pipeline_name']} job {job_id} failed on worker "
+            f"{result['worker']}. {error['name']}: {error['description']}")
+
+    return result['out']
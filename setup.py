@@ -130,7 +130,8 @@
     # pip to create the appropriate form of executable for the target platform.
     entry_points={
         'console_scripts': [
-            'pypyr=pypyr.cli:main'
+            'pypyr=pypyr.cli:main',
+            'pypyr-worker=pypyr.cli:worker_main'
         ]
     },
 )
@@ -0,0 +1,109 @@
+"""Benchmark fetchJson's select & lazy modes against a full json.loads.
+
+Builds a json document with a big items array before a small summary object,
+so selecting the summary has to skip the whole array.
+
+Run it directly to print a table of timings & peak memory:
+    python -m tests.common.jsonbench --items 100000
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from timeit import default_timer as timer
+from pypyr.utils.lazyjson import load_pointer
+
+
+def get_document(items):
+    """Get json bytes with items array entries, then a summary object."""
+    return json.dumps({
+        'items': [{'id': i,
+                   'name': f'item {i} [{{"quoted"}}]',
+                   'tags': ['a', 'b', 'ü'],
+                   'nested': {'values': [i, i * 1.5, None, True]}}
+                  for i in range(items)],
+        'summary': {'total': items}}).encode()
+
+
+def time_best(func, repeat=3):
+    """Get the fastest of repeat runs of func, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = timer()
+        func()
+        seconds = timer() - start
+        if best is None or seconds < best:
+            best = seconds
+
+    return best
+
+
+def get_peak_bytes(func):
+    """Get the most memory python allocated while func ran, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def get_modes(document):
+    """Get a full load, a select past the items & a lazy items array.
+
+    Each one gets the summary total, or the last item's id for lazy, & checks
+    it got the right value.
+
+    Returns:
+        dict of {mode: function}.
+    """
+    total = json.loads(document)['summary']['total']
+
+    def full():
+        assert json.loads(document)['summary']['total'] == total
+
+    def select():
+        assert load_pointer(document, '/summary/total') == total
+
+    def lazy():
+        items = load_pointer(document, '/items', is_lazy=True)
+        assert items[-1]['id'] == total - 1
+
+    return {'full': full, 'select': select, 'lazy': lazy}
+
+
+def get_timings(document, repeat=3):
+    """Get {mode: seconds} for each of get_modes."""
+    return {mode: time_best(func, repeat)
+            for mode, func in get_modes(document).items()}
+
+
+def get_peaks(document):
+    """Get {mode: peak bytes} for each of get_modes."""
+    return {mode: get_peak_bytes(func)
+            for mode, func in get_modes(document).items()}
+
+
+def main(args=None):
+    """Print seconds & peak memory for each mode against a full load."""
+    parser = argparse.ArgumentParser(
+        description='time fetchJson select & lazy against a full load.')
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parsed_args = parser.parse_args(args)
+
+    document = get_document(parsed_args.items)
+    print(f"document: {len(document) / 1024 / 1024:.1f} MB")
+
+    timings = get_timings(document, parsed_args.repeat)
+    peaks = get_peaks(document)
+    for mode, seconds in timings.items():
+        print(f"{mode:>6}: {seconds:>8.3f}s  "
+              f"vs full: {timings['full'] / seconds:>5.2f}x  "
+              f"peak: {peaks[mode] / 1024 / 1024:>7.1f} MB")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
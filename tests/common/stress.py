@@ -0,0 +1,94 @@
+"""Stress harness that runs many pipelines at the same time on threads.
+
+Checks that every run's result is its own & measures how throughput scales
+with the number of threads. On free-threaded python 3.13+, cpu-bound runs
+should scale with cores. With the GIL, expect correct results, but no
+scaling.
+
+Run it directly to print a scaling table:
+    python -m tests.common.stress --runs 200 --work 20 --threads 1 2 4 8
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+from timeit import default_timer as timer
+import pypyr.pipelinerunner
+
+working_dir = Path(__file__).resolve().parents[1]
+
+# sum(range(200)), as the stress pipeline sums it for each foreach item.
+_ITEM_TOTAL = 19900
+
+
+def is_gil_enabled():
+    """Return True unless this is free-threaded python with the GIL off."""
+    return getattr(sys, '_is_gil_enabled', lambda: True)()
+
+
+def run_pipelines(runs, threads, work=10):
+    """Run the stress pipeline runs times on a pool of threads.
+
+    Args:
+        runs: int. How many times to run the pipeline.
+        threads: int. How many pipelines run at the same time.
+        work: int. How many cpu-bound foreach items each run does.
+
+    Returns:
+        tuple (list of Context in run order, seconds it took).
+    """
+    def run(run_id):
+        return pypyr.pipelinerunner.main_with_context(
+            pipeline_name='stress/work',
+            dict_in={'runId': run_id, 'work': work},
+            working_dir=working_dir)
+
+    start = timer()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        contexts = list(executor.map(run, range(runs)))
+
+    return contexts, timer() - start
+
+
+def assert_results(contexts, work=10):
+    """Assert that each run's result belongs to that run & only that run."""
+    for run_id, context in enumerate(contexts):
+        total = run_id * work * _ITEM_TOTAL
+        assert context['result'] == f'run {run_id}/child {run_id}/{total}', (
+            f"run {run_id} got someone else's result: {context['result']}")
+
+
+def main(args=None):
+    """Print throughput & speedup for each thread count."""
+    parser = argparse.ArgumentParser(
+        description='run pypyr pipelines concurrently on threads.')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--work', type=int, default=20)
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parsed_args = parser.parse_args(args)
+
+    print(f"python {sys.version.split()[0]}. "
+          f"GIL {'enabled' if is_gil_enabled() else 'disabled'}.")
+
+    # warm the caches, so the 1st thread count isn't paying for loading.
+    run_pipelines(1, 1, parsed_args.work)
+
+    base_seconds = None
+    for threads in parsed_args.threads:
+        contexts, seconds = run_pipelines(parsed_args.runs,
+                                          threads,
+                                          parsed_args.work)
+        assert_results(contexts, parsed_args.work)
+        if base_seconds is None:
+            base_seconds = seconds
+
+        print(f"threads: {threads:>3}  "
+              f"runs/s: {parsed_args.runs / seconds:>9.1f}  "
+              f"speedup: {base_seconds / seconds:>5.2f}x")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
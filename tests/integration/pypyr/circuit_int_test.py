@@ -0,0 +1,16 @@
+"""Retry circuit breakers. Pipelines are in ./tests/pipelines/circuit."""
+import pypyr.circuit
+import tests.common.pipeline_runner as test_pipe_runner
+
+
+def test_pipeline_retry_circuit_fails_fast():
+    """Open circuit stops retries & the next step on it fails fast."""
+    pypyr.circuit.clear()
+    try:
+        test_pipe_runner.assert_pipeline_notify_output_is(
+            'circuit/retry-circuit',
+            ["circuit int-test-db is open. stopped retrying after 3 "
+             "attempts. last error was ConnectionError: db down",
+             "3 attempts, then pypyr.errors.CircuitOpenError"])
+    finally:
+        pypyr.circuit.clear()
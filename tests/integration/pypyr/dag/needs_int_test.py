@@ -0,0 +1,27 @@
+"""Steps that run by their needs. Pipelines are in ./tests/pipelines/dag."""
+import tests.common.pipeline_runner as test_pipe_runner
+
+
+def test_pipeline_dag_needs():
+    """Dependents run after & see the output of the steps they need."""
+    pipename = 'dag/needs'
+    test_pipe_runner.assert_pipeline_notify_output_is(
+        pipename,
+        ['publish artifact & docs', 'published artifact'])
+
+
+def test_pipeline_dag_needs_fail():
+    """Failed step skips its dependents & runs on_failure."""
+    pipename = 'dag/needs-fail'
+    test_pipe_runner.assert_pipeline_raises(pipename,
+                                            ValueError,
+                                            'artifact',
+                                            ['failed with artifact'])
+
+
+def test_pipeline_dag_needs_swallow_all_errors():
+    """Swallowed errors from steps running at the same time all save."""
+    pipename = 'dag/needs-swallow'
+    test_pipe_runner.assert_pipeline_notify_output_is(
+        pipename,
+        ['AssertionError True & AssertionError True'])
@@ -1,7 +1,10 @@
 """pipelinerunner.py integration tests."""
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from pathlib import Path
 import pytest
+import sys
+import time
 from unittest.mock import call
 from pypyr import pipelinerunner
 from pypyr.cache import pipelinecache
@@ -292,3 +295,105 @@ def test_pipeline_runner_main_with_context_with_failure_handled():
                               "exist for arbcaller.")
 
 # endregion main_with_context
+
+# region run_many
+
+
+def test_pipeline_runner_run_many(pipeline_cache_reset):
+    """Run many runs each input in worker processes, in input order."""
+    results = list(pipelinerunner.run_many(
+        pipeline_name='pipelines/api/run-many',
+        contexts=({'n': n} for n in range(4)),
+        workers=2,
+        working_dir=working_dir_tests))
+
+    assert results == [
+        {'index': 0, 'context': {'n': 0, 'out': 0}},
+        {'index': 1, 'context': {'n': 1, 'out': 10}},
+        {'index': 2, 'error': {'name': 'ValueError',
+                               'description': 'n is 2'}},
+        {'index': 3, 'context': {'n': 3, 'out': 30}}]
+
+
+def test_pipeline_runner_run_many_holds_back_inputs(pipeline_cache_reset):
+    """Run many only takes inputs from contexts as results yield."""
+    taken = []
+
+    def get_contexts():
+        for n in range(200):
+            taken.append(n)
+            yield {'n': 1}
+
+    results = pipelinerunner.run_many(
+        pipeline_name='pipelines/api/run-many',
+        contexts=get_contexts(),
+        workers=2,
+        working_dir=working_dir_tests,
+        max_pending=4)
+
+    assert next(results) == {'index': 0, 'context': {'n': 1, 'out': 10}}
+    time.sleep(0.5)
+    # 4 pending + 1 result yielded + 1 waiting for room.
+    assert len(taken) <= 6
+
+    assert len(list(results)) == 199
+    assert len(taken) == 200
+
+
+def test_pipeline_runner_run_many_close_early(pipeline_cache_reset):
+    """Closing run many early stops taking inputs & shuts the pool."""
+    taken = []
+
+    def get_contexts():
+        for n in range(200):
+            taken.append(n)
+            yield {'n': 1}
+
+    results = pipelinerunner.run_many(
+        pipeline_name='pipelines/api/run-many',
+        contexts=get_contexts(),
+        workers=2,
+        working_dir=working_dir_tests,
+        max_pending=2)
+
+    next(results)
+    results.close()
+
+    assert len(taken) <= 4
+# endregion run_many
+
+# region working dir
+
+
+def test_pipeline_runner_concurrent_working_dirs(tmp_path,
+                                                 pipeline_cache_reset):
+    """Concurrent runs with different working dirs each use their own."""
+    dirs = []
+    for i in range(4):
+        working_dir = tmp_path.joinpath(f'dir{i}')
+        working_dir.mkdir()
+        working_dir.joinpath('same-name.yaml').write_text(
+            'steps:\n'
+            '  - name: pypyr.steps.contextsetf\n'
+            '    in:\n'
+            '      contextSetf:\n'
+            f'        out: {i}\n')
+        dirs.append(working_dir)
+
+    sys_path_count = len(sys.path)
+
+    def run(working_dir):
+        return pipelinerunner.main_with_context(pipeline_name='same-name',
+                                                working_dir=working_dir)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        contexts = list(executor.map(run, dirs * 5))
+
+    assert [context['out'] for context in contexts] == [0, 1, 2, 3] * 5
+    assert [context.working_dir for context in contexts] == dirs * 5
+
+    # each dir added to sys.path only once, however many runs.
+    assert len(sys.path) == sys_path_count + 4
+    for working_dir in dirs:
+        sys.path.remove(str(working_dir))
+# endregion working dir
@@ -0,0 +1,65 @@
+"""Work queue integration tests. Pipelines in ./tests/pipelines/pype/queue."""
+import multiprocessing
+from pathlib import Path
+from pypyr import pipelinerunner, workqueue
+
+working_dir = Path(Path.cwd(), 'tests')
+
+
+def start_workers(queue_path, count, **kwargs):
+    """Start count worker processes on queue_path."""
+    workers = [multiprocessing.Process(target=workqueue.run_worker,
+                                       args=(queue_path,),
+                                       kwargs=kwargs)
+               for _ in range(count)]
+    for worker in workers:
+        worker.start()
+
+    return workers
+
+
+def join_workers(workers):
+    """Wait for worker processes to finish & assert they succeeded."""
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+
+def test_pype_queue_many_workers(tmp_path):
+    """Workers in other processes run queued jobs & parent gets results."""
+    queue_path = str(tmp_path / 'queue.db')
+    context = pipelinerunner.main_with_context(
+        pipeline_name='pype/queue/parent',
+        dict_in={'queuePath': queue_path},
+        working_dir=working_dir,
+        groups=['submit'])
+
+    assert context['pypeJobs'] == [1, 2, 3, 4, 5, 6]
+
+    join_workers(start_workers(queue_path, 3, is_stop_when_empty=True))
+
+    context = pipelinerunner.main_with_context(
+        pipeline_name='pype/queue/parent',
+        dict_in=dict(context),
+        working_dir=working_dir,
+        groups=['collect'])
+
+    assert context['pypeJobs'] == []
+    assert [context[f'square{i}'] for i in range(1, 7)] == [1, 4, 9, 16,
+                                                            25, 36]
+
+
+def test_pype_queue_wait(tmp_path):
+    """Parent waits for a worker that's already running."""
+    queue_path = str(tmp_path / 'queue.db')
+    workers = start_workers(queue_path, 1, max_jobs=1, interval=0.05)
+
+    context = pipelinerunner.main_with_context(
+        pipeline_name='pype/queue/parent',
+        dict_in={'queuePath': queue_path},
+        working_dir=working_dir,
+        groups=['waited'])
+
+    join_workers(workers)
+    assert context['square'] == 49
+    assert 'pypeJobs' not in context
@@ -0,0 +1,14 @@
+"""Named resources. Pipelines are in ./tests/pipelines/resources."""
+import pypyr.resources
+import tests.common.pipeline_runner as test_pipe_runner
+
+
+def test_pipeline_acquire_limits_parallel_steps():
+    """Parallel steps that acquire the same resource take turns."""
+    pypyr.resources.clear()
+    try:
+        test_pipe_runner.assert_pipeline_notify_output_is(
+            'resources/acquire',
+            ['3 acquisitions, 2 waits'])
+    finally:
+        pypyr.resources.clear()
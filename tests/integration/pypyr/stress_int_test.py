@@ -0,0 +1,33 @@
+"""Concurrency stress tests. Pipelines in ./tests/pipelines/stress."""
+import os
+import pytest
+from pypyr.cache.pipelinecache import pipeline_cache
+from tests.common.stress import assert_results, is_gil_enabled, run_pipelines
+
+
+@pytest.fixture
+def pipeline_cache_reset():
+    """Invoke for every test function in the module."""
+    pipeline_cache.clear()
+    yield
+    pipeline_cache.clear()
+
+
+def test_stress_threads_correct(pipeline_cache_reset):
+    """Many concurrent runs on threads each get their own result."""
+    contexts, _ = run_pipelines(runs=64, threads=8, work=3)
+    assert_results(contexts, work=3)
+
+
+@pytest.mark.skipif(is_gil_enabled() or (os.cpu_count() or 1) < 4,
+                    reason="needs free-threaded python & 4+ cores.")
+def test_stress_threads_scale(pipeline_cache_reset):
+    """Cpu-bound runs on 4 threads are faster than on 1 thread."""
+    run_pipelines(runs=1, threads=1, work=20)
+    contexts, one_thread_seconds = run_pipelines(runs=32, threads=1, work=20)
+    assert_results(contexts, work=20)
+
+    contexts, four_thread_seconds = run_pipelines(runs=32, threads=4, work=20)
+    assert_results(contexts, work=20)
+
+    assert one_thread_seconds / four_thread_seconds > 2
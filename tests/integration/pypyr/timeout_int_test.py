@@ -0,0 +1,46 @@
+"""Step, retry & pipeline timeouts.
+
+Pipelines are in ./tests/pipelines/timeout.
+"""
+import logging
+import time
+from unittest.mock import call
+import pytest
+from pypyr.errors import TimeoutExpiredError
+import pypyr.pipelinerunner
+import tests.common.pipeline_runner as test_pipe_runner
+from tests.common.utils import patch_logger
+
+
+def test_pipeline_step_timeout_kills_cmd_and_retry_gives_up():
+    """Step timeout kills its cmd & retry timeout stops retrying."""
+    start = time.monotonic()
+    test_pipe_runner.assert_pipeline_raises(
+        'timeout/step-timeout',
+        TimeoutExpiredError,
+        "retry didn't succeed within its 0.3s timeout. gave up after 2 "
+        "attempts. last error was ValueError: still failing",
+        ["step pypyr.steps.cmd didn't finish within its 0.5s timeout.",
+         "retry didn't succeed within its 0.3s timeout. gave up after 2 "
+         "attempts. last error was ValueError: still failing"])
+
+    # cmd would sleep 10s if the timeout didn't kill it.
+    assert time.monotonic() - start < 5
+
+
+def test_pipeline_timeout_runs_failure_handler():
+    """Pipeline timeout kills its cmd & on_failure still runs."""
+    start = time.monotonic()
+    with patch_logger('pypyr.steps.echo', logging.NOTIFY) as mock_log:
+        with pytest.raises(TimeoutExpiredError) as err:
+            pypyr.pipelinerunner.main(
+                pipeline_name='timeout/pipeline-timeout',
+                working_dir=test_pipe_runner.working_dir,
+                timeout=0.5)
+
+    assert str(err.value) == (
+        "pipeline timeout/pipeline-timeout didn't finish within its 0.5s "
+        "timeout.")
+    assert mock_log.mock_calls == [call('failure handler ran')]
+    # cmd would sleep 5s if the timeout didn't kill it.
+    assert time.monotonic() - start < 4
@@ -0,0 +1,15 @@
+"""lazyjson.py integration tests. Benchmarks in tests/common/jsonbench.py."""
+from tests.common.jsonbench import get_document, get_peaks, get_timings
+
+
+def test_lazyjson_select_faster_than_full_load():
+    """Select past a big array takes less time than loading it all."""
+    timings = get_timings(get_document(100000), repeat=2)
+    assert timings['select'] < timings['full']
+
+
+def test_lazyjson_select_lazy_less_memory_than_full_load():
+    """Select & lazy peak memory is a fraction of loading it all."""
+    peaks = get_peaks(get_document(20000))
+    assert peaks['select'] * 10 < peaks['full']
+    assert peaks['lazy'] * 4 < peaks['full']
@@ -1,6 +1,12 @@
 """cache.py unit tests."""
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from unittest.mock import call, MagicMock
+import threading
+import time
+from unittest.mock import call, MagicMock, patch
+
+import pytest
+
 from pypyr.cache.cache import Cache
 from tests.common.utils import patch_logger
 
@@ -105,3 +111,253 @@ def inner():
     assert obj1 == 5
     assert obj2 == 9
     assert obj3 == 5
+
+
+def test_cache_none_is_valid_value():
+    """Cache a creator that returns None rather than re-creating."""
+    cache = Cache()
+    creator_mock = MagicMock(return_value=None)
+
+    assert cache.get('one', creator_mock) is None
+    assert cache.get('one', creator_mock) is None
+
+    creator_mock.assert_called_once()
+
+
+def test_cache_stats():
+    """Cache counts hits, misses & creation time."""
+    cache = Cache()
+
+    assert cache.get_stats() == {'hits': 0,
+                                 'misses': 0,
+                                 'evictions': 0,
+                                 'creation_time': 0.0,
+                                 'size': 0}
+
+    with patch('pypyr.cache.cache.timer', side_effect=[1.0, 1.5, 2.0, 4.0]):
+        cache.get('one', lambda: 1)
+        cache.get('one', lambda: 2)
+        cache.get('two', lambda: 3)
+        cache.get('one', lambda: 4)
+
+    assert cache.get_stats() == {'hits': 2,
+                                 'misses': 2,
+                                 'evictions': 0,
+                                 'creation_time': 2.5,
+                                 'size': 2}
+
+    cache.clear()
+    stats = cache.get_stats()
+    assert stats['hits'] == 2
+    assert stats['size'] == 0
+
+
+def test_cache_creator_error_not_cached():
+    """Cache doesn't save anything when creator raises."""
+    cache = Cache()
+
+    def raise_me():
+        raise ValueError('arb')
+
+    with pytest.raises(ValueError):
+        cache.get('one', raise_me)
+
+    assert cache.get('one', lambda: 'two') == 'two'
+    assert cache.get_stats()['misses'] == 2
+
+
+def test_cache_concurrent_create_same_key_once():
+    """Concurrent get on the same key only calls creator once."""
+    cache = Cache()
+    creator_mock = MagicMock(return_value='obj')
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_creator():
+        started.set()
+        release.wait(5)
+        return creator_mock()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(cache.get, 'one', slow_creator)
+        started.wait(5)
+        others = [executor.submit(cache.get, 'one', slow_creator)
+                  for _ in range(3)]
+        release.set()
+        results = [first.result()] + [f.result() for f in others]
+
+    assert results == ['obj'] * 4
+    creator_mock.assert_called_once()
+    assert cache.get_stats()['hits'] == 3
+
+
+def test_cache_slow_create_does_not_block_other_keys():
+    """A slow creator on one key doesn't block a different key."""
+    cache = Cache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_creator():
+        started.set()
+        release.wait(5)
+        return 'slow'
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = executor.submit(cache.get, 'slow', slow_creator)
+        started.wait(5)
+        # would deadlock until timeout if held the slow key's lock.
+        assert cache.get('fast', lambda: 'fast') == 'fast'
+        assert not slow.done()
+        release.set()
+        assert slow.result() == 'slow'
+
+
+def test_cache_clear_keeps_held_key_lock():
+    """Clear while creating doesn't let a 2nd thread create the same key."""
+    cache = Cache()
+    started = threading.Event()
+    release = threading.Event()
+    second_creator = MagicMock(return_value='second')
+
+    def slow_creator():
+        started.set()
+        release.wait(5)
+        return 'first'
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(cache.get, 'key', slow_creator)
+        started.wait(5)
+        cache.clear()
+        cache.invalidate('key')
+        second = executor.submit(cache.get, 'key', second_creator)
+        # the 2nd thread waits on the creator's lock rather than a new one.
+        while cache._key_locks['key'][1] < 2:
+            time.sleep(0.01)
+        release.set()
+        assert first.result() == 'first'
+        assert second.result() == 'first'
+
+    second_creator.assert_not_called()
+    assert cache._key_locks == {}
+
+
+def test_cache_key_lock_dropped_when_creator_raises():
+    """Key lock doesn't outlive a creator that raises."""
+    cache = Cache()
+
+    with pytest.raises(ValueError):
+        cache.get('key', MagicMock(side_effect=ValueError('arb')))
+
+    assert cache._key_locks == {}
+    assert cache.get('key', lambda: 'ok') == 'ok'
+    assert cache._key_locks == {}
+
+
+def test_cache_max_size_invalid():
+    """Max size less than 1 raises."""
+    with pytest.raises(ValueError) as err:
+        Cache(max_size=0)
+
+    assert str(err.value) == "max_size must be at least 1."
+
+
+def test_cache_max_size_evicts_lru():
+    """Cache past max size evicts least recently used item."""
+    cache = Cache(max_size=2)
+
+    cache.get('one', lambda: 1)
+    cache.get('two', lambda: 2)
+    # touch one so two is least recently used
+    assert cache.get('one', lambda: 'nope') == 1
+
+    with patch_logger('pypyr.cache', logging.DEBUG) as mock_logger_debug:
+        cache.get('three', lambda: 3)
+
+    assert mock_logger_debug.mock_calls == [
+        call("three not found in cache. . . creating"),
+        call("two evicted from cache")]
+
+    assert list(cache._cache) == ['one', 'three']
+    assert 'two' not in cache._key_locks
+    assert cache.get('two', lambda: 'new two') == 'new two'
+    assert list(cache._cache) == ['three', 'two']
+    assert cache.get_stats()['evictions'] == 2
+
+
+def test_cache_configure():
+    """Configure changes limits & shrinking evicts right away."""
+    cache = Cache()
+    for key in ('one', 'two', 'three'):
+        cache.get(key, lambda: key)
+
+    cache.configure(max_size=1, ttl=5)
+
+    assert cache.max_size == 1
+    assert cache.ttl == 5
+    assert list(cache._cache) == ['three']
+    assert cache.get_stats()['evictions'] == 2
+
+    cache.configure()
+    assert cache.max_size is None
+    assert cache.ttl is None
+    cache.get('four', lambda: 4)
+    assert list(cache._cache) == ['three', 'four']
+
+    with pytest.raises(ValueError) as err:
+        cache.configure(max_size=0)
+
+    assert str(err.value) == "max_size must be at least 1."
+    assert cache.max_size is None
+
+
+def test_cache_lru_hit_tolerates_concurrent_eviction():
+    """A hit on an item evicted mid-lookup still returns the item."""
+    cache = Cache(max_size=1)
+    cache.get('one', lambda: 1)
+
+    with patch.object(cache._cache, 'move_to_end', side_effect=KeyError):
+        assert cache.get('one', lambda: 'nope') == 1
+
+
+def test_cache_ttl_expires():
+    """Cache item expires after ttl & creates again."""
+    cache = Cache(ttl=10)
+    creator = MagicMock(side_effect=['first', 'second'])
+
+    with patch('pypyr.cache.cache.monotonic', side_effect=[100, 105, 110,
+                                                           110, 111]):
+        # add expires at 110
+        assert cache.get('one', creator) == 'first'
+        # 105 live
+        assert cache.get('one', creator) == 'first'
+        with patch_logger('pypyr.cache',
+                          logging.DEBUG) as mock_logger_debug:
+            # 110 expired both on fast path & double-check, add at 111
+            assert cache.get('one', creator) == 'second'
+
+    assert mock_logger_debug.mock_calls == [
+        call("one expired"),
+        call("one expired"),
+        call("one not found in cache. . . creating")]
+    assert cache._expires == {'one': 121}
+    assert creator.call_count == 2
+
+
+def test_cache_invalidate():
+    """Invalidate removes only that key."""
+    cache = Cache(ttl=60)
+    cache.get('one', lambda: 1)
+    cache.get('two', lambda: 2)
+
+    with patch_logger('pypyr.cache', logging.DEBUG) as mock_logger_debug:
+        cache.invalidate('one')
+        cache.invalidate('arb')
+
+    mock_logger_debug.assert_called_once_with("one invalidated")
+    assert list(cache._cache) == ['two']
+    assert list(cache._expires) == ['two']
+    assert cache.get('one', lambda: 'new one') == 'new one'
+    assert cache.get('two', lambda: 'nope') == 2
+
+    cache.clear()
+    assert not cache._expires
@@ -0,0 +1,179 @@
+"""filecache.py unit tests."""
+import logging
+import os
+from unittest.mock import call, patch
+import pytest
+import pypyr.cache.filecache as filecache
+from tests.common.utils import patch_logger
+
+
+def write_file(path, text, mtime_ns):
+    """Write text to path & set its modified time to mtime_ns."""
+    path.write_text(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_file_cache_json_hit_returns_copy(tmp_path):
+    """Second get is a hit & callers can't corrupt cached document."""
+    path = tmp_path / 'doc.json'
+    write_file(path, '{"a": [1, 2]}', 1_000_000_000)
+    cache = filecache.FileCache()
+
+    first = cache.get_json(path)
+    assert first == {'a': [1, 2]}
+    first['a'].append(3)
+
+    with patch('pypyr.cache.filecache.open') as mock_open:
+        second = cache.get_json(str(path))
+
+    mock_open.assert_not_called()
+    assert second == {'a': [1, 2]}
+    assert second is not first
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+
+
+def test_file_cache_yaml_and_json_separate(tmp_path):
+    """Same path parsed as yaml & json are separate entries."""
+    path = tmp_path / 'doc.json'
+    write_file(path, '{"a": 1}', 1_000_000_000)
+    cache = filecache.FileCache()
+
+    assert cache.get_json(path) == {'a': 1}
+    assert cache.get_yaml(path) == {'a': 1}
+    assert cache.get_yaml(path) == {'a': 1}
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+
+
+def test_file_cache_relative_and_absolute_share(tmp_path, monkeypatch):
+    """Relative & absolute path to same file share an entry."""
+    path = tmp_path / 'doc.yaml'
+    write_file(path, 'a: 1', 1_000_000_000)
+    monkeypatch.chdir(tmp_path)
+    cache = filecache.FileCache()
+
+    assert cache.get_yaml('doc.yaml') == {'a': 1}
+    assert cache.get_yaml(str(path)) == {'a': 1}
+
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_file_cache_reloads_changed_file(tmp_path):
+    """Changed file reloads & outdated document drops out of cache."""
+    path = tmp_path / 'doc.yaml'
+    write_file(path, 'a: 1', 1_000_000_000)
+    cache = filecache.FileCache()
+
+    assert cache.get_yaml(path) == {'a': 1}
+
+    write_file(path, 'a: 2', 2_000_000_000)
+
+    with patch_logger('pypyr.cache.filecache',
+                      logging.DEBUG) as mock_logger_debug:
+        assert cache.get_yaml(path) == {'a': 2}
+
+    assert call(f"{path} changed on disk. . . reloading"
+                ) in mock_logger_debug.mock_calls
+
+    assert cache.get_yaml(path) == {'a': 2}
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 1
+
+
+def test_file_cache_size_change_same_mtime_reloads(tmp_path):
+    """Same mtime but different size still reloads."""
+    path = tmp_path / 'doc.json'
+    write_file(path, '[1]', 1_000_000_000)
+    cache = filecache.FileCache()
+
+    assert cache.get_json(path) == [1]
+
+    write_file(path, '[1, 2]', 1_000_000_000)
+    assert cache.get_json(path) == [1, 2]
+
+
+def test_file_cache_no_stat_skips_cache():
+    """Path that can't stat loads without cache so open raises."""
+    cache = filecache.FileCache()
+
+    with patch_logger('pypyr.cache.filecache',
+                      logging.DEBUG) as mock_logger_debug:
+        with pytest.raises(FileNotFoundError):
+            cache.get_json('/arb/unlikely/file.json')
+
+    assert call("can't stat /arb/unlikely/file.json. . . loading without "
+                "cache") in mock_logger_debug.mock_calls
+    assert cache.get_stats()['misses'] == 0
+
+
+def test_file_cache_clear(tmp_path):
+    """Clear drops documents & tracked signatures."""
+    path = tmp_path / 'doc.json'
+    write_file(path, '{"a": 1}', 1_000_000_000)
+    cache = filecache.FileCache()
+    cache.get_json(path)
+
+    cache.clear()
+
+    assert cache.get_stats()['size'] == 0
+    assert cache._current_keys == {}
+
+    with patch_logger('pypyr.cache.filecache',
+                      logging.DEBUG) as mock_logger_debug:
+        assert cache.get_json(path) == {'a': 1}
+
+    assert call(f"{path} changed on disk. . . reloading"
+                ) not in mock_logger_debug.mock_calls
+
+
+def test_file_cache_max_size(tmp_path):
+    """Bounded cache evicts least recently used document."""
+    cache = filecache.FileCache(max_size=1)
+    for i in range(2):
+        write_file(tmp_path / f'{i}.json', str(i), 1_000_000_000)
+        assert cache.get_json(tmp_path / f'{i}.json') == i
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['size'] == 1
+
+
+def test_file_cache_max_file_size(tmp_path):
+    """File bigger than max_file_size loads without the cache."""
+    cache = filecache.FileCache(max_file_size=4)
+    assert cache.max_file_size == 4
+    path = tmp_path / 'doc.json'
+    write_file(path, '[1, 2]', 1_000_000_000)
+
+    with patch_logger('pypyr.cache.filecache',
+                      logging.DEBUG) as mock_logger_debug:
+        assert cache.get_json(path) == [1, 2]
+
+    assert call(f"{path} is bigger than 4 bytes. . . loading without cache"
+                ) in mock_logger_debug.mock_calls
+    stats = cache.get_stats()
+    assert stats['misses'] == 0
+    assert stats['size'] == 0
+
+    write_file(path, '[1]', 1_000_000_000)
+    assert cache.get_json(path) == [1]
+    assert cache.get_stats()['size'] == 1
+
+
+def test_file_cache_global_instance():
+    """Global instance exists & is bounded."""
+    assert isinstance(filecache.file_cache, filecache.FileCache)
+    assert filecache.file_cache.max_size == filecache.DEFAULT_MAX_SIZE
+    assert filecache.file_cache.max_file_size == (
+        filecache.DEFAULT_MAX_FILE_SIZE)
+    assert filecache.FileCache().max_file_size is None
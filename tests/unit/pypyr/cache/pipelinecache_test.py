@@ -1,10 +1,14 @@
 """pipelinecache.py unit tests."""
+import logging
+import os
+from pathlib import Path
 import pytest
 from unittest.mock import MagicMock, patch
 from pypyr.errors import PipelineNotFoundError
 import pypyr.cache.pipelinecache as pipelinecache
 import pypyr.cache.loadercache as loadercache
 from pypyr.moduleloader import get_working_directory
+from tests.common.utils import patch_logger
 # ------------------------- load_pipeline --------------------------------#
 
 
@@ -50,7 +54,7 @@ def test_get_pipeline_default():
         mock.return_value = lambda: "arbtest"
         p = pipelinecache.PipelineCache().get_pipeline("arbpipeline")
 
-    mock.assert_called_once_with('arbpipeline', None)
+    mock.assert_called_once_with('arbpipeline', None, None)
     assert p == "arbtest"
 
 
@@ -61,8 +65,171 @@ def test_get_pipeline_specified_loader():
         p = pipelinecache.PipelineCache().get_pipeline("arbpipeline",
                                                        "loaderx")
 
-    mock.assert_called_once_with('arbpipeline', 'loaderx')
+    mock.assert_called_once_with('arbpipeline', 'loaderx', None)
     assert p == "arbtest"
-# ------------------------- PipeLineCache: get_pipeline -------------------#
+
+
+def test_get_pipeline_working_dir_keys(tmp_path):
+    """Same pipeline name in different working dirs caches separately."""
+    dir1 = tmp_path.joinpath('dir1')
+    dir2 = tmp_path.joinpath('dir2')
+    dir1.mkdir()
+    dir2.mkdir()
+    write_pipe(dir1.joinpath('pipe.yaml'), 'one', 1_000_000_000)
+    write_pipe(dir2.joinpath('pipe.yaml'), 'two', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache()
+    with patch('pypyr.moduleloader.get_working_directory') as mock_get_wd:
+        p1 = cache.get_pipeline('pipe', working_dir=str(dir1))
+        p2 = cache.get_pipeline('pipe', working_dir=dir2)
+        assert cache.get_pipeline('pipe', working_dir=dir1) is p1
+
+    mock_get_wd.assert_not_called()
+    assert p1['steps'] == [{'name': 'one'}]
+    assert p2['steps'] == [{'name': 'two'}]
+    assert cache.get_stats()['misses'] == 2
+
+    cache.invalidate(('pipe', dir1))
+    assert cache.get_pipeline('pipe', working_dir=dir2) is p2
+    assert cache.get_stats()['misses'] == 2
+
+# ------------------------- PipeLineCache: revalidate ---------------------#
+
+
+def write_pipe(path, text, mtime_ns):
+    """Write pipeline yaml to path & set its mtime."""
+    path.write_text(f'steps:\n  - name: {text}\n')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_get_pipeline_revalidate_reloads_only_changed(tmp_path):
+    """Revalidate reloads a pipeline when its file changed."""
+    pipe1 = tmp_path.joinpath('pipe1.yaml')
+    pipe2 = tmp_path.joinpath('pipe2.yaml')
+    write_pipe(pipe1, 'one', 1_000_000_000)
+    write_pipe(pipe2, 'two', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache(is_revalidate=True)
+    with patch('pypyr.moduleloader.get_working_directory',
+               return_value=tmp_path):
+        p1 = cache.get_pipeline('pipe1')
+        p2 = cache.get_pipeline('pipe2')
+        assert cache.get_pipeline('pipe1') is p1
+        assert p1['steps'] == [{'name': 'one'}]
+
+        write_pipe(pipe1, 'new one', 2_000_000_000)
+
+        with patch_logger('pypyr.cache.pipelinecache',
+                          logging.DEBUG) as mock_logger_debug:
+            new_p1 = cache.get_pipeline('pipe1')
+
+        assert cache.get_pipeline('pipe2') is p2
+
+    assert new_p1['steps'] == [{'name': 'new one'}]
+    assert "pipe1 changed on disk. . . reloading" in [
+        c.args[0] for c in mock_logger_debug.mock_calls]
+    assert cache._sources['pipe1'] == (pipe1, 2_000_000_000)
+    assert cache.get_stats()['misses'] == 3
+
+
+def test_pipeline_cache_configure_revalidate(tmp_path):
+    """Configure turns on revalidate & limits for an existing cache."""
+    pipe1 = tmp_path.joinpath('pipe1.yaml')
+    write_pipe(pipe1, 'one', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache()
+    cache.configure(max_size=2, ttl=60, is_revalidate=True)
+    assert cache.max_size == 2
+    assert cache.ttl == 60
+    assert cache.is_revalidate
+
+    p1 = cache.get_pipeline('pipe1', working_dir=tmp_path)
+    write_pipe(pipe1, 'new one', 2_000_000_000)
+    assert cache.get_pipeline('pipe1', working_dir=tmp_path) is not p1
+
+    cache.configure()
+    assert cache.max_size is None
+    assert cache.ttl is None
+    assert not cache.is_revalidate
+
+
+def test_get_pipeline_revalidate_working_dir(tmp_path):
+    """Revalidate tracks source per working dir."""
+    pipe1 = tmp_path.joinpath('pipe1.yaml')
+    write_pipe(pipe1, 'one', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache(is_revalidate=True)
+    p1 = cache.get_pipeline('pipe1', working_dir=tmp_path)
+    assert cache.get_pipeline('pipe1', working_dir=tmp_path) is p1
+    assert cache._sources == {('pipe1', tmp_path): (pipe1, 1_000_000_000)}
+
+    write_pipe(pipe1, 'new one', 2_000_000_000)
+    new_p1 = cache.get_pipeline('pipe1', working_dir=tmp_path)
+
+    assert new_p1['steps'] == [{'name': 'new one'}]
+    assert cache._sources == {('pipe1', tmp_path): (pipe1, 2_000_000_000)}
+
+
+def test_get_pipeline_revalidate_file_gone(tmp_path):
+    """Revalidate where source deleted reloads & so raises not found."""
+    pipe1 = tmp_path.joinpath('pipe1.yaml')
+    write_pipe(pipe1, 'one', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache(is_revalidate=True)
+    with patch('pypyr.moduleloader.get_working_directory',
+               return_value=tmp_path):
+        cache.get_pipeline('pipe1')
+        pipe1.unlink()
+
+        with pytest.raises(PipelineNotFoundError):
+            cache.get_pipeline('pipe1')
+
+    assert 'pipe1' not in cache._sources
+
+
+def test_get_pipeline_revalidate_custom_loader_not_tracked():
+    """Revalidate doesn't track sources for a custom loader."""
+    cache = pipelinecache.PipelineCache(is_revalidate=True)
+
+    with patch('pypyr.cache.pipelinecache.load_pipeline') as mock:
+        mock.return_value = lambda: "arbtest"
+        assert cache.get_pipeline("arbpipeline", "loaderx") == "arbtest"
+        assert cache.get_pipeline("arbpipeline", "loaderx") == "arbtest"
+
+    assert not cache._sources
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_get_pipeline_no_revalidate_serves_stale(tmp_path):
+    """Without revalidate a changed file doesn't reload."""
+    pipe1 = tmp_path.joinpath('pipe1.yaml')
+    write_pipe(pipe1, 'one', 1_000_000_000)
+
+    cache = pipelinecache.PipelineCache(max_size=5, ttl=60)
+    assert cache.max_size == 5
+    assert cache.ttl == 60
+
+    with patch('pypyr.moduleloader.get_working_directory',
+               return_value=tmp_path):
+        p1 = cache.get_pipeline('pipe1')
+        write_pipe(pipe1, 'new one', 2_000_000_000)
+        assert cache.get_pipeline('pipe1') is p1
+
+    assert not cache._sources
+
+
+def test_pipeline_cache_clear_and_invalidate_sources():
+    """Clear & invalidate forget the tracked sources."""
+    cache = pipelinecache.PipelineCache(is_revalidate=True)
+    cache._sources['a'] = (Path('a'), 1)
+    cache._sources['b'] = (Path('b'), 1)
+
+    cache.invalidate('a')
+    assert list(cache._sources) == ['b']
+
+    cache.clear()
+    assert not cache._sources
+
+# ------------------------- END PipeLineCache: revalidate -----------------#
 
 # ------------------------- END PipelineCache -----------------------------#
@@ -0,0 +1,305 @@
+"""circuit.py unit tests."""
+import json
+import logging
+from pathlib import Path
+import threading
+from unittest.mock import call, patch
+import pytest
+from pypyr.errors import CircuitOpenError, PipelineDefinitionError
+import pypyr.circuit as circuit
+from pypyr.circuit import CircuitBreaker, get_circuit, get_new_state
+from tests.common.utils import patch_logger
+
+
+@pytest.fixture(autouse=True)
+def clear_circuits():
+    """Each test starts without circuit breakers."""
+    circuit.clear()
+    yield
+    circuit.clear()
+
+# ------------------------- CircuitBreaker -----------------------------------
+
+
+def test_circuit_breaker_init():
+    """Circuit breaker sets its definition & starts closed."""
+    breaker = CircuitBreaker('arb')
+    assert breaker.name == 'arb'
+    assert breaker.failures == 5
+    assert breaker.window == 60
+    assert breaker.reset == 30
+    assert breaker.state_file is None
+    assert breaker.get_state() == 'closed'
+    assert repr(breaker) == "CircuitBreaker('arb', 5, 60, 30, None)"
+
+    breaker = CircuitBreaker('arb', 1, 2.5, 3, 'arb/file')
+    assert breaker.state_file == Path('arb/file')
+    assert repr(breaker) == "CircuitBreaker('arb', 1, 2.5, 3, 'arb/file')"
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_opens_on_failures_per_error_type(mock_time):
+    """Breaker opens when the same error type fails too often."""
+    breaker = CircuitBreaker('arb', failures=3, window=10, reset=5)
+
+    assert not breaker.record_failure('ValueError')
+    assert not breaker.record_failure('KeyError')
+    assert not breaker.record_failure('ValueError')
+    breaker.before_call()
+
+    with patch_logger('pypyr.circuit', logging.ERROR) as mock_error:
+        assert breaker.record_failure('ValueError')
+
+    mock_error.assert_called_once_with(
+        "circuit arb opened after 3 ValueError failures in 10s.")
+    assert breaker.get_state() == 'open'
+
+    mock_time.return_value = 102
+    with pytest.raises(CircuitOpenError) as err:
+        breaker.before_call()
+
+    assert str(err.value) == "circuit arb is open. failing fast for 3.0s more."
+
+    # an attempt that started before the breaker opened.
+    assert breaker.record_failure('ValueError')
+    assert breaker.get_state() == 'open'
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_window_forgets_old_failures(mock_time):
+    """Failures older than window don't count."""
+    breaker = CircuitBreaker('arb', failures=2, window=10)
+
+    assert not breaker.record_failure('ValueError')
+    mock_time.return_value = 111
+    assert not breaker.record_failure('ValueError')
+    mock_time.return_value = 112
+    assert breaker.record_failure('ValueError')
+
+
+def test_circuit_breaker_success_clears_failures():
+    """Success in closed state clears the failure counts."""
+    breaker = CircuitBreaker('arb', failures=2)
+
+    assert not breaker.record_failure('ValueError')
+    breaker.record_success()
+    assert not breaker.record_failure('ValueError')
+    assert breaker.get_state() == 'closed'
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_half_open_probe_closes(mock_time):
+    """After reset 1 probe goes through & success closes the breaker."""
+    breaker = CircuitBreaker('arb', failures=1, reset=5)
+    breaker.record_failure('ValueError')
+
+    mock_time.return_value = 105
+    with patch_logger('pypyr.circuit', logging.INFO) as mock_info:
+        breaker.before_call()
+        assert breaker.get_state() == 'half-open'
+
+        # another attempt while the probe is in flight.
+        mock_time.return_value = 106
+        with pytest.raises(CircuitOpenError) as err:
+            breaker.before_call()
+
+        breaker.record_success()
+
+    assert str(err.value) == (
+        "circuit arb is half-open & another attempt is probing.")
+    assert mock_info.mock_calls == [call("circuit arb half-open. probing."),
+                                    call("circuit arb closed.")]
+    assert breaker.get_state() == 'closed'
+    breaker.before_call()
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_half_open_probe_fails(mock_time):
+    """Failed probe opens the breaker for another reset."""
+    breaker = CircuitBreaker('arb', failures=1, reset=5)
+    breaker.record_failure('ValueError')
+
+    mock_time.return_value = 106
+    breaker.before_call()
+
+    with patch_logger('pypyr.circuit', logging.ERROR) as mock_error:
+        assert breaker.record_failure('KeyError')
+
+    mock_error.assert_called_once_with(
+        "circuit arb probe failed with KeyError. opened again.")
+    assert breaker.get_state() == 'open'
+
+    mock_time.return_value = 110
+    with pytest.raises(CircuitOpenError) as err:
+        breaker.before_call()
+
+    assert str(err.value) == "circuit arb is open. failing fast for 1.0s more."
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_half_open_stale_probe(mock_time):
+    """A probe that never finished lets another probe through after reset."""
+    breaker = CircuitBreaker('arb', failures=1, reset=5)
+    breaker.record_failure('ValueError')
+
+    mock_time.return_value = 105
+    breaker.before_call()
+
+    mock_time.return_value = 110
+    breaker.before_call()
+    assert breaker.get_state() == 'half-open'
+
+
+def test_circuit_breaker_threads_share_state():
+    """Concurrent failures open the breaker exactly once."""
+    breaker = CircuitBreaker('arb', failures=10)
+    results = []
+
+    def fail():
+        results.append(breaker.record_failure('ValueError'))
+
+    threads = [threading.Thread(target=fail) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 9 + [True]
+    assert breaker.get_state() == 'open'
+
+# ------------------------- END CircuitBreaker -------------------------------
+
+# ------------------------- state file ---------------------------------------
+
+
+@patch('time.time', return_value=100)
+def test_circuit_breaker_state_file_shares_state(mock_time, tmp_path):
+    """Breakers with the same state file share state, like processes."""
+    state_file = tmp_path.joinpath('arb', 'db.circuit')
+    breaker = CircuitBreaker('arb', 2, 10, 5, state_file)
+    other_process = CircuitBreaker('arb', 2, 10, 5, state_file)
+
+    assert other_process.get_state() == 'closed'
+    # reading doesn't create the file.
+    assert not state_file.exists()
+    assert tmp_path.joinpath('arb', 'db.circuit.lock').exists()
+
+    assert not breaker.record_failure('ValueError')
+    assert other_process.record_failure('ValueError')
+
+    assert json.loads(state_file.read_text()) == {
+        'state': 'open', 'opened': 100, 'probe': None, 'failures': {}}
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    mock_time.return_value = 105
+    other_process.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    other_process.record_success()
+    breaker.before_call()
+    assert json.loads(state_file.read_text()) == get_new_state()
+
+
+def test_circuit_breaker_state_file_corrupt(tmp_path):
+    """A state file a process didn't finish writing counts as closed."""
+    state_file = tmp_path.joinpath('db.circuit')
+    state_file.write_text('{"state": "op')
+    breaker = CircuitBreaker('arb', 1, state_file=state_file)
+
+    assert breaker.get_state() == 'closed'
+    assert breaker.record_failure('ValueError')
+    assert json.loads(state_file.read_text())['state'] == 'open'
+
+
+@patch('pypyr.circuit.LOCK_INTERVAL', 0.001)
+def test_circuit_breaker_state_file_waits_for_lock(tmp_path):
+    """Breaker waits while another process has the state file lock."""
+    state_file = tmp_path.joinpath('db.circuit')
+    breaker = CircuitBreaker('arb', state_file=state_file)
+    breaker.get_state()
+
+    with patch('pypyr.circuit.try_lock_file',
+               side_effect=[False, False, True]) as mock_lock:
+        assert breaker.get_state() == 'closed'
+
+    assert mock_lock.call_count == 3
+
+# ------------------------- END state file -----------------------------------
+
+# ------------------------- get_circuit --------------------------------------
+
+
+def test_get_circuit_by_name():
+    """Get circuit by name with defaults, reusing the same breaker."""
+    breaker = get_circuit('arb')
+    assert repr(breaker) == "CircuitBreaker('arb', 5, 60.0, 30.0, None)"
+    assert get_circuit('arb') is breaker
+    assert get_circuit({'name': 'arb', 'failures': 1}) is breaker
+
+
+def test_get_circuit_dict():
+    """Get circuit from dict, state file relative to working dir."""
+    with patch_logger('pypyr.circuit', logging.DEBUG) as mock_debug:
+        breaker = get_circuit({'name': 'arb',
+                               'failures': '2',
+                               'window': 3,
+                               'reset': 0,
+                               'stateFile': 'db.circuit'},
+                              'arb/dir')
+
+    assert breaker.failures == 2
+    assert breaker.window == 3.0
+    assert breaker.reset == 0.0
+    assert breaker.state_file == Path('arb/dir/db.circuit')
+    mock_debug.assert_called_once_with(f"using {breaker!r}")
+
+    breaker = get_circuit({'name': 'arb2', 'stateFile': 'db.circuit'})
+    assert breaker.state_file == Path('db.circuit')
+
+
+@pytest.mark.parametrize('definition', [None, 1, ['arb']])
+def test_get_circuit_not_str_or_dict(definition):
+    """Circuit must be a name or a dict."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_circuit(definition)
+
+    assert str(err.value) == (
+        "retry circuit must be a circuit name or a dict (i.e a map).")
+
+
+@pytest.mark.parametrize('definition', ['', {}, {'name': None}])
+def test_get_circuit_no_name(definition):
+    """Circuit must have a name."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_circuit(definition)
+
+    assert str(err.value) == "retry circuit must have a name."
+
+
+def test_get_circuit_not_a_number():
+    """Circuit numbers must be numbers."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_circuit({'name': 'arb', 'window': 'x'})
+
+    assert str(err.value) == (
+        "circuit arb failures, window & reset must be numbers. could not "
+        "convert string to float: 'x'")
+
+
+@pytest.mark.parametrize('definition', [{'failures': 0},
+                                        {'window': 0},
+                                        {'reset': -1}])
+def test_get_circuit_out_of_range(definition):
+    """Circuit numbers must be in range."""
+    definition['name'] = 'arb'
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_circuit(definition)
+
+    assert str(err.value) == (
+        "circuit arb failures must be at least 1, window more than 0 & reset "
+        "at least 0.")
+
+# ------------------------- END get_circuit ----------------------------------
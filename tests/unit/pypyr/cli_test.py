@@ -2,7 +2,7 @@
 from pathlib import Path
 import pypyr.cli
 import pytest
-from unittest.mock import patch
+from unittest.mock import call, patch
 
 
 def test_main_pass_with_sysargv_context_positional():
@@ -37,7 +37,9 @@ def test_main_pass_with_sysargv_context_positional():
         working_dir='dir here',
         groups=['group1', 'group 2', 'group3'],
         success_group='sg',
-        failure_group='f g'
+        failure_group='f g',
+        shard=None,
+        timeout=None
     )
 
 
@@ -71,7 +73,9 @@ def test_main_pass_with_sysargv_single_group():
         working_dir='dir here',
         groups=['group1'],
         success_group='sg',
-        failure_group='f g'
+        failure_group='f g',
+        shard=None,
+        timeout=None
     )
 
 
@@ -110,7 +114,9 @@ def test_main_pass_with_sysargv_context_multiple_positional():
         working_dir='dir here',
         groups=['group1', 'group 2', 'group3'],
         success_group='sg',
-        failure_group='f g'
+        failure_group='f g',
+        shard=None,
+        timeout=None
     )
 
 
@@ -138,7 +144,9 @@ def test_main_pass_with_sysargv_context_positional_log_alias():
         working_dir='dir here',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -168,7 +176,9 @@ def test_main_pass_with_sysargv_context_positional_abbreviations():
         working_dir='dir here',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -196,7 +206,9 @@ def test_main_pass_with_sysargv_context_positional_flags_last():
         working_dir='dir here',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -226,7 +238,9 @@ def test_main_pass_with_sysargv_context_multiple_positional_flags_last():
         working_dir='dir here',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -248,7 +262,9 @@ def test_main_pass_with_defaults_context_positional():
         working_dir=Path.cwd(),
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -269,7 +285,9 @@ def test_main_pass_with_no_context():
         working_dir=Path.cwd(),
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -292,7 +310,9 @@ def test_main_pass_with_no_context_other_flags_set():
         working_dir=Path.cwd(),
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
 
 
@@ -394,5 +414,155 @@ def test_main_pass_with_logpath():
         working_dir=Path.cwd(),
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        shard=None,
+        timeout=None
     )
+
+
+def test_main_batch(tmp_path, capsys):
+    """Batch runs pipeline per json line & writes results as json lines."""
+    batch_path = tmp_path / 'inputs.jsonl'
+    batch_path.write_text('{"a": 1}\n\n{"a": 2}\n')
+
+    def run_many(contexts, **kwargs):
+        for i, context in enumerate(contexts):
+            yield {'index': i, 'context': dict(context, path=Path('/p'))}
+
+    with patch('pypyr.pipelinerunner.run_many',
+               side_effect=run_many) as mock_run_many:
+        val = pypyr.cli.main(['blah',
+                              '--batch', str(batch_path),
+                              '--workers', '3',
+                              '--dir', 'dir here',
+                              '--groups', 'g'])
+
+    assert val == 0
+    assert capsys.readouterr().out == (
+        '{"index": 0, "context": {"a": 1, "path": "/p"}}\n'
+        '{"index": 1, "context": {"a": 2, "path": "/p"}}\n')
+
+    kwargs = mock_run_many.call_args[1]
+    del kwargs['contexts']
+    assert kwargs == {'pipeline_name': 'blah',
+                      'workers': 3,
+                      'working_dir': 'dir here',
+                      'groups': ['g'],
+                      'success_group': None,
+                      'failure_group': None,
+                      'is_ordered': True,
+                      'shard': None,
+                      'timeout': None}
+
+
+def test_main_batch_stdin_unordered_with_error(capsys):
+    """Batch from stdin returns 255 when any run fails."""
+    def run_many(contexts, **kwargs):
+        assert list(contexts) == [{'a': 1}]
+        yield {'index': 0, 'error': {'name': 'ValueError',
+                                     'description': 'arb'}}
+
+    with patch('sys.stdin', ['{"a": 1}\n']):
+        with patch('pypyr.pipelinerunner.run_many',
+                   side_effect=run_many) as mock_run_many:
+            val = pypyr.cli.main(['blah', '--batch', '-', '--unordered',
+                                  '--shard', '1/2', '--timeout', '3'])
+
+    assert val == 255
+    assert capsys.readouterr().out == (
+        '{"index": 0, "error": {"name": "ValueError", '
+        '"description": "arb"}}\n')
+    assert mock_run_many.call_args[1]['is_ordered'] is False
+    assert mock_run_many.call_args[1]['workers'] is None
+    assert mock_run_many.call_args[1]['shard'] == '1/2'
+    assert mock_run_many.call_args[1]['timeout'] == 3
+
+
+def test_main_shard():
+    """Shard passes to pipeline runner."""
+    with patch('pypyr.pipelinerunner.main') as mock_pipeline_main:
+        pypyr.cli.main(['blah', '--shard', '2/3'])
+
+    assert mock_pipeline_main.call_args[1]['shard'] == '2/3'
+
+
+def test_main_pipeline_cache_options():
+    """Cache options configure the pipeline cache."""
+    with patch('pypyr.pipelinerunner.main'):
+        with patch('pypyr.cli.pipeline_cache') as mock_cache:
+            pypyr.cli.main(['blah', '--cache-size', '10',
+                            '--cache-ttl', '2.5', '--revalidate'])
+            pypyr.cli.main(['blah', '--cache-size', '3'])
+            pypyr.cli.main(['blah', '--cache-ttl', '1'])
+            pypyr.cli.main(['blah'])
+
+    assert mock_cache.configure.mock_calls == [
+        call(max_size=10, ttl=2.5, is_revalidate=True),
+        call(max_size=3, ttl=None, is_revalidate=False),
+        call(max_size=None, ttl=1.0, is_revalidate=False)]
+
+
+def test_main_timeout():
+    """Timeout passes to pipeline runner as float."""
+    with patch('pypyr.pipelinerunner.main') as mock_pipeline_main:
+        pypyr.cli.main(['blah', '--timeout', '2.5'])
+
+    assert mock_pipeline_main.call_args[1]['timeout'] == 2.5
+
+
+def test_worker_main():
+    """Worker runs jobs from queue instead of running a pipeline."""
+    with patch('pypyr.workqueue.run_worker') as mock_run_worker:
+        with patch('pypyr.pipelinerunner.main') as mock_pipeline_main:
+            val = pypyr.cli.worker_main(['queue.db',
+                                         '--backend', 'arb.backend',
+                                         '--dir', 'arb/dir',
+                                         '--interval', '0.5',
+                                         '--max-jobs', '3',
+                                         '--exit-when-empty'])
+
+    assert val == 0
+    mock_pipeline_main.assert_not_called()
+    mock_run_worker.assert_called_once_with(location='queue.db',
+                                            backend='arb.backend',
+                                            working_dir='arb/dir',
+                                            interval=0.5,
+                                            max_jobs=3,
+                                            is_stop_when_empty=True)
+
+
+def test_worker_main_defaults():
+    """Worker defaults wait for jobs forever."""
+    with patch('pypyr.workqueue.run_worker') as mock_run_worker:
+        with patch('sys.argv', ['pypyr-worker', 'queue.db']):
+            val = pypyr.cli.worker_main()
+
+    assert val == 0
+    mock_run_worker.assert_called_once_with(location='queue.db',
+                                            backend=None,
+                                            working_dir=None,
+                                            interval=0.25,
+                                            max_jobs=None,
+                                            is_stop_when_empty=False)
+
+
+def test_worker_main_interrupt():
+    """Ctrl+C stops the worker."""
+    with patch('pypyr.workqueue.run_worker',
+               side_effect=KeyboardInterrupt):
+        with patch('sys.stdout'):
+            val = pypyr.cli.worker_main(['queue.db'])
+
+    assert val == 130
+
+
+def test_main_pipeline_called_worker():
+    """Pipeline called worker runs the pipeline, not a queue worker."""
+    with patch('pypyr.workqueue.run_worker') as mock_run_worker:
+        with patch('pypyr.pipelinerunner.main') as mock_pipeline_main:
+            pypyr.cli.main(['worker', 'queue.db'])
+
+    mock_run_worker.assert_not_called()
+    assert mock_pipeline_main.call_args[1]['pipeline_name'] == 'worker'
+    assert mock_pipeline_main.call_args[1]['pipeline_context_input'] == [
+        'queue.db']
@@ -1,17 +1,24 @@
 """context.py unit tests."""
+from collections import OrderedDict
 from collections.abc import MutableMapping
+from copy import deepcopy
 from pathlib import Path
 import pickle
+import sys
+import threading
 import typing
+from unittest.mock import call, patch
 
 import pytest
 
-from pypyr.context import Context, ContextItemInfo
-from pypyr.dsl import PyString, SicString
+from pypyr.context import ConcurrentContext, Context, ContextItemInfo
+from pypyr.dsl import Jsonify, PyString, SicString
 from pypyr.errors import (
     ContextError,
     KeyInContextHasNoValueError,
     KeyNotInContextError)
+from pypyr.steps import pyimport
+from pypyr.yaml import get_pipeline_yaml
 
 # region behaves like a dictionary
 
@@ -1524,6 +1531,29 @@ def test_get_processed_string_following_literal():
     output = context.get_formatted_value(input_string)
     assert output == 'downfollowing literal', (
         "string interpolation incorrect")
+
+
+def test_get_formatted_shared():
+    """Get formatted shared returns unchanged containers from context."""
+    context = Context({'k1': 'v1',
+                       'k2': {'a': ['b'], 'c': '{k1}'}})
+
+    out = context.get_formatted('k2', is_shared=True)
+    assert out == {'a': ['b'], 'c': 'v1'}
+    assert out['a'] is context['k2']['a']
+
+    out = context.get_formatted('k2')
+    assert out['a'] is not context['k2']['a']
+
+
+def test_get_formatted_value_shared():
+    """Get formatted value shared returns unchanged input as is."""
+    context = Context({'k1': 'v1'})
+    obj = [{'a': 'b'}, ('c',)]
+
+    assert context.get_formatted_value(obj, is_shared=True) is obj
+    assert context.get_formatted_value(obj) is not obj
+
 # endregion formats
 
 # region key info
@@ -1914,6 +1944,154 @@ def test_merge_key_substitutions():
                        'value3': '3new'}
 
 
+def deep_dict(depth, leaf):
+    """Build a dict nested depth levels deep, with leaf at the bottom."""
+    root = current = {}
+    for _ in range(depth - 1):
+        current['n'] = {}
+        current = current['n']
+    current.update(leaf)
+    return root
+
+
+def test_merge_deeper_than_recursion_limit():
+    """Merge doesn't recurse, so hierarchy can be deeper than the limit."""
+    depth = sys.getrecursionlimit() * 2
+    context = Context({'k1': 'v1', 'deep': deep_dict(depth, {'a': 1})})
+
+    context.merge({'deep': deep_dict(depth, {'b': '{k1}'})})
+
+    current = context['deep']
+    for _ in range(depth - 1):
+        current = current['n']
+    assert current == {'a': 1, 'b': 'v1'}
+
+
+def assert_deep_leaf(value, depth, leaf):
+    """Assert value from deep_dict has leaf at the bottom."""
+    for _ in range(depth - 1):
+        value = value['n']
+    assert value == leaf
+
+
+def test_merge_deeper_than_recursion_limit_into_empty():
+    """Merge copies a new deep hierarchy without recursion."""
+    depth = sys.getrecursionlimit() * 2
+    add_me = {'deep': deep_dict(depth, {'b': '{k1}',
+                                        'l': ['{k1}', ('{k1}', 1)],
+                                        's': {'{k1}'}})}
+    context = Context({'k1': 'v1'})
+
+    context.merge(add_me)
+
+    assert_deep_leaf(context['deep'], depth, {'b': 'v1',
+                                              'l': ['v1', ('v1', 1)],
+                                              's': {'v1'}})
+    # a copy, not the input.
+    assert context['deep'] is not add_me['deep']
+    assert_deep_leaf(add_me['deep'], depth, {'b': '{k1}',
+                                             'l': ['{k1}', ('{k1}', 1)],
+                                             's': {'{k1}'}})
+
+
+def test_merge_deeper_than_recursion_limit_only_top_key_exists():
+    """Merge copies deep values below the keys that exist already."""
+    depth = sys.getrecursionlimit() * 2
+    context = Context({'k1': 'v1', 'deep': {'a': 1}, 'list': [0]})
+
+    context.merge({'deep': {'n': deep_dict(depth, {'b': '{k1}'})},
+                   'list': [deep_dict(depth, {'c': '{k1}'})]})
+
+    assert context['deep']['a'] == 1
+    assert_deep_leaf(context['deep']['n'], depth, {'b': 'v1'})
+    assert context['list'][0] == 0
+    assert_deep_leaf(context['list'][1], depth, {'c': 'v1'})
+
+
+def test_merge_new_containers_same_as_formatter():
+    """Merged copies of new containers match get_formatted_value."""
+    shared = ['{k1}']
+    add_me = {'{k1}': {'a': shared,
+                       'b': shared,
+                       'od': OrderedDict([('x', '{k1}'), ('{k1}', 2)]),
+                       't': ({'{k1}': b'bytes'}, PyString('len(k1)')),
+                       (1, '{k1}'): frozenset(['{k1}']),
+                       'e': [[], {}]}}
+    expected = Context({'k1': 'v1'}).get_formatted_value(add_me)
+    context = Context({'k1': 'v1'})
+
+    context.merge(add_me)
+
+    assert context['v1'] == expected['v1']
+    assert type(context['v1']['od']) is OrderedDict
+    assert type(context['v1']['t']) is tuple
+    assert type(context['v1'][(1, 'v1')]) is frozenset
+    # the same object formats to the same copy, like the formatter.
+    assert context['v1']['a'] is context['v1']['b']
+    assert context['v1']['a'] is not shared
+
+
+def test_merge_container_contains_itself():
+    """Merge raises rather than loop forever on a cycle."""
+    cycle = {'a': 'b'}
+    cycle['self'] = [cycle]
+
+    with pytest.raises(RecursionError) as err:
+        Context().merge({'k': cycle})
+
+    assert str(err.value) == "can't format a container that contains itself."
+
+
+def test_merge_nested_order_formats_with_earlier_siblings():
+    """Nested merges complete before later siblings format."""
+    context = Context({'k1': {'k1.1': 'old'}})
+
+    context.merge({'k1': {'k1.1': 'new'},
+                   'k2': '{k1[k1.1]}'})
+
+    assert context == {'k1': {'k1.1': 'new'}, 'k2': 'new'}
+
+
+def test_merge_literals_skip_formatter():
+    """Literal keys & values & containers don't go to the formatter."""
+    context = Context({'k1': 'v1', 'k2': [0]})
+    with patch.object(context, 'get_formatted_value',
+                      wraps=context.get_formatted_value) as mock_format:
+        context.merge({'a': 'b', 1: 2.0, 'c': None, 'd': True,
+                       'k2': [1, '{k1}'], 'e': '{k1}'})
+
+    assert mock_format.mock_calls == [call('{k1}'), call('{k1}')]
+    assert context == {'k1': 'v1', 'k2': [0, 1, 'v1'], 'a': 'b', 1: 2.0,
+                       'c': None, 'd': True, 'e': 'v1'}
+
+
+def test_merge_iterables_copied_not_aliased():
+    """Merged iterables are new objects, not add_me's."""
+    add_me = {'k1': [1, 2], 'k2': {'k2.1': [3]}}
+    context = Context()
+
+    context.merge(add_me)
+
+    assert context == add_me
+    assert context['k1'] is not add_me['k1']
+    assert context['k2']['k2.1'] is not add_me['k2']['k2.1']
+
+
+def test_merge_replace_lists():
+    """Replace lists replaces rather than extends, even when nested."""
+    context = Context({'k1': 'v1',
+                       'k2': [1, 2],
+                       'k3': {'k3.1': ['a'], 'k3.2': (1,)}})
+
+    context.merge({'k2': ['{k1}'],
+                   'k3': {'k3.1': ['b'], 'k3.2': (2,)}},
+                  replace_lists=True)
+
+    assert context == {'k1': 'v1',
+                       'k2': ['v1'],
+                       'k3': {'k3.1': ['b'], 'k3.2': (1, 2)}}
+
+
 # endregion merge
 
 # region set_defaults
@@ -2093,4 +2271,359 @@ def test_set_defaults_pass_nested_with_types():
         'k12': 'end'
     }
 
+
+def test_set_defaults_deeper_than_recursion_limit():
+    """Set defaults doesn't recurse, so can be deeper than the limit."""
+    depth = sys.getrecursionlimit() * 2
+    context = Context({'k1': 'v1', 'deep': deep_dict(depth, {'a': 1})})
+
+    context.set_defaults({'deep': deep_dict(depth, {'a': 2, 'b': '{k1}'}),
+                          'k2': 'after'})
+
+    current = context['deep']
+    for _ in range(depth - 1):
+        current = current['n']
+    assert current == {'a': 1, 'b': 'v1'}
+    assert context['k2'] == 'after'
+
+
+def test_set_defaults_deeper_than_recursion_limit_into_empty():
+    """Set defaults copies a new deep hierarchy without recursion."""
+    depth = sys.getrecursionlimit() * 2
+    defaults = {'deep': deep_dict(depth, {'b': '{k1}', 'l': ['{k1}']})}
+    context = Context({'k1': 'v1'})
+
+    context.set_defaults(defaults)
+
+    assert_deep_leaf(context['deep'], depth, {'b': 'v1', 'l': ['v1']})
+    assert context['deep'] is not defaults['deep']
+
 # endregion set_defaults
+
+# region snapshot
+
+
+def test_context_snapshot_roundtrip():
+    """Snapshot keeps values, attributes & special tag types."""
+    og = Context({
+        'a': 'b',
+        'n': {'l': [1, 2.5, None, True], 't': (1, 'x'), 's': {1, 2}},
+        'py': PyString('len(a)'),
+        'sic': SicString('{a}'),
+        'json': Jsonify({'k': '{a}'}),
+        'nested': Context({'c': 'd'}),
+        'bytes': b'\x00\x01'})
+    og.pipeline_name = 'arb'
+    og.working_dir = Path('/arb')
+
+    reloaded = Context.loads(og.dumps())
+
+    assert type(reloaded) is Context
+    assert reloaded == og
+    assert reloaded.pipeline_name == 'arb'
+    assert reloaded.working_dir == Path('/arb')
+    assert type(reloaded['py']) is PyString
+    assert type(reloaded['sic']) is SicString
+    assert type(reloaded['json']) is Jsonify
+    assert type(reloaded['nested']) is Context
+    assert reloaded['nested'].pystring_globals == {}
+    assert reloaded.get_formatted('py') == 1
+    assert reloaded.get_formatted('sic') == '{a}'
+    assert reloaded.get_formatted('json') == '{"k": "b"}'
+
+
+def test_context_snapshot_yaml_tags():
+    """Snapshot keeps special tags parsed from yaml, incl tagged scalars."""
+    og = Context(get_pipeline_yaml(
+        "a: !jsonify '1'\nb: !jsonify\n  k: v\nc: !py a\nd: !sic '{a}'"))
+
+    reloaded = Context.loads(og.dumps())
+
+    # Jsonify repr has the TaggedScalar's id, so compare it separately.
+    assert {k: v for k, v in reloaded.items() if k != 'a'} == {
+        k: v for k, v in og.items() if k != 'a'}
+    assert type(reloaded['a']) is Jsonify
+    assert reloaded['a'].value == '1'
+    assert reloaded['a'].scalar.value == '1'
+    assert reloaded.get_formatted('a') == '"1"'
+    assert reloaded.get_formatted('b') == '{"k": "v"}'
+    assert reloaded.get_formatted('c') == reloaded['a']
+
+
+def test_context_snapshot_reimports_pystring_imports():
+    """Snapshot imports pystring_imports again, drops other globals."""
+    og = Context({'pyImport': 'import math\nfrom pathlib import Path as P',
+                  'x': PyString('math.sqrt(4)'),
+                  'p': PyString("P('a')")})
+    pyimport.run_step(og)
+    og.pystring_globals['unimported'] = object()
+
+    reloaded = Context.loads(og.dumps())
+
+    assert reloaded.pystring_imports == og.pystring_imports
+    assert reloaded.pystring_imports is not og.pystring_imports
+    assert set(reloaded.pystring_globals) == {'math', 'P'}
+    assert reloaded.get_formatted('x') == 2
+    assert reloaded.get_formatted('p') == Path('a')
+
+
+def test_context_snapshot_file(tmp_path):
+    """Dump & load snapshot to binary file."""
+    og = Context({'a': 'b', 'c': [1, {'d': 'e'}]})
+    path = tmp_path / 'snapshot.bin'
+
+    with open(path, 'wb') as file:
+        og.dump(file)
+
+    with open(path, 'rb') as file:
+        reloaded = Context.load(file)
+
+    assert reloaded == og
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+                    reason="out-of-band buffers need pickle protocol 5")
+def test_context_snapshot_out_of_band_buffers():
+    """Large buffers go out-of-band, not into the pickle stream."""
+    payload = bytearray(b'x' * 1024)
+    og = Context({'buf': pickle.PickleBuffer(payload)})
+
+    snapshot = og.dumps()
+
+    # once for the out-of-band buffer, none in the pickle stream.
+    assert snapshot.count(bytes(payload)) == 1
+    assert snapshot.rindex(bytes(payload)) < len(snapshot) - 1024
+
+    reloaded = Context.loads(snapshot)
+    assert bytes(reloaded['buf']) == bytes(payload)
+
+
+def test_context_snapshot_not_snapshot_raises():
+    """Loading something that isn't a snapshot raises ValueError."""
+    with pytest.raises(ValueError) as err:
+        Context.loads(pickle.dumps(Context({'a': 'b'})))
+
+    assert str(err.value) == "input is not a pypyr context snapshot."
+
+
+def test_context_snapshot_deepcopy_unchanged():
+    """Snapshot reducer doesn't change how deepcopy copies globals."""
+    og = Context({'a': 'b'})
+    sentinel = object()
+    og.pystring_globals['s'] = sentinel
+
+    copied = deepcopy(og)
+
+    assert copied == og
+    assert 's' in copied.pystring_globals
+# endregion snapshot
+
+# region concurrent
+
+
+def test_context_lock_does_not_lock():
+    """Plain context lock yields context without locking."""
+    context = Context({'a': 1})
+
+    with context.lock('a') as locked:
+        assert locked is context
+        context['a'] += 1
+
+    assert context == {'a': 2}
+
+
+def test_context_snapshot_read():
+    """Snapshot deep copies values into a new Context."""
+    context = Context({'a': {'b': [1, 2]}, 'c': 'd'})
+    context.pystring_globals['e'] = 'f'
+
+    snapshot = context.snapshot()
+    context['a']['b'].append(3)
+    context['c'] = 'changed'
+
+    assert type(snapshot) is Context
+    assert snapshot == {'a': {'b': [1, 2]}, 'c': 'd'}
+    assert snapshot.pystring_globals == {}
+
+
+def test_context_snapshot_read_keys():
+    """Snapshot only copies the keys asked for."""
+    context = ConcurrentContext({'a': {'b': 'c'}, 'd': 'e', 'f': 'g'})
+
+    snapshot = context.snapshot('a', 'f')
+
+    assert type(snapshot) is Context
+    assert snapshot == {'a': {'b': 'c'}, 'f': 'g'}
+    assert snapshot['a'] is not context['a']
+
+
+def test_context_snapshot_read_key_missing():
+    """Snapshot of key not in context raises KeyNotInContextError."""
+    with pytest.raises(KeyNotInContextError):
+        ConcurrentContext({'a': 'b'}).snapshot('a', 'x')
+
+
+def test_concurrent_context_is_context():
+    """Concurrent context is a Context that behaves like a dict."""
+    context = ConcurrentContext({'a': 'b'}, c='d')
+
+    assert isinstance(context, Context)
+    assert context == {'a': 'b', 'c': 'd'}
+    assert context.pystring_globals == {}
+    assert '_locks' not in vars(context)
+
+    context['e'] = 'f'
+    assert context.setdefault('e', 'x') == 'f'
+    assert context.setdefault('g') is None
+    del context['g']
+    assert context.pop('a') == 'b'
+    assert context.pop('a', 'default') == 'default'
+    context.update({'h': 'i'}, j='k')
+    context |= {'l': 'm'}
+    assert context == {'c': 'd', 'e': 'f', 'h': 'i', 'j': 'k', 'l': 'm'}
+    assert context.popitem() == ('l', 'm')
+
+    with pytest.raises(KeyNotInContextError):
+        context['a']
+
+    with pytest.raises(KeyError):
+        del context['a']
+
+    with pytest.raises(KeyError):
+        context.pop('a')
+
+    context.clear()
+    assert context == {}
+
+
+def test_concurrent_context_merge_set_defaults():
+    """Concurrent context merge & set_defaults work like Context's."""
+    context = ConcurrentContext({'a': 'b', 'c': {'d': 'e'}, 'l': [1]})
+
+    context.merge({'c': {'f': '{a}'}, 'l': [2]})
+    context.set_defaults({'a': 'x', 'c': {'g': 'h'}})
+    assert context == {'a': 'b', 'c': {'d': 'e', 'f': 'b', 'g': 'h'},
+                       'l': [1, 2]}
+
+    context.merge({'l': [3]}, replace_lists=True)
+    assert context['l'] == [3]
+
+
+def test_concurrent_context_lock_reentrant():
+    """Thread holding locks can write & lock the same keys again."""
+    context = ConcurrentContext({'a': 1, 'b': 2})
+
+    with context.lock('a', 'b', 'a') as locked:
+        assert locked is context
+        with context.lock():
+            context['a'] += 1
+            context.merge({'b': 3})
+
+        del context['b']
+
+    assert context == {'a': 2}
+
+
+def test_concurrent_context_lock_blocks_other_threads():
+    """Other threads wait for the key's lock, but not for other keys."""
+    context = ConcurrentContext()
+    done = []
+
+    def write(key):
+        context[key] = 'value'
+        done.append(key)
+
+    # a key in a different shard to 'a' doesn't wait.
+    other = next(key for key in range(100)
+                 if hash(key) % 16 != hash('a') % 16)
+
+    with context.lock('a'):
+        waiter = threading.Thread(target=write, args=('a',))
+        waiter.start()
+        free = threading.Thread(target=write, args=(other,))
+        free.start()
+        free.join()
+        waiter.join(0.1)
+        assert done == [other]
+
+    waiter.join()
+    assert done == [other, 'a']
+
+
+def test_concurrent_context_read_modify_write_threads():
+    """Increments under the key's lock from many threads don't get lost."""
+    context = ConcurrentContext({'count': 0})
+
+    def increment():
+        for _ in range(1000):
+            with context.lock('count'):
+                context['count'] += 1
+
+    threads = [threading.Thread(target=increment) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert context['count'] == 8000
+
+
+def test_concurrent_context_snapshot_sees_whole_merge():
+    """Snapshot never sees only some of a merge from another thread."""
+    context = ConcurrentContext({'a': 0, 'b': 0, 'nested': {'c': 0}})
+    stop = threading.Event()
+
+    def merge():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            context.merge({'a': i, 'b': i, 'nested': {'c': i}})
+
+    merger = threading.Thread(target=merge)
+    merger.start()
+    try:
+        for _ in range(500):
+            snapshot = context.snapshot()
+            assert snapshot['a'] == snapshot['b'] == snapshot['nested']['c']
+    finally:
+        stop.set()
+        merger.join()
+
+
+def test_concurrent_context_copies_and_pickles():
+    """Concurrent context copies & pickles with new locks."""
+    og = ConcurrentContext({'a': {'b': 'c'}})
+    og.pipeline_name = 'arb'
+
+    copied = deepcopy(og)
+    assert type(copied) is ConcurrentContext
+    assert copied == og
+    assert copied['a'] is not og['a']
+    assert copied.pipeline_name == 'arb'
+    assert copied._locks is not og._locks
+
+    reloaded = pickle.loads(pickle.dumps(og))
+    assert type(reloaded) is ConcurrentContext
+    assert reloaded == og
+    assert reloaded.pipeline_name == 'arb'
+    reloaded['d'] = 'e'
+    assert reloaded['d'] == 'e'
+
+
+def test_concurrent_context_dump_load():
+    """Concurrent context round-trips through a binary snapshot."""
+    og = ConcurrentContext({'a': 'b'})
+    og.working_dir = Path('/arb')
+    og.pystring_globals['x'] = object()
+
+    reloaded = Context.loads(og.dumps())
+
+    assert type(reloaded) is ConcurrentContext
+    assert reloaded == {'a': 'b'}
+    assert reloaded.working_dir == Path('/arb')
+    assert reloaded.pystring_globals == {}
+    with reloaded.lock('a'):
+        reloaded['a'] = 'c'
+
+# endregion concurrent
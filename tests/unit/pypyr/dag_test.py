@@ -0,0 +1,185 @@
+"""dag.py unit tests."""
+from unittest.mock import patch
+import pytest
+from pypyr.dag import (get_max_workers,
+                       get_step_nodes,
+                       merge_step_context,
+                       StepNode)
+from pypyr.errors import PipelineDefinitionError
+
+# region StepNode
+
+
+def test_step_node_str_step():
+    """Simple string step has no id & no needs."""
+    node = StepNode('arb.step')
+    assert node.step == 'arb.step'
+    assert node.id is None
+    assert node.needs == []
+    assert node.pending == 0
+    assert node.dependents == []
+    assert repr(node) == 'arb.step'
+
+
+def test_step_node_needs_str():
+    """Single str needs is a list of 1."""
+    node = StepNode({'name': 'arb', 'id': 'x', 'needs': 'a'})
+    assert node.id == 'x'
+    assert node.needs == ['a']
+    assert node.pending == 1
+    assert repr(node) == 'x'
+
+
+def test_step_node_needs_list():
+    """List needs."""
+    node = StepNode({'name': 'arb', 'needs': ['a', 'b']})
+    assert node.id is None
+    assert node.needs == ['a', 'b']
+    assert node.pending == 2
+    assert repr(node) == 'arb'
+
+
+def test_step_node_needs_none():
+    """Empty needs is no needs."""
+    node = StepNode({'name': 'arb', 'needs': None})
+    assert node.needs == []
+    assert node.pending == 0
+# endregion StepNode
+
+# region get_max_workers
+
+
+@pytest.mark.parametrize('parallel, expected', [
+    (False, 1),
+    (1, 1),
+    (4, 4),
+    ('3', 3),
+    (' -2 ', 1),
+    ('False', 1),
+    ('no', 1),
+    (0, 1),
+    (-2, 1),
+])
+def test_get_max_workers(parallel, expected):
+    """Parallel int or bool to max workers."""
+    assert get_max_workers(parallel) == expected
+
+
+@patch('pypyr.dag.os.cpu_count', return_value=6)
+def test_get_max_workers_true_cpu_count(mock_cpu_count):
+    """True is cpu count."""
+    assert get_max_workers(True) == 6
+    assert get_max_workers('true') == 6
+
+
+@patch('pypyr.dag.os.cpu_count', return_value=None)
+def test_get_max_workers_true_no_cpu_count(mock_cpu_count):
+    """True is 1 if cpu count unknown."""
+    assert get_max_workers(True) == 1
+# endregion get_max_workers
+
+# region get_step_nodes
+
+
+def test_get_step_nodes():
+    """Dependents link to the steps they need."""
+    nodes = get_step_nodes(['s0',
+                            {'name': 's1', 'id': 'a'},
+                            {'name': 's2', 'id': 'b', 'needs': 'a'},
+                            {'name': 's3', 'needs': ['a', 'b']}])
+
+    s0, a, b, s3 = nodes
+    assert s0.step == 's0'
+    assert s0.dependents == []
+    assert a.dependents == [b, s3]
+    assert b.dependents == [s3]
+    assert s3.dependents == []
+    assert [node.pending for node in nodes] == [0, 0, 1, 2]
+
+
+def test_get_step_nodes_empty():
+    """No steps, no nodes."""
+    assert get_step_nodes([]) == []
+
+
+def test_get_step_nodes_duplicate_id():
+    """Ids must be unique."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_step_nodes([{'name': 's1', 'id': 'a'},
+                        {'name': 's2', 'id': 'a'}])
+
+    assert str(err.value) == "step id a is not unique in its step-group."
+
+
+def test_get_step_nodes_unknown_need():
+    """Needs must be ids in the same group."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_step_nodes([{'name': 's1', 'id': 'a'},
+                        {'name': 's2', 'needs': ['a', 'b']}])
+
+    assert str(err.value) == ("step s2 needs b, but no step in its "
+                              "step-group has that id.")
+
+
+def test_get_step_nodes_cycle():
+    """Steps that need each other raise."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_step_nodes([{'name': 's1', 'id': 'a', 'needs': 'c'},
+                        {'name': 's2', 'id': 'b'},
+                        {'name': 's3', 'id': 'c', 'needs': ['a', 'b']},
+                        {'name': 's4', 'needs': 'c'}])
+
+    assert str(err.value) == ("steps [a, c, s4] need each other in a circle, "
+                              "so none of them can ever run.")
+
+
+def test_get_step_nodes_needs_self():
+    """Step that needs itself is a cycle."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_step_nodes([{'name': 's1', 'id': 'a', 'needs': 'a'}])
+
+    assert str(err.value) == ("steps [a] need each other in a circle, "
+                              "so none of them can ever run.")
+# endregion get_step_nodes
+
+# region merge_step_context
+
+
+def test_merge_step_context():
+    """Merge adds, changes & removes what step changed only."""
+    shared_list = [1]
+    context = {'a': 1, 'b': shared_list, 'c': 3, 'd': 4, 'other': 'x'}
+    before = {'a': 1, 'b': shared_list, 'c': 3, 'd': 4}
+    after = {'a': 1, 'b': shared_list, 'c': 'changed', 'e': 5}
+
+    merge_step_context(context, before, after)
+
+    assert context == {'a': 1, 'b': [1], 'c': 'changed', 'e': 5,
+                       'other': 'x'}
+
+
+def test_merge_step_context_removed_already():
+    """Removing a key another step already removed is fine."""
+    context = {}
+    merge_step_context(context, {'a': 1}, {})
+    assert context == {}
+
+
+def test_merge_step_context_run_errors_append():
+    """Each step's new runErrors append, rather than the last one winning."""
+    context = {}
+    merge_step_context(context, {}, {'runErrors': ['a']})
+    merge_step_context(context, {}, {'runErrors': ['b']})
+    assert context == {'runErrors': ['a', 'b']}
+
+    # step replaced the list it started with: only its new entries append.
+    seen = ['a']
+    context = {'runErrors': ['a', 'b']}
+    merge_step_context(context, {'runErrors': seen},
+                       {'runErrors': ['a', 'c']})
+    assert context == {'runErrors': ['a', 'b', 'c']}
+
+    # not a list, so it overwrites.
+    merge_step_context(context, {}, {'runErrors': 'x'})
+    assert context == {'runErrors': 'x'}
+# endregion merge_step_context
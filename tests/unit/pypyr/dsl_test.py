@@ -2,6 +2,7 @@
 from copy import deepcopy
 from io import StringIO
 import logging
+import threading
 import pytest
 from unittest.mock import call, patch, MagicMock
 from tests.common.utils import DeepCopyMagicMock, patch_logger
@@ -11,17 +12,25 @@
 
 import pypyr.cache.stepcache as stepcache
 from pypyr.context import Context
-from pypyr.dsl import (Jsonify,
+from pypyr.dsl import (DecoratorValue,
+                       Jsonify,
                        PyString,
                        SicString,
+                       SimpleStep,
                        SpecialTagDirective,
                        Step,
                        RetryDecorator,
                        WhileDecorator)
 from pypyr.errors import (Call,
+                          CircuitOpenError,
                           HandledError,
+                          Jump,
                           LoopMaxExhaustedError,
-                          PipelineDefinitionError)
+                          PipelineDefinitionError,
+                          Stop,
+                          TimeoutExpiredError)
+import pypyr.circuit as circuit
+import pypyr.resources as resources
 
 
 def arb_step_mock(context):
@@ -495,6 +504,117 @@ def test_sic_string_truthy():
 
 # endregion custom yaml tags
 
+# region DecoratorValue
+
+
+def test_decorator_value_constants():
+    """Literal values resolve once to out_type."""
+    dv = DecoratorValue(True, bool)
+    assert dv.is_constant
+    assert dv.constant is True
+
+    dv = DecoratorValue('False', bool)
+    assert dv.is_constant
+    assert dv.constant is False
+
+    dv = DecoratorValue('3', int)
+    assert dv.is_constant
+    assert dv.constant == 3
+
+    dv = DecoratorValue(0, float)
+    assert dv.is_constant
+    assert dv.constant == 0.0
+    assert isinstance(dv.constant, float)
+
+    dv = DecoratorValue('arb description')
+    assert dv.is_constant
+    assert dv.constant == 'arb description'
+
+    dv = DecoratorValue(None)
+    assert dv.is_constant
+    assert dv.constant is None
+
+    # as_type doesn't recurse into iterables, so this is constant.
+    dv = DecoratorValue(['{k1}'], bool)
+    assert dv.is_constant
+    assert dv.constant is True
+
+
+def test_decorator_value_dynamic():
+    """Expressions, special tags, iterables & failed casts are dynamic."""
+    assert not DecoratorValue('{k1}', bool).is_constant
+    assert not DecoratorValue('{{escaped}}').is_constant
+    assert not DecoratorValue('stray }', int).is_constant
+    assert not DecoratorValue(PyString('k1'), bool).is_constant
+    assert not DecoratorValue(['{k1}']).is_constant
+    assert not DecoratorValue({'a': 'b'}).is_constant
+
+    dv = DecoratorValue('arb', int)
+    assert not dv.is_constant
+    assert dv.constant is None
+
+
+def test_decorator_value_get_value_constant_skips_formatter():
+    """Constant doesn't call formatter."""
+    context = MagicMock()
+    dv = DecoratorValue('1', int)
+
+    assert dv.get_value(context, dv.value) == 1
+    context.get_formatted_as_type.assert_not_called()
+    context.get_formatted_value.assert_not_called()
+
+
+def test_decorator_value_get_value_dynamic():
+    """Dynamic values format against context every time."""
+    context = Context({'k1': 'True', 'k2': '{k1} and more'})
+
+    dv = DecoratorValue('{k1}', bool)
+    assert dv.get_value(context, dv.value) is True
+    context['k1'] = 'false'
+    assert dv.get_value(context, dv.value) is False
+
+    dv = DecoratorValue('{k2}')
+    assert dv.get_value(context, dv.value) == 'false and more'
+
+    dv = DecoratorValue('arb', int)
+    with pytest.raises(ValueError):
+        dv.get_value(context, dv.value)
+
+
+def test_decorator_value_get_value_reclassifies_changed_value():
+    """Changing the raw value after init reclassifies."""
+    context = Context({'k1': 5})
+    dv = DecoratorValue(1, int)
+
+    assert dv.get_value(context, '{k1}') == 5
+    assert dv.value == '{k1}'
+    assert not dv.is_constant
+
+    assert dv.get_value(context, 2) == 2
+    assert dv.is_constant
+
+
+def test_step_decorators_constant_no_format():
+    """Step with literal decorators never calls formatter for them."""
+    step = Step({'name': 'pypyr.steps.echo',
+                 'description': 'arb',
+                 'run': True,
+                 'skip': 'False',
+                 'swallow': 0,
+                 'retry': {'max': 2, 'sleep': 0},
+                 'while': {'max': 1, 'errorOnMax': False}},
+                None)
+
+    context = Context({'echoMe': 'x'})
+    with patch.object(Context, 'get_formatted_as_type') as mock_as_type:
+        step.run_step(context)
+
+    mock_as_type.assert_not_called()
+    assert context['retryCounter'] == 1
+    assert context['whileCounter'] == 1
+
+# endregion DecoratorValue
+
 # ------------------- test context -------------------------------------------#
 
 
@@ -560,6 +680,8 @@ def test_simple_step_init_defaults(mocked_moduleloader):
     assert not step.skip_me
     assert step.steps_runner == 'stepsrunner'
     assert not step.swallow_me
+    assert step.timeout is None
+    assert step.acquire is None
     assert not step.while_decorator
     assert step.line_no is None
     assert step.line_col is None
@@ -1022,6 +1144,93 @@ def test_foreach_with_single_key_substitution(mock_run, mock_moduleloader):
     assert step.for_counter == 'formatted value1'
 
 
+@pytest.mark.parametrize('mode', [True, 'True', 'stride'])
+@patch('pypyr.moduleloader.get_module')
+@patch.object(Step, 'run_conditional_decorators', return_value=None)
+def test_foreach_shard_stride(mock_run, mock_moduleloader, mode):
+    """Foreach with shard only loops over this shard's items by position."""
+    step = Step({'name': 'step1',
+                 'foreach': '{items}',
+                 'shard': '{mode}'},
+                None)
+
+    context = Context({'items': ['a', 'b', 'c', 'd', 'e'],
+                       'mode': mode,
+                       'shardIndex': 1,
+                       'shardCount': 2})
+
+    with patch_logger('pypyr.dsl', logging.INFO) as mock_logger_info:
+        step.run_step(context)
+
+    assert mock_logger_info.mock_calls == [
+        call('foreach decorator will loop over shard 1/2 of 5 items, by '
+             'stride.'),
+        call('foreach: running step b'),
+        call('foreach: running step d')]
+
+    assert mock_run.call_count == 2
+    assert context['i'] == 'd'
+
+
+@patch('pypyr.moduleloader.get_module')
+@patch.object(Step, 'run_conditional_decorators', return_value=None)
+def test_foreach_shard_hash(mock_run, mock_moduleloader):
+    """Foreach with shard hash splits every item into exactly 1 shard."""
+    step = Step({'name': 'step1',
+                 'foreach': list(range(20)),
+                 'shard': 'hash'},
+                None)
+
+    seen = []
+    mock_run.side_effect = lambda context: seen.append(context['i'])
+    for index in range(3):
+        context = Context({'shardIndex': index, 'shardCount': 3})
+        with patch_logger('pypyr.dsl', logging.INFO) as mock_logger_info:
+            step.run_step(context)
+
+        assert mock_logger_info.mock_calls[0] == call(
+            f'foreach decorator will loop over shard {index}/3 of 20 '
+            'items, by hash.')
+
+    assert sorted(seen) == list(range(20))
+
+
+@pytest.mark.parametrize('step_shard, context_in', [
+    (True, {}),
+    (True, {'shardIndex': 0, 'shardCount': None}),
+    (False, {'shardIndex': 0, 'shardCount': 2}),
+    ('{mode}', {'shardIndex': 0, 'shardCount': 2, 'mode': False}),
+    ('{mode}', {'shardIndex': 0, 'shardCount': 2, 'mode': 'False'}),
+    ('{mode}', {'shardIndex': 0, 'shardCount': 2, 'mode': 'off'}),
+])
+@patch('pypyr.moduleloader.get_module')
+@patch.object(Step, 'run_conditional_decorators', return_value=None)
+def test_foreach_shard_not_applicable(mock_run,
+                                      mock_moduleloader,
+                                      step_shard,
+                                      context_in):
+    """Foreach loops over all items without shard on both step & context."""
+    step = Step({'name': 'step1',
+                 'foreach': ['a', 'b', 'c'],
+                 'shard': step_shard},
+                None)
+
+    with patch_logger('pypyr.dsl', logging.INFO) as mock_logger_info:
+        step.run_step(Context(context_in))
+
+    assert mock_logger_info.mock_calls[0] == call(
+        'foreach decorator will loop 3 times.')
+    assert mock_run.call_count == 3
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_shard_ignored_without_foreach(mock_moduleloader):
+    """Shard only applies to foreach."""
+    step = Step({'name': 'step1', 'shard': True}, None)
+
+    assert step.shard_mode is False
+
+
 def mock_step_mutating_run(context):
     """Mock a step's run_step by setting a context value False."""
     context['dynamic_run_expression'] = False
@@ -2676,6 +2885,161 @@ def test_run_pipeline_steps_simple_with_error(mock_invoke_step,
 
 # ------------------- Step: run_step: swallow --------------------------------#
 
+# ------------------- Step: run_step: timeout --------------------------------#
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_run_step_timeout_success(mock_get_module):
+    """Step with timeout runs normally when it finishes in time."""
+    step = Step({'name': 'step1', 'timeout': '{t}'}, None)
+    context = Context({'t': 5})
+    threads = []
+
+    def invoke_step(context):
+        threads.append(threading.current_thread().name)
+        context['out'] = 'value'
+
+    with patch.object(Step, 'invoke_step', side_effect=invoke_step):
+        step.run_step(context)
+
+    assert step.timeout == '{t}'
+    assert context == {'t': 5, 'out': 'value'}
+    assert threads == ['pypyr step step1']
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_run_step_timeout_expires(mock_get_module):
+    """Step that doesn't finish within timeout raises & saves error."""
+    step = Step({'name': 'step1', 'timeout': 0.05}, None)
+    release = threading.Event()
+    context = Context()
+
+    with patch.object(Step, 'invoke_step',
+                      side_effect=lambda context: release.wait(5)):
+        with pytest.raises(TimeoutExpiredError) as err_info:
+            step.run_step(context)
+
+    release.set()
+    assert str(err_info.value) == (
+        "step step1 didn't finish within its 0.05s timeout.")
+    assert context['runErrors'][0]['name'] == (
+        'pypyr.errors.TimeoutExpiredError')
+    assert not context['runErrors'][0]['swallowed']
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_run_step_timeout_expires_swallow(mock_get_module):
+    """Step with swallow carries on after its timeout."""
+    step = Step({'name': 'step1', 'timeout': 0.05, 'swallow': True}, None)
+    release = threading.Event()
+    context = Context()
+
+    with patch.object(Step, 'invoke_step',
+                      side_effect=lambda context: release.wait(5)):
+        with patch_logger('pypyr.dsl', logging.ERROR) as mock_logger_error:
+            step.run_step(context)
+
+    release.set()
+    mock_logger_error.assert_called_once_with(
+        "step1 Ignoring error because swallow is True for this step.\n"
+        "pypyr.errors.TimeoutExpiredError: step step1 didn't finish within "
+        "its 0.05s timeout.")
+    assert context['runErrors'][0]['swallowed']
+
+
+@patch('pypyr.moduleloader.get_module')
+@patch('time.sleep')
+def test_run_step_timeout_each_retry(mock_sleep, mock_get_module):
+    """Step timeout applies to each retry attempt."""
+    step = Step({'name': 'step1',
+                 'timeout': 0.05,
+                 'retry': {'max': 2}},
+                None)
+    release = threading.Event()
+    attempts = []
+
+    def invoke_step(context):
+        attempts.append(context['retryCounter'])
+        if len(attempts) == 1:
+            release.wait(5)
+
+    context = Context()
+    with patch.object(Step, 'invoke_step', side_effect=invoke_step):
+        step.run_step(context)
+
+    release.set()
+    assert attempts == [1, 2]
+    assert context['retryCounter'] == 2
+
+# ------------------- Step: run_step: timeout --------------------------------#
+
+# ------------------- Step: run_step: acquire --------------------------------#
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_run_step_acquire_holds_resources(mock_get_module):
+    """Step with acquire holds the resources while it runs."""
+    resources.add_resources({'dsl-a': 1, 'dsl-b': 1})
+    step = Step({'name': 'step1', 'acquire': ['dsl-a', '{b}']}, None)
+    context = Context({'b': 'dsl-b'})
+
+    def invoke_step(context):
+        stats = resources.get_stats()
+        context['held'] = [stats['dsl-a']['in_use'],
+                           stats['dsl-b']['in_use']]
+
+    with patch.object(Step, 'invoke_step', side_effect=invoke_step):
+        step.run_step(context)
+
+    assert step.acquire == ['dsl-a', '{b}']
+    assert context['held'] == [1, 1]
+    assert resources.get_stats()['dsl-a']['in_use'] == 0
+
+
+@patch('pypyr.moduleloader.get_module')
+@patch('time.sleep')
+def test_run_step_acquire_each_retry_within_timeout(mock_sleep,
+                                                    mock_get_module):
+    """Acquire holds resources per attempt, inside the step timeout."""
+    resources.add_resources({'dsl-c': 1})
+    step = Step({'name': 'step1',
+                 'acquire': 'dsl-c',
+                 'timeout': 5,
+                 'retry': {'max': 2}},
+                None)
+    attempts = []
+
+    def invoke_step(context):
+        attempts.append((threading.current_thread().name,
+                         resources.get_stats()['dsl-c']['in_use']))
+        if len(attempts) == 1:
+            raise ValueError('arb')
+
+    with patch.object(Step, 'invoke_step', side_effect=invoke_step):
+        step.run_step(Context())
+
+    assert attempts == [('pypyr step step1', 1), ('pypyr step step1', 1)]
+    stats = resources.get_stats()['dsl-c']
+    assert stats['acquisitions'] == 2
+    assert stats['in_use'] == 0
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_run_step_acquire_not_found(mock_get_module):
+    """Step with acquire raises if the resource doesn't exist."""
+    step = Step({'name': 'step1', 'acquire': 'dsl-arb-not-there'}, None)
+
+    with patch.object(Step, 'invoke_step') as mock_invoke_step:
+        with pytest.raises(PipelineDefinitionError) as err_info:
+            step.run_step(Context())
+
+    mock_invoke_step.assert_not_called()
+    assert str(err_info.value) == (
+        "resource dsl-arb-not-there doesn't exist. Define it in the "
+        "pipeline's resources section.")
+
+# ------------------- Step: run_step: acquire --------------------------------#
+
 
 # ------------------- Step: run_step: input context --------------------------#
 
@@ -2952,6 +3316,144 @@ def test_save_error_multiple_call(mocked_moduleloader):
 # ------------------- Step: save_error ---------------------------#
 # ------------------- Step----------------------------------------------------#
 
+# region SimpleStep
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_init(mock_get_step):
+    """Simple step loads step function & has decorator defaults."""
+    mock_get_step.return_value = mock_run_step
+
+    with patch_logger('pypyr.dsl', logging.DEBUG) as mock_logger_debug:
+        step = SimpleStep('mocked.step', 'runner')
+
+    mock_logger_debug.assert_called_once_with(
+        'mocked.step is a simple string.')
+    mock_get_step.assert_called_once_with('mocked.step')
+
+    assert isinstance(step, Step)
+    assert step.name == 'mocked.step'
+    assert step.steps_runner == 'runner'
+    assert step.run_step_function is mock_run_step
+    assert step.description is None
+    assert step.foreach_items is None
+    assert step.in_parameters is None
+    assert step.line_col is None
+    assert step.line_no is None
+    assert step.on_error is None
+    assert step.retry_decorator is None
+    assert step.run_me is True
+    assert step.skip_me is False
+    assert step.swallow_me is False
+    assert step.while_decorator is None
+
+
+@patch('pypyr.moduleloader.get_module', return_value=3)
+def test_simple_step_init_cant_get_run_step(mocked_moduleloader):
+    """Simple step logs step name when it can't load step."""
+    stepcache.step_cache.clear()
+    with pytest.raises(AttributeError):
+        with patch_logger('pypyr.dsl', logging.ERROR) as mock_logger_error:
+            SimpleStep('mocked.step', None)
+
+    mock_logger_error.assert_called_once_with(
+        'Error at pipeline step mocked.step')
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_run_step(mock_get_step):
+    """Simple step runs step without evaluating decorators & re-runs."""
+    mock_get_step.return_value = mock_run_step
+    context = Context()
+    step = SimpleStep('mocked.step', None)
+
+    with patch.object(DecoratorValue, 'get_value') as mock_get_value:
+        step.run_step(context)
+        del context['test_run_step']
+        step.run_step(context)
+
+    mock_get_value.assert_not_called()
+    assert context == {'test_run_step': 'this was set in step'}
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_run_step_error_saves_and_raises(mock_get_step):
+    """Simple step saves error to runErrors, logs & raises."""
+    err = ValueError('arb')
+    mock_get_step.return_value = MagicMock(side_effect=err)
+    context = Context()
+    step = SimpleStep('mocked.step', None)
+
+    with patch_logger('pypyr.dsl', logging.ERROR) as mock_logger_error:
+        with pytest.raises(ValueError) as err_info:
+            step.run_step(context)
+
+    assert err_info.value is err
+    mock_logger_error.assert_called_once_with(
+        'Error while running step mocked.step')
+    assert context['runErrors'] == [{
+        'col': None,
+        'customError': {},
+        'description': 'arb',
+        'exception': err,
+        'line': None,
+        'name': 'ValueError',
+        'step': 'mocked.step',
+        'swallowed': False,
+    }]
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_run_step_handled_error_not_saved(mock_get_step):
+    """Simple step doesn't save an already handled error again."""
+    err = ValueError('arb')
+    handled = HandledError()
+    handled.__cause__ = err
+    mock_get_step.return_value = MagicMock(side_effect=handled)
+    context = Context()
+
+    with pytest.raises(ValueError) as err_info:
+        SimpleStep('mocked.step', None).run_step(context)
+
+    assert err_info.value is err
+    assert 'runErrors' not in context
+
+
+@pytest.mark.parametrize('instruction', [
+    Jump(['g'], None, None, ('jump', 'g')), Stop()])
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_run_step_control_of_flow(mock_get_step, instruction):
+    """Simple step raises control-of-flow instructions & Stop as is."""
+    mock_get_step.return_value = MagicMock(side_effect=instruction)
+    context = Context()
+
+    with pytest.raises(type(instruction)) as err_info:
+        SimpleStep('mocked.step', None).run_step(context)
+
+    assert err_info.value is instruction
+    assert 'runErrors' not in context
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_simple_step_run_step_call(mock_get_step):
+    """Simple step runs called groups & resets call config."""
+    context = Context({'call': 'og'})
+    original_config = context['call']
+
+    def step_raises_call(context):
+        context['call'] = 'changed'
+        raise Call(['g'], 'sg', 'fg', ('call', original_config))
+
+    mock_get_step.return_value = step_raises_call
+    runner = MagicMock()
+    SimpleStep('mocked.step', runner).run_step(context)
+
+    runner.run_step_groups.assert_called_once_with(groups=['g'],
+                                                   success_group='sg',
+                                                   failure_group='fg')
+    assert context == {'call': 'og'}
+# endregion SimpleStep
+
 # ------------------- RetryDecorator -----------------------------------------#
 # ------------------- RetryDecorator: init -----------------------------------#
 
@@ -2987,6 +3489,24 @@ def test_retry_init_all_attributes():
     assert rd.stop_on == [4, 5, 6]
     assert rd.retry_on == [1, 2, 3]
     assert rd.retry_counter is None
+    assert rd.timeout is None
+    assert rd.circuit is None
+    assert rd.breaker is None
+
+
+def test_retry_init_circuit():
+    """The RetryDecorator ctor sets circuit but no breaker yet."""
+    rd = RetryDecorator({'circuit': 'arb'})
+    assert rd.circuit == 'arb'
+    assert rd.breaker is None
+
+
+def test_retry_init_timeout():
+    """The RetryDecorator ctor sets timeout but no deadline yet."""
+    rd = RetryDecorator({'timeout': 2.5})
+    assert rd.timeout == 2.5
+    assert rd.deadline is None
+    assert rd.timeout_seconds is None
 
 
 def test_retry_init_not_a_dict():
@@ -3524,6 +4044,143 @@ def mock_step(context):
         call('retry decorator will try 1 times at 0.3s intervals.'),
         call('retry: running step with counter 1')]
 
+
+@patch('time.sleep')
+def test_retry_loop_timeout_continue_on_success(mock_time_sleep):
+    """Retry loop with timeout breaks out of loop on success in time."""
+    rd = RetryDecorator({'timeout': '{t}', 'sleep': 0.1})
+    context = Context({'t': 10})
+    mock = MagicMock()
+    mock.side_effect = [ValueError('arb'), None]
+
+    with patch_logger('pypyr.dsl', logging.INFO) as mock_logger_info:
+        rd.retry_loop(context, mock)
+
+    assert context['retryCounter'] == 2
+    assert mock.call_count == 2
+    assert rd.timeout_seconds == 10
+    mock_time_sleep.assert_called_once_with(0.1)
+
+    assert mock_logger_info.mock_calls == [
+        call('retry decorator will give up after 10.0s.'),
+        call('retry decorator will try indefinitely at 0.1s intervals.'),
+        call('retry: running step with counter 1'),
+        call('retry: running step with counter 2')]
+
+
+@patch('time.sleep')
+def test_retry_loop_timeout_exhausted(mock_time_sleep):
+    """Retry loop raises when no time left to sleep & try again."""
+    rd = RetryDecorator({'max': 5, 'timeout': 1, 'sleep': 10})
+    context = Context()
+    mock = MagicMock()
+    arb_error = ValueError('arb')
+    mock.side_effect = arb_error
+
+    with patch_logger('pypyr.dsl', logging.ERROR) as mock_logger_error:
+        with pytest.raises(TimeoutExpiredError) as err_info:
+            rd.retry_loop(context, mock)
+
+    assert str(err_info.value) == (
+        "retry didn't succeed within its 1.0s timeout. gave up after 1 "
+        "attempts. last error was ValueError: arb")
+    assert err_info.value.__cause__ is arb_error
+    assert mock.call_count == 1
+    mock_time_sleep.assert_not_called()
+    mock_logger_error.assert_called_once_with(
+        "retry: timeout exhausted after 1 attempts. raising error.")
+
+
+def test_retry_loop_timeout_cuts_attempt_short():
+    """Retry timeout is the budget for all attempts, not just sleeps."""
+    rd = RetryDecorator({'timeout': 0.05})
+    release = threading.Event()
+
+    with pytest.raises(TimeoutExpiredError) as err_info:
+        rd.retry_loop(Context(), lambda context: release.wait(5))
+
+    release.set()
+    assert str(err_info.value).startswith(
+        "retry didn't succeed within its 0.05s timeout. gave up after 1 "
+        "attempts. last error was pypyr.errors.TimeoutExpiredError: retry "
+        "didn't finish within its ")
+
+
+@patch('time.sleep')
+def test_retry_loop_circuit_opens_and_fails_fast(mock_time_sleep):
+    """Retry stops when its circuit opens & other loops then fail fast."""
+    rd = RetryDecorator({'max': 10,
+                         'circuit': {'name': '{circuitName}',
+                                     'failures': 2}})
+    context = Context({'circuitName': 'dsl-open'})
+    mock = MagicMock()
+    arb_error = ValueError('arb')
+    mock.side_effect = arb_error
+
+    with patch_logger('pypyr.dsl', logging.ERROR) as mock_logger_error:
+        with pytest.raises(CircuitOpenError) as err_info:
+            rd.retry_loop(context, mock)
+
+    assert str(err_info.value) == (
+        "circuit dsl-open is open. stopped retrying after 2 attempts. last "
+        "error was ValueError: arb")
+    assert err_info.value.__cause__ is arb_error
+    assert mock.call_count == 2
+    mock_time_sleep.assert_called_once_with(0)
+    assert mock_logger_error.mock_calls[-1] == call(
+        "retry: circuit dsl-open open after 2 attempts. raising error.")
+
+    # another retry loop on the same circuit doesn't run its step.
+    other = MagicMock()
+    with pytest.raises(CircuitOpenError) as err_info:
+        RetryDecorator({'max': 10, 'circuit': 'dsl-open'}).retry_loop(
+            Context(), other)
+
+    assert str(err_info.value).startswith(
+        "circuit dsl-open is open. failing fast for ")
+    other.assert_not_called()
+    circuit.clear()
+
+
+@patch('time.sleep')
+def test_retry_loop_circuit_success_clears_failures(mock_time_sleep):
+    """Success between failures keeps the circuit closed."""
+    definition = {'circuit': {'name': 'dsl-success', 'failures': 2}}
+    mock = MagicMock()
+    mock.side_effect = [ValueError('arb'), 'instruction',
+                        ValueError('arb'), None]
+
+    assert RetryDecorator(definition).retry_loop(
+        Context(), mock) == 'instruction'
+    assert RetryDecorator(definition).retry_loop(Context(), mock) is None
+
+    assert mock.call_count == 4
+    assert circuit.get_circuit('dsl-success').get_state() == 'closed'
+    circuit.clear()
+
+
+@patch('time.sleep')
+def test_retry_loop_circuit_counts_last_attempt(mock_time_sleep):
+    """Failure on the last attempt counts, by the handled error's cause."""
+    definition = {'max': 1,
+                  'circuit': {'name': 'dsl-count', 'failures': 2}}
+    handled = HandledError('arb')
+    handled.__cause__ = ValueError('arb')
+
+    with pytest.raises(HandledError):
+        RetryDecorator(definition).retry_loop(
+            Context(), MagicMock(side_effect=handled))
+
+    assert circuit.get_circuit('dsl-count').get_state() == 'closed'
+
+    definition['max'] = 2
+    with pytest.raises(CircuitOpenError) as err_info:
+        RetryDecorator(definition).retry_loop(
+            Context(), MagicMock(side_effect=ValueError('arb')))
+
+    assert isinstance(err_info.value.__cause__, ValueError)
+    circuit.clear()
+
 # ------------------- RetryDecorator: retry_loop -----------------------------#
 
 # ------------------- RetryDecorator -----------------------------------------#
@@ -4040,5 +4697,26 @@ def mock_step(context):
         call('while: running step with counter 1'),
         call('while decorator looped 1 times, and {k1} never evaluated to '
              'True.')]
+
+
+@patch('time.sleep')
+def test_while_loop_returned_instruction_ends_loop(mock_time_sleep):
+    """While loop stops when step returns a control-of-flow instruction."""
+    wd = WhileDecorator({'max': 5, 'stop': '{k1}'})
+    context = Context({'k1': False})
+    jump = Jump(['b'], None, None, None)
+    mock = MagicMock()
+    # side_effect would raise the instruction, rather than return it.
+    results = iter([None, jump, None])
+    mock.side_effect = lambda context: next(results)
+
+    with patch_logger('pypyr.dsl', logging.DEBUG) as mock_logger_debug:
+        instruction = wd.while_loop(context, mock)
+
+    assert instruction is jump
+    assert mock.call_count == 2
+    assert wd.while_counter == 2
+    assert mock_time_sleep.call_count == 1
+    assert call('while: Jump ends loop at 2') in mock_logger_debug.mock_calls
 # ------------------- WhileDecorator: while_loop -----------------------------#
 # ------------------- WhileDecorator -----------------------------------------#
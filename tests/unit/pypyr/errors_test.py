@@ -1,6 +1,7 @@
 """errors.py unit tests."""
 from pypyr.errors import Error as PypyrError
 from pypyr.errors import (
+    CircuitOpenError,
     ContextError,
     get_error_name,
     HandledError,
@@ -11,6 +12,8 @@
     PipelineDefinitionError,
     PipelineNotFoundError,
     PyModuleNotFoundError,
+    QueueJobError,
+    TimeoutExpiredError,
     Stop,
     StopStepGroup,
     StopPipeline,
@@ -40,6 +43,16 @@ def test_base_error_raises():
     assert str(err_info.value) == "this is error text right here"
 
 
+def test_circuit_open_error_raises():
+    """A CircuitOpenError raises with correct message."""
+    assert isinstance(CircuitOpenError(), PypyrError)
+
+    with pytest.raises(CircuitOpenError) as err_info:
+        raise CircuitOpenError("this is error text right here")
+
+    assert str(err_info.value) == "this is error text right here"
+
+
 def test_context_error_raises():
     """A ContextError raises with correct message."""
     assert isinstance(ContextError(), PypyrError)
@@ -144,6 +157,29 @@ def test_pymodule_not_found_error_raises():
 
     assert str(err_info.value) == "this is error text right here"
 
+
+def test_queue_job_error_raises():
+    """A QueueJobError raises with correct message."""
+    # confirm subclassed from pypyr root error
+    assert isinstance(QueueJobError(), PypyrError)
+
+    with pytest.raises(QueueJobError) as err_info:
+        raise QueueJobError("this is error text right here")
+
+    assert str(err_info.value) == "this is error text right here"
+
+
+def test_timeout_expired_error_raises():
+    """A TimeoutExpiredError raises with correct message."""
+    # confirm subclassed from pypyr root error & builtin TimeoutError
+    assert isinstance(TimeoutExpiredError(), PypyrError)
+    assert isinstance(TimeoutExpiredError(), TimeoutError)
+
+    with pytest.raises(TimeoutExpiredError) as err_info:
+        raise TimeoutExpiredError("this is error text right here")
+
+    assert str(err_info.value) == "this is error text right here"
+
 # -------------------------- Control of Flow Instructions ---------------------
 
 
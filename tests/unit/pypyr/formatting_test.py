@@ -1,5 +1,5 @@
 """formatting.py unit tests."""
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 import pytest
 from pypyr.formatting import RecursionSpec, RecursiveFormatter
 
@@ -642,4 +642,181 @@ def test_recursive_formatted_unused_one_expression():
 
 # endregion RecursiveFormatter.check_used_arguments
 
+# region RecursiveFormatter memo
+
+
+def test_recursive_formatter_literal_returns_input():
+    """String without expressions returns as is, even with memo."""
+    formatter = RecursiveFormatter(memo_size=10)
+    literal = 'arb literal'
+
+    with patch.object(formatter, '_format_keep_type') as mock_format:
+        assert formatter.vformat(literal, None, {}) is literal
+
+    mock_format.assert_not_called()
+    assert not formatter._memo
+
+
+def test_recursive_formatter_escaped_literal():
+    """Escaped braces with no expression is still a literal."""
+    formatter = RecursiveFormatter(memo_size=10)
+    assert formatter.vformat('{{arb}}', None, {}) == '{arb}'
+    assert formatter.vformat('arb{{', None, {}) == 'arb{'
+    assert formatter._memo == {('{{arb}}', False): ('{arb}', ()),
+                               ('arb{{', False): ('arb{', ())}
+
+
+def test_recursive_formatter_no_memo_by_default():
+    """Without memo_size nothing memoizes."""
+    formatter = RecursiveFormatter()
+    assert formatter.vformat('a {k1}', None, {'k1': 'b'}) == 'a b'
+    assert not formatter._memo
+
+
+def test_recursive_formatter_memo_hit_until_arg_changes():
+    """Memoized string reuses result until an arg it read changes."""
+    formatter = RecursiveFormatter(memo_size=10)
+    d = {'k1': 'v1', 'k2': '{k3}', 'k3': 3, 'k4': 'unread'}
+    real_format = formatter._format_keep_type
+
+    with patch.object(formatter, '_format_keep_type',
+                      side_effect=real_format) as mock_format:
+        assert formatter.vformat('a {k1} {k2:rf}', None, d) == 'a v1 3'
+        assert mock_format.call_count == 2
+        assert formatter._memo[('{k3}', True)] == (3, (('k3', 3),))
+
+        # hit. unread arg doesn't matter.
+        d['k4'] = 'changed'
+        assert formatter.vformat('a {k1} {k2:rf}', None, d) == 'a v1 3'
+        assert mock_format.call_count == 2
+
+        # nested arg changed
+        d['k3'] = 4
+        assert formatter.vformat('a {k1} {k2:rf}', None, d) == 'a v1 4'
+        assert mock_format.call_count == 4
+
+        # arg removed
+        del d['k1']
+        with pytest.raises(KeyError):
+            formatter.vformat('a {k1} {k2:rf}', None, d)
+
+
+def test_recursive_formatter_memo_hit_tracks_used_args():
+    """Memoized hit still reports the args it read."""
+    formatter = UnusedArgs({'k1', 'k2'})
+    formatter.memo_size = 10
+    d = {'k1': 'v1', 'k2': '{k1}'}
+
+    assert formatter.vformat('{k2}', None, d) == 'v1'
+    assert formatter._memo
+    assert formatter.vformat('{k2}', None, d) == 'v1'
+
+
+def test_recursive_formatter_memo_skips_container_args():
+    """String that read a container arg doesn't memoize."""
+    formatter = RecursiveFormatter(memo_size=10)
+    d = {'k1': {'a': 'b'}, 'k2': 'v2'}
+
+    assert formatter.vformat('{k2} {k1[a]}', None, d) == 'v2 b'
+    assert not formatter._memo
+
+    # result itself a container
+    assert formatter.vformat('{k1}', None, d) == {'a': 'b'}
+    assert not formatter._memo
+
+
+def test_recursive_formatter_memo_skips_positional_args():
+    """Positional args never memoize."""
+    formatter = RecursiveFormatter(memo_size=10)
+
+    assert formatter.format('{0} {k1}', 'a', k1='b') == 'a b'
+    assert not formatter._memo
+
+
+def test_recursive_formatter_memo_full_clears():
+    """Memo clears when it reaches memo_size."""
+    formatter = RecursiveFormatter(memo_size=2)
+    d = {'k1': 1}
+
+    formatter.vformat('{k1}', None, d)
+    formatter.vformat('a{k1}', None, d)
+    assert len(formatter._memo) == 2
+
+    formatter.vformat('b{k1}', None, d)
+    assert list(formatter._memo) == [('b{k1}', False)]
+
+    formatter.clear_memo()
+    assert not formatter._memo
+
+# endregion RecursiveFormatter memo
+
+# region RecursiveFormatter is_shared
+
+
+def test_recursive_formatter_shared_unchanged_returns_input():
+    """Shared returns the same container when nothing in it changed."""
+    formatter = RecursiveFormatter()
+    obj = {'k1': ['a', 1, ('b', None)],
+           'k2': {'k2.1': {'c', 'd'}},
+           3: b'bytes'}
+
+    assert formatter.vformat(obj, None, {}, is_shared=True) is obj
+
+    # default still copies
+    out = formatter.vformat(obj, None, {})
+    assert out == obj
+    assert out is not obj
+    assert out['k1'] is not obj['k1']
+
+
+def test_recursive_formatter_shared_only_copies_changed_path():
+    """Shared allocates new containers only along the changed path."""
+    formatter = RecursiveFormatter()
+    unchanged_list = ['a', 'b']
+    unchanged_dict = {'x': 'y'}
+    changed_list = ['a', '{k1}', 'c']
+    obj = {'k1': unchanged_list,
+           'k2': {'k2.1': unchanged_dict, 'k2.2': changed_list},
+           'k3': ('{k1}',),
+           'k4': {'{k1}'}}
+
+    out = formatter.vformat(obj, None, {'k1': 'v1'}, is_shared=True)
+
+    assert out == {'k1': ['a', 'b'],
+                   'k2': {'k2.1': {'x': 'y'}, 'k2.2': ['a', 'v1', 'c']},
+                   'k3': ('v1',),
+                   'k4': {'v1'}}
+    assert out is not obj
+    assert out['k1'] is unchanged_list
+    assert out['k2'] is not obj['k2']
+    assert out['k2']['k2.1'] is unchanged_dict
+    assert out['k2']['k2.2'] is not changed_list
+    # input not mutated
+    assert changed_list == ['a', '{k1}', 'c']
+
+
+def test_recursive_formatter_shared_changed_key():
+    """Shared copies a mapping when only a key changed."""
+    formatter = RecursiveFormatter()
+    obj = {'a': 1, '{k1}': 2}
+
+    out = formatter.vformat(obj, None, {'k1': 'b'}, is_shared=True)
+
+    assert out == {'a': 1, 'b': 2}
+    assert list(out) == ['a', 'b']
+    assert obj == {'a': 1, '{k1}': 2}
+
+
+def test_recursive_formatter_shared_expression_returns_arg():
+    """Shared expression returns the arg itself rather than a copy."""
+    formatter = RecursiveFormatter()
+    arg = {'x': ['y']}
+
+    assert formatter.vformat('{k1}', None, {'k1': arg}, is_shared=True) is arg
+    assert formatter.vformat('{k1:rf}', None, {'k1': arg},
+                             is_shared=True) is arg
+    assert formatter.vformat('{k1}', None, {'k1': arg}) is not arg
+
+# endregion RecursiveFormatter is_shared
+
 # endregion RecursiveFormatter
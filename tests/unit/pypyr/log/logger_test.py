@@ -75,6 +75,21 @@ def test_notify_log_level_available():
     mock_logger_notify.assert_called_once_with("Arb message: arb value")
 
 
+def test_notify_log_level_patches_logger_class_once():
+    """Notify only patches the logger class if it isn't already."""
+    class ArbLogger():
+        pass
+
+    with patch('logging.getLoggerClass', return_value=ArbLogger):
+        with patch('logging.addLevelName') as mock_add_level_name:
+            pypyr.log.logger.set_up_notify_log_level()
+            pypyr.log.logger.set_up_notify_log_level()
+
+    mock_add_level_name.assert_called_once_with(pypyr.log.logger.NOTIFY,
+                                                'NOTIFY')
+    assert ArbLogger.notify is pypyr.log.logger.notify
+
+
 def test_set_logging_log_level_none():
     """Level None should default to simplified log output."""
     with patch.object(logging, 'basicConfig') as mock_logger:
@@ -1,6 +1,7 @@
 """moduleloader.py unit tests."""
 from pathlib import Path
 import sys
+from unittest.mock import patch
 
 import pytest
 
@@ -215,26 +216,23 @@ def test_get_module_in_package_pass():
 def test_working_dir_set_default():
     """Set working dir to cwd if not specified."""
     w = moduleloader.WorkingDir()
-    w.set_working_directory()
+    with patch('sys.path', []):
+        assert w.set_working_directory() == Path.cwd()
 
-    cwd = Path.cwd()
-    assert w.get_working_directory() == cwd
-
-    cwd = str(cwd)
-    assert cwd in sys.path
-    sys.path.remove(cwd)
+        cwd = Path.cwd()
+        assert w.get_working_directory() == cwd
+        assert sys.path == [str(cwd)]
 
 
 def test_working_dir_set_explicit_none():
     """Set working dir to cwd if None."""
     w = moduleloader.WorkingDir()
-    w.set_working_directory(None)
+    with patch('sys.path', []):
+        w.set_working_directory(None)
 
-    cwd = Path.cwd()
-    assert w.get_working_directory() == cwd
-    cwd = str(cwd)
-    assert cwd in sys.path
-    sys.path.remove(cwd)
+        cwd = Path.cwd()
+        assert w.get_working_directory() == cwd
+        assert sys.path == [str(cwd)]
 
 
 def test_working_dir_get_before_set():
@@ -250,8 +248,20 @@ def test_set_working_dir():
     """Working dir added to sys paths."""
     p = '/arb/path'
     assert p not in sys.path
-    moduleloader.set_working_directory(p)
+    assert moduleloader.set_working_directory(p) == Path(p)
     assert p in sys.path
     sys.path.remove(p)
 
+
+def test_set_working_dir_no_duplicate_sys_path():
+    """Setting the same working dir many times adds it to sys.path once."""
+    with patch('sys.path', ['/a']):
+        w = moduleloader.WorkingDir()
+        w.set_working_directory('/b')
+        w.set_working_directory(Path('/b'))
+        w.set_working_directory('/a')
+
+        assert sys.path == ['/a', '/b']
+        assert w.get_working_directory() == Path('/a')
+
 # endregion WorkingDir
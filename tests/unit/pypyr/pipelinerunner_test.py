@@ -1,12 +1,14 @@
 """pipelinerunner.py unit tests."""
 import logging
 from pathlib import Path
+import pickle
+import threading
 import pytest
 from unittest.mock import call, patch
 from pypyr.cache.loadercache import pypeloader_cache
 from pypyr.cache.parsercache import contextparser_cache
 from pypyr.cache.pipelinecache import pipeline_cache
-from pypyr.context import Context
+from pypyr.context import ConcurrentContext, Context
 from pypyr.errors import (ContextError,
                           KeyNotInContextError,
                           PyModuleNotFoundError,
@@ -99,7 +101,8 @@ def test_get_parser_context_signature_wrong(mocked_moduleloader):
 
 @patch('pypyr.log.logger.set_up_notify_log_level')
 @patch('pypyr.pipelinerunner.load_and_run_pipeline')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_main_pass(mocked_get_mocked_work_dir,
                    mocked_set_work_dir,
@@ -120,17 +123,58 @@ def test_main_pass(mocked_get_mocked_work_dir,
     mocked_run_pipeline.assert_called_once_with(
         pipeline_name='arb pipe',
         pipeline_context_input='arb context input',
-        context=None,
+        context=Context(),
         parse_input=True,
         loader='arb loader',
         groups=['g'],
         success_group='sg',
-        failure_group='fg')
+        failure_group='fg',
+        timeout=None)
 
 
 @patch('pypyr.log.logger.set_up_notify_log_level')
 @patch('pypyr.pipelinerunner.load_and_run_pipeline')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_main_with_shard(mocked_get_mocked_work_dir,
+                         mocked_set_work_dir,
+                         mocked_run_pipeline,
+                         mocked_set_up_notify):
+    """Main with shard creates context with shard index & count."""
+    pipeline_cache.clear()
+    pypyr.pipelinerunner.main(pipeline_name='arb pipe', shard='1/3')
+
+    context = mocked_run_pipeline.call_args[1]['context']
+    assert context == {'shardIndex': 1, 'shardCount': 3}
+    assert type(context) is Context
+    assert context.pipeline_name == 'arb pipe'
+    assert context.working_dir == 'arb/dir'
+    assert mocked_run_pipeline.call_args[1]['parse_input'] is True
+
+
+@patch('pypyr.log.logger.set_up_notify_log_level')
+@patch('pypyr.pipelinerunner.load_and_run_pipeline')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_main_with_shard_invalid(mocked_get_mocked_work_dir,
+                                 mocked_set_work_dir,
+                                 mocked_run_pipeline,
+                                 mocked_set_up_notify):
+    """Main with invalid shard raises before running pipeline."""
+    with pytest.raises(ValueError) as err:
+        pypyr.pipelinerunner.main(pipeline_name='arb pipe', shard='3/3')
+
+    assert str(err.value) == ("shard 3/3 must be INDEX/COUNT, where COUNT is "
+                              "at least 1 & INDEX is 0 to COUNT - 1.")
+    mocked_run_pipeline.assert_not_called()
+
+
+@patch('pypyr.log.logger.set_up_notify_log_level')
+@patch('pypyr.pipelinerunner.load_and_run_pipeline')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_main_with_minimal(mocked_get_mocked_work_dir,
                            mocked_set_work_dir,
@@ -145,12 +189,13 @@ def test_main_with_minimal(mocked_get_mocked_work_dir,
     mocked_run_pipeline.assert_called_once_with(
         pipeline_name='arb pipe',
         pipeline_context_input=None,
-        context=None,
+        context=Context(),
         parse_input=True,
         loader=None,
         groups=None,
         success_group=None,
-        failure_group=None)
+        failure_group=None,
+        timeout=None)
 
 
 @patch('pypyr.pipelinerunner.load_and_run_pipeline',
@@ -170,12 +215,13 @@ def test_main_fail(mocked_work_dir, mocked_run_pipeline):
     mocked_run_pipeline.assert_called_once_with(
         pipeline_name='arb pipe',
         pipeline_context_input='arb context input',
-        context=None,
+        context=Context(),
         parse_input=True,
         loader=None,
         groups=None,
         success_group=None,
-        failure_group=None)
+        failure_group=None,
+        timeout=None)
 
 # endregion main
 
@@ -184,7 +230,8 @@ def test_main_fail(mocked_work_dir, mocked_run_pipeline):
 
 @patch('pypyr.log.logger.set_up_notify_log_level')
 @patch('pypyr.pipelinerunner.load_and_run_pipeline')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_main_with_context_pass(mocked_get_mocked_work_dir,
                                 mocked_set_work_dir,
@@ -216,12 +263,14 @@ def test_main_with_context_pass(mocked_get_mocked_work_dir,
         loader='arb loader',
         groups=['g'],
         success_group='sg',
-        failure_group='fg')
+        failure_group='fg',
+        timeout=None)
 
 
 @patch('pypyr.log.logger.set_up_notify_log_level')
 @patch('pypyr.pipelinerunner.load_and_run_pipeline')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_main_with_context_minimal(mocked_get_mocked_work_dir,
                                    mocked_set_work_dir,
@@ -246,12 +295,55 @@ def test_main_with_context_minimal(mocked_get_mocked_work_dir,
         loader=None,
         groups=None,
         success_group=None,
-        failure_group=None)
+        failure_group=None,
+        timeout=None)
+
+
+@patch('pypyr.log.logger.set_up_notify_log_level')
+@patch('pypyr.pipelinerunner.load_and_run_pipeline')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_main_with_context_shard(mocked_get_mocked_work_dir,
+                                 mocked_set_work_dir,
+                                 mocked_run_pipeline,
+                                 mocked_set_up_notify):
+    """Main with context adds shard index & count to context."""
+    pipeline_cache.clear()
+    out = pypyr.pipelinerunner.main_with_context(pipeline_name='arb pipe',
+                                                 dict_in={'a': 'b'},
+                                                 shard=(0, 2))
+
+    assert out == {'a': 'b', 'shardIndex': 0, 'shardCount': 2}
+    assert mocked_run_pipeline.call_args[1]['context'] is out
+
+
+@patch('pypyr.log.logger.set_up_notify_log_level')
+@patch('pypyr.pipelinerunner.load_and_run_pipeline')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_main_with_context_concurrent(mocked_get_mocked_work_dir,
+                                      mocked_set_work_dir,
+                                      mocked_run_pipeline,
+                                      mocked_set_up_notify):
+    """Main with context runs with a copy of input ConcurrentContext."""
+    pipeline_cache.clear()
+    dict_in = ConcurrentContext()
+    out = pypyr.pipelinerunner.main_with_context(pipeline_name='arb pipe',
+                                                 dict_in=dict_in)
+
+    assert out == {}
+    assert type(out) is ConcurrentContext
+    assert out is not dict_in
+    assert out.pipeline_name == 'arb pipe'
+    assert mocked_run_pipeline.call_args[1]['context'] is out
 
 
 @patch('pypyr.pipelinerunner.load_and_run_pipeline',
        side_effect=ContextError('arb'))
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_main_with_context_fail(mocked_get_work_dir,
                                 mocked_work_dir,
@@ -275,9 +367,175 @@ def test_main_with_context_fail(mocked_get_work_dir,
         loader=None,
         groups=None,
         success_group=None,
-        failure_group=None)
+        failure_group=None,
+        timeout=None)
+
+
+@patch('pypyr.pipelinerunner.load_and_run_pipeline')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_main_with_context_timeout(mocked_get_work_dir,
+                                   mocked_work_dir,
+                                   mocked_run_pipeline):
+    """Main with context passes timeout to the pipeline's steps."""
+    pipeline_cache.clear()
+
+    out = pypyr.pipelinerunner.main_with_context(pipeline_name='arb pipe',
+                                                 timeout=5)
+
+    assert out == Context()
+    mocked_run_pipeline.assert_called_once_with(
+        pipeline_name='arb pipe',
+        pipeline_context_input=None,
+        context=out,
+        parse_input=False,
+        loader=None,
+        groups=None,
+        success_group=None,
+        failure_group=None,
+        timeout=5)
 # endregion main_with_context
 
+# region run_many
+
+
+class FakePool():
+    """Pool that runs work in this process, so tests see what it does."""
+
+    def __init__(self, processes):
+        """Save processes for asserts."""
+        self.processes = processes
+
+    def __enter__(self):
+        """Enter context manager."""
+        return self
+
+    def __exit__(self, *args):
+        """Exit context manager."""
+
+    def imap(self, func, iterable, chunksize):
+        """Ordered map."""
+        self.mapped = ('imap', chunksize)
+        return map(func, iterable)
+
+    def imap_unordered(self, func, iterable, chunksize):
+        """Unordered map, reversed to prove order is whatever pool says."""
+        self.mapped = ('imap_unordered', chunksize)
+        return reversed(list(map(func, iterable)))
+
+
+def run_many_main_with_context(pipeline_name, dict_in, **kwargs):
+    """Mock main_with_context that fails on input with fail key."""
+    if 'fail' in dict_in:
+        raise ValueError(dict_in['fail'])
+
+    context = Context(dict_in)
+    context['out'] = f"{pipeline_name} {kwargs['working_dir']}"
+    return context
+
+
+@patch('pypyr.pipelinerunner.main_with_context',
+       side_effect=run_many_main_with_context)
+def test_run_many_ordered(mock_main_with_context):
+    """Run many yields results & errors in input order."""
+    pools = []
+
+    def get_pool(processes):
+        pools.append(FakePool(processes))
+        return pools[-1]
+
+    with patch('multiprocessing.Pool', side_effect=get_pool), patch(
+            'pypyr.pipelinerunner.threading.Semaphore',
+            wraps=threading.Semaphore) as mock_semaphore:
+        with patch_logger('pypyr.pipelinerunner',
+                          logging.ERROR) as mock_logger_error:
+            results = list(pypyr.pipelinerunner.run_many(
+                'arb pipe',
+                iter([{'a': 1}, {'fail': 'arb'}, {'a': 3}]),
+                workers=3,
+                working_dir='arb/dir',
+                groups=['g'],
+                success_group='sg',
+                failure_group='fg',
+                loader='arb loader',
+                shard='0/2',
+                timeout=1.5))
+
+    assert results == [
+        {'index': 0, 'context': {'a': 1, 'out': 'arb pipe arb/dir'}},
+        {'index': 1, 'error': {'name': 'ValueError', 'description': 'arb'}},
+        {'index': 2, 'context': {'a': 3, 'out': 'arb pipe arb/dir'}}]
+    assert type(results[0]['context']) is dict
+
+    assert pools[0].processes == 3
+    assert pools[0].mapped == ('imap', 1)
+    # 2 chunks per worker.
+    mock_semaphore.assert_called_once_with(6)
+    mock_logger_error.assert_called_once_with("run_many input 1 failed.")
+
+    assert mock_main_with_context.call_args_list[0] == call(
+        pipeline_name='arb pipe',
+        dict_in={'a': 1},
+        working_dir='arb/dir',
+        groups=['g'],
+        success_group='sg',
+        failure_group='fg',
+        loader='arb loader',
+        shard='0/2',
+        timeout=1.5)
+
+
+@patch('pypyr.pipelinerunner.main_with_context',
+       side_effect=run_many_main_with_context)
+def test_run_many_unordered(mock_main_with_context):
+    """Run many yields results in completion order."""
+    pool = FakePool(None)
+    with patch('multiprocessing.Pool', return_value=pool), patch(
+            'pypyr.pipelinerunner.threading.Semaphore',
+            wraps=threading.Semaphore) as mock_semaphore:
+        results = list(pypyr.pipelinerunner.run_many('arb pipe',
+                                                     [{'a': 1}, {'a': 2}],
+                                                     is_ordered=False,
+                                                     chunksize=10,
+                                                     max_pending=3))
+
+    assert [result['index'] for result in results] == [1, 0]
+    assert pool.mapped == ('imap_unordered', 10)
+    # less than a chunk never fills a chunk.
+    mock_semaphore.assert_called_once_with(10)
+
+
+def test_iter_pending_waits_for_room_and_stops():
+    """Iter pending takes room for each item & stops when stop is set."""
+    pending = threading.Semaphore(2)
+    stop = threading.Event()
+    items = pypyr.pipelinerunner._iter_pending(iter([1, 2, 3]),
+                                               pending,
+                                               stop)
+
+    assert next(items) == 1
+    assert next(items) == 2
+    assert not pending.acquire(blocking=False)
+
+    stop.set()
+    pending.release()
+    assert list(items) == []
+
+
+@patch('pypyr.pipelinerunner.main_with_context')
+def test_run_many_item_unpicklable_context(mock_main_with_context):
+    """Context value that can't pickle is an error for that input only."""
+    mock_main_with_context.return_value = Context({'a': lambda: None})
+
+    result = pickle.loads(pypyr.pipelinerunner._run_many_item(
+        (5, {}), 'arb pipe', None, None, None, None, None, None, None))
+
+    assert result['index'] == 5
+    assert set(result) == {'index', 'error'}
+    assert result['error']['name'] in ('PicklingError', 'AttributeError')
+# endregion run_many
+
 # region prepare_context
 
 
@@ -321,7 +579,8 @@ def test_prepare_context_with_parse_merge(mocked_get_parsed_context):
        return_value=Context({'a': 'b'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_load_and_run_pipeline_pass(mocked_get_work_dir,
                                     mocked_set_work_dir,
@@ -339,7 +598,7 @@ def test_load_and_run_pipeline_pass(mocked_get_work_dir,
 
     mocked_set_work_dir.assert_not_called()
     mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='arb/dir')
+                                                working_dir=Path('arb/dir'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -353,7 +612,8 @@ def test_load_and_run_pipeline_pass(mocked_get_work_dir,
     sr = mocked_steps_runner.return_value
     sr.run_step_groups.assert_called_once_with(groups=['steps'],
                                                success_group='on_success',
-                                               failure_group='on_failure')
+                                               failure_group='on_failure',
+                                               timeout=None)
     sr.run_failure_step_group.assert_not_called()
 
 
@@ -362,7 +622,8 @@ def test_load_and_run_pipeline_pass(mocked_get_work_dir,
        return_value=Context())
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_load_and_run_pipeline_pass_skip_parse_context(
         mocked_get_work_dir,
@@ -379,7 +640,7 @@ def test_load_and_run_pipeline_pass_skip_parse_context(
 
     mocked_set_work_dir.assert_not_called()
     mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='arb/dir')
+                                                working_dir=Path('arb/dir'))
     mocked_get_parsed_context.assert_not_called()
 
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
@@ -388,15 +649,38 @@ def test_load_and_run_pipeline_pass_skip_parse_context(
     sr = mocked_steps_runner.return_value
     sr.run_step_groups.assert_called_once_with(groups=['steps'],
                                                success_group='on_success',
-                                               failure_group='on_failure')
+                                               failure_group='on_failure',
+                                               timeout=None)
     sr.run_failure_step_group.assert_not_called()
 
 
+@patch('pypyr.pipelinerunner.StepsRunner', autospec=True)
+@patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
+       return_value='pipe def')
+@patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
+def test_load_and_run_pipeline_timeout(mocked_get_work_dir,
+                                       mocked_get_pipe_def,
+                                       mocked_steps_runner):
+    """Timeout goes to the steps runner with the step-groups."""
+    pipeline_cache.clear()
+    pypeloader_cache.clear()
+    pypyr.pipelinerunner.load_and_run_pipeline(pipeline_name='arb pipe',
+                                               parse_input=False,
+                                               timeout=1.5)
+
+    sr = mocked_steps_runner.return_value
+    sr.run_step_groups.assert_called_once_with(groups=['steps'],
+                                               success_group='on_success',
+                                               failure_group='on_failure',
+                                               timeout=1.5)
+
+
 @patch('pypyr.pipelinerunner.StepsRunner', autospec=True)
 @patch('pypyr.pipelinerunner.get_parsed_context')
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_load_and_run_pipeline_parse_context_error(
         mocked_get_work_dir,
@@ -416,7 +700,7 @@ def test_load_and_run_pipeline_parse_context_error(
 
     mocked_set_work_dir.assert_not_called()
     mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='arb/dir')
+                                                working_dir=Path('arb/dir'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -434,7 +718,8 @@ def test_load_and_run_pipeline_parse_context_error(
        return_value=Context())
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='arb/dir')
 @patch('pypyr.moduleloader.get_working_directory', return_value='arb/dir')
 def test_load_and_run_pipeline_steps_error_raises(
         mocked_get_work_dir,
@@ -457,7 +742,7 @@ def test_load_and_run_pipeline_steps_error_raises(
     mocked_set_work_dir.assert_not_called()
 
     mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='arb/dir')
+                                                working_dir=Path('arb/dir'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -465,7 +750,8 @@ def test_load_and_run_pipeline_steps_error_raises(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['steps'],
         success_group='on_success',
-        failure_group='on_failure'
+        failure_group='on_failure',
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={})
@@ -476,8 +762,10 @@ def test_load_and_run_pipeline_steps_error_raises(
        return_value=Context({'1': 'context 1', '2': 'context2'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
-@patch('pypyr.moduleloader.get_working_directory', return_value='from/context')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='from/context')
+@patch('pypyr.moduleloader.get_working_directory',
+       return_value='from/context')
 def test_load_and_run_pipeline_with_existing_context_pass(
         mocked_get_work_dir,
         mocked_set_work_dir,
@@ -497,8 +785,9 @@ def test_load_and_run_pipeline_with_existing_context_pass(
 
     assert existing_context.working_dir == 'from/context'
     mocked_set_work_dir.assert_not_called()
-    mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='from/context')
+    mocked_get_pipe_def.assert_called_once_with(
+        pipeline_name='arb pipe',
+        working_dir=Path('from/context'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -506,7 +795,8 @@ def test_load_and_run_pipeline_with_existing_context_pass(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['steps'],
         success_group='on_success',
-        failure_group='on_failure'
+        failure_group='on_failure',
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={'1': 'context 1',
@@ -519,8 +809,10 @@ def test_load_and_run_pipeline_with_existing_context_pass(
        return_value=Context({'1': 'context 1', '2': 'context2'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
-@patch('pypyr.moduleloader.get_working_directory', return_value='from/context')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='from/context')
+@patch('pypyr.moduleloader.get_working_directory',
+       return_value='from/context')
 def test_load_and_run_pipeline_with_group_specified(
         mocked_get_work_dir,
         mocked_set_work_dir,
@@ -541,8 +833,9 @@ def test_load_and_run_pipeline_with_group_specified(
 
     assert existing_context.working_dir == 'from/context'
     mocked_set_work_dir.assert_not_called()
-    mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='from/context')
+    mocked_get_pipe_def.assert_called_once_with(
+        pipeline_name='arb pipe',
+        working_dir=Path('from/context'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -550,7 +843,8 @@ def test_load_and_run_pipeline_with_group_specified(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['arb1', 'arb2'],
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={'1': 'context 1',
@@ -563,8 +857,10 @@ def test_load_and_run_pipeline_with_group_specified(
        return_value=Context({'1': 'context 1', '2': 'context2'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
-@patch('pypyr.moduleloader.get_working_directory', return_value='from/context')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='from/context')
+@patch('pypyr.moduleloader.get_working_directory',
+       return_value='from/context')
 def test_load_and_run_pipeline_with_success_group_specified(
         mocked_get_work_dir,
         mocked_set_work_dir,
@@ -585,8 +881,9 @@ def test_load_and_run_pipeline_with_success_group_specified(
 
     assert existing_context.working_dir == 'from/context'
     mocked_set_work_dir.assert_not_called()
-    mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='from/context')
+    mocked_get_pipe_def.assert_called_once_with(
+        pipeline_name='arb pipe',
+        working_dir=Path('from/context'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -594,7 +891,8 @@ def test_load_and_run_pipeline_with_success_group_specified(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['steps'],
         success_group='arb1',
-        failure_group=None
+        failure_group=None,
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={'1': 'context 1',
@@ -607,8 +905,10 @@ def test_load_and_run_pipeline_with_success_group_specified(
        return_value=Context({'1': 'context 1', '2': 'context2'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
-@patch('pypyr.moduleloader.get_working_directory', return_value='from/context')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='from/context')
+@patch('pypyr.moduleloader.get_working_directory',
+       return_value='from/context')
 def test_load_and_run_pipeline_with_failure_group_specified(
         mocked_get_work_dir,
         mocked_set_work_dir,
@@ -629,8 +929,9 @@ def test_load_and_run_pipeline_with_failure_group_specified(
 
     assert existing_context.working_dir == 'from/context'
     mocked_set_work_dir.assert_not_called()
-    mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='from/context')
+    mocked_get_pipe_def.assert_called_once_with(
+        pipeline_name='arb pipe',
+        working_dir=Path('from/context'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -638,7 +939,8 @@ def test_load_and_run_pipeline_with_failure_group_specified(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['steps'],
         success_group=None,
-        failure_group='arb1'
+        failure_group='arb1',
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={'1': 'context 1',
@@ -651,8 +953,10 @@ def test_load_and_run_pipeline_with_failure_group_specified(
        return_value=Context({'1': 'context 1', '2': 'context2'}))
 @patch('pypyr.pypeloaders.fileloader.get_pipeline_definition',
        return_value='pipe def')
-@patch('pypyr.moduleloader.set_working_directory')
-@patch('pypyr.moduleloader.get_working_directory', return_value='from/context')
+@patch('pypyr.moduleloader.set_working_directory',
+       return_value='from/context')
+@patch('pypyr.moduleloader.get_working_directory',
+       return_value='from/context')
 def test_load_and_run_pipeline_with_group_and_failure_group_specified(
         mocked_get_work_dir,
         mocked_set_work_dir,
@@ -674,8 +978,9 @@ def test_load_and_run_pipeline_with_group_and_failure_group_specified(
 
     assert existing_context.working_dir == 'from/context'
     mocked_set_work_dir.assert_not_called()
-    mocked_get_pipe_def.assert_called_once_with(pipeline_name='arb pipe',
-                                                working_dir='from/context')
+    mocked_get_pipe_def.assert_called_once_with(
+        pipeline_name='arb pipe',
+        working_dir=Path('from/context'))
     mocked_get_parsed_context.assert_called_once_with(
         pipeline='pipe def',
         context_in_args='arb context input')
@@ -683,7 +988,8 @@ def test_load_and_run_pipeline_with_group_and_failure_group_specified(
     mocked_steps_runner.return_value.run_step_groups.assert_called_once_with(
         groups=['arb1'],
         success_group=None,
-        failure_group='arb2'
+        failure_group='arb2',
+        timeout=None
     )
     mocked_steps_runner.assert_called_once_with(pipeline_definition='pipe def',
                                                 context={'1': 'context 1',
@@ -843,7 +1149,8 @@ def test_empty_loader_set_up_to_default(mock_get_pipeline_definition,
         pipeline_context_input='arb context input',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        timeout=None
     )
 
 
@@ -869,7 +1176,8 @@ def test_arb_loader(mock_run_pipeline):
         pipeline_context_input='arb context input',
         groups=None,
         success_group=None,
-        failure_group=None
+        failure_group=None,
+        timeout=None
     )
 
 
@@ -0,0 +1,212 @@
+"""sqlitequeue.py unit tests."""
+import logging
+import threading
+from unittest.mock import patch
+import pytest
+from pypyr.queues.sqlitequeue import get_queue, SqliteQueue
+from tests.common.utils import patch_logger
+
+
+def test_sqlite_queue_creates_file(tmp_path):
+    """Queue creates the file & its parent dirs."""
+    path = tmp_path / 'sub' / 'queue.db'
+    queue = get_queue(str(path))
+
+    assert isinstance(queue, SqliteQueue)
+    assert queue.path == path
+    assert path.is_file()
+    assert repr(queue) == f"SqliteQueue({str(path)!r})"
+
+    # re-open existing queue
+    assert SqliteQueue(path).claim('w') is None
+
+
+def test_sqlite_queue_put_claim_complete(tmp_path):
+    """Jobs claim oldest first & results round-trip."""
+    queue = SqliteQueue(tmp_path / 'queue.db')
+
+    assert queue.put({'job': 1}) == 1
+    assert queue.put({'job': 2}) == 2
+
+    assert queue.get_result(1) is None
+
+    assert queue.claim('w1') == (1, {'job': 1})
+    assert queue.get_result(1) is None
+
+    assert queue.complete(1, 'w1', {'out': {'a': [1, 2]}})
+    assert queue.get_result(1) == {'out': {'a': [1, 2]}}
+
+    # done already.
+    assert not queue.complete(1, 'w1', {'out': {}})
+    assert queue.get_result(1) == {'out': {'a': [1, 2]}}
+
+    # another queue instance on the same file sees the same jobs
+    other = SqliteQueue(tmp_path / 'queue.db')
+    assert other.claim('w2') == (2, {'job': 2})
+    assert other.claim('w2') is None
+    assert queue.get_result(2) is None
+
+
+def test_sqlite_queue_get_result_unknown(tmp_path):
+    """Unknown job raises."""
+    queue = SqliteQueue(tmp_path / 'queue.db')
+
+    with pytest.raises(ValueError) as err:
+        queue.get_result(99)
+
+    assert str(err.value) == (
+        f"job 99 isn't on queue {tmp_path / 'queue.db'}.")
+
+
+def test_sqlite_queue_claim_rolls_back_on_error(tmp_path):
+    """A failed claim leaves the job waiting."""
+    queue = SqliteQueue(tmp_path / 'queue.db')
+    queue.put({'job': 1})
+
+    with patch('pypyr.queues.sqlitequeue.time.time',
+               side_effect=RuntimeError('arb')):
+        with pytest.raises(RuntimeError):
+            queue.claim('w1')
+
+    assert queue.claim('w2') == (1, {'job': 1})
+
+
+def test_sqlite_queue_concurrent_claims(tmp_path):
+    """No 2 workers claim the same job."""
+    queue = SqliteQueue(tmp_path / 'queue.db')
+    for i in range(40):
+        queue.put({'job': i})
+
+    claimed = []
+
+    def work(worker):
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                return
+            claimed.append(job[1]['job'])
+
+    threads = [threading.Thread(target=work, args=(f'w{i}',))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == list(range(40))
+
+
+def test_sqlite_queue_renew(tmp_path):
+    """Only the worker holding a running job renews it."""
+    queue = SqliteQueue(tmp_path / 'queue.db')
+    queue.put({'job': 1})
+
+    # not running yet.
+    assert not queue.renew(1, 'w1')
+
+    queue.claim('w1')
+    assert queue.renew(1, 'w1')
+    assert not queue.renew(1, 'w2')
+
+    queue.complete(1, 'w1', {'out': {}})
+    assert not queue.renew(1, 'w1')
+
+
+def test_sqlite_queue_claim_reclaims_expired_lease(tmp_path):
+    """Running job goes back on the queue when its lease runs out."""
+    queue = SqliteQueue(tmp_path / 'queue.db', lease=10)
+    assert queue.lease == 10
+    assert SqliteQueue(tmp_path / 'queue.db').lease == 60
+    queue.put({'job': 1})
+    queue.put({'job': 2})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=100):
+        assert queue.claim('dead') == (1, {'job': 1})
+        assert queue.claim('alive') == (2, {'job': 2})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=105):
+        assert queue.renew(2, 'alive')
+
+    # lease not out yet.
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=110):
+        assert queue.claim('w3') is None
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=111):
+        with patch_logger('pypyr.queues.sqlitequeue',
+                          logging.WARNING) as mock_warn:
+            assert queue.claim('w3') == (1, {'job': 1})
+
+    mock_warn.assert_called_once_with(
+        "job 1 lease on worker dead ran out after 10s. Put it back on the "
+        "queue.")
+    # the dead worker lost the job.
+    assert not queue.renew(1, 'dead')
+    assert queue.renew(1, 'w3')
+    assert queue.get_result(1) is None
+
+    # the stalled worker wakes up, but can't overwrite the new claim.
+    assert not queue.complete(1, 'dead', {'out': {'from': 'dead'}})
+    assert queue.get_result(1) is None
+    assert queue.complete(1, 'w3', {'out': {'from': 'w3'}})
+    assert queue.get_result(1) == {'out': {'from': 'w3'}}
+
+
+def test_sqlite_queue_claim_fails_job_after_max_attempts(tmp_path):
+    """Job whose lease keeps running out fails rather than running again."""
+    queue = SqliteQueue(tmp_path / 'queue.db', lease=10, max_attempts=2)
+    assert queue.max_attempts == 2
+    assert SqliteQueue(tmp_path / 'queue.db').max_attempts == 3
+    queue.put({'pipeline_name': 'poison'})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=100):
+        assert queue.claim('w1') == (1, {'pipeline_name': 'poison'})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=111):
+        assert queue.claim('w2') == (1, {'pipeline_name': 'poison'})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=122):
+        with patch_logger('pypyr.queues.sqlitequeue',
+                          logging.ERROR) as mock_error:
+            assert queue.claim('w3') is None
+
+    mock_error.assert_called_once_with(
+        "job 1 lease on worker w2 ran out after 10s. That was attempt 2 of "
+        "2, so the job failed.")
+    assert queue.get_result(1) == {
+        'error': {'name': 'QueueJobError',
+                  'description': ("job 1 lease ran out on all 2 attempts, "
+                                  "so it won't run again.")},
+        'pipeline_name': 'poison',
+        'worker': 'w2'}
+    assert not queue.complete(1, 'w2', {'out': {}})
+
+
+def test_sqlite_queue_claim_deletes_old_finished_jobs(tmp_path):
+    """Finished jobs older than retention go, others stay."""
+    queue = SqliteQueue(tmp_path / 'queue.db', retention=50)
+    assert queue.retention == 50
+    assert SqliteQueue(tmp_path / 'queue.db').retention == 86400
+    for i in range(3):
+        queue.put({'job': i})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=100):
+        queue.claim('w')
+        queue.complete(1, 'w', {'out': {}})
+        queue.claim('w')
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=140):
+        queue.complete(2, 'w', {'out': {}})
+
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=151):
+        assert queue.claim('w') == (3, {'job': 2})
+
+    with pytest.raises(ValueError):
+        queue.get_result(1)
+    assert queue.get_result(2) == {'out': {}}
+    queue.complete(3, 'w', {'out': {}})
+
+    # None keeps finished jobs forever.
+    forever = SqliteQueue(tmp_path / 'queue.db', retention=None)
+    with patch('pypyr.queues.sqlitequeue.time.time', return_value=10 ** 9):
+        assert forever.claim('w') is None
+    assert forever.get_result(2) == {'out': {}}
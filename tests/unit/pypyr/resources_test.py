@@ -0,0 +1,378 @@
+"""resources.py unit tests."""
+import logging
+from pathlib import Path
+import threading
+import time
+from unittest.mock import MagicMock, call, patch
+import pytest
+from pypyr.errors import PipelineDefinitionError, TimeoutExpiredError
+import pypyr.resources as resources
+from pypyr.resources import (Resource,
+                             add_resources,
+                             get_resource,
+                             get_stats,
+                             run_with_resources,
+                             try_lock_file)
+from pypyr.utils.cancel import CancelToken, run_with_token
+from tests.common.utils import patch_logger
+
+
+@pytest.fixture(autouse=True)
+def clear_resources():
+    """Each test starts without resources."""
+    resources.clear()
+    yield
+    resources.clear()
+
+# ------------------------- Resource -----------------------------------------
+
+
+def test_resource_init():
+    """Resource sets its definition & starts with empty stats."""
+    resource = Resource('arb', 2)
+    assert resource.name == 'arb'
+    assert resource.limit == 2
+    assert resource.lock_dir is None
+    assert repr(resource) == "Resource('arb', 2, None)"
+    assert resource.get_stats() == {'limit': 2,
+                                    'in_use': 0,
+                                    'acquisitions': 0,
+                                    'waits': 0,
+                                    'wait_time': 0.0,
+                                    'max_wait': 0.0}
+
+    resource = Resource('arb', 1, 'arb/dir')
+    assert resource.lock_dir == Path('arb/dir')
+    assert repr(resource) == "Resource('arb', 1, 'arb/dir')"
+
+
+def test_resource_acquire_release_no_wait():
+    """Acquire takes a free slot without waiting & release gives it back."""
+    resource = Resource('arb', 2)
+
+    assert resource.acquire() == (None, 0.0)
+    assert resource.acquire() == (None, 0.0)
+    assert resource.get_stats()['in_use'] == 2
+
+    resource.release(None)
+    resource.release(None)
+
+    stats = resource.get_stats()
+    assert stats['in_use'] == 0
+    assert stats['acquisitions'] == 2
+    assert stats['waits'] == 0
+
+
+def test_resource_acquire_waits_for_slot():
+    """Acquire waits until another holder releases & records the wait."""
+    resource = Resource('arb', 1)
+    resource.acquire()
+
+    releaser = threading.Timer(0.3, resource.release, [None])
+    releaser.start()
+    slot_file, waited = resource.acquire()
+    releaser.join()
+
+    assert slot_file is None
+    assert waited >= 0.1
+    stats = resource.get_stats()
+    assert stats['acquisitions'] == 2
+    assert stats['in_use'] == 1
+    assert stats['waits'] == 1
+    assert stats['wait_time'] == waited
+    assert stats['max_wait'] == waited
+
+    # shorter wait doesn't change max.
+    releaser = threading.Timer(0.01, resource.release, [None])
+    releaser.start()
+    _, shorter_wait = resource.acquire()
+    releaser.join()
+
+    assert shorter_wait < waited
+    stats = resource.get_stats()
+    assert stats['waits'] == 2
+    assert stats['wait_time'] == waited + shorter_wait
+    assert stats['max_wait'] == waited
+
+    resource.release(None)
+
+
+@patch('pypyr.resources.POLL_INTERVAL', 0.01)
+def test_resource_acquire_cancelled_while_waiting():
+    """Cancelling the work stops the wait for a slot."""
+    resource = Resource('arb', 1)
+    resource.acquire()
+    token = CancelToken()
+    token.cancel('arb reason')
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_token(token, resource.acquire)
+
+    assert str(err.value) == 'arb reason'
+    assert resource.get_stats()['acquisitions'] == 1
+
+
+def test_resource_lock_dir_shares_slots(tmp_path):
+    """Resources with the same lock dir share the limit, like processes."""
+    lock_dir = tmp_path.joinpath('locks')
+    resource = Resource('arb', 2, lock_dir)
+    other_process = Resource('arb', 2, lock_dir)
+
+    first, waited = resource.acquire()
+    assert waited == 0.0
+    assert Path(first.name) == lock_dir.joinpath('arb.0.lock')
+
+    second, waited = other_process.acquire()
+    assert waited == 0.0
+    assert Path(second.name) == lock_dir.joinpath('arb.1.lock')
+
+    releaser = threading.Timer(0.2, other_process.release, [second])
+    releaser.start()
+    third, waited = resource.acquire()
+    releaser.join()
+
+    assert waited >= 0.1
+    assert Path(third.name) == lock_dir.joinpath('arb.1.lock')
+    assert resource.get_stats()['waits'] == 1
+
+    resource.release(first)
+    resource.release(third)
+    assert first.closed
+    assert third.closed
+    assert resource.get_stats()['in_use'] == 0
+
+
+@patch('pypyr.resources.POLL_INTERVAL', 0.01)
+def test_resource_lock_dir_cancelled_releases_semaphore(tmp_path):
+    """Cancel while waiting for a lock file gives back the process slot."""
+    resource = Resource('arb', 1, tmp_path)
+    other_process = Resource('arb', 1, tmp_path)
+    held, _ = other_process.acquire()
+
+    token = CancelToken()
+    token.cancel('arb reason')
+    with pytest.raises(TimeoutExpiredError):
+        run_with_token(token, resource.acquire)
+
+    assert resource._semaphore.acquire(blocking=False)
+    other_process.release(held)
+
+# ------------------------- END Resource -------------------------------------
+
+# ------------------------- try_lock_file ------------------------------------
+
+
+def test_try_lock_file(tmp_path):
+    """Lock file is exclusive until closed."""
+    path = tmp_path.joinpath('arb.lock')
+    with open(path, 'a') as first:
+        assert try_lock_file(first)
+        with open(path, 'a') as second:
+            assert not try_lock_file(second)
+
+    with open(path, 'a') as third:
+        assert try_lock_file(third)
+
+
+@patch('os.name', 'nt')
+def test_try_lock_file_not_posix():
+    """Lock file on windows with msvcrt."""
+    mock_msvcrt = MagicMock()
+    mock_msvcrt.locking.side_effect = [None, OSError('arb')]
+    file = MagicMock()
+    file.fileno.return_value = 3
+
+    with patch.dict('sys.modules', {'msvcrt': mock_msvcrt}):
+        assert try_lock_file(file)
+        assert not try_lock_file(file)
+
+    assert mock_msvcrt.locking.mock_calls == [
+        call(3, mock_msvcrt.LK_NBLCK, 1),
+        call(3, mock_msvcrt.LK_NBLCK, 1)]
+
+# ------------------------- END try_lock_file --------------------------------
+
+# ------------------------- add_resources ------------------------------------
+
+
+def test_add_resources():
+    """Add resources from int limits & dicts, lockDir from working dir."""
+    with patch_logger('pypyr.resources', logging.DEBUG) as mock_debug:
+        add_resources({'a': 1,
+                       'b': {'limit': 2},
+                       'c': {'limit': 3, 'lockDir': 'locks'}},
+                      'arb/dir')
+
+    mock_debug.assert_any_call("added Resource('a', 1, None)")
+
+    assert get_resource('a').limit == 1
+    assert get_resource('a').lock_dir is None
+    assert get_resource('b').limit == 2
+    assert get_resource('c').limit == 3
+    assert get_resource('c').lock_dir == Path('arb/dir/locks')
+
+    add_resources({'d': {'limit': 1, 'lockDir': 'locks'}})
+    assert get_resource('d').lock_dir == Path('locks')
+
+
+def test_add_resources_empty():
+    """No resources section adds nothing."""
+    add_resources(None)
+    add_resources({})
+    assert get_stats() == {}
+
+
+def test_add_resources_first_definition_wins():
+    """A name that already exists keeps its definition."""
+    add_resources({'a': 1})
+    existing = get_resource('a')
+
+    with patch_logger('pypyr.resources', logging.WARNING) as mock_warn:
+        add_resources({'a': 1})
+        add_resources({'a': 2})
+        add_resources({'a': {'limit': 1, 'lockDir': 'arb'}})
+
+    assert get_resource('a') is existing
+    assert mock_warn.mock_calls == [
+        call("resource a already exists as Resource('a', 1, None). Ignoring "
+             "Resource('a', 2, None)."),
+        call("resource a already exists as Resource('a', 1, None). Ignoring "
+             "Resource('a', 1, 'arb').")]
+
+
+def test_add_resources_not_a_dict():
+    """Resources section must be a dict."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        add_resources(['a'])
+
+    assert str(err.value) == (
+        "resources must be a dict (i.e a map) of resource names.")
+
+
+@pytest.mark.parametrize('config', [0, -1, True, 'arb', 1.5, None, {},
+                                    {'limit': 0}])
+def test_add_resources_bad_limit(config):
+    """Limit must be an int of at least 1."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        add_resources({'arb': config})
+
+    assert str(err.value) == "resource arb limit must be an int of at least 1."
+
+# ------------------------- END add_resources --------------------------------
+
+# ------------------------- get_resource & get_stats -------------------------
+
+
+def test_get_resource_not_found():
+    """Get resource raises if no pipeline defined it."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        get_resource('arb')
+
+    assert str(err.value) == (
+        "resource arb doesn't exist. Define it in the pipeline's resources "
+        "section.")
+
+
+def test_get_stats():
+    """Get stats for each resource by name."""
+    add_resources({'a': 1, 'b': 2})
+    run_with_resources('a', int)
+
+    stats = get_stats()
+    assert list(stats) == ['a', 'b']
+    assert stats['a']['acquisitions'] == 1
+    assert stats['b']['acquisitions'] == 0
+    assert stats['b']['limit'] == 2
+
+# ------------------------- END get_resource & get_stats ---------------------
+
+# ------------------------- run_with_resources -------------------------------
+
+
+def test_run_with_resources_holds_while_running():
+    """Function runs holding all the resources & releases them after."""
+    add_resources({'a': 1, 'b': 1})
+
+    def check_held(arg, kwarg=None):
+        stats = get_stats()
+        assert stats['a']['in_use'] == 1
+        assert stats['b']['in_use'] == 1
+        return arg, kwarg
+
+    assert run_with_resources(['b', 'a', 'b'],
+                              check_held, 1, kwarg=2) == (1, 2)
+    stats = get_stats()
+    assert stats['a'] == {'limit': 1,
+                          'in_use': 0,
+                          'acquisitions': 1,
+                          'waits': 0,
+                          'wait_time': 0.0,
+                          'max_wait': 0.0}
+    assert stats['b']['in_use'] == 0
+
+
+def test_run_with_resources_releases_on_error():
+    """Resources release when function raises."""
+    add_resources({'a': 1})
+
+    with pytest.raises(ValueError):
+        run_with_resources(('a',), int, 'x')
+
+    assert get_stats()['a']['in_use'] == 0
+
+
+def test_run_with_resources_limits_concurrency():
+    """No more than limit functions run at the same time."""
+    add_resources({'a': 2})
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def work():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    threads = [threading.Thread(target=run_with_resources, args=('a', work))
+               for _ in range(6)]
+    with patch_logger('pypyr.resources', logging.INFO) as mock_info:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert max_running == 2
+    stats = get_stats()['a']
+    assert stats['acquisitions'] == 6
+    assert stats['waits'] >= 4
+    assert stats['max_wait'] > 0
+    assert mock_info.call_count == stats['waits']
+    assert mock_info.call_args[0][0].startswith('waited ')
+    assert mock_info.call_args[0][0].endswith('s for resources a.')
+
+
+def test_run_with_resources_bad_names():
+    """Acquire must be a name or a list of names."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        run_with_resources({'a': 1}, int)
+
+    assert str(err.value) == (
+        "acquire must be a resource name or a list of resource names.")
+
+
+def test_run_with_resources_not_found_holds_nothing():
+    """Unknown resource name raises before acquiring any resources."""
+    add_resources({'a': 1})
+    function = MagicMock()
+
+    with pytest.raises(PipelineDefinitionError):
+        run_with_resources(['a', 'z'], function)
+
+    function.assert_not_called()
+    assert get_stats()['a']['acquisitions'] == 0
+
+# ------------------------- END run_with_resources ---------------------------
@@ -1,6 +1,5 @@
 """call.py unit tests."""
 import logging
-import pytest
 from pypyr.context import Context
 from pypyr.errors import Call
 from pypyr.steps.call import run_step
@@ -9,15 +8,13 @@
 
 
 def test_call_step_dict_with_all_args():
-    """Dict with all values set."""
-    with pytest.raises(Call) as err:
-        with patch_logger('pypyr.steps.call',
-                          logging.INFO) as mock_logger_info:
-            run_step(Context(Context({'call': {'groups': ['b', 'c'],
-                                               'success': 'sg',
-                                               'failure': 'fg'}})))
+    """Dict with all values set returns instruction."""
+    with patch_logger('pypyr.steps.call',
+                      logging.INFO) as mock_logger_info:
+        cof = run_step(Context(Context({'call': {'groups': ['b', 'c'],
+                                                 'success': 'sg',
+                                                 'failure': 'fg'}})))
 
-    cof = err.value
     assert isinstance(cof, Call)
     assert cof.groups == ['b', 'c']
     assert cof.success_group == 'sg'
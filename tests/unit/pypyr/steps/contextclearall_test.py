@@ -18,6 +18,7 @@ def test_context_clear_all_pass():
     })
 
     context.pystring_globals.update({'a': 'b'})
+    context.pystring_imports.append('import a')
 
     pypyr.steps.contextclearall.run_step(context)
 
@@ -28,6 +29,7 @@ def test_context_clear_all_pass():
     assert len(context.pystring_globals) == 0
     assert context.pystring_globals is not None
     assert type(context.pystring_globals) is dict
+    assert context.pystring_imports == []
 
     context['k1'] = 'value1'
 
@@ -1,14 +1,26 @@
 """cmd.py unit tests."""
 import logging
+import os
 import pytest
+import signal
 import subprocess
-from unittest.mock import patch
+import sys
+import time
+from unittest.mock import call, MagicMock, patch
+from tempfile import NamedTemporaryFile
 from pypyr.context import Context
 from pypyr.dsl import SicString
 from pypyr.errors import (ContextError,
                           KeyInContextHasNoValueError,
-                          KeyNotInContextError)
-from pypyr.steps.dsl.cmd import CmdStep
+                          KeyNotInContextError,
+                          TimeoutExpiredError)
+from pypyr.steps.dsl.cmd import (CmdStep,
+                                 run_process,
+                                 StreamCapture,
+                                 terminate_live_process,
+                                 terminate_process,
+                                 wait_for_process)
+from pypyr.utils.cancel import CancelToken, run_with_timeout, run_with_token
 
 # ------------------------- FileInRewriterStep -------------------------------
 from tests.common.utils import patch_logger
@@ -468,3 +480,590 @@ def test_cmdstep_runstep_cmd_is_dict_save_true_shell_false_formatting():
     assert context['cmdOut']['returncode'] == 0
     assert context['cmdOut']['stdout'] == 'std'
     assert context['cmdOut']['stderr'] == 'err'
+
+# ------------------------- stream -------------------------------------------
+
+
+def test_cmdstep_stream_defaults():
+    """Stream options default off."""
+    obj = CmdStep('blahname', Context({'cmd': {'run': 'blah'}}))
+
+    assert not obj.is_stream
+    assert obj.head is None
+    assert obj.tail is None
+    assert not obj.is_spill
+
+
+def test_cmdstep_stream_options_with_formatting():
+    """Stream options cast from formatting expressions."""
+    obj = CmdStep('blahname', Context({'k1': '5',
+                                       'cmd': {'run': 'blah',
+                                               'save': True,
+                                               'stream': 'True',
+                                               'head': '{k1}',
+                                               'tail': 6,
+                                               'spill': True}}))
+
+    assert obj.is_save
+    assert obj.is_stream
+    assert obj.head == 5
+    assert obj.tail == 6
+    assert obj.is_spill
+
+
+def test_cmdstep_stream_without_save_does_not_capture():
+    """Stream only applies when save, output goes to console otherwise."""
+    obj = CmdStep('blahname', Context({'cmd': {'run': 'blah',
+                                               'stream': True}}))
+
+    with patch('subprocess.run') as mock_run:
+        obj.run_step(is_shell=True)
+
+    mock_run.assert_called_once_with('blah',
+                                     cwd=None, shell=True, check=True)
+
+
+def test_cmdstep_stream_logs_lines_and_saves_all():
+    """Stream logs each line as it arrives & saves all with no caps."""
+    context = Context({'cmd': {'run': 'echo a; echo b; echo c 1>&2',
+                               'save': True,
+                               'stream': True}})
+    obj = CmdStep('blahname', context)
+
+    with patch_logger('blahname', logging.INFO) as mock_logger_info:
+        with patch_logger('blahname', logging.ERROR) as mock_logger_error:
+            obj.run_step(is_shell=True)
+
+    assert mock_logger_info.mock_calls == [call('a'), call('b')]
+    mock_logger_error.assert_called_once_with('c')
+
+    out = context['cmdOut']
+    assert out['returncode'] == 0
+    assert out['stdout'] == 'a\nb'
+    assert out['stderr'] == 'c'
+    assert out['elapsed'] > 0
+    assert 'stdoutPath' not in out
+    assert 'stderrPath' not in out
+
+
+def test_cmdstep_stream_head_tail_spill(tmp_path):
+    """Head & tail cap what's saved, spill writes everything to file."""
+    context = Context({'cmd': {
+        'run': 'for i in 1 2 3 4 5 6; do echo $i; done',
+        'save': True,
+        'stream': True,
+        'head': 2,
+        'tail': 1,
+        'spill': True,
+        'cwd': str(tmp_path)}})
+    obj = CmdStep('blahname', context)
+
+    obj.run_step(is_shell=True)
+
+    out = context['cmdOut']
+    assert out['returncode'] == 0
+    assert out['stdout'] == '1\n2\n... 3 lines omitted ...\n6'
+    assert out['stderr'] is None
+
+    with open(out['stdoutPath']) as spilled:
+        assert spilled.read() == '1\n2\n3\n4\n5\n6\n'
+
+    with open(out['stderrPath']) as spilled:
+        assert spilled.read() == ''
+
+    os.remove(out['stdoutPath'])
+    os.remove(out['stderrPath'])
+
+
+def test_cmdstep_stream_spill_only_saves_paths():
+    """Spill without head or tail doesn't keep output in memory."""
+    context = Context({'cmd': {'run': 'echo a',
+                               'save': True,
+                               'stream': True,
+                               'spill': True}})
+
+    CmdStep('blahname', context).run_step(is_shell=False)
+
+    out = context['cmdOut']
+    assert out['stdout'] is None
+
+    with open(out['stdoutPath']) as spilled:
+        assert spilled.read() == 'a\n'
+
+    os.remove(out['stdoutPath'])
+    os.remove(out['stderrPath'])
+
+
+def test_cmdstep_stream_spill_removed_on_popen_error(tmp_path):
+    """Spill files don't leak when the command can't start."""
+    context = Context({'cmd': {'run': 'arb',
+                               'save': True,
+                               'stream': True,
+                               'spill': True}})
+
+    spill_files = []
+
+    def get_temp_file(**kwargs):
+        spill_file = NamedTemporaryFile(dir=tmp_path, **kwargs)
+        spill_files.append(spill_file.name)
+        return spill_file
+
+    with patch('pypyr.steps.dsl.cmd.NamedTemporaryFile',
+               side_effect=get_temp_file):
+        with patch('subprocess.Popen', side_effect=OSError('arb')):
+            with pytest.raises(OSError) as err:
+                CmdStep('blahname', context).run_step(is_shell=False)
+
+    assert str(err.value) == 'arb'
+    assert len(spill_files) == 2
+    assert list(tmp_path.iterdir()) == []
+    assert 'cmdOut' not in context
+
+
+def test_cmdstep_stream_error_raises_after_save():
+    """Non-zero return code saves cmdOut & then raises."""
+    context = Context({'cmd': {'run': 'echo a; echo b 1>&2; exit 3',
+                               'save': True,
+                               'stream': True,
+                               'tail': 1}})
+    obj = CmdStep('blahname', context)
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        obj.run_step(is_shell=True)
+
+    assert err.value.returncode == 3
+    assert err.value.output == 'a'
+    assert err.value.stderr == 'b'
+    assert context['cmdOut']['returncode'] == 3
+
+
+def test_stream_capture_tail_only():
+    """Tail only keeps last lines & says how many it dropped."""
+    log = []
+    capture = StreamCapture(log.append, tail=2, is_keep_all=False)
+    capture.read(['1\n', '2\n', '3\n'])
+
+    assert log == ['1', '2', '3']
+    assert capture.line_count == 3
+    assert capture.get_value() == '... 1 lines omitted ...\n2\n3'
+
+
+def test_stream_capture_zero_head_tail():
+    """Head 0 with tail still says how many lines it dropped."""
+    capture = StreamCapture(lambda line: None, head=0, tail=1,
+                            is_keep_all=False)
+    capture.read(['1\n', '2\n', '3\n'])
+
+    assert capture.get_value() == '... 2 lines omitted ...\n3'
+
+
+def test_stream_capture_remove_spill_file(tmp_path):
+    """Remove spill file deletes it & tolerates it already gone."""
+    spill_path = tmp_path / 'spill'
+    spill_path.write_text('a')
+    capture = StreamCapture(lambda line: None)
+    capture.remove_spill_file()
+
+    capture.spill_file = MagicMock()
+    capture.spill_file.name = str(spill_path)
+    capture.remove_spill_file()
+    assert not spill_path.exists()
+
+    capture.remove_spill_file()
+
+
+def test_stream_capture_head_only():
+    """Head only keeps first lines & says how many it dropped."""
+    capture = StreamCapture(lambda line: None, head=1, is_keep_all=False)
+    capture.read(['1\n', '2\n', '3\n'])
+
+    assert capture.get_value() == '1\n... 2 lines omitted ...'
+
+
+def test_stream_capture_empty():
+    """No output gives None."""
+    capture = StreamCapture(lambda line: None)
+    capture.read([])
+    capture.close()
+
+    assert capture.get_value() is None
+
+
+def test_wait_for_process_no_wait4(monkeypatch):
+    """Without os.wait4 there's no peak memory."""
+    monkeypatch.delattr(os, 'wait4', raising=False)
+    process = MagicMock()
+    process.wait.return_value = 2
+
+    assert wait_for_process(process) == (2, None)
+
+
+def test_wait_for_process_signal():
+    """A signaled child gives a negative return code."""
+    process = subprocess.Popen(['sleep', '10'])
+    process.kill()
+
+    returncode, max_rss = wait_for_process(process)
+
+    assert returncode == -signal.SIGKILL
+    assert process.returncode == returncode
+    assert max_rss >= 0
+
+
+def test_wait_for_process_darwin_bytes(monkeypatch):
+    """On macOS ru_maxrss is in bytes, convert to KB."""
+    monkeypatch.setattr(sys, 'platform', 'darwin')
+    rusage = MagicMock()
+    rusage.ru_maxrss = 4096
+    process = MagicMock()
+
+    with patch('os.wait4', return_value=(1, 0, rusage)):
+        assert wait_for_process(process) == (0, 4)
+
+    assert process.returncode == 0
+
+# ------------------------- END stream ---------------------------------------
+
+# ------------------------- batch --------------------------------------------
+
+
+def test_cmdstep_batch_options():
+    """Parallel & failFast parse from dict, default serial complete-all."""
+    obj = CmdStep('blahname', Context({'cmd': ['a', 'b']}))
+    assert obj.cmd_text == ['a', 'b']
+    assert obj.max_workers == 1
+    assert not obj.is_fail_fast
+
+    obj = CmdStep('blahname', Context({'k1': '3',
+                                       'cmd': {'run': ['a', 'b'],
+                                               'parallel': '{k1}',
+                                               'failFast': True}}))
+    assert obj.cmd_text == ['a', 'b']
+    assert obj.max_workers == 3
+    assert obj.is_fail_fast
+
+    obj = CmdStep('blahname', Context({'cmd': {'run': ['a'],
+                                               'parallel': 0}}))
+    assert obj.max_workers == 1
+
+    obj = CmdStep('blahname', Context({'cmd': {'run': ['a'],
+                                               'parallel': False}}))
+    assert obj.max_workers == 1
+
+    with patch('os.cpu_count', return_value=6):
+        obj = CmdStep('blahname', Context({'cmd': {'run': ['a'],
+                                                   'parallel': True}}))
+    assert obj.max_workers == 6
+
+
+def test_cmdstep_batch_stream_raises():
+    """Batch can't stream, so stream with a list of commands raises."""
+    with pytest.raises(ContextError) as err:
+        CmdStep('blahname', Context({'cmd': {'run': ['a', 'b'],
+                                             'save': True,
+                                             'stream': True}}))
+
+    assert str(err.value) == (
+        "blahname cmd can't stream a list of commands. Set stream only when "
+        "run is a single command string.")
+
+
+def test_cmdstep_batch_list_no_save():
+    """Bare list of commands runs them all without saving."""
+    context = Context({'cmd': ['echo a', 'echo b']})
+
+    CmdStep('blahname', context).run_step(is_shell=False)
+
+    assert 'cmdOut' not in context
+
+
+def test_cmdstep_batch_parallel_save_in_order():
+    """Parallel batch saves results in input order."""
+    context = Context({'cmd': {'run': ['sleep 0.2; echo a',
+                                       'echo b 1>&2',
+                                       'echo c'],
+                               'parallel': 3,
+                               'save': True}})
+
+    with patch_logger('blahname', logging.ERROR) as mock_logger_error:
+        CmdStep('blahname', context).run_step(is_shell=True)
+
+    mock_logger_error.assert_called_once_with('stderr: b\n')
+    assert context['cmdOut'] == [
+        {'returncode': 0, 'stdout': 'a', 'stderr': None},
+        {'returncode': 0, 'stdout': None, 'stderr': 'b'},
+        {'returncode': 0, 'stdout': 'c', 'stderr': None}]
+
+
+def test_cmdstep_batch_complete_all_raises_first_failure():
+    """Without fail fast all commands run, then raise 1st failure."""
+    context = Context({'cmd': {'run': ['echo a',
+                                       'exit 2',
+                                       'exit 3',
+                                       'echo d'],
+                               'parallel': 2,
+                               'save': True}})
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        CmdStep('blahname', context).run_step(is_shell=True)
+
+    assert err.value.returncode == 2
+    assert err.value.cmd == 'exit 2'
+    assert [out['returncode'] for out in context['cmdOut']] == [0, 2, 3, 0]
+    assert context['cmdOut'][3]['stdout'] == 'd'
+
+
+def test_cmdstep_batch_complete_all_no_save_raises():
+    """Without save a failure still raises."""
+    context = Context({'cmd': {'run': ['true', 'false'],
+                               'parallel': 2}})
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        CmdStep('blahname', context).run_step(is_shell=False)
+
+    assert err.value.returncode == 1
+    assert err.value.cmd == ['false']
+    assert 'cmdOut' not in context
+
+
+def test_cmdstep_batch_fail_fast():
+    """Fail fast terminates running commands & skips unstarted ones."""
+    context = Context({'cmd': {'run': ['sleep 10',
+                                       'sleep 0.1; exit 2',
+                                       'echo never'],
+                               'parallel': 2,
+                               'failFast': True,
+                               'save': True}})
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        CmdStep('blahname', context).run_step(is_shell=True)
+
+    # the cause, not the casualty
+    assert err.value.returncode == 2
+    out = context['cmdOut']
+    assert out[0]['returncode'] == -signal.SIGTERM
+    assert out[1]['returncode'] == 2
+    assert out[2] == {'returncode': None, 'stdout': None, 'stderr': None}
+
+
+def test_cmdstep_batch_fail_fast_terminates_late_starter():
+    """A command that starts as fail fast triggers terminates immediately."""
+    context = Context({'cmd': {'run': ['exit 2', 'sleep 10'],
+                               'parallel': 2,
+                               'failFast': True,
+                               'save': True}})
+    obj = CmdStep('blahname', context)
+
+    real_popen = subprocess.Popen
+
+    def slow_popen(args, **kwargs):
+        # past the cancel check, but only starts once exit 2 is done.
+        if args == 'sleep 10':
+            time.sleep(0.5)
+        return real_popen(args, **kwargs)
+
+    with patch('pypyr.steps.dsl.cmd.subprocess.Popen',
+               side_effect=slow_popen):
+        with pytest.raises(subprocess.CalledProcessError) as err:
+            obj.run_step(is_shell=True)
+
+    assert err.value.returncode == 2
+    assert context['cmdOut'][1]['returncode'] == -signal.SIGTERM
+
+
+def test_terminate_process_group_leader():
+    """Group leader kills the whole group."""
+    process = MagicMock()
+    process.pid = 123
+
+    with patch('os.getpgid', return_value=123):
+        with patch('os.killpg') as mock_killpg:
+            terminate_process(process)
+
+    mock_killpg.assert_called_once_with(123, signal.SIGTERM)
+    process.terminate.assert_not_called()
+
+
+def test_terminate_process_not_group_leader():
+    """Not a group leader only terminates the process."""
+    process = MagicMock()
+    process.pid = 123
+
+    with patch('os.getpgid', return_value=1):
+        with patch('os.killpg') as mock_killpg:
+            terminate_process(process)
+
+    mock_killpg.assert_not_called()
+    process.terminate.assert_called_once()
+
+
+def test_terminate_process_gone():
+    """Process that already exited is a no-op."""
+    process = MagicMock()
+
+    with patch('os.getpgid', side_effect=ProcessLookupError):
+        terminate_process(process)
+
+    process.terminate.assert_not_called()
+
+
+def test_terminate_process_not_posix(monkeypatch):
+    """Non-posix just terminates."""
+    monkeypatch.setattr(os, 'name', 'nt')
+    process = MagicMock()
+
+    terminate_process(process)
+
+    process.terminate.assert_called_once()
+
+
+def test_terminate_live_process_running():
+    """A running process terminates."""
+    process = MagicMock()
+    process.poll.return_value = None
+
+    with patch('pypyr.steps.dsl.cmd.terminate_process') as mock_terminate:
+        terminate_live_process(process, is_kill=True)
+
+    mock_terminate.assert_called_once_with(process, is_kill=True)
+
+
+def test_terminate_live_process_reaped():
+    """A process that already exited doesn't get signaled."""
+    process = MagicMock()
+    process.poll.return_value = 0
+
+    with patch('pypyr.steps.dsl.cmd.terminate_process') as mock_terminate:
+        terminate_live_process(process)
+
+    mock_terminate.assert_not_called()
+
+
+def test_terminate_live_process_gone():
+    """A process that exits after poll is a no-op."""
+    process = MagicMock()
+    process.poll.return_value = None
+
+    with patch('pypyr.steps.dsl.cmd.terminate_process',
+               side_effect=ProcessLookupError) as mock_terminate:
+        terminate_live_process(process)
+
+    mock_terminate.assert_called_once_with(process, is_kill=False)
+
+# ------------------------- END batch ----------------------------------------
+
+# ------------------------- timeout ------------------------------------------
+
+
+def run_cmd_step_with_timeout(context, is_shell=True):
+    """Run cmd step with a short timeout & wait until its thread finishes."""
+    step = CmdStep('blahname', context)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutExpiredError):
+        run_with_timeout(0.2, 'step blahname', step.run_step, is_shell)
+
+    # the abandoned step thread saves cmdOut once the kill lands.
+    while 'cmdOut' not in context:
+        assert time.perf_counter() - start < 5
+        time.sleep(0.01)
+
+    return context['cmdOut']
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="posix signals")
+def test_cmdstep_timeout_kills_save():
+    """Timeout kills a saving command & its children."""
+    out = run_cmd_step_with_timeout(
+        Context({'cmd': {'run': 'sleep 10; echo done', 'save': True}}))
+
+    assert out['returncode'] == -signal.SIGKILL
+    assert out['stdout'] is None
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="posix signals")
+def test_cmdstep_timeout_kills_stream():
+    """Timeout kills a streaming command."""
+    out = run_cmd_step_with_timeout(
+        Context({'cmd': {'run': 'echo start; sleep 10',
+                         'save': True,
+                         'stream': True}}))
+
+    assert out['returncode'] == -signal.SIGKILL
+    assert out['stdout'] == 'start'
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="posix signals")
+def test_cmdstep_timeout_kills_batch():
+    """Timeout kills running batch commands & skips unstarted ones."""
+    out = run_cmd_step_with_timeout(
+        Context({'cmd': {'run': ['sleep 10', 'sleep 10', 'echo never'],
+                         'parallel': 2,
+                         'save': True}}))
+
+    assert [cmd_out['returncode'] for cmd_out in out] == [-signal.SIGKILL,
+                                                          -signal.SIGKILL,
+                                                          None]
+
+
+def test_run_process_with_token():
+    """Run process with token runs like subprocess.run."""
+    token = CancelToken()
+
+    completed_process = run_with_token(token,
+                                       run_process,
+                                       [sys.executable, '-c', 'print(1)'],
+                                       stdout=subprocess.PIPE,
+                                       universal_newlines=True)
+
+    assert completed_process.returncode == 0
+    assert completed_process.stdout == '1\n'
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        run_with_token(token,
+                       run_process,
+                       [sys.executable, '-c', 'exit(3)'],
+                       check=True)
+
+    assert err.value.returncode == 3
+
+
+def test_run_process_with_token_not_posix(monkeypatch):
+    """Run process with token on non-posix doesn't start a new session."""
+    monkeypatch.setattr(os, 'name', 'nt')
+    real_popen = subprocess.Popen
+
+    def popen(args, **kwargs):
+        assert 'start_new_session' not in kwargs
+        return real_popen(args, **kwargs)
+
+    with patch('pypyr.steps.dsl.cmd.subprocess.Popen', side_effect=popen):
+        completed_process = run_with_token(CancelToken(),
+                                           run_process,
+                                           [sys.executable, '-c', 'exit(0)'])
+
+    assert completed_process.returncode == 0
+
+
+def test_terminate_process_group_leader_kill():
+    """Kill group leader kills the whole group with SIGKILL."""
+    process = MagicMock()
+    process.pid = 123
+
+    with patch('os.getpgid', return_value=123):
+        with patch('os.killpg') as mock_killpg:
+            terminate_process(process, is_kill=True)
+
+    mock_killpg.assert_called_once_with(123, signal.SIGKILL)
+
+
+def test_terminate_process_not_posix_kill(monkeypatch):
+    """Non-posix kill just kills."""
+    monkeypatch.setattr(os, 'name', 'nt')
+    process = MagicMock()
+
+    terminate_process(process, is_kill=True)
+
+    process.kill.assert_called_once()
+    process.terminate.assert_not_called()
+
+# ------------------------- END timeout --------------------------------------
@@ -8,6 +8,7 @@
                           KeyInContextHasNoValueError,
                           KeyNotInContextError)
 from pypyr.steps.dsl.cof import control_of_flow_instruction as cof_func
+from pypyr.steps.dsl.cof import get_control_of_flow_instruction
 
 from tests.common.utils import patch_logger
 
@@ -257,3 +258,18 @@ def test_cof_dict_with_all_args_formatting_to_string():
                                            'success': '{sg}',
                                            'failure': '{fg}'
                                            })
+
+
+def test_get_cof_returns_instruction():
+    """Get instruction returns rather than raises the instruction."""
+    cof = get_control_of_flow_instruction(
+        name='blah',
+        instruction_type=Call,
+        context=Context({'key': {'groups': 'g', 'success': 'sg'}}),
+        context_key='key')
+
+    assert type(cof) is Call
+    assert cof.groups == ['g']
+    assert cof.success_group == 'sg'
+    assert cof.failure_group is None
+    assert cof.original_config == ('key', {'groups': 'g', 'success': 'sg'})
@@ -0,0 +1,108 @@
+"""pypyr.steps.dsl.filewriter unit tests."""
+import pytest
+from pypyr.context import Context
+from pypyr.errors import KeyNotInContextError
+from pypyr.steps.dsl.filewriter import FileWriterStep
+
+# ------------------------ FileWriterStep: init -------------------------------
+
+
+def test_filewriterstep_formats_config_not_payload():
+    """Config formats, payload stays raw for the writer to format."""
+    context = Context({'k1': 'v1',
+                       'root': {'path': '/{k1}',
+                                'atomic': '{k1}',
+                                'payload': ['{k1}']}})
+
+    step = FileWriterStep('blah', 'root', context)
+
+    assert step.config == {'path': '/v1', 'atomic': 'v1'}
+    assert step.path == '/v1'
+    assert not step.is_atomic
+    assert step.payload is context['root']['payload']
+    assert not step.is_payload_formatted
+    assert step.format_value(step.payload) == ['v1']
+
+
+def test_filewriterstep_no_payload_is_context():
+    """No payload means entire context."""
+    context = Context({'root': {'path': '/arb', 'atomic': True}})
+
+    step = FileWriterStep('blah', 'root', context)
+
+    assert step.is_atomic
+    assert step.payload is context
+    assert not step.is_payload_formatted
+
+
+def test_filewriterstep_none_payload():
+    """Payload None writes None, not the context."""
+    context = Context({'root': {'path': '/arb', 'payload': None}})
+
+    step = FileWriterStep('blah', 'root', context)
+
+    assert step.payload is None
+
+
+def test_filewriterstep_config_expression_formats_payload():
+    """Config that is an expression formats everything in it."""
+    context = Context({'k1': 'v1',
+                       'conf': {'path': '/arb', 'payload': ['{k1}']},
+                       'root': '{conf}'})
+
+    step = FileWriterStep('blah', 'root', context)
+
+    assert step.payload == ['v1']
+    assert step.is_payload_formatted
+    # formatted already, so doesn't format again
+    assert step.format_value('{k1}') == '{k1}'
+
+
+def test_filewriterstep_config_expression_no_payload():
+    """Config expression without payload still formats the context."""
+    context = Context({'conf': {'path': '/arb'},
+                       'root': '{conf}'})
+
+    step = FileWriterStep('blah', 'root', context)
+
+    assert step.payload is context
+    assert not step.is_payload_formatted
+
+
+def test_filewriterstep_no_path_raises():
+    """Missing path raises."""
+    with pytest.raises(KeyNotInContextError) as err:
+        FileWriterStep('blah', 'root', Context({'root': {'payload': 1}}))
+
+    assert str(err.value) == ("context['root']['path'] doesn't exist. It "
+                              "must exist for blah.")
+
+# ------------------------ FileWriterStep: open -------------------------------
+
+
+def test_filewriterstep_open(tmp_path):
+    """Open writes straight to path, creating dirs."""
+    path = tmp_path.joinpath('sub', 'out.txt')
+    step = FileWriterStep('blah', 'root',
+                          Context({'root': {'path': str(path)}}))
+
+    with step.open() as outfile:
+        assert outfile.name == str(path)
+        outfile.write('arb')
+
+    assert path.read_text() == 'arb'
+
+
+def test_filewriterstep_open_atomic(tmp_path):
+    """Open atomic writes to temp file & then replaces path."""
+    path = tmp_path.joinpath('sub', 'out.txt')
+    step = FileWriterStep('blah', 'root',
+                          Context({'root': {'path': str(path),
+                                            'atomic': True}}))
+
+    with step.open() as outfile:
+        assert outfile.name != str(path)
+        outfile.write('arb')
+        assert not path.exists()
+
+    assert path.read_text() == 'arb'
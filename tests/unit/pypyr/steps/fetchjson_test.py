@@ -1,8 +1,11 @@
 """fetchjson.py unit tests."""
+import json
 from unittest.mock import mock_open, patch
 from pypyr.context import Context
+from pypyr.dsl import Step
 from pypyr.errors import KeyInContextHasNoValueError, KeyNotInContextError
 import pypyr.steps.fetchjson as filefetcher
+from pypyr.utils.lazyjson import LazyJsonArray
 import pytest
 
 
@@ -102,13 +105,35 @@ def test_fetchjson_with_destination():
             'path': '/arb/arbfile',
             'key': 'outkey'}})
 
-    with patch('pypyr.steps.fetchjson.open', mock_open(read_data='[1,2,3]')):
+    with patch('pypyr.cache.filecache.open', mock_open(read_data='[1,2,3]')):
         filefetcher.run_step(context)
 
     assert context['outkey'] == [1, 2, 3]
     assert len(context) == 2
 
 
+def test_fetchjson_cache(tmp_path):
+    """Only cache: True uses the file cache."""
+    path = tmp_path / 'doc.json'
+    path.write_text('{"a": [1]}')
+    context = Context({'fetchJson': {'path': str(path), 'key': 'out'}})
+
+    with patch('pypyr.steps.fetchjson.file_cache') as mock_cache:
+        filefetcher.run_step(context)
+
+    mock_cache.get_json.assert_not_called()
+    assert context['out'] == {'a': [1]}
+
+    context['fetchJson']['cache'] = '{isCache}'
+    context['isCache'] = 'True'
+    with patch('pypyr.steps.fetchjson.file_cache') as mock_cache:
+        mock_cache.get_json.return_value = {'b': 2}
+        filefetcher.run_step(context)
+
+    mock_cache.get_json.assert_called_once_with(str(path))
+    assert context['out'] == {'b': 2}
+
+
 def test_fetchjson_with_destination_int():
     """Json writes to destination key that's not a string."""
     context = Context({
@@ -116,7 +141,7 @@ def test_fetchjson_with_destination_int():
             'path': '/arb/arbfile',
             'key': 99}})
 
-    with patch('pypyr.steps.fetchjson.open', mock_open(read_data='[1,2,3]')):
+    with patch('pypyr.cache.filecache.open', mock_open(read_data='[1,2,3]')):
         filefetcher.run_step(context)
 
     assert context[99] == [1, 2, 3]
@@ -131,7 +156,7 @@ def test_fetchjson_with_destination_formatting():
             'path': '/arb/arbfile',
             'key': '{keyhere[sub][0]}'}})
 
-    with patch('pypyr.steps.fetchjson.open', mock_open(
+    with patch('pypyr.cache.filecache.open', mock_open(
             read_data='{"1": 2,"2": 3}')):
         filefetcher.run_step(context)
 
@@ -147,6 +172,150 @@ def test_fetchjson_list_fails():
         'fetchJson': {
             'path': '/arb/arbfile'}})
 
-    with patch('pypyr.steps.fetchjson.open', mock_open(read_data='[1,2,3]')):
+    with patch('pypyr.cache.filecache.open', mock_open(read_data='[1,2,3]')):
         with pytest.raises(TypeError):
             filefetcher.run_step(context)
+
+# region select, lazy & mmap
+
+
+BIG_JSON = '''{
+    "meta": {"name": "arb", "version": 2},
+    "items": [{"id": 1}, {"id": 2}, {"id": 3}],
+    "skipped": {"deep": [1, 2, 3]}
+}'''
+
+
+@pytest.fixture
+def big_json(tmp_path):
+    """Write json file to tmp_path & return its path."""
+    path = tmp_path / 'big.json'
+    path.write_text(BIG_JSON)
+    return str(path)
+
+
+def test_fetchjson_select_list(big_json):
+    """Select list of pointers merges each into context by last token."""
+    context = Context({
+        'ok1': 'ov1',
+        'fetchJson': {
+            'path': big_json,
+            'select': ['/meta/name', '/items/1']}})
+
+    filefetcher.run_step(context)
+
+    assert len(context) == 4
+    assert context['ok1'] == 'ov1'
+    assert context['name'] == 'arb'
+    assert context['1'] == {'id': 2}
+    assert 'skipped' not in context
+
+
+def test_fetchjson_select_dict_with_key(big_json):
+    """Select dict of pointers writes to destination key."""
+    context = Context({
+        'pointer': '/meta/version',
+        'fetchJson': {
+            'path': big_json,
+            'key': 'out',
+            'select': {'v': '{pointer}', 'all': ''}}})
+
+    filefetcher.run_step(context)
+
+    assert context['out'] == {'v': 2, 'all': json.loads(BIG_JSON)}
+
+
+def test_fetchjson_select_str_mmap(big_json):
+    """Select single pointer string from memory-mapped file."""
+    context = Context({
+        'fetchJson': {
+            'path': big_json,
+            'select': '/meta',
+            'mmap': True}})
+
+    filefetcher.run_step(context)
+
+    assert context['meta'] == {'name': 'arb', 'version': 2}
+
+
+def test_fetchjson_select_not_found(big_json):
+    """Missing pointer raises KeyError."""
+    context = Context({
+        'fetchJson': {
+            'path': big_json,
+            'select': ['/meta/nope']}})
+
+    with pytest.raises(KeyError) as err:
+        filefetcher.run_step(context)
+
+    assert err.value.args[0] == '/meta/nope not found.'
+
+
+def test_fetchjson_mmap_whole_file(big_json):
+    """Memory-mapped without select merges whole document."""
+    context = Context({
+        'fetchJson': {
+            'path': big_json,
+            'mmap': 'True'}})
+
+    filefetcher.run_step(context)
+
+    assert context['meta'] == {'name': 'arb', 'version': 2}
+    assert context['skipped'] == {'deep': [1, 2, 3]}
+
+
+def test_fetchjson_lazy_select_foreach(big_json):
+    """Lazy array from select works as foreach input."""
+    context = Context({
+        'fetchJson': {
+            'path': big_json,
+            'select': ['/items'],
+            'lazy': True,
+            'mmap': True}})
+
+    filefetcher.run_step(context)
+
+    items = context['items']
+    assert isinstance(items, LazyJsonArray)
+    assert len(items) == 3
+
+    step = Step({'name': 'pypyr.steps.py',
+                 'foreach': '{items}',
+                 'in': {'pycode':
+                        'context["out"].append(context["i"]["id"])'}},
+                None)
+
+    context['out'] = []
+    step.run_step(context)
+
+    assert context['out'] == [1, 2, 3]
+
+
+def test_fetchjson_lazy_root_array_with_key(tmp_path):
+    """Lazy root array writes to destination key."""
+    path = tmp_path / 'arr.json'
+    path.write_text('[1, {"a": 2}]')
+    context = Context({
+        'fetchJson': {
+            'path': str(path),
+            'key': 'out',
+            'lazy': True}})
+
+    filefetcher.run_step(context)
+
+    assert isinstance(context['out'], LazyJsonArray)
+    assert list(context['out']) == [1, {'a': 2}]
+
+
+def test_fetchjson_lazy_root_array_no_key_fails(tmp_path):
+    """Lazy root array can't merge into context root."""
+    path = tmp_path / 'arr.json'
+    path.write_text('[1, 2]')
+    context = Context({
+        'fetchJson': {
+            'path': str(path),
+            'lazy': True}})
+
+    with pytest.raises(TypeError):
+        filefetcher.run_step(context)
+# endregion select, lazy & mmap
@@ -122,7 +122,7 @@ def test_fetchyaml_with_destination():
             'path': '/arb/arbfile',
             'key': 'outkey'}})
 
-    with patch('pypyr.steps.fetchyaml.open', mock_open(
+    with patch('pypyr.cache.filecache.open', mock_open(
             read_data='[1,2,3]')) as mock_file:
         filefetcher.run_step(context)
 
@@ -131,6 +131,27 @@ def test_fetchyaml_with_destination():
     assert len(context) == 2
 
 
+def test_fetchyaml_cache(tmp_path):
+    """Only cache: True uses the file cache."""
+    path = tmp_path / 'doc.yaml'
+    path.write_text('a: [1]')
+    context = Context({'fetchYaml': {'path': str(path), 'key': 'out'}})
+
+    with patch('pypyr.steps.fetchyaml.file_cache') as mock_cache:
+        filefetcher.run_step(context)
+
+    mock_cache.get_yaml.assert_not_called()
+    assert context['out'] == {'a': [1]}
+
+    context['fetchYaml']['cache'] = True
+    with patch('pypyr.steps.fetchyaml.file_cache') as mock_cache:
+        mock_cache.get_yaml.return_value = {'b': 2}
+        filefetcher.run_step(context)
+
+    mock_cache.get_yaml.assert_called_once_with(str(path))
+    assert context['out'] == {'b': 2}
+
+
 def test_fetchyaml_with_destination_int():
     """Yaml writes to destination key that's not a string."""
     context = Context({
@@ -138,7 +159,7 @@ def test_fetchyaml_with_destination_int():
             'path': '/arb/arbfile',
             'key': 99}})
 
-    with patch('pypyr.steps.fetchyaml.open', mock_open(read_data='[1,2,3]')):
+    with patch('pypyr.cache.filecache.open', mock_open(read_data='[1,2,3]')):
         filefetcher.run_step(context)
 
     assert context[99] == [1, 2, 3]
@@ -153,7 +174,7 @@ def test_fetchyaml_with_destination_formatting():
             'path': '/arb/{keyhere[arbk]}',
             'key': '{keyhere[sub][0]}'}})
 
-    with patch('pypyr.steps.fetchyaml.open', mock_open(
+    with patch('pypyr.cache.filecache.open', mock_open(
             read_data='1: 2\n2: 3')) as mock_file:
         filefetcher.run_step(context)
 
@@ -165,3 +186,52 @@ def test_fetchyaml_with_destination_formatting():
     assert context['fetchYaml'] == {
         'path': '/arb/{keyhere[arbk]}',
         'key': '{keyhere[sub][0]}'}
+
+
+def test_fetchyaml_select_list():
+    """Select list of pointers merges each into context by last token."""
+    context = Context({
+        'ok1': 'ov1',
+        'fetchYaml': {
+            'path': '/arb/arbfile',
+            'select': ['/a/b', '/c/1']}})
+
+    with patch('pypyr.cache.filecache.open', mock_open(
+            read_data='a:\n  b: 1\nc: [2, 3]\nd: 4')):
+        filefetcher.run_step(context)
+
+    assert context == {'ok1': 'ov1',
+                       'b': 1,
+                       '1': 3,
+                       'fetchYaml': {'path': '/arb/arbfile',
+                                     'select': ['/a/b', '/c/1']}}
+
+
+def test_fetchyaml_select_dict_with_key():
+    """Select dict of pointers writes to destination key."""
+    context = Context({
+        'fetchYaml': {
+            'path': '/arb/arbfile',
+            'key': 'out',
+            'select': {'x': '/a/b', 'y': '/d'}}})
+
+    with patch('pypyr.cache.filecache.open', mock_open(
+            read_data='a:\n  b: 1\nc: [2, 3]\nd: 4')):
+        filefetcher.run_step(context)
+
+    assert context['out'] == {'x': 1, 'y': 4}
+
+
+def test_fetchyaml_select_not_found():
+    """Missing pointer raises KeyError."""
+    context = Context({
+        'fetchYaml': {
+            'path': '/arb/arbfile',
+            'select': '/a/x'}})
+
+    with patch('pypyr.cache.filecache.open', mock_open(
+            read_data='a:\n  b: 1')):
+        with pytest.raises(KeyError) as err:
+            filefetcher.run_step(context)
+
+    assert err.value.args[0] == '/a/x not found.'
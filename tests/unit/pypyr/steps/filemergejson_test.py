@@ -0,0 +1,69 @@
+"""filemergejson.py unit tests."""
+import json
+import pytest
+from pypyr.context import Context
+from pypyr.errors import KeyInContextHasNoValueError, KeyNotInContextError
+import pypyr.steps.filemergejson as filemergejson
+
+
+def test_filemergejson_no_input_raises():
+    """No input context raises."""
+    with pytest.raises(KeyNotInContextError) as err_info:
+        filemergejson.run_step(Context({'k1': 'v1'}))
+
+    assert str(err_info.value) == ("context['fileMergeJson'] "
+                                   "doesn't exist. It must exist for "
+                                   "pypyr.steps.filemergejson.")
+
+
+def test_filemergejson_no_out_raises():
+    """Out path is mandatory."""
+    with pytest.raises(KeyInContextHasNoValueError) as err_info:
+        filemergejson.run_step(Context({'fileMergeJson': {'in': 'arb',
+                                                          'out': None}}))
+
+    assert str(err_info.value) == ("context['fileMergeJson']['out'] must "
+                                   "have a value for "
+                                   "pypyr.steps.filemergejson.")
+
+
+def test_filemergejson_glob(tmp_path):
+    """Merge shard outputs from a glob in sorted order."""
+    for i in (2, 0, 1):
+        (tmp_path / f'out-{i}.json').write_text(json.dumps([{'shard': i}]))
+
+    context = Context({
+        'dir': str(tmp_path),
+        'fileMergeJson': {'in': '{dir}/out-*.json',
+                          'out': '{dir}/merged/out.json'}})
+    filemergejson.run_step(context)
+
+    merged = json.loads((tmp_path / 'merged' / 'out.json').read_text())
+    assert merged == [{'shard': 0}, {'shard': 1}, {'shard': 2}]
+
+
+def test_filemergejson_list(tmp_path):
+    """Merge list of globs in list order."""
+    (tmp_path / 'b.json').write_text('{"k": "b", "b": 1}')
+    (tmp_path / 'a.json').write_text('{"k": "a", "a": 1}')
+
+    out_path = tmp_path / 'out.json'
+    filemergejson.run_step(Context({
+        'fileMergeJson': {'in': [tmp_path / 'b.json', tmp_path / 'a.json'],
+                          'out': out_path}}))
+
+    assert json.loads(out_path.read_text()) == {'k': 'a', 'a': 1, 'b': 1}
+
+
+def test_filemergejson_no_matches_raises(tmp_path):
+    """No files matching the input globs raises rather than writing null."""
+    out_path = tmp_path / 'out.json'
+    with pytest.raises(FileNotFoundError) as err_info:
+        filemergejson.run_step(Context({
+            'fileMergeJson': {'in': str(tmp_path / 'nope-*.json'),
+                              'out': out_path}}))
+
+    assert str(err_info.value) == (
+        "fileMergeJson found no json files to merge in "
+        f"['{tmp_path / 'nope-*.json'}'].")
+    assert not out_path.exists()
@@ -1,12 +1,14 @@
 """filewritejson.py unit tests."""
-import pytest
 import io
+import json
+import pytest
 from unittest.mock import mock_open, patch
 from pypyr.context import Context
 from pypyr.errors import (
     ContextError,
     KeyInContextHasNoValueError,
     KeyNotInContextError)
+from pypyr.dsl import PyString
 import pypyr.steps.filewritejson as filewrite
 
 
@@ -91,7 +93,7 @@ def test_filewritejson_pass_no_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -129,7 +131,7 @@ def test_filewritejson_pass_with_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -189,7 +191,7 @@ def test_filewritejson_pass_no_payload_substitutions(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -239,7 +241,7 @@ def test_filewritejson_pass_with_payload_substitutions(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -286,7 +288,7 @@ def test_filewritejson_pass_with_empty_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -314,7 +316,7 @@ def test_filewritejson_pass_with_none_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewritejson.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -329,3 +331,108 @@ def test_filewritejson_pass_with_none_payload(mock_makedirs):
         mock_output.assert_called_once_with('/arb/blah', 'w')
         # json well formed & new lines + indents are where they should be
         assert out_text.getvalue() == "null"
+
+
+def test_filewritejson_compact_atomic(tmp_path):
+    """Compact writes without whitespace, atomic replaces path."""
+    path = tmp_path.joinpath('out.json')
+    path.write_text('original')
+    context = Context({
+        'k1': 'v1',
+        'fileWriteJson': {
+            'path': str(path),
+            'compact': True,
+            'atomic': True,
+            'payload': {'a': ['{k1}', 1, None], 'b': {}}
+        }})
+
+    filewrite.run_step(context)
+
+    assert path.read_text() == '{"a":["v1",1,null],"b":{}}'
+
+
+def test_filewritejson_formats_node_by_node(tmp_path):
+    """Each node formats once, expressions resolving to containers as is."""
+    path = tmp_path.joinpath('out.json')
+    context = Context({
+        'k1': 'v1',
+        'literal': ['{{not an expression}}'],
+        'fileWriteJson': {
+            'path': str(path),
+            'payload': {
+                '{k1}': '{literal}',
+                'py': PyString('len(k1)'),
+                3: (True, 1.5),
+            }
+        }})
+
+    filewrite.run_step(context)
+
+    assert path.read_text() == ('{\n'
+                                '  "v1": [\n'
+                                '    "{not an expression}"\n'
+                                '  ],\n'
+                                '  "py": 2,\n'
+                                '  "3": [\n'
+                                '    true,\n'
+                                '    1.5\n'
+                                '  ]\n'
+                                '}')
+
+
+def test_iter_json_matches_json_dump():
+    """Output is the same as json.dump."""
+    obj = {'a': 1,
+           'b': [1, 2.5, {'c': None, 'd': True}],
+           'e': {},
+           'f': [],
+           'g': '\u00fc"\n',
+           1: 2,
+           2.5: 'x',
+           False: 'y',
+           None: 'z',
+           'h': (1, 2),
+           'n': float('nan'),
+           'i': float('-inf')}
+
+    for indent in (2, 4):
+        assert ''.join(filewrite.iter_json(obj, indent=indent)) == json.dumps(
+            obj, indent=indent, ensure_ascii=False)
+
+    assert ''.join(filewrite.iter_json(obj, indent=None)) == json.dumps(
+        obj, separators=(',', ':'), ensure_ascii=False)
+
+    assert ''.join(filewrite.iter_json('arb')) == '"arb"'
+
+
+def test_iter_json_bad_key_raises():
+    """Key that isn't json serializable raises."""
+    with pytest.raises(TypeError) as err:
+        ''.join(filewrite.iter_json({(1, 2): 'arb'}))
+
+    assert str(err.value) == ("keys must be str, int, float, bool or None, "
+                              "not tuple")
+
+
+def test_iter_json_bad_value_raises():
+    """Value that isn't json serializable raises."""
+    with pytest.raises(TypeError):
+        ''.join(filewrite.iter_json({'a': {1, 2}}))
+
+
+def test_iter_json_circular_raises():
+    """Circular reference raises."""
+    obj = {'a': []}
+    obj['a'].append(obj)
+
+    with pytest.raises(ValueError) as err:
+        ''.join(filewrite.iter_json(obj))
+
+    assert str(err.value) == "Circular reference detected"
+
+
+def test_iter_json_repeated_reference_not_circular():
+    """Same object twice that isn't circular is fine."""
+    shared = ['x']
+    assert ''.join(filewrite.iter_json([shared, shared], indent=None)) == (
+        '[["x"],["x"]]')
@@ -92,7 +92,7 @@ def test_filewriteyaml_pass_no_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -127,7 +127,7 @@ def test_filewriteyaml_pass_with_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -183,7 +183,7 @@ def test_filewriteyaml_pass_no_payload_substitutions(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -228,7 +228,7 @@ def test_filewriteyaml_pass_with_payload_substitutions(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -269,7 +269,7 @@ def test_filewriteyaml_pass_with_empty_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -297,7 +297,7 @@ def test_filewriteyaml_pass_with_none_payload(mock_makedirs):
         }})
 
     with io.StringIO() as out_text:
-        with patch('pypyr.steps.filewriteyaml.open',
+        with patch('pypyr.steps.dsl.filewriter.open',
                    mock_open()) as mock_output:
             mock_output.return_value.write.side_effect = out_text.write
             filewrite.run_step(context)
@@ -312,3 +312,34 @@ def test_filewriteyaml_pass_with_none_payload(mock_makedirs):
         mock_output.assert_called_once_with('/arb/blah', 'w')
         # yaml well formed & new lines + indents are where they should be
         assert out_text.getvalue() == "null\n...\n"
+
+
+def test_filewriteyaml_streams_items_atomic(tmp_path):
+    """Mapping & list payloads write per item, same as a whole dump."""
+    path = tmp_path.joinpath('out.yaml')
+    context = Context({
+        'k1': 'v1',
+        'fileWriteYaml': {
+            'path': str(path),
+            'atomic': True,
+            'payload': {'a': ['{k1}', {'b': 1}], '{k1}': 'c'}
+        }})
+
+    filewrite.run_step(context)
+
+    assert path.read_text() == ('a:\n'
+                                '  - v1\n'
+                                '  - b: 1\n'
+                                'v1: c\n')
+
+    context['fileWriteYaml']['payload'] = ['{k1}', [1, 2]]
+    filewrite.run_step(context)
+
+    assert path.read_text() == ('  - v1\n'
+                                '  -   - 1\n'
+                                '      - 2\n')
+
+    context['fileWriteYaml']['payload'] = {}
+    filewrite.run_step(context)
+
+    assert path.read_text() == '{}\n'
@@ -1,6 +1,5 @@
 """jump.py unit tests."""
 import logging
-import pytest
 from pypyr.context import Context
 from pypyr.errors import Jump
 from pypyr.steps.jump import run_step
@@ -9,15 +8,13 @@
 
 
 def test_jump_step_dict_with_all_args():
-    """Dict with all values set."""
-    with pytest.raises(Jump) as err:
-        with patch_logger('pypyr.steps.jump',
-                          logging.INFO) as mock_logger_info:
-            run_step(Context(Context({'jump': {'groups': ['b', 'c'],
-                                               'success': 'sg',
-                                               'failure': 'fg'}})))
+    """Dict with all values set returns instruction."""
+    with patch_logger('pypyr.steps.jump',
+                      logging.INFO) as mock_logger_info:
+        cof = run_step(Context(Context({'jump': {'groups': ['b', 'c'],
+                                                 'success': 'sg',
+                                                 'failure': 'fg'}})))
 
-    cof = err.value
     assert isinstance(cof, Jump)
     assert cof.groups == ['b', 'c']
     assert cof.success_group == 'sg'
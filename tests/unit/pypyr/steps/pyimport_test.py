@@ -49,6 +49,7 @@ def test_pyimport():
     pyimport.run_step(context)
     ns = context.pystring_globals
     len(ns) == 4
+    assert context.pystring_imports == [source]
 
     assert ns['math'].sqrt(4) == 2
     # no return value but shouldn't raise not found.
@@ -1,13 +1,16 @@
 """pype.py unit tests."""
 import logging
 import pytest
+from pathlib import Path
 from unittest.mock import call, patch
 from pypyr.context import Context
 from pypyr.errors import (
     ContextError,
     Stop,
     KeyInContextHasNoValueError,
-    KeyNotInContextError)
+    KeyNotInContextError,
+    LoopMaxExhaustedError,
+    QueueJobError)
 import pypyr.steps.pype as pype
 
 from tests.common.utils import patch_logger
@@ -875,6 +878,210 @@ def test_pype_set_groups(mock_run_pipeline):
         call('pyped pipe name.')]
 # endregion run_step
 
+# region run_step queue
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_wait(mock_get_queue, mock_wait):
+    """Queue the child pipeline, wait for it & write out to parent."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.put.return_value = 123
+    mock_wait.return_value = [{'out': {'parentkey': 'value'},
+                               'pipeline_name': 'pipe name',
+                               'worker': 'w'}]
+
+    context = Context({
+        'q': 'queue.db',
+        'pype': {
+            'name': 'pipe name',
+            'args': {'a': 'b'},
+            'out': 'parentkey',
+            'queue': '{q}',
+            'queueBackend': 'arb.backend',
+            'groups': 'g',
+        }
+    })
+    context.working_dir = Path('arb/dir')
+
+    with patch_logger('pypyr.steps.pype', logging.INFO) as mock_logger_info:
+        pype.run_step(context)
+
+    mock_get_queue.assert_called_once_with('queue.db', 'arb.backend')
+    mock_queue.put.assert_called_once_with({
+        'pipeline_name': 'pipe name',
+        'args': {'a': 'b'},
+        'pipe_arg': None,
+        'skip_parse': True,
+        'working_dir': Path('arb/dir'),
+        'loader': None,
+        'groups': ['g'],
+        'success_group': None,
+        'failure_group': None,
+        'out': {'parentkey': 'parentkey'}})
+    mock_wait.assert_called_once_with(mock_queue, [123], timeout=None)
+
+    assert context['parentkey'] == 'value'
+    assert 'pypeJobs' not in context
+
+    assert mock_logger_info.mock_calls == [
+        call('queueing pipe name on queue.db.'),
+        call('waiting for pipe name job 123.'),
+        call('pyped pipe name.')]
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_no_wait(mock_get_queue, mock_wait):
+    """Queue the child pipeline & save job id without waiting."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.put.side_effect = [1, 2]
+
+    context = Context({
+        'pype': {
+            'name': 'pipe name',
+            'useParentContext': False,
+            'pipeArg': 'a b',
+            'queue': 'queue.db',
+            'wait': False,
+        }
+    })
+    context.working_dir = 'arb/dir'
+
+    with patch_logger('pypyr.steps.pype', logging.INFO) as mock_logger_info:
+        pype.run_step(context)
+        pype.run_step(context)
+
+    mock_get_queue.assert_called_with('queue.db', None)
+    mock_wait.assert_not_called()
+
+    job = mock_queue.put.call_args[0][0]
+    assert job['pipe_arg'] == ['a', 'b']
+    assert job['skip_parse'] is False
+    assert job['args'] is None
+    assert job['out'] is None
+
+    assert context['pypeJobs'] == [1, 2]
+    assert call('queued pipe name job 2. Not waiting for it.') in (
+        mock_logger_info.mock_calls)
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_job_failed(mock_get_queue, mock_wait):
+    """Failed job raises in parent."""
+    mock_get_queue.return_value.put.return_value = 1
+    mock_wait.return_value = [{'error': {'name': 'ValueError',
+                                         'description': 'arb'},
+                               'pipeline_name': 'pipe name',
+                               'worker': 'w'}]
+
+    context = Context({'pype': {'name': 'pipe name',
+                                'args': {'a': 'b'},
+                                'queue': 'queue.db'}})
+    context.working_dir = 'arb/dir'
+
+    with pytest.raises(QueueJobError) as err:
+        pype.run_step(context)
+
+    assert str(err.value) == ("pipe name job 1 failed on worker w. "
+                              "ValueError: arb")
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_job_failed_swallow(mock_get_queue, mock_wait):
+    """Failed job with raiseError False carries on."""
+    mock_get_queue.return_value.put.return_value = 1
+    mock_wait.return_value = [{'error': {'name': 'ValueError',
+                                         'description': 'arb'},
+                               'pipeline_name': 'pipe name',
+                               'worker': 'w'}]
+
+    context = Context({'pype': {'name': 'pipe name',
+                                'args': {'a': 'b'},
+                                'out': 'x',
+                                'raiseError': False,
+                                'queue': 'queue.db'}})
+    context.working_dir = 'arb/dir'
+
+    pype.run_step(context)
+
+    assert 'x' not in context
+
+
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_with_parent_context(mock_get_queue):
+    """Queue can't use parent context."""
+    context = Context({'pype': {'name': 'pipe name',
+                                'queue': 'queue.db'}})
+
+    with pytest.raises(ContextError) as err:
+        pype.run_step(context)
+
+    assert str(err.value) == (
+        "pypyr.steps.pype pype.queue runs the child pipeline in a worker "
+        "process, so it can't use the parent context. Set "
+        "useParentContext = False, or pass pype.args.")
+    mock_get_queue.assert_not_called()
+
+
+def test_pype_get_queue_arguments_none():
+    """No queue means run here."""
+    context = Context({'pype': {'name': 'pipe name',
+                                'queue': None,
+                                'wait': False}})
+
+    assert pype.get_queue_arguments(context) == (None, None, True, None)
+
+
+def test_pype_get_queue_arguments_formatted():
+    """Queue arguments format."""
+    context = Context({'q': 'queue.db',
+                       'b': 'arb.backend',
+                       'w': False,
+                       'pype': {'name': 'pipe name',
+                                'queue': '{q}',
+                                'queueBackend': '{b}',
+                                'wait': '{w}'}})
+
+    assert pype.get_queue_arguments(context) == (
+        'queue.db', 'arb.backend', False, None)
+
+
+def test_pype_get_queue_arguments_wait_str_timeout():
+    """Wait str casts to bool & timeout to float."""
+    context = Context({'w': 'False',
+                       't': '1.5',
+                       'pype': {'name': 'pipe name',
+                                'queue': 'queue.db',
+                                'wait': '{w}',
+                                'timeout': '{t}'}})
+
+    assert pype.get_queue_arguments(context) == (
+        'queue.db', None, False, 1.5)
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pype_queue_wait_timeout(mock_get_queue, mock_wait):
+    """Queue wait gives up after timeout."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.put.return_value = 1
+    mock_wait.side_effect = LoopMaxExhaustedError('arb')
+
+    context = Context({'pype': {'name': 'pipe name',
+                                'args': {'a': 'b'},
+                                'queue': 'queue.db',
+                                'timeout': 2}})
+    context.working_dir = 'arb/dir'
+
+    with pytest.raises(LoopMaxExhaustedError):
+        pype.run_step(context)
+
+    mock_wait.assert_called_once_with(mock_queue, [1], timeout=2.0)
+# endregion run_step queue
+
 
 # region write_child_context_to_parent
 
@@ -0,0 +1,126 @@
+"""pypewait.py unit tests."""
+import logging
+from unittest.mock import call, patch
+import pytest
+from pypyr.context import Context
+from pypyr.errors import KeyNotInContextError, QueueJobError
+import pypyr.steps.pypewait as pypewait
+from tests.common.utils import patch_logger
+
+
+def test_pypewait_no_queue_raises():
+    """Queue is mandatory."""
+    with pytest.raises(KeyNotInContextError) as err_info:
+        pypewait.run_step(Context({'pypeWait': {'jobs': [1]}}))
+
+    assert str(err_info.value) == ("context['pypeWait']['queue'] doesn't "
+                                   "exist. It must exist for "
+                                   "pypyr.steps.pypewait.")
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pypewait_pype_jobs(mock_get_queue, mock_wait):
+    """Wait for pypeJobs, write outs in job order & clear pypeJobs."""
+    mock_wait.return_value = [{'out': {'a': 1, 'b': 1}},
+                              {'out': {'b': 2}}]
+    context = Context({'q': 'queue.db',
+                       'pypeJobs': [3, 4],
+                       'pypeWait': {'queue': '{q}',
+                                    'queueBackend': 'arb.backend',
+                                    'interval': 2,
+                                    'timeout': 10}})
+
+    with patch_logger('pypyr.steps.pypewait', logging.INFO) as mock_log:
+        pypewait.run_step(context)
+
+    mock_get_queue.assert_called_once_with('queue.db', 'arb.backend')
+    mock_wait.assert_called_once_with(mock_get_queue.return_value,
+                                      [3, 4],
+                                      interval=2,
+                                      timeout=10)
+    assert context['a'] == 1
+    assert context['b'] == 2
+    assert context['pypeJobs'] == []
+    assert mock_log.mock_calls == [call('waiting for 2 pype jobs.'),
+                                   call('pype jobs done.')]
+
+
+@patch('pypyr.workqueue.wait_for_results', return_value=[])
+@patch('pypyr.workqueue.get_queue')
+def test_pypewait_no_pype_jobs(mock_get_queue, mock_wait):
+    """No jobs to wait for."""
+    context = Context({'pypeWait': {'queue': 'queue.db'}})
+
+    pypewait.run_step(context)
+
+    mock_wait.assert_called_once_with(mock_get_queue.return_value,
+                                      [],
+                                      interval=0.25,
+                                      timeout=None)
+    assert context['pypeJobs'] == []
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pypewait_jobs_failed(mock_get_queue, mock_wait):
+    """Raise 1st failed job after writing outs of the rest."""
+    mock_wait.return_value = [
+        {'error': {'name': 'E1', 'description': 'x'},
+         'pipeline_name': 'p', 'worker': 'w'},
+        {'out': {'a': 1}},
+        {'error': {'name': 'E2', 'description': 'y'},
+         'pipeline_name': 'p', 'worker': 'w'}]
+    context = Context({'pypeJobs': [9],
+                       'pypeWait': {'queue': 'queue.db',
+                                    'jobs': [1, 2, 3]}})
+
+    with patch_logger('pypyr.steps.pypewait', logging.ERROR) as mock_log:
+        with pytest.raises(QueueJobError) as err:
+            pypewait.run_step(context)
+
+    assert str(err.value) == "p job 1 failed on worker w. E1: x"
+    assert mock_wait.call_args[0][1] == [1, 2, 3]
+    assert context['a'] == 1
+    assert context['pypeJobs'] == [9]
+    assert mock_log.mock_calls == [
+        call('p job 1 failed on worker w. E1: x'),
+        call('p job 3 failed on worker w. E2: y')]
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pypewait_jobs_failed_swallow(mock_get_queue, mock_wait):
+    """Failed jobs with raiseError False carry on."""
+    mock_wait.return_value = [
+        {'error': {'name': 'E1', 'description': 'x'},
+         'pipeline_name': 'p', 'worker': 'w'}]
+    context = Context({'pypeWait': {'queue': 'queue.db',
+                                    'jobs': [1],
+                                    'raiseError': False}})
+
+    pypewait.run_step(context)
+
+
+@patch('pypyr.workqueue.wait_for_results')
+@patch('pypyr.workqueue.get_queue')
+def test_pypewait_formatted_strings_cast(mock_get_queue, mock_wait):
+    """Formatted interval, timeout & raiseError cast to float & bool."""
+    mock_wait.return_value = [
+        {'error': {'name': 'E1', 'description': 'x'},
+         'pipeline_name': 'p', 'worker': 'w'}]
+    context = Context({'interval': '0.5',
+                       'isRaise': 'False',
+                       'ids': [1],
+                       'pypeWait': {'queue': 'queue.db',
+                                    'jobs': '{ids}',
+                                    'interval': '{interval}',
+                                    'timeout': '3',
+                                    'raiseError': '{isRaise}'}})
+
+    pypewait.run_step(context)
+
+    mock_wait.assert_called_once_with(mock_get_queue.return_value,
+                                      [1],
+                                      interval=0.5,
+                                      timeout=3.0)
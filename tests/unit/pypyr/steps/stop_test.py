@@ -1,19 +1,18 @@
 """stop.py unit tests."""
-import pytest
 from pypyr.context import Context
 from pypyr.errors import Stop
 import pypyr.steps.stop
 
 
 def test_step_stop():
-    """Raise stop from stop."""
-    with pytest.raises(Stop):
-        pypyr.steps.stop.run_step({})
+    """Return stop from stop."""
+    result = pypyr.steps.stop.run_step({})
+    assert type(result) is Stop
 
 
 def test_step_stop_context_same():
     """Context endures on Stop."""
     context = Context({'test': 'value1'})
-    with pytest.raises(Stop):
-        pypyr.steps.stop.run_step(context)
+    result = pypyr.steps.stop.run_step(context)
+    assert type(result) is Stop
     assert context['test'] == 'value1', "context not returned from step."
@@ -1,5 +1,4 @@
 """stoppipeline.py unit tests."""
-import pytest
 from pypyr.context import Context
 from pypyr.errors import StopPipeline
 import pypyr.steps.stoppipeline
@@ -7,13 +6,13 @@
 
 def test_step_stoppipeline():
     """Stop raises stop."""
-    with pytest.raises(StopPipeline):
-        pypyr.steps.stoppipeline.run_step({})
+    result = pypyr.steps.stoppipeline.run_step({})
+    assert type(result) is StopPipeline
 
 
 def test_step_stoppipeline_context_same():
     """Stop doesn't nuke context."""
     context = Context({'test': 'value1'})
-    with pytest.raises(StopPipeline):
-        pypyr.steps.stoppipeline.run_step(context)
+    result = pypyr.steps.stoppipeline.run_step(context)
+    assert type(result) is StopPipeline
     assert context['test'] == 'value1', "context not returned from step."
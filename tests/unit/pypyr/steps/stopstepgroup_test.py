@@ -1,5 +1,4 @@
 """stopstepgroup.py unit tests."""
-import pytest
 from pypyr.context import Context
 from pypyr.errors import StopStepGroup
 import pypyr.steps.stopstepgroup
@@ -7,13 +6,13 @@
 
 def test_step_stopstepgroup():
     """Stop raises stop."""
-    with pytest.raises(StopStepGroup):
-        pypyr.steps.stopstepgroup.run_step({})
+    result = pypyr.steps.stopstepgroup.run_step({})
+    assert type(result) is StopStepGroup
 
 
 def test_step_stopstepgroup_context_same():
     """Stop doesn't nuke context."""
     context = Context({'test': 'value1'})
-    with pytest.raises(StopStepGroup):
-        pypyr.steps.stopstepgroup.run_step(context)
+    result = pypyr.steps.stopstepgroup.run_step(context)
+    assert type(result) is StopStepGroup
     assert context['test'] == 'value1', "context not returned from step."
@@ -1,9 +1,13 @@
 """tar.py unit tests."""
+import posixpath
+import subprocess
+import tarfile
+import threading
 from pypyr.context import Context
 from pypyr.errors import KeyNotInContextError
 import pypyr.steps.tar
 import pytest
-from unittest.mock import patch, DEFAULT
+from unittest.mock import patch, DEFAULT, MagicMock
 
 # ------------------------- get file mode ------------------------------------#
 
@@ -356,3 +360,290 @@ def test_tar_archive_pass():
      __enter__().add.assert_any_call('.', arcname='.'))
 
 # ------------------------- tar archive --------------------------------------#
+
+# ------------------------- tar parallel -------------------------------------#
+
+
+def test_get_max_workers():
+    """Parallel defaults to 1, True is cpu count, int is int."""
+    assert pypyr.steps.tar.get_max_workers({}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': None}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': False}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': 0}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': -1}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': 3}) == 3
+    assert pypyr.steps.tar.get_max_workers({'parallel': '4'}) == 4
+    assert pypyr.steps.tar.get_max_workers({'parallel': ' -1 '}) == 1
+    assert pypyr.steps.tar.get_max_workers({'parallel': 'False'}) == 1
+
+    with patch('os.cpu_count', return_value=8):
+        assert pypyr.steps.tar.get_max_workers({'parallel': True}) == 8
+        assert pypyr.steps.tar.get_max_workers({'parallel': 'True'}) == 8
+
+    with patch('os.cpu_count', return_value=None):
+        assert pypyr.steps.tar.get_max_workers({'parallel': True}) == 1
+
+
+def test_tar_archive_parallel():
+    """Archive runs each entry on the thread pool when parallel > 1."""
+    context = Context({
+        'tar': {'archive': [
+            {'in': 'path/to/dir',
+             'out': './blah.tar.xz'},
+            {'in': '.',
+             'out': '/tra/la/la.tar.xz'}
+        ],
+            'parallel': 2}
+    })
+
+    lock = threading.Lock()
+    opened = []
+    added = []
+
+    def open_tar(name, mode):
+        """Record each open & add under a lock, with its own mock."""
+        archive = MagicMock()
+        archive.__enter__.return_value.add.side_effect = (
+            lambda source, arcname: record(added, (source, arcname)))
+        record(opened, (name, mode))
+        return archive
+
+    def record(calls, value):
+        """Append value to calls from any thread."""
+        with lock:
+            calls.append(value)
+
+    with patch('pypyr.steps.tar.ThreadPoolExecutor',
+               wraps=pypyr.steps.tar.ThreadPoolExecutor) as mock_executor:
+        with patch('tarfile.open', side_effect=open_tar):
+            pypyr.steps.tar.run_step(context)
+
+    mock_executor.assert_called_once_with(max_workers=2)
+    assert sorted(opened) == [('./blah.tar.xz', 'w:xz'),
+                              ('/tra/la/la.tar.xz', 'w:xz')]
+    assert sorted(added) == [('.', '.'), ('path/to/dir', '.')]
+
+
+def test_tar_extract_parallel_raises():
+    """Error on a parallel extract raises to caller."""
+    context = Context({
+        'tar': {'extract': [
+            {'in': './blah.tar.xz',
+             'out': 'path/to/dir'},
+            {'in': '/tra/la/la.tar.xz',
+             'out': '.'}
+        ],
+            'parallel': 2}
+    })
+
+    with patch('tarfile.open') as mock_tarfile:
+        mock_tarfile.side_effect = [DEFAULT, ValueError('arb')]
+        with pytest.raises(ValueError) as err:
+            pypyr.steps.tar.run_step(context)
+
+    assert str(err.value) == 'arb'
+    assert mock_tarfile.call_count == 2
+
+
+def test_tar_parallel_single_item_runs_inline():
+    """Don't bother with a thread pool for a single entry."""
+    context = Context({
+        'tar': {'archive': [
+            {'in': 'path/to/dir',
+             'out': './blah.tar.xz'}
+        ],
+            'parallel': 4}
+    })
+
+    with patch('pypyr.steps.tar.ThreadPoolExecutor') as mock_executor:
+        with patch('tarfile.open') as mock_tarfile:
+            pypyr.steps.tar.run_step(context)
+
+    mock_executor.assert_not_called()
+    mock_tarfile.assert_called_once_with('./blah.tar.xz', 'w:xz')
+
+# ------------------------- tar parallel -------------------------------------#
+
+# ------------------------- tar filters & compressor -------------------------#
+
+
+def make_source_tree(root):
+    """Create a little directory tree to archive under root."""
+    root.joinpath('sub', '__pycache__').mkdir(parents=True)
+    root.joinpath('a.py').write_text('a')
+    root.joinpath('b.txt').write_text('b')
+    root.joinpath('sub', 'c.py').write_text('c')
+    root.joinpath('sub', 'c.pyc').write_text('c')
+    root.joinpath('sub', '__pycache__', 'd.py').write_text('d')
+    return root
+
+
+def get_names(tar_path, mode='r:*'):
+    """Get the normalized, sorted names of files in tar_path."""
+    with tarfile.open(tar_path, mode) as tar:
+        return sorted(posixpath.normpath(m.name)
+                      for m in tar.getmembers() if m.isfile())
+
+
+def test_get_member_filter_none():
+    """No include or exclude means no filter."""
+    assert pypyr.steps.tar.get_member_filter({}) is None
+    assert pypyr.steps.tar.get_member_filter({'include': None,
+                                              'exclude': []}) is None
+
+
+def test_tar_archive_include_exclude(tmp_path):
+    """Archive only includes matching files, excludes pruned dirs."""
+    source = make_source_tree(tmp_path.joinpath('src'))
+    out = tmp_path.joinpath('out.tar.gz')
+
+    context = Context({
+        'tar': {'archive': [{'in': str(source), 'out': str(out)}],
+                'format': 'gz',
+                'include': '*.py',
+                'exclude': ['__pycache__', '*.pyc']}
+    })
+
+    pypyr.steps.tar.run_step(context)
+
+    assert get_names(out) == ['a.py', 'sub/c.py']
+
+
+def test_tar_extract_include_exclude(tmp_path):
+    """Extract only pulls out matching members."""
+    source = make_source_tree(tmp_path.joinpath('src'))
+    tar_path = tmp_path.joinpath('all.tar')
+    destination = tmp_path.joinpath('dest')
+
+    pypyr.steps.tar.run_step(Context({
+        'tar': {'archive': [{'in': str(source), 'out': str(tar_path)}],
+                'format': ''}
+    }))
+
+    assert get_names(tar_path) == ['a.py',
+                                   'b.txt',
+                                   'sub/__pycache__/d.py',
+                                   'sub/c.py',
+                                   'sub/c.pyc']
+
+    pypyr.steps.tar.run_step(Context({
+        'tar': {'extract': [{'in': str(tar_path), 'out': str(destination)}],
+                'exclude': '__pycache__',
+                'include': ['*.py', 'b.*']}
+    }))
+
+    extracted = sorted(p.relative_to(destination).as_posix()
+                       for p in destination.rglob('*') if p.is_file())
+    assert extracted == ['a.py', 'b.txt', 'sub/c.py']
+
+
+def test_tar_compressor_round_trip(tmp_path):
+    """External compressor streams archive & extract in parallel."""
+    source1 = make_source_tree(tmp_path.joinpath('src1'))
+    source2 = make_source_tree(tmp_path.joinpath('src2'))
+    out1 = tmp_path.joinpath('out1.tar.gz')
+    out2 = tmp_path.joinpath('out2.tar.gz')
+
+    pypyr.steps.tar.run_step(Context({
+        'tar': {'archive': [{'in': str(source1), 'out': str(out1)},
+                            {'in': str(source2), 'out': str(out2)}],
+                'compressor': 'gzip -1',
+                'exclude': '*.pyc',
+                'parallel': 2}
+    }))
+
+    # stdlib can read what the external compressor wrote
+    expected = ['a.py', 'b.txt', 'sub/__pycache__/d.py', 'sub/c.py']
+    assert get_names(out1, 'r:gz') == expected
+    assert get_names(out2, 'r:gz') == expected
+
+    dest1 = tmp_path.joinpath('dest1')
+    dest2 = tmp_path.joinpath('dest2')
+    pypyr.steps.tar.run_step(Context({
+        'tar': {'extract': [{'in': str(out1), 'out': str(dest1)},
+                            {'in': str(out2), 'out': str(dest2)}],
+                'compressor': 'gzip',
+                'include': 'c.py',
+                'parallel': 2}
+    }))
+
+    for dest in [dest1, dest2]:
+        extracted = sorted(p.relative_to(dest).as_posix()
+                           for p in dest.rglob('*') if p.is_file())
+        assert extracted == ['sub/c.py']
+        assert dest.joinpath('sub', 'c.py').read_text() == 'c'
+
+
+def test_tar_compressor_archive_error(tmp_path):
+    """Non-zero exit from the compressor raises."""
+    source = make_source_tree(tmp_path.joinpath('src'))
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        pypyr.steps.tar.run_step(Context({
+            'tar': {'archive': [{'in': str(source),
+                                 'out': str(tmp_path.joinpath('x.tar'))}],
+                    'compressor': 'sh -c "cat > /dev/null; exit 3"'}
+        }))
+
+    assert err.value.returncode == 3
+
+
+def test_tar_compressor_dies_early(tmp_path):
+    """Compressor that dies before reading it all raises its exit code."""
+    source = tmp_path.joinpath('src')
+    source.mkdir()
+    # bigger than the pipe buffer, so the write breaks the pipe.
+    source.joinpath('big.bin').write_bytes(bytes(1024 * 1024))
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        pypyr.steps.tar.run_step(Context({
+            'tar': {'archive': [{'in': str(source),
+                                 'out': str(tmp_path.joinpath('x.tar'))}],
+                    'compressor': 'sh -c "exit 5"'}
+        }))
+
+    assert err.value.returncode == 5
+
+
+@pytest.mark.parametrize('add_error, returncode, expected', [
+    (BrokenPipeError(), 5, subprocess.CalledProcessError),
+    (BrokenPipeError(), 0, BrokenPipeError),
+    (FileNotFoundError(), 1, FileNotFoundError),
+])
+def test_tar_compressor_broken_pipe_on_close(add_error, returncode, expected):
+    """Broken pipe on close doesn't hide the error that matters."""
+    with patch('pypyr.steps.tar.open'):
+        with patch('subprocess.Popen') as mock_popen:
+            process = mock_popen.return_value
+            process.stdin.close.side_effect = BrokenPipeError()
+            process.wait.return_value = returncode
+            with patch('tarfile.open', side_effect=add_error):
+                with pytest.raises(expected):
+                    pypyr.steps.tar.archive_item({'in': 'a', 'out': 'b'},
+                                                 mode='w|',
+                                                 compressor='arb')
+
+    process.stdin.close.assert_called_once()
+    process.wait.assert_called_once()
+
+
+def test_tar_compressor_extract_error(tmp_path):
+    """Non-zero exit from the decompressor raises."""
+    tar_path = tmp_path.joinpath('x.tar')
+    pypyr.steps.tar.run_step(Context({
+        'tar': {'archive': [{'in': str(make_source_tree(tmp_path / 'src')),
+                             'out': str(tar_path)}],
+                'format': ''}
+    }))
+
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        pypyr.steps.tar.run_step(Context({
+            'tar': {'extract': [{'in': str(tar_path),
+                                 'out': str(tmp_path.joinpath('dest'))}],
+                    'compressor': 'sh -c "cat; exit 4"'}
+        }))
+
+    assert err.value.returncode == 4
+    assert err.value.cmd == ['sh', '-c', 'cat; exit 4', '-d']
+
+# ------------------------- tar filters & compressor -------------------------#
@@ -1,16 +1,23 @@
 """stepsrunner.py unit tests."""
 import logging
+from pathlib import Path
+import threading
+import time
 import pytest
 from unittest.mock import call, patch
 from pypyr.context import Context
-from pypyr.dsl import Step
+from pypyr.dsl import SimpleStep, Step
 from pypyr.errors import (Call,
                           ContextError,
                           Jump,
+                          PipelineDefinitionError,
                           Stop,
                           StopPipeline,
-                          StopStepGroup)
+                          StopStepGroup,
+                          TimeoutExpiredError)
+from pypyr.resources import add_resources, get_resource
 from pypyr.stepsrunner import StepsRunner
+from pypyr.utils.cancel import CancelToken, get_token, run_with_token
 from tests.common.utils import DeepCopyMagicMock, patch_logger
 
 
@@ -630,7 +637,7 @@ def test_run_pipeline_steps_swallow_sequence(mock_invoke_step, mock_module):
 
 
 @patch('pypyr.moduleloader.get_module')
-@patch.object(Step, 'run_step')
+@patch.object(SimpleStep, 'run_step')
 def test_run_pipeline_steps_simple(mock_run_step, mock_module):
     """Simple step run."""
     with patch_logger('pypyr.dsl', logging.DEBUG) as mock_logger_debug:
@@ -640,6 +647,47 @@ def test_run_pipeline_steps_simple(mock_run_step, mock_module):
     mock_run_step.assert_called_once_with({'k1': 'v1'})
 
 
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_pipeline_steps_simple_reuses_step(mock_get_step):
+    """Same simple step name re-uses the same SimpleStep instance."""
+    mock_get_step.return_value = lambda context: context.update(
+        count=context['count'] + 1)
+    context = Context({'count': 0})
+    runner = StepsRunner(None, context)
+
+    with patch.object(Step, '__init__') as mock_step_init:
+        runner.run_pipeline_steps(['step1', 'step2', 'step1'])
+        runner.run_pipeline_steps(['step1'])
+
+    mock_step_init.assert_not_called()
+    assert mock_get_step.call_args_list == [call('step1'), call('step2')]
+    assert context['count'] == 4
+    assert list(runner._simple_steps) == ['step1', 'step2']
+    assert type(runner._simple_steps['step1']) is SimpleStep
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_pipeline_steps_cancelled_starts_no_new_steps(mock_get_step):
+    """Cancelled token stops the runner before the next step."""
+    token = CancelToken()
+
+    def cancel_step(context):
+        context['ran'] = True
+        token.cancel('arb reason')
+
+    mock_get_step.return_value = cancel_step
+    context = Context()
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_token(token,
+                       StepsRunner(None, context).run_pipeline_steps,
+                       ['step1', 'step2'])
+
+    assert str(err.value) == 'arb reason'
+    assert mock_get_step.call_args_list == [call('step1')]
+    assert context == {'ran': True}
+
+
 # ------------------------- run_pipeline_steps--------------------------------#
 
 # ------------------------- run_step_group------------------------------------#
@@ -887,8 +935,406 @@ def test_run_step_groups_none_groups():
 
     assert str(err.value) == (
         'you must specify which step-groups you want to run. groups is None.')
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_step_groups_adds_resources(mock_get_step):
+    """Run step groups adds pipeline resources before steps run."""
+    def check_resource(context):
+        context['limit'] = get_resource('runner-arb').limit
+
+    mock_get_step.return_value = check_resource
+    context = Context()
+    context.working_dir = 'arb/dir'
+
+    with patch('pypyr.stepsrunner.add_resources',
+               wraps=add_resources) as mock_add:
+        StepsRunner({'resources': {'runner-arb': {'limit': 2,
+                                                  'lockDir': 'locks'}},
+                     'sg1': ['step1']},
+                    context).run_step_groups(groups=['sg1'],
+                                             success_group=None,
+                                             failure_group=None)
+
+    mock_add.assert_called_once_with(
+        {'runner-arb': {'limit': 2, 'lockDir': 'locks'}}, 'arb/dir')
+    assert context['limit'] == 2
+    assert get_resource('runner-arb').lock_dir == Path('arb/dir/locks')
+
+
+@patch.object(StepsRunner, 'run_step_group')
+def test_run_step_groups_timeout_pass(mock_run_step_group):
+    """Groups & success group run under the time limit on another thread."""
+    tokens = []
+    mock_run_step_group.side_effect = lambda *args, **kwargs: tokens.append(
+        get_token())
+    context = Context()
+    context.pipeline_name = 'arb pipe'
+
+    StepsRunner(get_valid_test_pipeline(), context).run_step_groups(
+        groups=['sg1'],
+        success_group='arb success',
+        failure_group='arb fail',
+        timeout=5)
+
+    assert mock_run_step_group.mock_calls == [call('sg1'),
+                                              call('arb success')]
+    assert tokens[0] is tokens[1]
+    assert 0 < tokens[0].get_remaining() <= 5
+    assert get_token() is None
+
+
+@patch.object(StepsRunner, 'run_step_group')
+def test_run_step_groups_timeout_runs_failure_group(mock_run_step_group):
+    """Failure group runs on the caller thread when the time runs out."""
+    release = threading.Event()
+    failure_tokens = []
+
+    def run_step_group(name, raise_stop=False):
+        if name == 'sg1':
+            release.wait(5)
+        elif name == 'arb fail':
+            failure_tokens.append(get_token())
+
+    mock_run_step_group.side_effect = run_step_group
+    context = Context()
+    context.pipeline_name = 'arb pipe'
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        StepsRunner(get_valid_test_pipeline(), context).run_step_groups(
+            groups=['sg1'],
+            success_group='arb success',
+            failure_group='arb fail',
+            timeout=0.05)
+
+    release.set()
+    assert str(err.value) == (
+        "pipeline arb pipe didn't finish within its 0.05s timeout.")
+    assert mock_run_step_group.call_args_list[:2] == [
+        call('sg1'), call('arb fail', raise_stop=True)]
+    # outside the cancelled work, so the failure group's steps can run.
+    assert failure_tokens == [None]
+
 # ------------------------- END: run_step_groups -----------------------------#
 
+# ------------------------- run_dag_steps ------------------------------------#
+
+
+def get_dag_step_cache(steps):
+    """Step cache side effect that gets step functions by name."""
+    def get_step(name):
+        return steps[name]
+    return get_step
+
+
+def set_step(key, value):
+    """Step that sets key in context."""
+    def run_step(context):
+        context[key] = value
+    return run_step
+
+
+def wait_step(barrier, key):
+    """Step that only finishes once barrier.parties steps run at same time."""
+    def run_step(context):
+        context[key] = context['inKey']
+        barrier.wait(timeout=5)
+    return run_step
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_needs_order(mock_step_cache):
+    """Steps run after their needs & see what the needs wrote to context."""
+    order = []
+
+    def record(name):
+        def run_step(context):
+            order.append(name)
+            context[name] = [context.get(need) for need in ('a', 'b')]
+        return run_step
+
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'a': record('a'), 'b': record('b'), 'c': record('c'),
+         'd': record('d')})
+
+    context = Context({'k1': 'v1'})
+    instruction = StepsRunner(None, context).run_dag_steps(
+        steps=[{'name': 'c', 'needs': ['a', 'b']},
+               {'name': 'b', 'id': 'b', 'needs': 'a'},
+               {'name': 'a', 'id': 'a'},
+               'd'],
+        max_workers=1)
+
+    assert instruction is None
+    # most recently ready goes first, so a chain keeps going.
+    assert order == ['a', 'b', 'c', 'd']
+    assert context == {'k1': 'v1',
+                       'a': [None, None],
+                       'b': [[None, None], None],
+                       'c': [[None, None], [[None, None], None]],
+                       'd': [[None, None], [[None, None], None]]}
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_concurrent_in_parameters(mock_step_cache):
+    """Concurrent steps each see their own in parameters."""
+    barrier = threading.Barrier(3)
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'a': wait_step(barrier, 'outA'),
+         'b': wait_step(barrier, 'outB'),
+         'c': wait_step(barrier, 'outC')})
+
+    context = Context({'inKey': 'shared'})
+    with patch_logger('pypyr.stepsrunner', logging.DEBUG) as mock_log:
+        StepsRunner(None, context).run_dag_steps(
+            steps=[{'name': 'a', 'in': {'inKey': 'A'}},
+                   {'name': 'b', 'in': {'inKey': 'B'}},
+                   {'name': 'c'}],
+            max_workers=3)
+
+    assert context == {'outA': 'A', 'outB': 'B', 'outC': 'shared'}
+    assert call('running 3 steps by their needs, up to 3 at a time.'
+                ) in mock_log.mock_calls
+    assert call('executed 3 of 3 steps') in mock_log.mock_calls
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_keeps_context_attributes(mock_step_cache):
+    """Step context shares pystring globals with the shared context."""
+    def check_globals(context):
+        context['same'] = context.pystring_globals is shared_globals
+
+    mock_step_cache.return_value = check_globals
+    context = Context()
+    shared_globals = context.pystring_globals
+
+    StepsRunner(None, context).run_dag_steps(steps=['a'], max_workers=1)
+    assert context['same'] is True
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_carry_cancel_token(mock_step_cache):
+    """Steps on worker threads run as work of the caller's token."""
+    def save_token(context):
+        context['token'] = get_token()
+
+    mock_step_cache.return_value = save_token
+    token = CancelToken()
+    context = Context()
+
+    run_with_token(token,
+                   StepsRunner(None, context).run_dag_steps,
+                   steps=['a'],
+                   max_workers=1)
+    assert context['token'] is token
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_error_stops_new_steps(mock_step_cache):
+    """Failed step raises once running steps finish & skips the rest."""
+    barrier = threading.Barrier(2)
+
+    def fail(context):
+        barrier.wait(timeout=5)
+        raise ValueError('arb')
+
+    def finish_after_fail(context):
+        barrier.wait(timeout=5)
+        # still running when fail raises.
+        time.sleep(0.1)
+        context['finished'] = True
+
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'fail': fail, 'slow': finish_after_fail,
+         'never': set_step('never', True)})
+
+    context = Context()
+    with pytest.raises(ValueError) as err:
+        StepsRunner(None, context).run_dag_steps(
+            steps=[{'name': 'fail', 'id': 'f'},
+                   {'name': 'slow', 'id': 's'},
+                   {'name': 'never', 'needs': 's'},
+                   'never'],
+            max_workers=2)
+
+    assert str(err.value) == 'arb'
+    assert context['finished'] is True
+    assert 'never' not in context
+    assert context['runErrors'][0]['name'] == 'ValueError'
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_first_error_wins(mock_step_cache):
+    """When concurrent steps fail, the first to finish raises."""
+    barrier = threading.Barrier(2)
+
+    def fail(message, delay):
+        def run_step(context):
+            barrier.wait(timeout=5)
+            time.sleep(delay)
+            raise ValueError(message)
+        return run_step
+
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'a': fail('first', 0), 'b': fail('second', 0.2)})
+
+    with pytest.raises(ValueError) as err:
+        StepsRunner(None, Context()).run_dag_steps(steps=['a', 'b'],
+                                                   max_workers=2)
+
+    assert str(err.value) == 'first'
+
+
+@pytest.mark.parametrize('instruction', [Stop, StopPipeline, StopStepGroup])
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_returned_instruction(mock_step_cache, instruction):
+    """Returned instruction stops new steps & returns."""
+    stop = instruction()
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'stop': lambda context: stop,
+         'never': set_step('never', True)})
+
+    context = Context()
+    with patch_logger('pypyr.stepsrunner', logging.DEBUG) as mock_log:
+        result = StepsRunner(None, context).run_dag_steps(
+            steps=[{'name': 'stop', 'id': 'x'},
+                   {'name': 'never', 'needs': 'x'},
+                   'never'],
+            max_workers=1)
+
+    assert result is stop
+    assert context == {}
+    assert call(f'x returned {instruction.__name__}. not starting new '
+                'steps.') in mock_log.mock_calls
+    assert call('executed 1 of 3 steps') in mock_log.mock_calls
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_raised_jump_first_wins(mock_step_cache):
+    """Raised instruction returns. First instruction to finish wins."""
+    barrier = threading.Barrier(2)
+
+    def jump(groups, delay):
+        def run_step(context):
+            barrier.wait(timeout=5)
+            time.sleep(delay)
+            raise Jump(groups, None, None, ('jump', groups))
+        return run_step
+
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'a': jump(['sg1'], 0), 'b': jump(['sg2'], 0.2)})
+
+    result = StepsRunner(None, Context()).run_dag_steps(steps=['a', 'b'],
+                                                        max_workers=2)
+
+    assert type(result) is Jump
+    assert result.groups == ['sg1']
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_error_beats_instruction(mock_step_cache):
+    """Error raises even when another step returned an instruction."""
+    barrier = threading.Barrier(2)
+
+    def stop(context):
+        barrier.wait(timeout=5)
+        return Stop()
+
+    def fail(context):
+        barrier.wait(timeout=5)
+        time.sleep(0.2)
+        raise ValueError('arb')
+
+    mock_step_cache.side_effect = get_dag_step_cache({'a': stop, 'b': fail})
+
+    with pytest.raises(ValueError) as err:
+        StepsRunner(None, Context()).run_dag_steps(steps=['a', 'b'],
+                                                   max_workers=2)
+
+    assert str(err.value) == 'arb'
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_call_uses_step_context(mock_step_cache):
+    """Call from a dag step runs the called group on the step's context."""
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'call': call_step(['sg2'], original_config=('call', 'sg2')),
+         'called': set_step('called', True)})
+
+    context = Context()
+    StepsRunner({'sg2': ['called']}, context).run_dag_steps(steps=['call'],
+                                                            max_workers=2)
+
+    assert context == {'called': True, 'call': 'sg2'}
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_dag_steps_empty(mock_step_cache):
+    """No steps does nothing."""
+    assert StepsRunner(None, Context()).run_dag_steps(
+        steps=[], max_workers=1) is None
+
+    mock_step_cache.assert_not_called()
+
+
+@patch.object(StepsRunner, 'run_dag_steps', return_value=None)
+def test_run_step_group_dag(mock_run_dag_steps):
+    """Mapping step-group runs steps by their needs."""
+    pipeline = {'sg1': {'parallel': 3, 'steps': ['a']},
+                'sg2': {'steps': None},
+                'sg3': {'parallel': '{workers}', 'steps': ['b']},
+                'sg4': {'parallel': '{useAll}', 'steps': ['c']}}
+
+    with patch('pypyr.dag.os.cpu_count', return_value=5):
+        StepsRunner(pipeline,
+                    Context({'workers': 2, 'useAll': 'False'})
+                    ).run_step_groups(groups=['sg1', 'sg2', 'sg3', 'sg4'],
+                                      success_group=None,
+                                      failure_group=None)
+
+    assert mock_run_dag_steps.mock_calls == [
+        call(steps=['a'], max_workers=3),
+        call(steps=[], max_workers=5),
+        call(steps=['b'], max_workers=2),
+        call(steps=['c'], max_workers=1)]
+
+
+def test_run_step_group_dag_no_steps():
+    """Mapping step-group needs steps."""
+    with pytest.raises(PipelineDefinitionError) as err:
+        StepsRunner({'sg1': {'parallel': 2}},
+                    Context()).run_step_group('sg1')
+
+    assert str(err.value) == ("step-group sg1 is a mapping, so it needs a "
+                              "steps: sequence.")
+
+
+@patch('pypyr.cache.stepcache.step_cache.get_step')
+def test_run_step_groups_dag_failure_handler(mock_step_cache):
+    """Failed dag step runs failure group with runErrors, same as list."""
+    def fail(context):
+        raise ValueError('arb')
+
+    def handle(context):
+        context['handled'] = context['runErrors'][0]['description']
+
+    mock_step_cache.side_effect = get_dag_step_cache(
+        {'ok': set_step('ok', True), 'fail': fail, 'handle': handle})
+
+    context = Context()
+    with pytest.raises(ValueError):
+        StepsRunner({'sg1': {'steps': [{'name': 'ok', 'id': 'ok'},
+                                       {'name': 'fail', 'needs': 'ok'}]},
+                     'on_failure': ['handle']},
+                    context).run_step_groups(groups=['sg1'],
+                                             success_group=None,
+                                             failure_group='on_failure')
+
+    assert context['ok'] is True
+    assert context['handled'] == 'arb'
+
+# ------------------------- END: run_dag_steps -------------------------------#
+
 # ------------------------- Jump ---------------------------------------------#
 
 
@@ -0,0 +1,238 @@
+"""cancel.py unit tests."""
+import logging
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from pypyr.errors import TimeoutExpiredError
+from pypyr.utils.cancel import (CancelToken,
+                                check_cancelled,
+                                get_remaining,
+                                get_token,
+                                run_with_timeout,
+                                run_with_token)
+from tests.common.utils import patch_logger
+
+# ------------------------- CancelToken --------------------------------------
+
+
+@patch('time.monotonic', return_value=100)
+def test_cancel_token_deadline(mock_monotonic):
+    """Deadline is timeout from now, but never later than parent's."""
+    assert CancelToken().deadline is None
+    assert CancelToken().get_remaining() is None
+
+    parent = CancelToken(10, expired_reason='parent expired')
+    assert parent.deadline == 110
+    assert parent.expired_reason == 'parent expired'
+    assert parent.parent is None
+    assert parent.reason is None
+
+    assert CancelToken(5, parent).deadline == 105
+    assert CancelToken(5, parent, 'arb').expired_reason == 'arb'
+    assert CancelToken(20, parent).deadline == 110
+    assert CancelToken(20, parent, 'arb').expired_reason == 'parent expired'
+    assert CancelToken(10, parent, 'arb').expired_reason == 'parent expired'
+    assert CancelToken(None, parent).deadline == 110
+    assert CancelToken(5, CancelToken()).deadline == 105
+    assert CancelToken(5, CancelToken(), 'arb').expired_reason == 'arb'
+
+    child = CancelToken(20, parent)
+    assert child.parent is parent
+
+    mock_monotonic.return_value = 104
+    assert child.get_remaining() == 6
+
+    mock_monotonic.return_value = 200
+    assert child.get_remaining() == 0
+
+
+def test_cancel_token_callbacks():
+    """Cancel calls callbacks once, except removed ones."""
+    token = CancelToken()
+    callback = MagicMock()
+    removed = MagicMock()
+    token.add_callback(callback)
+    token.add_callback(removed)
+    token.remove_callback(removed)
+    token.remove_callback(removed)
+
+    token.check()
+    token.cancel('arb reason')
+    token.cancel('ignored')
+
+    assert token.reason == 'arb reason'
+    callback.assert_called_once_with()
+    removed.assert_not_called()
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        token.check()
+
+    assert str(err.value) == 'arb reason'
+
+    late = MagicMock()
+    token.add_callback(late)
+    late.assert_called_once_with()
+
+
+def test_cancel_token_callback_error_logs():
+    """A failing callback logs & doesn't stop the others."""
+    token = CancelToken()
+    callback = MagicMock()
+    token.add_callback(MagicMock(side_effect=ValueError('arb')))
+    token.add_callback(callback)
+
+    with patch_logger('pypyr.utils.cancel', logging.ERROR) as mock_error:
+        token.cancel('arb reason')
+
+    mock_error.assert_called_once_with(
+        "cancel callback failed. ValueError: arb")
+    callback.assert_called_once_with()
+
+# ------------------------- END CancelToken ----------------------------------
+
+# ------------------------- thread token -------------------------------------
+
+
+def test_no_token():
+    """Without a token there's no limit & nothing cancels."""
+    assert get_token() is None
+    assert get_remaining() is None
+    check_cancelled()
+
+
+def test_run_with_token():
+    """Run with token sets token for the call, then restores previous."""
+    outer = CancelToken(10)
+    inner = CancelToken()
+
+    def run():
+        assert get_token() is inner
+        assert get_remaining() is None
+        return run_with_token(None, get_token)
+
+    assert run_with_token(outer, run_with_token, inner, run) is None
+    assert get_token() is None
+
+    inner.cancel('arb')
+    with pytest.raises(TimeoutExpiredError):
+        run_with_token(inner, check_cancelled)
+
+
+def test_run_with_token_raises():
+    """Run with token restores previous token on error."""
+    with pytest.raises(ValueError):
+        run_with_token(CancelToken(), int, 'x')
+
+    assert get_token() is None
+
+# ------------------------- END thread token ---------------------------------
+
+# ------------------------- run_with_timeout ---------------------------------
+
+
+def test_run_with_timeout_returns():
+    """Function returns in time."""
+    def arb(a, b=None):
+        token = get_token()
+        assert token is not None
+        assert 0 < token.get_remaining() <= 5
+        return f'{a} {b}'
+
+    assert run_with_timeout(5, 'arb', arb, 1, b=2) == '1 2'
+    assert get_token() is None
+
+
+def test_run_with_timeout_raises_function_error():
+    """Function error raises as is."""
+    with pytest.raises(ValueError) as err:
+        run_with_timeout(5, 'arb', int, 'x')
+
+    assert 'invalid literal' in str(err.value)
+
+
+def test_run_with_timeout_expires():
+    """Time runs out, so it raises & cancels the function's token."""
+    release = threading.Event()
+    tokens = []
+
+    def stuck():
+        tokens.append(get_token())
+        release.wait(5)
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_timeout(0.05, 'step arb', stuck)
+
+    release.set()
+    expected = "step arb didn't finish within its 0.05s timeout."
+    assert str(err.value) == expected
+    assert tokens[0].reason == expected
+
+
+def test_run_with_timeout_nested_parent_cancels():
+    """Outer timeout cancels inner work with the outer reason."""
+    release = threading.Event()
+    inner_tokens = []
+    inner_errors = []
+
+    def stuck():
+        inner_tokens.append(get_token())
+        release.wait(5)
+
+    def outer():
+        try:
+            run_with_timeout(10, 'inner', stuck)
+        except TimeoutExpiredError as err:
+            inner_errors.append(err)
+            raise
+        finally:
+            release.set()
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_timeout(0.05, 'outer', outer)
+
+    # the inner waiter cancels on the abandoned outer thread.
+    assert release.wait(5)
+    expected = "outer didn't finish within its 0.05s timeout."
+    assert str(err.value) == expected
+    assert str(inner_errors[0]) == expected
+    assert inner_tokens[0].reason == expected
+    assert inner_tokens[0].deadline == inner_tokens[0].parent.deadline
+
+
+def test_run_with_timeout_parent_already_cancelled():
+    """Work under a cancelled parent cancels with parent's reason."""
+    parent = CancelToken()
+    parent.cancel('parent reason')
+    release = threading.Event()
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_token(parent,
+                       run_with_timeout, 10, 'arb', release.wait, 5)
+
+    release.set()
+    assert str(err.value) == 'parent reason'
+
+
+def test_run_with_timeout_interrupted():
+    """Interrupt while waiting cancels the function's token."""
+    tokens = []
+    release = threading.Event()
+
+    def stuck():
+        tokens.append(get_token())
+        release.wait(5)
+
+    class InterruptedEvent(threading.Event):
+        def wait(self, timeout=None):
+            while not tokens:
+                super().wait(0.01)
+            raise KeyboardInterrupt()
+
+    with patch('pypyr.utils.cancel.threading.Event', InterruptedEvent):
+        with pytest.raises(KeyboardInterrupt):
+            run_with_timeout(10, 'arb', stuck)
+
+    release.set()
+    assert tokens[0].reason == 'arb interrupted.'
+
+# ------------------------- END run_with_timeout -----------------------------
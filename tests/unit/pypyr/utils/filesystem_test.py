@@ -1,5 +1,6 @@
 """fileformat.py unit tests."""
 import io
+import os
 import pytest
 from unittest.mock import mock_open
 import pypyr.utils.filesystem as filesystem
@@ -107,3 +108,34 @@ def test_is_same_file_none():
 
 
 # ------------------------ END is_same_file -----------------------------------
+
+# ------------------------ open_atomic ----------------------------------------
+
+
+def test_open_atomic_replaces_path(tmp_path):
+    """Open atomic only replaces path once done writing."""
+    path = tmp_path.joinpath('sub', 'out.txt')
+
+    with filesystem.open_atomic(path) as outfile:
+        outfile.write('arb')
+        assert not path.exists()
+        assert os.path.dirname(outfile.name) == str(path.parent)
+
+    assert path.read_text() == 'arb'
+    assert os.listdir(path.parent) == ['out.txt']
+
+
+def test_open_atomic_error_keeps_original(tmp_path):
+    """Open atomic error removes temp file & leaves path as it was."""
+    path = tmp_path.joinpath('out.txt')
+    path.write_text('original')
+
+    with pytest.raises(ValueError):
+        with filesystem.open_atomic(path) as outfile:
+            outfile.write('partial')
+            raise ValueError('arb')
+
+    assert path.read_text() == 'original'
+    assert os.listdir(tmp_path) == ['out.txt']
+
+# ------------------------ END open_atomic ------------------------------------
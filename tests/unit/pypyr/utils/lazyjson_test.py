@@ -0,0 +1,335 @@
+"""lazyjson.py unit tests."""
+import copy
+import json
+import mmap
+import pickle
+from pypyr.context import Context
+import pypyr.utils.lazyjson as lazyjson
+import pytest
+
+DOC = b'''
+{
+    "a": {"b": [1, {"c": "d"}, [2, 3]], "x/y": true, "m~n": null},
+    "s": "has [brackets] {braces} , and \\"quotes\\" \\\\",
+    "arr": [ {"k": 1}, {"k": "]"}, 3.5e2 , "v", false ],
+    "empty": [],
+    "emptyobj": {},
+    "a": "duplicate"
+}
+'''
+
+# region get_pointer_tokens
+
+
+def test_get_pointer_tokens_root():
+    """Empty pointer is whole document."""
+    assert lazyjson.get_pointer_tokens('') == []
+
+
+def test_get_pointer_tokens_unescapes():
+    """Tokens unescape ~1 and ~0, in that order."""
+    assert lazyjson.get_pointer_tokens('/a/x~1y/m~0n/~01/') == [
+        'a', 'x/y', 'm~n', '~1', '']
+
+
+def test_get_pointer_tokens_no_slash_raises():
+    """Pointer must start with /."""
+    with pytest.raises(ValueError) as err:
+        lazyjson.get_pointer_tokens('a/b')
+
+    assert str(err.value) == "json pointer a/b must be '' or start with /."
+# endregion get_pointer_tokens
+
+# region get_by_pointer
+
+
+def test_get_by_pointer():
+    """Get value from parsed obj by pointer."""
+    obj = json.loads(DOC)
+    assert lazyjson.get_by_pointer(obj, '') is obj
+    assert lazyjson.get_by_pointer(obj, '/a') == 'duplicate'
+    assert lazyjson.get_by_pointer(obj, '/arr/1/k') == ']'
+
+
+@pytest.mark.parametrize('pointer', ['/nope', '/arr/9', '/arr/-',
+                                     '/arr/4/x', '/s/0'])
+def test_get_by_pointer_not_found(pointer):
+    """Missing pointer raises KeyError."""
+    obj = json.loads(DOC)
+    with pytest.raises(KeyError) as err:
+        lazyjson.get_by_pointer(obj, pointer)
+
+    assert err.value.args[0] == f'{pointer} not found.'
+# endregion get_by_pointer
+
+# region get_selection
+
+
+def test_get_selection_mapping():
+    """Mapping selection is used as is."""
+    select = {'k': '/a'}
+    assert lazyjson.get_selection(select) is select
+
+
+def test_get_selection_str():
+    """Single pointer string uses its last token as key."""
+    assert lazyjson.get_selection('/a/b') == {'b': '/a/b'}
+
+
+def test_get_selection_list():
+    """List uses last token of each pointer as key."""
+    assert lazyjson.get_selection(['/a/b', '/x~1y']) == {'b': '/a/b',
+                                                         'x/y': '/x~1y'}
+
+
+def test_get_selection_list_root_raises():
+    """Whole document has no key in list."""
+    with pytest.raises(ValueError) as err:
+        lazyjson.get_selection(['/a', ''])
+
+    assert str(err.value) == (
+        "select list can't contain the whole document pointer ''. "
+        "Use a dict like {myKey: ''} instead.")
+# endregion get_selection
+
+# region find_pointer & load_pointer
+
+
+@pytest.mark.parametrize('pointer', ['', '/a', '/a/b', '/a/b/1/c', '/a/b/2/0',
+                                     '/a/x~1y', '/a/m~0n', '/s', '/arr',
+                                     '/arr/1', '/arr/1/k', '/arr/2',
+                                     '/arr/4', '/empty', '/emptyobj'])
+def test_load_pointer_matches_json(pointer):
+    """Scanned values parse same as the stdlib, first duplicate key wins."""
+    expected = json.loads(DOC)
+    # scanner stops at first match, so first duplicate "a" wins.
+    expected['a'] = json.loads(DOC.replace(b'"a": "duplicate"',
+                                           b'"z": 0'))['a']
+    if pointer:
+        expected = lazyjson.get_by_pointer(expected, pointer)
+    else:
+        # root parses whole doc with json.loads, so last duplicate wins.
+        expected = json.loads(DOC)
+
+    assert lazyjson.load_pointer(DOC, pointer) == expected
+
+
+def test_find_pointer_span():
+    """Find pointer gets start & end without parsing."""
+    start, end = lazyjson.find_pointer(DOC, '/arr/2')
+    assert DOC[start:end] == b'3.5e2'
+
+    start, end = lazyjson.find_pointer(b'  [1, 2]  ', '')
+    assert (start, end) == (2, 8)
+
+
+@pytest.mark.parametrize('pointer', ['/nope', '/arr/9', '/arr/-',
+                                     '/arr/2/x', '/s/0', '/empty/0',
+                                     '/emptyobj/x'])
+def test_find_pointer_not_found(pointer):
+    """Missing pointer raises KeyError."""
+    with pytest.raises(KeyError) as err:
+        lazyjson.find_pointer(DOC, pointer)
+
+    assert err.value.args[0] == f'{pointer} not found.'
+
+
+def test_load_pointer_mmap(tmp_path):
+    """Load pointers & lazy arrays from a memory map."""
+    path = tmp_path / 'doc.json'
+    path.write_bytes(DOC)
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    assert lazyjson.load_pointer(buffer, '/arr/1') == {'k': ']'}
+    assert lazyjson.load_pointer(buffer) == json.loads(DOC)
+
+    arr = lazyjson.load_pointer(buffer, '/arr', is_lazy=True)
+    assert list(arr) == [{'k': 1}, {'k': ']'}, 350.0, 'v', False]
+    buffer.close()
+
+
+def test_load_pointer_lazy_only_arrays():
+    """Lazy only applies to arrays."""
+    assert lazyjson.load_pointer(DOC, '/a/b/1', is_lazy=True) == {'c': 'd'}
+
+    root = lazyjson.load_pointer(b'[1,2]', is_lazy=True)
+    assert isinstance(root, lazyjson.LazyJsonArray)
+    assert list(root) == [1, 2]
+# endregion find_pointer & load_pointer
+
+# region scan errors
+
+
+@pytest.mark.parametrize('doc, message', [
+    (b'"abc', 'unterminated json string at 0.'),
+    (b'[1, [2]', "invalid json at 0. Expecting ',' delimiter at 7."),
+    (b'{"a": "}"', "invalid json at 0. Expecting ',' delimiter at 9."),
+    (b':', 'expected json value at 0.'),
+    (b'', 'expected json value at 0.'),
+])
+def test_scan_value_invalid(doc, message):
+    """Invalid json raises ValueError."""
+    with pytest.raises(ValueError) as err:
+        lazyjson.scan_value(doc, 0)
+
+    assert str(err.value) == message
+
+
+@pytest.mark.parametrize('doc, end', [
+    (b'"a \\" b" ', 8),
+    (b'-1.5e3,', 6),
+    (b'[1, {"a": [2]}] ', 15),
+])
+def test_scan_value(doc, end):
+    """Scan gets index 1 past the end of the value."""
+    assert lazyjson.scan_value(doc, 0) == end
+
+
+@pytest.mark.parametrize('doc, pointer, message', [
+    (b'[1 2]', '/1', 'expected , at 3 in json.'),
+    (b'{"a" 1}', '/a', 'expected : at 5 in json.'),
+    (b'{"a": 1 "b": 2}', '/b', 'expected , at 8 in json.'),
+    (b'{a: 1}', '/a', 'expected " at 1 in json.'),
+])
+def test_find_pointer_invalid(doc, pointer, message):
+    """Invalid containers raise ValueError."""
+    with pytest.raises(ValueError) as err:
+        lazyjson.find_pointer(doc, pointer)
+
+    assert str(err.value) == message
+
+
+def test_iter_array_not_array():
+    """Iterating something that isn't an array raises."""
+    with pytest.raises(ValueError) as err:
+        list(lazyjson.iter_array(b'{}', 0))
+
+    assert str(err.value) == 'expected [ at 0 in json.'
+
+
+def test_iter_object_spans():
+    """Iterate object members with value spans."""
+    doc = b'{"a" : [1], "b":"2"}'
+    assert [(key, doc[start:end])
+            for key, start, end in lazyjson.iter_object(doc, 0)] == [
+        ('a', b'[1]'), ('b', b'"2"')]
+# endregion scan errors
+
+# region small windows
+
+
+BIG = {
+    'big': [{'id': i, 's': '}, {"id": 1', 'ü': '€𝄞'} for i in range(20)],
+    'nums': [123456789.125, -1e-7] * 10,
+    'obj': {f'k{i}': [i, '], [', {'"': {}}] for i in range(20)},
+    'nested': [[[i, [i]], {'a': [i, 'ü']}] for i in range(10)],
+    'after': {'x': 'ü'},
+}
+
+BIG_POINTERS = ['', '/big', '/big/0', '/big/19/id', '/big/7/ü', '/nums',
+                '/nums/19', '/obj', '/obj/k19/1', '/obj/k3/2/"', '/nested',
+                '/nested/9/1/a/1', '/after', '/after/x']
+
+
+@pytest.mark.parametrize('window', [4, 8, 16, 1 << 16])
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+@pytest.mark.parametrize('indent', [None, 1])
+def test_load_pointer_small_windows(monkeypatch, window, ensure_ascii,
+                                    indent):
+    """Values span windows & multi-byte characters."""
+    monkeypatch.setattr(lazyjson, '_WINDOW', window)
+    doc = json.dumps(BIG, ensure_ascii=ensure_ascii,
+                     indent=indent).encode()
+
+    for pointer in BIG_POINTERS:
+        expected = lazyjson.get_by_pointer(BIG, pointer)
+        assert lazyjson.load_pointer(doc, pointer) == expected
+
+        start, end = lazyjson.find_pointer(doc, pointer)
+        assert json.loads(doc[start:end]) == expected
+
+    assert lazyjson.scan_value(doc, 0) == len(doc)
+    assert list(lazyjson.load_pointer(doc, '/big',
+                                      is_lazy=True)) == BIG['big']
+    assert list(lazyjson.load_pointer(doc, '/nested',
+                                      is_lazy=True)) == BIG['nested']
+    assert [(key, json.loads(doc[start:end]))
+            for key, start, end in lazyjson.iter_object(
+                doc, lazyjson.find_pointer(doc, '/obj')[0])] == list(
+                    BIG['obj'].items())
+
+
+def test_load_pointer_number_at_window_end(monkeypatch):
+    """Number the window cuts short isn't taken as done."""
+    monkeypatch.setattr(lazyjson, '_WINDOW', 8)
+    doc = b'[123456.789, 2]'
+    assert lazyjson.load_pointer(doc, '/0') == 123456.789
+    assert list(lazyjson.LazyJsonArray(doc)) == [123456.789, 2]
+
+
+def test_scan_value_invalid_past_window(monkeypatch):
+    """Invalid json after the 1st window raises with its byte index."""
+    monkeypatch.setattr(lazyjson, '_WINDOW', 8)
+    doc = '["ü", [1, 2, 3], 4, 5, 6 7]'.encode()
+
+    with pytest.raises(ValueError) as err:
+        lazyjson.scan_value(doc, 0)
+
+    assert str(err.value) == 'expected , at 26 in json.'
+# endregion small windows
+
+# region LazyJsonArray
+
+
+def test_lazy_json_array():
+    """Lazy array behaves like a read-only list."""
+    arr = lazyjson.LazyJsonArray(DOC, DOC.index(b'[ {'))
+    expected = [{'k': 1}, {'k': ']'}, 350.0, 'v', False]
+
+    assert len(arr) == 5
+    assert list(arr) == expected
+    assert arr[0] == {'k': 1}
+    assert arr[-1] is False
+    assert arr[1:4] == expected[1:4]
+    assert arr[::-2] == expected[::-2]
+    assert repr(arr) == '<LazyJsonArray of 5 items>'
+
+    with pytest.raises(IndexError):
+        arr[5]
+
+
+def test_lazy_json_array_items_fresh():
+    """Each access parses a new item, so mutations don't stick."""
+    arr = lazyjson.LazyJsonArray(b'[{"a": 1}]')
+    item = arr[0]
+    item['a'] = 2
+    assert arr[0] == {'a': 1}
+
+
+def test_lazy_json_array_empty():
+    """Empty lazy array."""
+    arr = lazyjson.LazyJsonArray(b' [ ] ', 1)
+    assert len(arr) == 0
+    assert list(arr) == []
+
+
+def test_lazy_json_array_copy_pickle_as_list():
+    """Deepcopy & pickle give a plain list."""
+    arr = lazyjson.LazyJsonArray(b'[1, [2], {"3": 4}]')
+
+    copied = copy.deepcopy(arr)
+    assert type(copied) is list
+    assert copied == [1, [2], {'3': 4}]
+
+    assert pickle.loads(pickle.dumps(arr)) == [1, [2], {'3': 4}]
+
+
+def test_lazy_json_array_formatter_passes_through():
+    """Formatter doesn't copy lazy array, so foreach can use it as is."""
+    arr = lazyjson.LazyJsonArray(b'["{k}", 2]')
+    context = Context({'arr': arr, 'k': 'v'})
+
+    assert context.get_formatted_value('{arr}') is arr
+    assert context.get_formatted('arr') is arr
+# endregion LazyJsonArray
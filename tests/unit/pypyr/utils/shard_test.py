@@ -0,0 +1,156 @@
+"""shard.py unit tests."""
+import pickle
+import pytest
+from pypyr.utils.lazyjson import LazyJsonArray
+from pypyr.utils.shard import (get_item_hash,
+                               get_shard,
+                               merge_json_files,
+                               Shard)
+
+# region Shard
+
+
+def test_shard_init():
+    """Shard converts index & count to int."""
+    shard = Shard('1', '4')
+    assert shard.index == 1
+    assert shard.count == 4
+    assert repr(shard) == '1/4'
+    assert shard == Shard(1, 4)
+    assert shard != Shard(2, 4)
+    assert shard != '1/4'
+    assert pickle.loads(pickle.dumps(shard)) == shard
+
+
+@pytest.mark.parametrize('index, count', [(0, 0), (-1, 2), (2, 2)])
+def test_shard_out_of_range(index, count):
+    """Index must be in range for count."""
+    with pytest.raises(ValueError) as err:
+        Shard(index, count)
+
+    assert str(err.value) == (
+        f"shard {index}/{count} must be INDEX/COUNT, where COUNT is at least "
+        "1 & INDEX is 0 to COUNT - 1.")
+
+
+@pytest.mark.parametrize('mode', [True, 'stride'])
+def test_shard_get_items_stride(mode):
+    """Stride splits by position."""
+    items = list('abcdefg')
+    assert list(Shard(0, 3).get_items(items, mode)) == ['a', 'd', 'g']
+    assert list(Shard(1, 3).get_items(items, mode)) == ['b', 'e']
+    assert list(Shard(2, 3).get_items(items, mode)) == ['c', 'f']
+
+
+def test_shard_get_items_stride_iterables():
+    """Stride works on iterators, mappings & lazy arrays."""
+    assert list(Shard(1, 2).get_items(iter(range(5)))) == [1, 3]
+    assert list(Shard(0, 2).get_items({'a': 1, 'b': 2, 'c': 3})) == ['a', 'c']
+
+    lazy = LazyJsonArray(b'[1, 2, 3, 4]')
+    assert list(Shard(1, 2).get_items(lazy)) == [2, 4]
+
+
+def test_shard_get_items_hash():
+    """Hash puts every item in exactly 1 shard, whatever its position."""
+    items = [{'id': i} for i in range(50)]
+    shards = [list(Shard(i, 4).get_items(items, 'hash')) for i in range(4)]
+
+    assert sorted(item['id'] for shard in shards for item in shard) == list(
+        range(50))
+    assert all(shards)
+
+    # same item, same shard, even when other items come & go.
+    item = items[7]
+    home = next(i for i, shard in enumerate(shards) if item in shard)
+    assert list(Shard(home, 4).get_items([item], 'hash')) == [item]
+
+
+def test_shard_get_items_bad_mode():
+    """Mode must be stride or hash."""
+    with pytest.raises(ValueError) as err:
+        list(Shard(0, 2).get_items([1], 'arb'))
+
+    assert str(err.value) == ("shard mode must be one of ('stride', 'hash'). "
+                              "Instead, it's arb.")
+# endregion Shard
+
+# region get_item_hash
+
+
+def test_get_item_hash_stable():
+    """Item hash is stable across processes & key order."""
+    assert get_item_hash('abc') == 777682385
+    assert get_item_hash({'a': 1, 'b': 2}) == get_item_hash({'b': 2, 'a': 1})
+
+
+def test_get_item_hash_not_json():
+    """Items that aren't json hash on their str."""
+    assert get_item_hash({1, 2}) == get_item_hash(str({1, 2}))
+# endregion get_item_hash
+
+# region get_shard
+
+
+def test_get_shard():
+    """Get shard from str, tuple, Shard & None."""
+    shard = Shard(1, 2)
+    assert get_shard(None) is None
+    assert get_shard(shard) is shard
+    assert get_shard('1/2') == shard
+    assert get_shard((1, 2)) == shard
+
+
+@pytest.mark.parametrize('shard', ['1', '1/2/3', ''])
+def test_get_shard_bad_str(shard):
+    """Shard str must be INDEX/COUNT."""
+    with pytest.raises(ValueError) as err:
+        get_shard(shard)
+
+    assert str(err.value) == f"shard {shard} must be INDEX/COUNT, like 0/4."
+# endregion get_shard
+
+# region merge_json_files
+
+
+def test_merge_json_files_lists(tmp_path):
+    """Lists concatenate in path order."""
+    paths = [tmp_path / f'{i}.json' for i in range(3)]
+    for i, path in enumerate(paths):
+        path.write_text(f'[{i}, "{i}"]')
+
+    assert merge_json_files(paths) == [0, '0', 1, '1', 2, '2']
+
+
+def test_merge_json_files_dicts(tmp_path):
+    """Later dicts overwrite earlier keys."""
+    paths = [tmp_path / 'a.json', tmp_path / 'b.json']
+    paths[0].write_text('{"a": 1, "b": 1}')
+    paths[1].write_text('{"b": 2, "c": 2}')
+
+    assert merge_json_files(paths) == {'a': 1, 'b': 2, 'c': 2}
+
+
+def test_merge_json_files_none():
+    """No paths merge to None."""
+    assert merge_json_files([]) is None
+
+
+@pytest.mark.parametrize('first, second, type_name', [
+    ('[1]', '{"a": 1}', 'dict'),
+    ('{"a": 1}', '[1]', 'list'),
+    ('"a"', '[1]', 'str'),
+])
+def test_merge_json_files_mismatch(tmp_path, first, second, type_name):
+    """Mixed arrays & objects can't merge."""
+    paths = [tmp_path / 'a.json', tmp_path / 'b.json']
+    paths[0].write_text(first)
+    paths[1].write_text(second)
+
+    bad_path = paths[0] if type_name == 'str' else paths[1]
+    with pytest.raises(TypeError) as err:
+        merge_json_files(paths)
+
+    assert str(err.value) == ("can only merge json that is all arrays or all "
+                              f"objects. {bad_path} is a {type_name}.")
+# endregion merge_json_files
@@ -0,0 +1,367 @@
+"""workqueue.py unit tests."""
+import logging
+import threading
+import time
+from unittest.mock import call, MagicMock, patch
+import pytest
+from pypyr.context import Context
+from pypyr.errors import (LoopMaxExhaustedError,
+                          QueueJobError,
+                          TimeoutExpiredError)
+from pypyr.queues.sqlitequeue import SqliteQueue
+from pypyr.utils.cancel import CancelToken, run_with_token
+import pypyr.workqueue as workqueue
+from tests.common.utils import patch_logger
+
+
+def get_job(**kwargs):
+    """Get a job like pype puts on the queue."""
+    job = {'pipeline_name': 'arb pipe',
+           'args': None,
+           'pipe_arg': None,
+           'skip_parse': True,
+           'working_dir': 'job/dir',
+           'loader': None,
+           'groups': None,
+           'success_group': None,
+           'failure_group': None,
+           'out': None}
+    job.update(kwargs)
+    return job
+
+# region get_queue
+
+
+def test_get_queue_default_backend(tmp_path):
+    """Default backend is sqlite."""
+    queue = workqueue.get_queue(tmp_path / 'queue.db')
+    assert isinstance(queue, SqliteQueue)
+
+
+@patch('pypyr.moduleloader.get_module')
+def test_get_queue_backend(mock_get_module):
+    """Backend module gets the queue."""
+    queue = workqueue.get_queue('arb location', 'arb.backend')
+
+    mock_get_module.assert_called_once_with('arb.backend')
+    mock_get_module.return_value.get_queue.assert_called_once_with(
+        'arb location')
+    assert queue is mock_get_module.return_value.get_queue.return_value
+# endregion get_queue
+
+# region get_worker_name
+
+
+@patch('pypyr.workqueue.os.getpid', return_value=123)
+@patch('pypyr.workqueue.socket.gethostname', return_value='host')
+def test_get_worker_name(mock_host, mock_pid):
+    """Worker name is host & pid."""
+    assert workqueue.get_worker_name() == 'host-123'
+# endregion get_worker_name
+
+# region run_job
+
+
+@patch('pypyr.pipelinerunner.prepare_and_run')
+def test_run_job_out(mock_run):
+    """Run job with args & get formatted out values."""
+    def run(context, **kwargs):
+        context['c'] = 'child {a}'
+        context['d'] = 'arb'
+
+    mock_run.side_effect = run
+    job = get_job(args={'a': 'b'},
+                  pipe_arg=['x'],
+                  skip_parse=False,
+                  loader='arb.loader',
+                  groups=['g'],
+                  success_group='s',
+                  failure_group='f',
+                  out={'parent_c': 'c'})
+
+    assert workqueue.run_job(job) == {'out': {'parent_c': 'child b'}}
+
+    mock_run.assert_called_once_with(pipeline_name='arb pipe',
+                                     working_dir='job/dir',
+                                     pipeline_context_input=['x'],
+                                     context={'a': 'b',
+                                              'c': 'child {a}',
+                                              'd': 'arb'},
+                                     parse_input=True,
+                                     loader='arb.loader',
+                                     groups=['g'],
+                                     success_group='s',
+                                     failure_group='f')
+    assert isinstance(mock_run.call_args[1]['context'], Context)
+
+
+@patch('pypyr.pipelinerunner.prepare_and_run')
+def test_run_job_no_args_no_out_working_dir(mock_run):
+    """Worker working dir overrides job's & no out is empty out."""
+    assert workqueue.run_job(get_job(), 'worker/dir') == {'out': {}}
+
+    assert mock_run.call_args[1]['working_dir'] == 'worker/dir'
+    assert mock_run.call_args[1]['context'] == {}
+    assert mock_run.call_args[1]['parse_input'] is False
+
+
+@patch('pypyr.pipelinerunner.prepare_and_run',
+       side_effect=ValueError('arb'))
+def test_run_job_error(mock_run):
+    """Failed job's result has the error."""
+    with patch_logger('pypyr.workqueue', logging.ERROR) as mock_log:
+        result = workqueue.run_job(get_job())
+
+    assert result == {'error': {'name': 'ValueError', 'description': 'arb'}}
+    mock_log.assert_called_once_with(
+        "Something went wrong running arb pipe job. ValueError: arb")
+# endregion run_job
+
+# region renewing_claim
+
+
+def test_renewing_claim_renews_until_done():
+    """Claim renews every interval while the with block runs."""
+    queue = MagicMock()
+    renewed = threading.Event()
+    renewals = []
+
+    def renew(job_id, worker):
+        renewals.append((job_id, worker))
+        if len(renewals) == 3:
+            renewed.set()
+        return True
+
+    queue.renew.side_effect = renew
+
+    with workqueue.renewing_claim(queue, 1, 'w', interval=0.01):
+        assert renewed.wait(5)
+
+    count = len(renewals)
+    time.sleep(0.05)
+    # stopped renewing after the with block.
+    assert len(renewals) == count
+    assert renewals[0] == (1, 'w')
+
+
+def test_renewing_claim_lost():
+    """Claim stops renewing when the worker lost the job."""
+    queue = MagicMock()
+    queue.renew.return_value = False
+
+    with patch_logger('pypyr.workqueue', logging.WARNING) as mock_warn:
+        with workqueue.renewing_claim(queue, 1, 'w', interval=0.01):
+            time.sleep(0.1)
+
+    queue.renew.assert_called_once_with(1, 'w')
+    mock_warn.assert_called_once_with(
+        "worker w lost its claim on job 1, so another worker might run it "
+        "too.")
+
+
+def test_renewing_claim_error_tries_again():
+    """Failed renewal logs & tries again next interval."""
+    queue = MagicMock()
+    done = threading.Event()
+
+    def renew(job_id, worker):
+        if queue.renew.call_count == 1:
+            raise ValueError('arb')
+
+        done.set()
+        return True
+
+    queue.renew.side_effect = renew
+
+    with patch_logger('pypyr.workqueue', logging.ERROR) as mock_error:
+        with workqueue.renewing_claim(queue, 1, 'w', interval=0.01):
+            assert done.wait(5)
+
+    mock_error.assert_called_once_with(
+        "Couldn't renew claim on job 1. ValueError: arb")
+
+
+@patch('pypyr.workqueue.renewing_claim')
+@patch('pypyr.workqueue.get_worker_name', return_value='w')
+@patch('pypyr.workqueue.run_job', return_value={'out': {}})
+@patch('pypyr.workqueue.get_queue')
+def test_run_worker_renews_claim(mock_get_queue,
+                                 mock_run_job,
+                                 mock_name,
+                                 mock_renewing):
+    """Worker renews its claim while the job runs."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.claim.return_value = (1, get_job())
+
+    assert workqueue.run_worker('queue.db', max_jobs=1) == 1
+
+    mock_renewing.assert_called_once_with(mock_queue, 1, 'w')
+# endregion renewing_claim
+
+# region run_worker
+
+
+@patch('pypyr.workqueue.get_worker_name', return_value='w')
+@patch('pypyr.workqueue.run_job')
+@patch('pypyr.workqueue.get_queue')
+def test_run_worker_stop_when_empty(mock_get_queue,
+                                    mock_run_job,
+                                    mock_name):
+    """Worker runs jobs until queue is empty."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.claim.side_effect = [(1, get_job()),
+                                    (2, get_job(pipeline_name='p2')),
+                                    None]
+    mock_queue.complete.return_value = True
+    mock_run_job.side_effect = [{'out': {}},
+                                {'error': {'name': 'E', 'description': 'x'}}]
+
+    with patch_logger('pypyr.workqueue', logging.INFO) as mock_log:
+        count = workqueue.run_worker('queue.db',
+                                     backend='arb.backend',
+                                     working_dir='arb/dir',
+                                     is_stop_when_empty=True)
+
+    assert count == 2
+    mock_get_queue.assert_called_once_with('queue.db', 'arb.backend')
+    assert mock_run_job.mock_calls == [call(get_job(), 'arb/dir'),
+                                       call(get_job(pipeline_name='p2'),
+                                            'arb/dir')]
+    assert mock_queue.complete.mock_calls == [
+        call(1, 'w', {'out': {}, 'pipeline_name': 'arb pipe', 'worker': 'w'}),
+        call(2, 'w', {'error': {'name': 'E', 'description': 'x'},
+                      'pipeline_name': 'p2',
+                      'worker': 'w'})]
+    assert mock_log.mock_calls == [
+        call('worker w started on queue.db.'),
+        call('worker w running arb pipe job 1.'),
+        call('worker w running p2 job 2.'),
+        call('worker w done after 2 jobs.')]
+
+
+@patch('pypyr.workqueue.time.sleep')
+@patch('pypyr.workqueue.get_worker_name', return_value='w')
+@patch('pypyr.workqueue.run_job', return_value={'out': {}})
+@patch('pypyr.workqueue.get_queue')
+def test_run_worker_waits_for_jobs_max_jobs(mock_get_queue,
+                                            mock_run_job,
+                                            mock_name,
+                                            mock_sleep):
+    """Worker sleeps while queue empty & stops at max jobs."""
+    mock_get_queue.return_value.claim.side_effect = [None,
+                                                     None,
+                                                     (1, get_job())]
+
+    assert workqueue.run_worker('queue.db', interval=0.5, max_jobs=1) == 1
+    assert mock_sleep.mock_calls == [call(0.5), call(0.5)]
+    mock_run_job.assert_called_once_with(get_job(), None)
+
+
+@patch('pypyr.workqueue.get_worker_name', return_value='w')
+@patch('pypyr.workqueue.run_job', return_value={'out': {'a': object()}})
+@patch('pypyr.workqueue.get_queue')
+def test_run_worker_result_wont_save(mock_get_queue,
+                                     mock_run_job,
+                                     mock_name):
+    """Result that doesn't serialize fails the job, not the worker."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.claim.return_value = (1, get_job())
+    mock_queue.complete.side_effect = [TypeError('arb'), True]
+
+    with patch_logger('pypyr.workqueue', logging.ERROR) as mock_log:
+        assert workqueue.run_worker('queue.db', max_jobs=1) == 1
+
+    assert mock_queue.complete.call_args == call(
+        1, 'w', {'error': {'name': 'TypeError', 'description': 'arb'},
+                 'pipeline_name': 'arb pipe',
+                 'worker': 'w'})
+    mock_log.assert_called_once_with(
+        "Couldn't save result of job 1. TypeError: arb")
+
+
+@patch('pypyr.workqueue.get_worker_name', return_value='w')
+@patch('pypyr.workqueue.run_job', return_value={'out': {}})
+@patch('pypyr.workqueue.get_queue')
+def test_run_worker_lost_claim(mock_get_queue,
+                               mock_run_job,
+                               mock_name):
+    """Worker that lost its claim doesn't save its result."""
+    mock_queue = mock_get_queue.return_value
+    mock_queue.claim.return_value = (1, get_job())
+    mock_queue.complete.return_value = False
+
+    with patch_logger('pypyr.workqueue', logging.WARNING) as mock_log:
+        assert workqueue.run_worker('queue.db', max_jobs=1) == 1
+
+    mock_log.assert_called_once_with(
+        "worker w lost its claim on job 1 before it finished, so its result "
+        "isn't saved.")
+# endregion run_worker
+
+# region wait_for_results
+
+
+@patch('pypyr.workqueue.time.sleep')
+def test_wait_for_results(mock_sleep):
+    """Wait until all done & return results in job order."""
+    queue = MagicMock()
+    queue.get_result.side_effect = [None, {'r': 2},
+                                    {'r': 1}]
+
+    assert workqueue.wait_for_results(queue, [1, 2], interval=3) == [
+        {'r': 1}, {'r': 2}]
+    assert queue.get_result.mock_calls == [call(1), call(2), call(1)]
+    mock_sleep.assert_called_once_with(3)
+
+
+def test_wait_for_results_no_jobs():
+    """No jobs, nothing to wait for."""
+    assert workqueue.wait_for_results(MagicMock(), []) == []
+
+
+@patch('pypyr.workqueue.time.sleep')
+@patch('pypyr.workqueue.time.monotonic', side_effect=[0, 1, 2.5])
+def test_wait_for_results_timeout(mock_monotonic, mock_sleep):
+    """Jobs not done before timeout raise."""
+    queue = MagicMock()
+    queue.get_result.side_effect = [{'r': 1}, None, None]
+
+    with pytest.raises(LoopMaxExhaustedError) as err:
+        workqueue.wait_for_results(queue, [1, 2], timeout=2)
+
+    assert str(err.value) == "jobs [2] still not done after waiting 2 seconds."
+    mock_sleep.assert_called_once_with(0.25)
+
+
+def test_wait_for_results_cancelled():
+    """Wait stops when the work on this thread cancels."""
+    queue = MagicMock()
+    queue.get_result.return_value = None
+    token = CancelToken()
+    token.cancel('arb reason')
+
+    with pytest.raises(TimeoutExpiredError) as err:
+        run_with_token(token, workqueue.wait_for_results, queue, [1])
+
+    assert str(err.value) == 'arb reason'
+    queue.get_result.assert_called_once_with(1)
+# endregion wait_for_results
+
+# region get_out
+
+
+def test_get_out():
+    """Out from a successful result."""
+    assert workqueue.get_out(1, {'out': {'a': 'b'}}) == {'a': 'b'}
+
+
+def test_get_out_error():
+    """Failed result raises."""
+    with pytest.raises(QueueJobError) as err:
+        workqueue.get_out(1, {'error': {'name': 'ValueError',
+                                        'description': 'arb'},
+                              'pipeline_name': 'p',
+                              'worker': 'w'})
+
+    assert str(err.value) == "p job 1 failed on worker w. ValueError: arb"
+# endregion get_out